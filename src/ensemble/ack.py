@@ -11,7 +11,8 @@ import time
 from datetime import datetime
 from pathlib import Path
 
-from ensemble.lock import atomic_write
+from ensemble.config import get_durability
+from ensemble.lock import GroupCommitWriter, atomic_write, validate_durability
 
 
 class AckManager:
@@ -21,13 +22,27 @@ class AckManager:
     タスク配信後、エージェントからの受領確認を管理する。
     """
 
-    def __init__(self, ack_dir: Path | None = None) -> None:
+    def __init__(
+        self,
+        ack_dir: Path | None = None,
+        writer: GroupCommitWriter | None = None,
+        durability: str | None = None,
+    ) -> None:
         """
         ACKマネージャを初期化する
 
         Args:
             ack_dir: ACKファイル保存ディレクトリ（デフォルト: queue/ack/）
+            writer: 指定時はこのGroupCommitWriter経由でACKを書き込む
+                    （多数のACKを短時間に送る場合に書き込みをまとめる）
+            durability: ACKファイルの耐久性レベル（"none" / "rename" / "fsync"）。
+                        Noneの場合は設定の durability.ack に従う。
+                        writer指定時はwriter側のレベルが使われる
         """
+        self.writer = writer
+        if durability is None:
+            durability = get_durability("ack")
+        self.durability = validate_durability(durability)
         self.ack_dir = ack_dir if ack_dir else Path("queue/ack")
         self.ack_dir.mkdir(parents=True, exist_ok=True)
 
@@ -41,7 +56,10 @@ class AckManager:
         """
         ack_file = self.ack_dir / f"{task_id}.ack"
         content = f"{agent}\n{datetime.now().isoformat()}\n"
-        atomic_write(str(ack_file), content)
+        if self.writer is not None:
+            self.writer.write(str(ack_file), content)
+        else:
+            atomic_write(str(ack_file), content, durability=self.durability)
 
     def wait(self, task_id: str, timeout: float = 30.0, interval: float = 0.1) -> bool:
         """
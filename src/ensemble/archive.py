@@ -0,0 +1,210 @@
+"""
+完了レポートのセグメントアーカイブ
+
+queue/reports/ に溜まるレポートを追記専用のNDJSONセグメントにまとめ、
+タスクIDからの取得はオフセットインデックスで O(1) に行う。
+
+ディレクトリ構造:
+    queue/archive/
+    ├── 000001.ndjson   # レポート1件 = 1行（JSON）
+    ├── 000002.ndjson   # セグメントが上限サイズを超えたら次の番号へ
+    └── index.tsv       # task_id <TAB> セグメント名 <TAB> オフセット <TAB> 長さ
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+from ensemble import codec
+
+
+class AppendOnlyReader:
+    """
+    複数プロセスから追記されるファイルを前回の続きから読むリーダー
+
+    ファイルが作り直された（inodeが変わった、または縮んだ）場合は先頭から読み直す。
+    書き込み途中の末尾行は次回に回す。
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: 追記専用ファイルのパス
+        """
+        self.path = path
+        self._offset = 0
+        self._inode: int | None = None
+
+    @property
+    def position(self) -> tuple[int | None, int]:
+        """読み終えた位置 (inode, オフセット)"""
+        return self._inode, self._offset
+
+    def seek(self, inode: int, offset: int) -> None:
+        """
+        読み始める位置を設定する（保存しておいた position から再開する場合）
+
+        ファイルが作り直されていれば（inodeが違う）次の read_new() で先頭から読み直す。
+        """
+        self._inode = inode
+        self._offset = offset
+
+    def read_new(self) -> tuple[bool, list[str]]:
+        """
+        前回以降に追記された完全な行を読む
+
+        Returns:
+            (先頭から読み直したか, 新しい行のリスト)。
+            ファイルが存在しない場合は (True, [])
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            reset = self._inode is not None
+            self._offset = 0
+            self._inode = None
+            return reset, []
+
+        reset = False
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            reset = self._inode is not None
+            self._offset = 0
+            self._inode = stat.st_ino
+
+        if stat.st_size <= self._offset:
+            return reset, []
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        return reset, data[:end].decode().splitlines()
+
+
+class ReportArchive:
+    """NDJSONセグメント + オフセットインデックスによるレポートアーカイブ"""
+
+    SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+    INDEX_NAME = "index.tsv"
+    LOCK_NAME = ".archive.lock"
+
+    def __init__(self, archive_dir: Path, segment_max_bytes: int = SEGMENT_MAX_BYTES) -> None:
+        """
+        Args:
+            archive_dir: アーカイブディレクトリ（queue/archive/）
+            segment_max_bytes: 1セグメントの上限サイズ。超えたら次のセグメントへ
+        """
+        self.archive_dir = archive_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.index_path = archive_dir / self.INDEX_NAME
+        self._index: dict[str, tuple[str, int, int]] = {}
+        self._reader = AppendOnlyReader(self.index_path)
+
+    def append(self, reports: dict[str, dict[str, Any]]) -> list[str]:
+        """
+        レポートをセグメントに追記し、インデックスに登録する
+
+        セグメント → インデックスの順にfsyncするため、インデックスに
+        載ったレポートは必ずセグメントから読める。
+
+        Args:
+            reports: {タスクID: レポート}
+
+        Returns:
+            アーカイブしたタスクIDのリスト
+        """
+        if not reports:
+            return []
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            segment = self._current_segment()
+            entries = []
+            with open(segment, "ab") as f:
+                offset = f.tell()
+                for task_id, report in reports.items():
+                    line = codec.dumps(report, "json").encode()
+                    f.write(line)
+                    entries.append(f"{task_id}\t{segment.name}\t{offset}\t{len(line)}\n")
+                    offset += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self.index_path, "a") as f:
+                f.write("".join(entries))
+                f.flush()
+                os.fsync(f.fileno())
+
+        return list(reports)
+
+    def get(self, task_id: str) -> dict[str, Any] | None:
+        """
+        タスクIDでレポートを取得する
+
+        Args:
+            task_id: タスクID
+
+        Returns:
+            レポート、またはアーカイブにない場合None
+        """
+        entry = self._load_index().get(task_id)
+        if entry is None:
+            return None
+
+        segment_name, offset, length = entry
+        with open(self.archive_dir / segment_name, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def task_ids(self) -> list[str]:
+        """アーカイブ済みのタスクIDを返す"""
+        return list(self._load_index())
+
+    def clear(self) -> None:
+        """全セグメントとインデックスを削除する"""
+        if not self.archive_dir.exists():
+            return
+        with self._locked():
+            for f in self.archive_dir.glob("*.ndjson"):
+                f.unlink()
+            self.index_path.unlink(missing_ok=True)
+        self._index = {}
+
+    def _load_index(self) -> dict[str, tuple[str, int, int]]:
+        """インデックスの追記分を読み込む"""
+        reset, lines = self._reader.read_new()
+        if reset:
+            self._index = {}
+        for line in lines:
+            task_id, segment_name, offset, length = line.split("\t")
+            # 同じタスクが再アーカイブされた場合は新しい方を使う
+            self._index[task_id] = (segment_name, int(offset), int(length))
+        return self._index
+
+    def _current_segment(self) -> Path:
+        """書き込み先のセグメントを返す（上限を超えていれば次の番号）"""
+        segments = sorted(self.archive_dir.glob("*.ndjson"))
+        if not segments:
+            return self.archive_dir / f"{1:06d}.ndjson"
+
+        latest = segments[-1]
+        if latest.stat().st_size < self.segment_max_bytes:
+            return latest
+        return self.archive_dir / f"{int(latest.stem) + 1:06d}.ndjson"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """アーカイブ全体の排他ロック（複数アーカイバーの追記を直列化）"""
+        lock_fd = os.open(self.archive_dir / self.LOCK_NAME, os.O_CREAT | os.O_WRONLY, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
@@ -0,0 +1,318 @@
+"""
+asyncio向けのタスクキュー
+
+TaskQueue（および create_task_queue で作れる他のバックエンド）の
+ブロッキングI/Oを上限付きのスレッドプールで実行し、await可能なAPIにする。
+claim(timeout=...) の待機はinotifyのfdをイベントループに登録して待つため、
+待っている間はスレッドを占有しない（inotifyが使えない環境ではasyncio.sleepで
+バックオフ付きポーリング）。
+
+使い方:
+    async with AsyncTaskQueue(base_dir=Path("queue")) as queue:
+        task_id = await queue.enqueue("Fix bug", agent="worker")
+        task = await queue.claim(agent="worker", timeout=30)
+        await queue.complete(task["task_id"], "success", "done")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, TypeVar
+
+from ensemble.queue import DEFAULT_PRIORITY, TaskQueue
+from ensemble.watch import IN_MODIFY, DirectoryWatcher, backoff_delays
+
+T = TypeVar("T")
+
+# ブロッキングI/Oを実行するスレッド数のデフォルト
+DEFAULT_MAX_WORKERS = 4
+
+# バックエンドが変更を通知できない場合の再確認間隔（秒）
+FALLBACK_POLL_INTERVAL = 1.0
+
+
+class AsyncTaskQueue:
+    """
+    TaskQueue の asyncio ラッパー
+
+    1つのイベントループから多数のワーカーコルーチンを動かしても、
+    同時に走るブロッキングI/Oは max_workers 本に抑えられる。
+    """
+
+    def __init__(
+        self,
+        queue: Any | None = None,
+        base_dir: Path | None = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Args:
+            queue: ラップするキュー（TaskQueue / SQLiteTaskQueue / RemoteTaskQueue）。
+                   Noneの場合は base_dir と kwargs で TaskQueue を作る
+            base_dir: キューのベースディレクトリ（queue省略時のみ）
+            max_workers: ブロッキングI/Oを実行するスレッド数の上限
+            **kwargs: TaskQueue に渡す追加引数（queue省略時のみ）
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.queue = queue if queue is not None else TaskQueue(base_dir=base_dir, **kwargs)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ensemble-queue"
+        )
+
+    async def enqueue(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+        **kwargs: Any,
+    ) -> str:
+        """
+        タスクをキューに追加する（TaskQueue.enqueue と同じ引数）
+
+        Returns:
+            タスクID
+        """
+        return await self._run(
+            self.queue.enqueue, command, agent, params, priority=priority, **kwargs
+        )
+
+    async def enqueue_many(self, specs: list[dict[str, Any]]) -> list[str]:
+        """
+        複数タスクをまとめてキューに追加する（TaskQueue.enqueue_many と同じ形式）
+
+        Returns:
+            タスクIDのリスト
+        """
+        return await self._run(self.queue.enqueue_many, specs)
+
+    async def enqueue_with_dependency(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        blocked_by: list[str] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """
+        依存関係付きでタスクをキューに追加する
+
+        Returns:
+            タスクID
+        """
+        return await self._run(
+            self.queue.enqueue_with_dependency,
+            command,
+            agent,
+            params,
+            blocked_by=blocked_by,
+            priority=priority,
+        )
+
+    async def claim(
+        self,
+        agent: str | None = None,
+        lease: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any] | None:
+        """
+        タスクを取得する
+
+        キューが空の場合は、新しいタスクが置かれるかtimeoutに達するまで
+        イベントループを止めずに待つ。
+
+        Args:
+            agent: 指定時はこのエージェントのレーンのみから取得
+            lease: リース期間（秒）
+            timeout: キューが空の場合に待つ最大秒数。Noneまたは0の場合は待たない
+
+        Returns:
+            タスクデータ、またはタイムアウトした場合None
+        """
+        claimed = await self.claim_batch(1, agent=agent, lease=lease)
+        if claimed or not timeout:
+            return claimed[0] if claimed else None
+
+        deadline = time.monotonic() + timeout
+        watch_dirs = await self._run(self._claim_watch_dirs, agent)
+        async with _ChangeWaiter(watch_dirs) as wait_for_change:
+            while True:
+                # 待つ前に再確認する（watch開始前に置かれたタスクを取りこぼさない）
+                claimed = await self.claim_batch(1, agent=agent, lease=lease)
+                if claimed:
+                    return claimed[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if await self._run(self._has_delayed):
+                    remaining = min(remaining, TaskQueue.DELAYED_POLL_INTERVAL)
+                await wait_for_change(remaining)
+
+    async def claim_batch(
+        self, n: int, agent: str | None = None, lease: float | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        最大n件のタスクをまとめて取得する（待たない）
+
+        Returns:
+            取得したタスクデータのリスト
+        """
+        return await self._run(self.queue.claim_batch, n, agent=agent, lease=lease)
+
+    async def complete(
+        self,
+        task_id: str,
+        result: str,
+        output: str,
+        error: str | None = None,
+    ) -> None:
+        """タスク完了を報告する（TaskQueue.complete と同じ引数）"""
+        await self._run(self.queue.complete, task_id, result, output, error)
+
+    async def heartbeat(self, task_id: str, lease: float | None = None) -> bool:
+        """処理中タスクのリースを延長する"""
+        return await self._run(self.queue.heartbeat, task_id, lease)
+
+    async def reap_expired(self) -> list[str]:
+        """リース期限切れの処理中タスクをキューに戻す"""
+        return await self._run(self.queue.reap_expired)
+
+    async def get_report(self, task_id: str) -> dict[str, Any] | None:
+        """完了報告を取得する"""
+        return await self._run(self.queue.get_report, task_id)
+
+    async def get_ready_tasks(self) -> list[dict[str, Any]]:
+        """依存関係を考慮して実行可能なタスクを取得する"""
+        return await self._run(self.queue.get_ready_tasks)
+
+    async def ready_tasks(
+        self, idle_timeout: float | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        実行可能になったタスクを順に返す非同期イテレータ
+
+        依存先の完了などで新たに実行可能になったタスクも、変更を待って返す。
+        同じタスクは1回だけ返す（claimはしない）。
+
+        Args:
+            idle_timeout: 新しいタスクがこの秒数現れなければ終了する。Noneなら終了しない
+
+        Yields:
+            実行可能なタスク
+        """
+        seen: set[str] = set()
+        watch_dirs = await self._run(self._ready_watch_dirs)
+        async with _ChangeWaiter(watch_dirs) as wait_for_change:
+            idle_deadline = None if idle_timeout is None else time.monotonic() + idle_timeout
+            while True:
+                fresh = [
+                    task for task in await self.get_ready_tasks() if task["task_id"] not in seen
+                ]
+                for task in fresh:
+                    seen.add(task["task_id"])
+                    yield task
+                if fresh and idle_timeout is not None:
+                    idle_deadline = time.monotonic() + idle_timeout
+
+                if idle_deadline is None:
+                    remaining = FALLBACK_POLL_INTERVAL
+                else:
+                    remaining = idle_deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                await wait_for_change(remaining)
+
+    async def close(self) -> None:
+        """スレッドプールを停止する（実行中のI/Oの完了は待つ）"""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        if hasattr(self.queue, "close"):
+            self.queue.close()
+
+    async def __aenter__(self) -> AsyncTaskQueue:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """ブロッキング関数をスレッドプールで実行する"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _claim_watch_dirs(self, agent: str | None) -> list[Path]:
+        """claim待ちでwatchするディレクトリ（ファイルバックエンド以外は空）"""
+        if isinstance(self.queue, TaskQueue):
+            return self.queue.claim_watch_dirs(agent)
+        return []
+
+    def _ready_watch_dirs(self) -> list[Path]:
+        """ready_tasks()でwatchするディレクトリ（新しいタスクと完了報告）"""
+        if isinstance(self.queue, TaskQueue):
+            return [*self.queue.claim_watch_dirs(), self.queue.reports_dir]
+        return []
+
+    def _has_delayed(self) -> bool:
+        """遅延タスクがあるか（ファイルバックエンドのみ）"""
+        return isinstance(self.queue, TaskQueue) and self.queue.has_delayed()
+
+
+class _ChangeWaiter:
+    """
+    DirectoryWatcher のfdをイベントループに登録し、変更をawaitで待つ
+
+    inotifyが使えない（またはwatchするディレクトリがない）場合は
+    asyncio.sleep によるバックオフ付きポーリングになる。
+    """
+
+    def __init__(self, paths: list[Path]) -> None:
+        # 投入ログはタスクファイルの作成後に追記されるため、追記（IN_MODIFY）でも起きる
+        self._watcher = DirectoryWatcher(paths, mask=IN_MODIFY) if paths else None
+        self._event = asyncio.Event()
+        self._backoff = backoff_delays(maximum=FALLBACK_POLL_INTERVAL)
+        self._fd: int | None = None
+
+    async def __aenter__(self) -> Callable[[float], Any]:
+        if self._watcher is not None:
+            self._fd = self._watcher.fileno()
+        if self._fd is not None:
+            asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+        return self.wait
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+        if self._watcher is not None:
+            self._watcher.close()
+
+    def _on_readable(self) -> None:
+        """fdが読めるようになったらイベントを読み捨てて起こす"""
+        assert self._watcher is not None
+        self._watcher.drain()
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        変更があるかtimeoutに達するまで待つ
+
+        Returns:
+            変更があった（または再確認すべき）場合True、タイムアウト時False
+        """
+        if timeout <= 0:
+            return False
+        if self._fd is None:
+            delay = min(next(self._backoff), timeout)
+            await asyncio.sleep(delay)
+            return delay < timeout
+
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
@@ -25,6 +25,9 @@ from pathlib import Path
 from ensemble.logger import NDJSONLogger
 from ensemble.loop_detector import LoopDetector
 
+# queueモードのリース期間に task_timeout へ上乗せする秒数
+QUEUE_LEASE_MARGIN = 60
+
 
 class LoopStatus(Enum):
     """ループ終了ステータス"""
@@ -47,6 +50,12 @@ class LoopConfig:
         model: 使用するモデル（デフォルト: sonnet）
         commit_each: 各イテレーションでコミットするか（デフォルト: True）
         log_dir: ログ出力ディレクトリ（デフォルト: .ensemble/logs/loop）
+        queue_backend: キューモードのストレージ（"file" / "sqlite" / "remote"、デフォルト: file）
+        queue_address: remoteバックエンドのサーバーアドレス
+            （デフォルト: None = <work_dir>/queue/queue.sock）
+        queue_wait: キューが空のとき新しいタスクを待つ秒数（デフォルト: 0 = 待たずに終了）
+        queue_max_attempts: 失敗したキュータスクの最大実行回数。2以上で
+            バックオフ付き再試行と dead-letter を有効にする（fileバックエンドのみ、デフォルト: 1）
     """
 
     max_iterations: int = 50
@@ -55,12 +64,24 @@ class LoopConfig:
     model: str = "sonnet"
     commit_each: bool = True
     log_dir: str = ".ensemble/logs/loop"
+    queue_backend: str = "file"
+    queue_address: str | None = None
+    queue_wait: float = 0.0
+    queue_max_attempts: int = 1
 
     def __post_init__(self) -> None:
         if self.max_iterations <= 0:
             raise ValueError("max_iterations must be positive")
         if self.task_timeout <= 0:
             raise ValueError("task_timeout must be positive")
+        if self.queue_backend not in ("file", "sqlite", "remote"):
+            raise ValueError("queue_backend must be 'file', 'sqlite' or 'remote'")
+        if self.queue_wait < 0:
+            raise ValueError("queue_wait must not be negative")
+        if self.queue_max_attempts < 1:
+            raise ValueError("queue_max_attempts must be at least 1")
+        if self.queue_max_attempts > 1 and self.queue_backend != "file":
+            raise ValueError("queue_max_attempts > 1 requires the 'file' queue backend")
 
 
 @dataclass
@@ -158,8 +179,22 @@ class AutonomousLoopRunner:
         # queueモード用のインスタンスを事前作成
         queue_instance = None
         if self.use_queue:
-            from ensemble.queue import TaskQueue
-            queue_instance = TaskQueue(base_dir=self.work_dir / "queue")
+            from ensemble.queue import RetryPolicy, create_task_queue
+            queue_kwargs = {}
+            if self.config.queue_address is not None:
+                queue_kwargs["address"] = self.config.queue_address
+            if self.config.queue_max_attempts > 1:
+                queue_kwargs["retry_policy"] = RetryPolicy(
+                    max_attempts=self.config.queue_max_attempts
+                )
+            # リースはイテレーションのタイムアウトより少し長くする
+            queue_instance = create_task_queue(
+                base_dir=self.work_dir / "queue",
+                backend=self.config.queue_backend,
+                visibility_timeout=self.config.task_timeout + QUEUE_LEASE_MARGIN,
+                logger=self.logger,
+                **queue_kwargs,
+            )
 
         for i in range(self.config.max_iterations):
             self.iteration = i + 1
@@ -442,7 +477,9 @@ class AutonomousLoopRunner:
         if queue_instance is None:
             return None
         try:
-            return queue_instance.claim()
+            # クラッシュしたワーカーが残したタスクを先にキューへ戻す
+            queue_instance.reap_expired()
+            return queue_instance.claim(timeout=self.config.queue_wait)
         except Exception:
             return None
 
@@ -0,0 +1,161 @@
+"""
+タスクキューの深さ管理とバックプレッシャー
+
+TaskQueue の保留タスク数（レーン別）をカウンターファイルで管理し、
+上限を超える投入を待たせる・拒否する・優先度の低いタスクを落とす。
+深さの確認はカウンターファイルの読み込みだけで行い、ディレクトリを一覧しない。
+
+カウンターファイル（queue/depth）:
+    {"<レーン名>": 保留タスク数, ...}   # delayed/ の遅延タスクも含む
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+# 上限に達したときの動作
+OVERFLOW_POLICIES = ("block", "reject", "drop_lowest")
+
+
+class QueueFullError(Exception):
+    """キューの深さが上限に達していて投入できない"""
+
+
+@dataclass
+class Backpressure:
+    """
+    投入の上限と、上限に達したときの動作
+
+    Attributes:
+        max_depth: キュー全体の保留タスク数の上限（Noneなら無制限）
+        max_lane_depth: エージェントのレーンごとの上限（Noneなら無制限）
+        policy: "block"（空くまでtimeout秒待つ）/ "reject"（すぐQueueFullError）/
+                "drop_lowest"（新しいタスクより優先度の低い保留タスクを落とす）
+        timeout: policy="block" で待つ最大秒数
+    """
+
+    max_depth: int | None = None
+    max_lane_depth: int | None = None
+    policy: str = "block"
+    timeout: float = 30.0
+
+    def __post_init__(self) -> None:
+        if self.policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy: {self.policy!r} (expected one of {OVERFLOW_POLICIES})"
+            )
+        for limit in (self.max_depth, self.max_lane_depth):
+            if limit is not None and limit < 1:
+                raise ValueError("depth limits must be at least 1")
+        if self.timeout < 0:
+            raise ValueError("timeout must not be negative")
+
+    def overflow(self, depths: dict[str, int], additions: dict[str, int]) -> dict[str, int]:
+        """
+        追加するとあふれる分を求める
+
+        Args:
+            depths: 現在のレーン別の深さ
+            additions: 追加するレーン別のタスク数
+
+        Returns:
+            {"": キュー全体の超過数, レーン名: レーンの超過数}（超過がなければ空）
+        """
+        excess: dict[str, int] = {}
+        if self.max_depth is not None:
+            total = sum(depths.values()) + sum(additions.values())
+            if total > self.max_depth:
+                excess[""] = total - self.max_depth
+        if self.max_lane_depth is not None:
+            for lane, count in additions.items():
+                lane_total = depths.get(lane, 0) + count
+                if lane_total > self.max_lane_depth:
+                    excess[lane] = lane_total - self.max_lane_depth
+        return excess
+
+
+class DepthCounter:
+    """レーン別の保留タスク数を持つカウンターファイル（flockで更新）"""
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: カウンターファイルのパス
+        """
+        self.path = path
+
+    def read(self) -> dict[str, int]:
+        """現在の深さを読む（ロックなし）"""
+        try:
+            return _parse(self.path.read_bytes())
+        except FileNotFoundError:
+            return {}
+
+    def add(self, deltas: dict[str, int]) -> None:
+        """
+        レーン別の深さを増減する（0未満にはならない）
+
+        Args:
+            deltas: {レーン名: 増減数}
+        """
+        if not any(deltas.values()):
+            return
+        with self.locked() as depths:
+            apply_deltas(depths, deltas)
+
+    def reset(self, depths: dict[str, int]) -> None:
+        """深さを数え直した値で置き換える"""
+        with self.locked() as current:
+            current.clear()
+            current.update({lane: n for lane, n in depths.items() if n > 0})
+
+    @contextmanager
+    def locked(self) -> Iterator[dict[str, int]]:
+        """
+        排他ロックを取り、深さの辞書を渡す（書き換えた内容はロック解放前に保存）
+
+        ディレクトリにファイルを作らない（claim待ちのinotifyを起こさない）よう、
+        tmp + renameではなくその場で書き換える。
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = b""
+            while chunk := os.pread(fd, 65536, len(data)):
+                data += chunk
+            depths = _parse(data)
+            before = dict(depths)
+            yield depths
+            if depths != before:
+                content = json.dumps(depths, sort_keys=True).encode() + b"\n"
+                os.pwrite(fd, content, 0)
+                os.ftruncate(fd, len(content))
+        finally:
+            os.close(fd)  # closeでロックも解放される
+
+
+def apply_deltas(depths: dict[str, int], deltas: dict[str, int]) -> None:
+    """深さの辞書にレーン別の増減を反映する（0以下のレーンは消す）"""
+    for lane, delta in deltas.items():
+        count = depths.get(lane, 0) + delta
+        if count > 0:
+            depths[lane] = count
+        else:
+            depths.pop(lane, None)
+
+
+def _parse(data: bytes) -> dict[str, int]:
+    """カウンターファイルの内容を読む（壊れていれば空）"""
+    try:
+        depths = json.loads(data or b"{}")
+    except ValueError:
+        return {}
+    if not isinstance(depths, dict):
+        return {}
+    return {str(lane): int(n) for lane, n in depths.items() if isinstance(n, int) and n > 0}
@@ -0,0 +1,364 @@
+"""
+キュー性能ベンチマーク
+
+TaskQueueのスループット・複数プロセス競合時のレイテンシ・
+get_ready_tasksのコスト・シリアライズコストを計測し、結果をJSONで出力する。
+リリース間でJSONをdiffして性能の退行を確認する。
+
+使い方:
+    ensemble bench queue
+    python -m ensemble.bench
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from ensemble import codec
+from ensemble.queue import create_task_queue
+
+# デフォルトで計測するバッチサイズ
+DEFAULT_BATCH_SIZES = (1, 10, 100)
+
+# get_ready_tasksを計測するキューサイズ
+DEFAULT_READY_SIZES = (100, 1000, 10000)
+
+# 計測するバックエンド（remoteは別プロセスのサーバーが必要なため対象外）
+BENCH_BACKENDS = ("file", "sqlite")
+
+# 競合ベンチマークで計測する操作
+CONTENTION_OPERATIONS = ("enqueue", "claim", "complete")
+
+
+def bench_batch_throughput(
+    base_dir: Path,
+    batch_sizes: tuple[int, ...] = DEFAULT_BATCH_SIZES,
+    total: int = 1000,
+    backend: str = "file",
+) -> dict[str, Any]:
+    """
+    enqueue_many / claim_batch のバッチサイズ別スループットを計測する
+
+    バッチサイズごとに新しいキューを作り、total件のタスクを
+    enqueue_many → claim_batch で全て流して所要時間を測る。
+
+    Args:
+        base_dir: 一時キューを作るディレクトリ
+        batch_sizes: 計測するバッチサイズ
+        total: 各バッチサイズで流すタスク数
+        backend: キューのバックエンド（"file" or "sqlite"）
+
+    Returns:
+        {"backend": ..., "total": ..., "results": [
+            {"batch_size": 10, "enqueue_ops_per_sec": ..., "claim_ops_per_sec": ...}, ...]}
+    """
+    results = []
+
+    for batch_size in batch_sizes:
+        queue = create_task_queue(
+            base_dir=base_dir / f"{backend}-batch-{batch_size}", backend=backend
+        )
+        specs = [
+            {"command": f"bench task {i}", "agent": "worker"} for i in range(total)
+        ]
+
+        start = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            queue.enqueue_many(specs[offset : offset + batch_size])
+        enqueue_seconds = time.perf_counter() - start
+
+        claimed = 0
+        start = time.perf_counter()
+        while True:
+            batch = queue.claim_batch(batch_size)
+            if not batch:
+                break
+            claimed += len(batch)
+        claim_seconds = time.perf_counter() - start
+
+        if hasattr(queue, "close"):
+            queue.close()
+
+        results.append(
+            {
+                "batch_size": batch_size,
+                "tasks": total,
+                "claimed": claimed,
+                "enqueue_seconds": round(enqueue_seconds, 6),
+                "claim_seconds": round(claim_seconds, 6),
+                "enqueue_ops_per_sec": round(total / enqueue_seconds, 1),
+                "claim_ops_per_sec": round(claimed / claim_seconds, 1),
+            }
+        )
+
+    return {"backend": backend, "total": total, "results": results}
+
+
+def bench_codec(iterations: int = 1000) -> dict[str, Any]:
+    """
+    タスク/レポート1件あたりのdump・parseコストを計測する
+
+    従来の純Python YAML（yaml.dump / yaml.safe_load）と、
+    codecのYAML（libyamlがあればC実装）・JSONを比較する。
+
+    Args:
+        iterations: 各方式で繰り返す回数
+
+    Returns:
+        {"libyaml": bool, "results": [
+            {"codec": "pyyaml", "dump_us": ..., "parse_us": ...}, ...]}
+    """
+    report = {
+        "task_id": "20260101120000-0123abcd",
+        "command": "fix lint errors in src/ensemble/queue.py",
+        "agent": "worker-1",
+        "params": {"source": "scan", "file_path": "src/ensemble/queue.py", "line_number": 42},
+        "blocked_by": ["20260101115959-89abcdef"],
+        "priority": "medium",
+        "status": "pending",
+        "created_at": "2026-01-01T12:00:00",
+        "result": "success",
+        "output": "Fixed 3 issues\n" * 5,
+        "completed_at": "2026-01-01T12:05:00",
+    }
+
+    def pyyaml_dump(data: Any) -> str:
+        return yaml.dump(data, allow_unicode=True, default_flow_style=False)
+
+    codecs = [
+        ("pyyaml", pyyaml_dump, yaml.safe_load),
+        ("yaml", lambda data: codec.dumps(data, "yaml"), codec.loads),
+        ("json", lambda data: codec.dumps(data, "json"), codec.loads),
+    ]
+
+    results = []
+    for name, dump, parse in codecs:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            text = dump(report)
+        dump_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            parse(text)
+        parse_seconds = time.perf_counter() - start
+
+        results.append(
+            {
+                "codec": name,
+                "bytes": len(text.encode()),
+                "dump_us": round(dump_seconds / iterations * 1e6, 2),
+                "parse_us": round(parse_seconds / iterations * 1e6, 2),
+            }
+        )
+
+    return {"libyaml": codec.SafeLoader is not yaml.SafeLoader, "results": results}
+
+
+def latency_summary(samples: list[float], elapsed: float) -> dict[str, Any]:
+    """
+    レイテンシのサンプルから件数・スループット・パーセンタイルを求める
+
+    Args:
+        samples: 1操作ごとの所要時間（秒）
+        elapsed: 全操作にかかった実時間（秒）。ops_per_secの分母
+
+    Returns:
+        {"count": ..., "ops_per_sec": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ...}
+    """
+    if not samples:
+        return {"count": 0, "ops_per_sec": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "ops_per_sec": round(len(samples) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+    }
+
+
+def _contention_worker(args: tuple[str, str, int, int]) -> dict[str, Any]:
+    """
+    競合ベンチマークの1ワーカー（別プロセスで実行）
+
+    ops件をenqueueした後、キューが空になるまでclaim → completeを繰り返す。
+
+    Returns:
+        {"latencies": {操作: [秒, ...]}, "elapsed": {操作: フェーズの実時間}}
+    """
+    base_dir, backend, ops, worker = args
+    queue = create_task_queue(base_dir=Path(base_dir), backend=backend)
+    latencies: dict[str, list[float]] = {op: [] for op in CONTENTION_OPERATIONS}
+    elapsed: dict[str, float] = {}
+
+    phase_start = time.perf_counter()
+    for i in range(ops):
+        start = time.perf_counter()
+        queue.enqueue(command=f"bench task {worker}-{i}", agent=f"worker-{i % 4}")
+        latencies["enqueue"].append(time.perf_counter() - start)
+    elapsed["enqueue"] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    while True:
+        start = time.perf_counter()
+        task = queue.claim()
+        if task is None:
+            break
+        latencies["claim"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        queue.complete(task["task_id"], result="success", output="ok")
+        latencies["complete"].append(time.perf_counter() - start)
+    elapsed["claim"] = elapsed["complete"] = time.perf_counter() - phase_start
+
+    if hasattr(queue, "close"):
+        queue.close()
+    return {"latencies": latencies, "elapsed": elapsed}
+
+
+def bench_contention(
+    base_dir: Path, workers: int = 4, ops_per_worker: int = 200, backend: str = "file"
+) -> dict[str, Any]:
+    """
+    複数プロセスから同じキューへ enqueue / claim / complete した時の性能を計測する
+
+    Args:
+        base_dir: 一時キューを作るディレクトリ
+        workers: ワーカープロセス数
+        ops_per_worker: 各ワーカーがenqueueするタスク数
+        backend: キューのバックエンド（"file" or "sqlite"）
+
+    Returns:
+        {"backend": ..., "workers": ..., "ops_per_worker": ...,
+         "operations": {"enqueue": {"count": ..., "ops_per_sec": ..., "p50_ms": ...}, ...}}
+    """
+    queue_dir = base_dir / f"{backend}-contention-{workers}"
+    # スキーマ作成などの初期化を計測から外す
+    queue = create_task_queue(base_dir=queue_dir, backend=backend)
+    if hasattr(queue, "close"):
+        queue.close()
+
+    jobs = [(str(queue_dir), backend, ops_per_worker, worker) for worker in range(workers)]
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.map(_contention_worker, jobs)
+
+    operations = {}
+    for op in CONTENTION_OPERATIONS:
+        samples = [sample for result in results for sample in result["latencies"][op]]
+        # 全ワーカーが並行して動くので、最も遅いワーカーのフェーズ時間を実時間とする
+        elapsed = max(result["elapsed"][op] for result in results)
+        operations[op] = latency_summary(samples, elapsed)
+
+    return {
+        "backend": backend,
+        "workers": workers,
+        "ops_per_worker": ops_per_worker,
+        "operations": operations,
+    }
+
+
+def bench_ready_tasks(
+    base_dir: Path, sizes: tuple[int, ...] = DEFAULT_READY_SIZES, backend: str = "file"
+) -> dict[str, Any]:
+    """
+    キューサイズ別にget_ready_tasksの所要時間を計測する
+
+    半数のタスクは外部タスクにblocked_byで依存させ、その依存先の半数を完了させる。
+    初回（キャッシュなし）と2回目（変更なし）の両方を計測する。
+
+    Args:
+        base_dir: 一時キューを作るディレクトリ
+        sizes: 計測するタスク数
+        backend: キューのバックエンド（"file" or "sqlite"）
+
+    Returns:
+        {"backend": ..., "results": [{"tasks": 100, "cold_ms": ..., "warm_ms": ..., "ready": ...}, ...]}
+    """
+    results = []
+
+    for size in sizes:
+        queue = create_task_queue(base_dir=base_dir / f"{backend}-ready-{size}", backend=backend)
+        specs: list[dict[str, Any]] = []
+        for i in range(size):
+            spec: dict[str, Any] = {"command": f"bench task {i}", "agent": "worker"}
+            if i % 2:
+                spec["blocked_by"] = [f"dep-{i - 1}"]
+            specs.append(spec)
+        queue.enqueue_many(specs)
+        for i in range(0, size, 4):
+            queue.complete(f"dep-{i}", result="success", output="ok")
+
+        start = time.perf_counter()
+        ready = queue.get_ready_tasks()
+        cold_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        queue.get_ready_tasks()
+        warm_seconds = time.perf_counter() - start
+
+        if hasattr(queue, "close"):
+            queue.close()
+
+        results.append(
+            {
+                "tasks": size,
+                "ready": len(ready),
+                "cold_ms": round(cold_seconds * 1000, 3),
+                "warm_ms": round(warm_seconds * 1000, 3),
+            }
+        )
+
+    return {"backend": backend, "results": results}
+
+
+def run_queue_suite(
+    backends: tuple[str, ...] = BENCH_BACKENDS,
+    workers: int = 4,
+    ops_per_worker: int = 200,
+    ready_sizes: tuple[int, ...] = DEFAULT_READY_SIZES,
+    batch_sizes: tuple[int, ...] = DEFAULT_BATCH_SIZES,
+) -> dict[str, Any]:
+    """
+    一時ディレクトリでキューのベンチマーク一式を実行する
+
+    Args:
+        backends: 計測するバックエンド
+        workers: 競合ベンチマークのワーカープロセス数
+        ops_per_worker: 各ワーカーがenqueueするタスク数
+        ready_sizes: get_ready_tasksを計測するタスク数
+        batch_sizes: バッチスループットを計測するバッチサイズ
+
+    Returns:
+        {"backends": {backend: {"contention": ..., "ready_tasks": ..., "batch": ...}},
+         "codec": ...}
+    """
+    report: dict[str, Any] = {"backends": {}}
+    with tempfile.TemporaryDirectory(prefix="ensemble-bench-") as tmp:
+        for backend in backends:
+            base_dir = Path(tmp) / backend
+            report["backends"][backend] = {
+                "contention": bench_contention(base_dir, workers, ops_per_worker, backend),
+                "ready_tasks": bench_ready_tasks(base_dir, ready_sizes, backend),
+                "batch": bench_batch_throughput(base_dir, batch_sizes, backend=backend),
+            }
+    report["codec"] = bench_codec()
+    return report
+
+
+def main() -> None:
+    """キューのベンチマーク一式を実行してJSONを出力する"""
+    print(json.dumps(run_queue_suite(), indent=2))
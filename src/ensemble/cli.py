@@ -7,12 +7,15 @@ import click
 
 from ensemble import __version__
 from ensemble.autonomous_loop import AutonomousLoopRunner, LoopConfig, LoopStatus
+from ensemble.commands.bench import bench
 from ensemble.commands.init import init
 from ensemble.investigator import InvestigationStrategy, TaskInvestigator
 from ensemble.scanner import CodebaseScanner
 from ensemble.commands.issue import issue
 from ensemble.commands.launch import launch
+from ensemble.commands.queue import queue
 from ensemble.commands.upgrade import upgrade
+from ensemble.config import configure_lock_stats
 from ensemble.pipeline import PipelineRunner
 
 
@@ -24,12 +27,14 @@ def cli() -> None:
     Ensemble provides multi-agent orchestration for complex development tasks,
     enabling parallel execution, automatic code review, and self-improvement.
     """
-    pass
+    configure_lock_stats()
 
 
+cli.add_command(bench)
 cli.add_command(init)
 cli.add_command(issue)
 cli.add_command(launch)
+cli.add_command(queue)
 cli.add_command(upgrade)
 
 
@@ -114,6 +119,30 @@ def pipeline(task: str, workflow: str, auto_pr: bool, branch: str | None) -> Non
     is_flag=True,
     help="Use TaskQueue for task selection instead of prompt file",
 )
+@click.option(
+    "--queue-backend",
+    default="file",
+    type=click.Choice(["file", "sqlite", "remote"]),
+    help="Storage backend for --queue (default: file; remote connects to `ensemble queue serve`)",
+)
+@click.option(
+    "--queue-address",
+    default=None,
+    help="Queue server address for --queue-backend remote (default: queue/queue.sock)",
+)
+@click.option(
+    "--queue-wait",
+    default=0.0,
+    type=float,
+    help="Seconds to wait for new tasks when the queue is empty (default: 0, stop immediately)",
+)
+@click.option(
+    "--queue-max-attempts",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Retry failed queue tasks with backoff up to this many attempts, "
+    "then dead-letter them (file backend only, default: 1)",
+)
 @click.option(
     "--scan",
     is_flag=True,
@@ -132,6 +161,10 @@ def loop(
     timeout: int,
     no_commit: bool,
     queue: bool,
+    queue_backend: str,
+    queue_address: str | None,
+    queue_wait: float,
+    queue_max_attempts: int,
     scan: bool,
     work_dir: str,
 ) -> None:
@@ -163,6 +196,18 @@ def loop(
 
       # Run with task queue
       ensemble loop --queue --max-iterations 20
+
+      # Run with SQLite-backed task queue
+      ensemble loop --queue --queue-backend sqlite
+
+      # Use a queue server shared by workers on several machines
+      ensemble loop --queue --queue-backend remote --queue-address tcp:queue-host:7878
+
+      # Keep waiting up to 5 minutes for new tasks instead of stopping
+      ensemble loop --queue --queue-wait 300
+
+      # Retry failed tasks up to 3 times before moving them to queue/dead/
+      ensemble loop --queue --queue-max-attempts 3
     """
     config = LoopConfig(
         max_iterations=max_iterations,
@@ -170,6 +215,10 @@ def loop(
         prompt_file=prompt,
         model=model,
         commit_each=not no_commit,
+        queue_backend=queue_backend,
+        queue_address=queue_address,
+        queue_wait=queue_wait,
+        queue_max_attempts=queue_max_attempts,
     )
 
     runner = AutonomousLoopRunner(
@@ -183,7 +232,7 @@ def loop(
     if scan:
         click.echo("Mode: CodebaseScanner (auto-discover tasks)")
     elif queue:
-        click.echo("Mode: TaskQueue")
+        click.echo(f"Mode: TaskQueue ({queue_backend})")
     else:
         click.echo(f"Mode: Prompt file ({prompt})")
     click.echo("")
@@ -235,7 +284,23 @@ def loop(
     is_flag=True,
     help="Exclude test files from TODO/FIXME scanning",
 )
-def scan(output_format: str, include: tuple[str, ...], exclude_tests: bool) -> None:
+@click.option(
+    "--enqueue",
+    is_flag=True,
+    help="Push task candidates into queue/ with their scan priority",
+)
+@click.option(
+    "--agent",
+    default="worker",
+    help="Agent lane for --enqueue (default: worker)",
+)
+def scan(
+    output_format: str,
+    include: tuple[str, ...],
+    exclude_tests: bool,
+    enqueue: bool,
+    agent: str,
+) -> None:
     """Scan codebase and generate task candidates.
 
     Analyzes the project for TODO/FIXME comments, open GitHub issues,
@@ -251,6 +316,9 @@ def scan(output_format: str, include: tuple[str, ...], exclude_tests: bool) -> N
 
       # JSON output
       ensemble scan --format json
+
+      # Queue candidates for workers (high priority first)
+      ensemble scan --enqueue --agent worker
     """
     import json as json_mod
 
@@ -306,6 +374,27 @@ def scan(output_format: str, include: tuple[str, ...], exclude_tests: bool) -> N
 
     if result.total == 0:
         click.echo("No task candidates found.")
+    elif enqueue:
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=Path.cwd() / "queue")
+        task_ids = queue.enqueue_many(
+            [
+                {
+                    "command": t.title,
+                    "agent": agent,
+                    "priority": t.priority.value,
+                    "params": {
+                        "source": t.source,
+                        "file_path": t.file_path,
+                        "line_number": t.line_number,
+                        "description": t.description,
+                    },
+                }
+                for t in result.sorted_by_priority()
+            ]
+        )
+        click.echo(f"Enqueued {len(task_ids)} tasks (agent: {agent})")
 
 
 @cli.command()
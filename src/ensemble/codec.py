@@ -0,0 +1,105 @@
+"""
+キュー・レポートファイルのシリアライズ
+
+YAMLの読み書きを一箇所にまとめ、libyamlが使える環境では
+Cベースの CSafeLoader / CSafeDumper を使う（純Python実装より大幅に速い）。
+
+機械しか読まないファイル向けにJSON形式も選べる。JSONはYAMLのサブセットなので、
+.yaml拡張子のままでも既存のYAMLリーダーで読める。
+エージェントがペインで読むファイルはデフォルトのYAMLのままにすること。
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+# libyamlがない環境では純Python実装にフォールバック
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# 選択可能な書き込み形式
+CODEC_FORMATS = ("yaml", "json")
+
+
+def validate_format(fmt: str) -> str:
+    """
+    書き込み形式を検証する
+
+    Args:
+        fmt: "yaml" or "json"
+
+    Returns:
+        検証済みの形式
+
+    Raises:
+        ValueError: 未知の形式の場合
+    """
+    if fmt not in CODEC_FORMATS:
+        raise ValueError(f"Unknown codec format: {fmt!r} (expected one of {CODEC_FORMATS})")
+    return fmt
+
+
+def dumps(data: Any, fmt: str = "yaml", sort_keys: bool = True) -> str:
+    """
+    データを文字列にシリアライズする
+
+    Args:
+        data: シリアライズするデータ
+        fmt: "yaml"（人間向け、ブロック形式）or "json"（機械向け、1行）
+        sort_keys: キーをソートするか（yaml.dumpのデフォルトに合わせてTrue）
+
+    Returns:
+        シリアライズ結果
+    """
+    if validate_format(fmt) == "json":
+        return json.dumps(data, ensure_ascii=False, sort_keys=sort_keys, default=str) + "\n"
+    return yaml.dump(
+        data,
+        Dumper=SafeDumper,
+        allow_unicode=True,
+        default_flow_style=False,
+        sort_keys=sort_keys,
+    )
+
+
+def loads(text: str | bytes) -> Any:
+    """
+    YAMLまたはJSONの文字列をデシリアライズする
+
+    JSONらしい内容はまずjsonモジュールで読み、失敗した場合はYAMLとして読む。
+
+    Args:
+        text: ファイル内容
+
+    Returns:
+        デシリアライズ結果（空の場合None）
+
+    Raises:
+        yaml.YAMLError: YAMLとしても不正な場合
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    if text.lstrip()[:1] in ("{", "["):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def load_file(path: Path | str) -> Any:
+    """
+    ファイルを読み込んでデシリアライズする
+
+    Args:
+        path: ファイルパス
+
+    Returns:
+        デシリアライズ結果（空の場合None）
+    """
+    with open(path, "rb") as f:
+        return loads(f.read())
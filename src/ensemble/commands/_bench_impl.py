@@ -0,0 +1,40 @@
+"""Implementation of the ensemble bench command."""
+
+import json
+from pathlib import Path
+
+import click
+
+from ensemble.bench import BENCH_BACKENDS, DEFAULT_READY_SIZES, run_queue_suite
+
+
+def run_bench_queue(
+    backends: tuple[str, ...] = (),
+    workers: int = 4,
+    ops: int = 200,
+    ready_sizes: tuple[int, ...] = (),
+    output: str | None = None,
+) -> None:
+    """Run the bench queue command implementation.
+
+    Args:
+        backends: Backends to measure. Empty means all backends.
+        workers: Worker processes for the contention benchmark.
+        ops: Tasks each worker enqueues, claims and completes.
+        ready_sizes: Queue sizes for the get_ready_tasks benchmark. Empty means defaults.
+        output: File to write the JSON report to. None prints to stdout.
+    """
+    report = run_queue_suite(
+        backends=backends or BENCH_BACKENDS,
+        workers=workers,
+        ops_per_worker=ops,
+        ready_sizes=ready_sizes or DEFAULT_READY_SIZES,
+    )
+    text = json.dumps(report, indent=2)
+
+    if output is None:
+        click.echo(text)
+        return
+
+    Path(output).write_text(text + "\n")
+    click.echo(f"Wrote benchmark report to {output}")
@@ -0,0 +1,222 @@
+"""Implementation of the ensemble queue command."""
+
+import math
+import time
+from pathlib import Path
+from typing import Any
+
+import click
+
+from ensemble.config import load_config
+from ensemble.lock import atomic_write
+from ensemble.logger import NDJSONLogger
+from ensemble.metrics import QueueMetrics, load_metrics
+from ensemble.queue import TaskQueue, create_task_queue
+from ensemble.queue_server import DEFAULT_SOCKET_NAME, QueueServer, QueueState
+from ensemble.snapshot import SNAPSHOT_NAME
+
+
+def run_reap(queue_dir: str = "queue", backend: str = "file", interval: float | None = None) -> None:
+    """Run the queue reap command implementation.
+
+    Args:
+        queue_dir: Queue directory to operate on.
+        backend: Queue storage backend ("file" or "sqlite").
+        interval: If set, keep reaping every ``interval`` seconds until interrupted.
+    """
+    queue = create_task_queue(base_dir=Path(queue_dir), backend=backend, logger=NDJSONLogger())
+    try:
+        while True:
+            reaped = queue.reap_expired()
+            for task_id in reaped:
+                click.echo(f"Requeued {task_id}")
+            click.echo(f"Reaped {len(reaped)} expired task(s)")
+
+            if interval is None:
+                return
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if hasattr(queue, "close"):
+            queue.close()
+
+
+def run_archive(queue_dir: str = "queue", older_than: float = 0.0) -> None:
+    """Run the queue archive command implementation.
+
+    Args:
+        queue_dir: Queue directory to operate on.
+        older_than: Only archive reports completed at least this many seconds ago.
+    """
+    queue = _open_existing_queue(queue_dir, metrics=False)
+    archived = queue.archive_reports(older_than=older_than)
+    click.echo(f"Archived {len(archived)} report(s)")
+
+
+def run_snapshot(queue_dir: str = "queue", output: str | None = None) -> None:
+    """Run the queue snapshot command implementation.
+
+    Args:
+        queue_dir: Queue directory to operate on.
+        output: Snapshot file to write. None uses <queue_dir>/snapshot.ndjson.
+    """
+    queue = _open_existing_queue(queue_dir, read_only=True)
+    path = Path(output) if output else queue.base_dir / SNAPSHOT_NAME
+    count = queue.snapshot(path)
+    click.echo(f"Wrote {count} record(s) to {path}")
+
+
+def _open_existing_queue(queue_dir: str, **kwargs: Any) -> TaskQueue:
+    """Open a queue directory that must already exist (never creates one).
+
+    Raises:
+        click.ClickException: If ``queue_dir`` is not a task queue.
+    """
+    base_dir = Path(queue_dir)
+    if not (base_dir / "tasks").is_dir():
+        raise click.ClickException(f"Not a task queue: {queue_dir}")
+    return TaskQueue(base_dir=base_dir, **kwargs)
+
+
+def run_restore(snapshot_file: str, queue_dir: str = "queue") -> None:
+    """Run the queue restore command implementation.
+
+    Args:
+        snapshot_file: Snapshot file written by ``ensemble queue snapshot``.
+        queue_dir: Queue directory to restore into.
+    """
+    queue = TaskQueue(base_dir=Path(queue_dir), metrics=False)
+    try:
+        restored = queue.restore(Path(snapshot_file))
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    if not restored:
+        click.echo("Nothing to restore")
+    for state, count in sorted(restored.items()):
+        click.echo(f"Restored {count} {state} record(s)")
+
+
+def run_serve(
+    queue_dir: str = "queue",
+    socket_path: str | None = None,
+    tcp: str | None = None,
+    token: str | None = None,
+    insecure: bool = False,
+    visibility_timeout: float = 1800.0,
+    fsync: bool = False,
+) -> None:
+    """Run the queue serve command implementation.
+
+    Args:
+        queue_dir: Directory for the write-ahead log and the default socket.
+        socket_path: Unix socket path. None uses <queue_dir>/queue.sock.
+        tcp: Optional "HOST:PORT" to also listen on.
+        token: Shared secret clients must send. None disables the check.
+        insecure: Allow TCP without a token.
+        visibility_timeout: Default claim lease in seconds.
+        fsync: fsync the write-ahead log after every operation.
+    """
+    data_dir = Path(queue_dir)
+    tcp_address = None
+    if tcp is not None:
+        host, sep, port = tcp.rpartition(":")
+        if not sep or not port.isdigit():
+            raise click.BadParameter("expected HOST:PORT", param_hint="--tcp")
+        tcp_address = (host or "127.0.0.1", int(port))
+        if token is None:
+            if not insecure:
+                raise click.UsageError(
+                    "--tcp requires --token (or pass --insecure to serve without one)"
+                )
+            click.echo("Warning: listening on TCP without --token", err=True)
+
+    state = QueueState(
+        data_dir, visibility_timeout=visibility_timeout, fsync=fsync, logger=NDJSONLogger()
+    )
+    server = QueueServer(
+        state,
+        socket_path=Path(socket_path) if socket_path else data_dir / DEFAULT_SOCKET_NAME,
+        tcp_address=tcp_address,
+        token=token,
+    )
+    server.start()
+    for address in server.addresses:
+        click.echo(f"Serving queue on {address}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+def run_stats(
+    queue_dir: str = "queue",
+    prom_file: str | None = ".ensemble/metrics/queue.prom",
+    interval: float | None = None,
+) -> None:
+    """Run the queue stats command implementation.
+
+    Args:
+        queue_dir: Queue directory to operate on.
+        prom_file: Where to write Prometheus text-format metrics. None disables it.
+        interval: If set, keep refreshing every ``interval`` seconds until interrupted.
+    """
+    queue = _open_existing_queue(queue_dir, read_only=True)
+    try:
+        while True:
+            counts = queue.counts()
+            metrics = load_metrics(queue.base_dir / "metrics")
+            _echo_stats(queue_dir, counts, metrics)
+
+            if prom_file is not None:
+                path = Path(prom_file)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                gauges = {
+                    **{f"tasks_{state}": count for state, count in counts.items()},
+                    "throughput_per_second": metrics.throughput(),
+                    "busy_workers": metrics.busy_workers(),
+                }
+                atomic_write(str(path), metrics.render_prometheus(gauges=gauges))
+                click.echo(f"Wrote {path}")
+
+            if interval is None:
+                return
+            time.sleep(interval)
+            click.echo("")
+    except KeyboardInterrupt:
+        pass
+
+
+def _echo_stats(queue_dir: str, counts: dict[str, int], metrics: QueueMetrics) -> None:
+    """Print current queue depth and the recorded histograms."""
+    click.echo(f"Queue: {queue_dir}")
+    click.echo("  ".join(f"{state.capitalize()}: {count}" for state, count in counts.items()))
+    click.echo("")
+
+    click.echo(f"{'Metric':<16} {'Count':>8} {'Mean':>10} {'p50':>8} {'p90':>8} {'p99':>8}")
+    for name, histogram in metrics.histograms.items():
+        click.echo(
+            f"{name:<16} {histogram.count:>8} {histogram.mean:>10.2f} "
+            f"{_format_bound(histogram.quantile(0.5)):>8} "
+            f"{_format_bound(histogram.quantile(0.9)):>8} "
+            f"{_format_bound(histogram.quantile(0.99)):>8}"
+        )
+    click.echo("")
+
+    max_workers = load_config().get("limits", {}).get("max_parallel_workers")
+    click.echo(f"Throughput: {metrics.throughput():.3f} tasks/s")
+    click.echo(
+        f"Average busy workers (Little's law): {metrics.busy_workers():.2f} "
+        f"(limits.max_parallel_workers: {max_workers})"
+    )
+
+
+def _format_bound(value: float) -> str:
+    """Format a histogram bucket bound, shown as an upper limit."""
+    if math.isinf(value):
+        return "+Inf"
+    return f"<={value:g}"
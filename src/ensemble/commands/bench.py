@@ -0,0 +1,74 @@
+"""Ensemble bench command - Measure queue performance."""
+
+import click
+
+from ensemble.commands._bench_impl import run_bench_queue
+from ensemble.bench import BENCH_BACKENDS
+
+
+@click.group()
+def bench() -> None:
+    """Run Ensemble performance benchmarks."""
+
+
+@bench.command("queue")
+@click.option(
+    "--backend",
+    "backends",
+    type=click.Choice(list(BENCH_BACKENDS)),
+    multiple=True,
+    help="Queue backend to measure (repeatable, default: all).",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Worker processes for the contention benchmark.",
+)
+@click.option(
+    "--ops",
+    type=click.IntRange(min=1),
+    default=200,
+    show_default=True,
+    help="Tasks each worker enqueues, claims and completes.",
+)
+@click.option(
+    "--ready-size",
+    "ready_sizes",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help="Queue size for the get_ready_tasks benchmark (repeatable, default: 100, 1000, 10000).",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Write the JSON report to a file instead of stdout.",
+)
+def queue_bench(
+    backends: tuple[str, ...],
+    workers: int,
+    ops: int,
+    ready_sizes: tuple[int, ...],
+    output: str | None,
+) -> None:
+    """Benchmark TaskQueue throughput, contention and dependency resolution.
+
+    Spawns worker processes that enqueue, claim and complete tasks against a
+    temporary queue and reports ops/sec plus p50/p95/p99 latency for each
+    operation. The report is JSON so runs can be diffed across releases.
+
+    Examples:
+        ensemble bench queue                          # All backends, default sizes
+        ensemble bench queue --backend file --workers 8
+        ensemble bench queue -o bench-$(git describe).json
+    """
+    run_bench_queue(
+        backends=backends,
+        workers=workers,
+        ops=ops,
+        ready_sizes=ready_sizes,
+        output=output,
+    )
@@ -0,0 +1,242 @@
+"""Ensemble queue command - Maintain the task queue."""
+
+import click
+
+from ensemble.commands._queue_impl import (
+    run_archive,
+    run_reap,
+    run_restore,
+    run_serve,
+    run_snapshot,
+    run_stats,
+)
+from ensemble.queue import QUEUE_BACKENDS
+
+
+@click.group()
+def queue() -> None:
+    """Inspect and maintain the Ensemble task queue."""
+
+
+@queue.command()
+@click.option(
+    "--queue-dir",
+    default="queue",
+    show_default=True,
+    help="Queue directory to operate on.",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(list(QUEUE_BACKENDS)),
+    default="file",
+    show_default=True,
+    help="Queue storage backend.",
+)
+@click.option(
+    "--interval",
+    type=float,
+    default=None,
+    help="Keep running and reap every N seconds.",
+)
+def reap(queue_dir: str, backend: str, interval: float | None) -> None:
+    """Return tasks with expired leases to the pending queue.
+
+    Tasks claimed by a worker that crashed or stopped sending heartbeats are
+    moved back to their lane so another worker can claim them.
+
+    Examples:
+        ensemble queue reap                 # Reap once
+        ensemble queue reap --interval 30   # Reap every 30 seconds
+    """
+    run_reap(queue_dir=queue_dir, backend=backend, interval=interval)
+
+
+@queue.command()
+@click.option(
+    "--queue-dir",
+    default="queue",
+    show_default=True,
+    help="Queue directory to operate on.",
+)
+@click.option(
+    "--older-than",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Only archive reports completed at least N seconds ago.",
+)
+def archive(queue_dir: str, older_than: float) -> None:
+    """Move completed reports into append-only archive segments.
+
+    Archived reports can still be fetched by task ID, but no longer appear
+    in queue/reports/, which keeps directory scans fast in long sessions.
+
+    Examples:
+        ensemble queue archive                    # Archive all reports
+        ensemble queue archive --older-than 3600  # Keep the last hour live
+    """
+    run_archive(queue_dir=queue_dir, older_than=older_than)
+
+
+@queue.command()
+@click.option(
+    "--queue-dir",
+    default="queue",
+    show_default=True,
+    help="Directory for the write-ahead log and the Unix socket.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    default=None,
+    help="Unix socket path (default: <queue-dir>/queue.sock).",
+)
+@click.option(
+    "--tcp",
+    default=None,
+    metavar="HOST:PORT",
+    help="Also listen on TCP for workers on other nodes.",
+)
+@click.option(
+    "--token",
+    envvar="ENSEMBLE_QUEUE_TOKEN",
+    default=None,
+    help="Shared secret clients must send (env: ENSEMBLE_QUEUE_TOKEN).",
+)
+@click.option(
+    "--insecure",
+    is_flag=True,
+    help="Allow --tcp without --token (anyone who can connect may read and write).",
+)
+@click.option(
+    "--visibility-timeout",
+    type=float,
+    default=1800.0,
+    show_default=True,
+    help="Default claim lease in seconds.",
+)
+@click.option(
+    "--fsync",
+    is_flag=True,
+    help="fsync the write-ahead log after every operation.",
+)
+def serve(
+    queue_dir: str,
+    socket_path: str | None,
+    tcp: str | None,
+    token: str | None,
+    insecure: bool,
+    visibility_timeout: float,
+    fsync: bool,
+) -> None:
+    """Serve the task queue from memory over a Unix socket (and optional TCP).
+
+    Queue state is kept in memory and persisted to <queue-dir>/queue.wal,
+    which is replayed on restart. Workers connect with
+    `ensemble loop --queue --queue-backend remote`.
+
+    Examples:
+        ensemble queue serve                          # Unix socket only
+        ensemble queue serve --tcp 0.0.0.0:7878 --token s3cret
+    """
+    run_serve(
+        queue_dir=queue_dir,
+        socket_path=socket_path,
+        tcp=tcp,
+        token=token,
+        insecure=insecure,
+        visibility_timeout=visibility_timeout,
+        fsync=fsync,
+    )
+
+
+@queue.command()
+@click.option(
+    "--queue-dir",
+    default="queue",
+    show_default=True,
+    help="Queue directory to operate on.",
+)
+@click.option(
+    "--prom-file",
+    default=".ensemble/metrics/queue.prom",
+    show_default=True,
+    help="Write Prometheus text-format metrics to this file.",
+)
+@click.option(
+    "--no-prom",
+    is_flag=True,
+    help="Do not write the Prometheus metrics file.",
+)
+@click.option(
+    "--interval",
+    type=float,
+    default=None,
+    help="Keep running and refresh every N seconds.",
+)
+def stats(queue_dir: str, prom_file: str, no_prom: bool, interval: float | None) -> None:
+    """Show queue depth, wait-time and service-time histograms.
+
+    Workers record how long tasks wait before a claim, how long they take
+    between claim and complete, and how deep the queue is at each claim.
+    The average number of busy workers (throughput x mean service time)
+    helps size limits.max_parallel_workers.
+
+    Examples:
+        ensemble queue stats                # Print stats, write .ensemble/metrics/queue.prom
+        ensemble queue stats --interval 15  # Refresh for a textfile collector
+    """
+    run_stats(
+        queue_dir=queue_dir,
+        prom_file=None if no_prom else prom_file,
+        interval=interval,
+    )
+
+
+@queue.command()
+@click.option(
+    "--queue-dir",
+    default="queue",
+    show_default=True,
+    help="Queue directory to operate on.",
+)
+@click.option(
+    "--output",
+    "-o",
+    default=None,
+    help="Snapshot file to write (default: <queue-dir>/snapshot.ndjson).",
+)
+def snapshot(queue_dir: str, output: str | None) -> None:
+    """Write the whole queue state to one compact NDJSON file.
+
+    The snapshot holds pending, delayed, processing, completed and
+    dead-lettered tasks, the completed-ID index, groups and dedup keys.
+    Restore it with `ensemble queue restore`.
+
+    Examples:
+        ensemble queue snapshot                       # queue/snapshot.ndjson
+        ensemble queue snapshot -o /backup/queue.ndjson
+    """
+    run_snapshot(queue_dir=queue_dir, output=output)
+
+
+@queue.command()
+@click.argument("snapshot_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--queue-dir",
+    default="queue",
+    show_default=True,
+    help="Queue directory to restore into.",
+)
+def restore(snapshot_file: str, queue_dir: str) -> None:
+    """Restore queue state from a snapshot file.
+
+    Files that already exist, and tasks that have moved on since the
+    snapshot was taken, are left alone. Tasks that were processing are
+    restored with their lease, so `ensemble queue reap` returns them to
+    the queue once it has expired.
+
+    Examples:
+        ensemble queue restore /backup/queue.ndjson
+    """
+    run_restore(snapshot_file=snapshot_file, queue_dir=queue_dir)
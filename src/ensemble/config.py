@@ -3,14 +3,21 @@
 Handles global (~/.config/ensemble/) and local (.ensemble/) configuration.
 """
 
+import os
 import shutil
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Optional
 
 import yaml
 
+from ensemble.lock import DEFAULT_DURABILITY, LockStats, enable_lock_stats, validate_durability
+from ensemble.logger import NDJSONLogger
 from ensemble.templates import get_template_path
 
+# Environment variable that overrides the ``lock_stats`` config key
+LOCK_STATS_ENV = "ENSEMBLE_LOCK_STATS"
+
 # Default configuration values
 DEFAULT_CONFIG = {
     "version": "0.3.0",
@@ -37,6 +44,14 @@ DEFAULT_CONFIG = {
         "max_parallel_workers": 4,
         "max_iterations": 15,
     },
+    # atomic_write durability per subsystem: none / rename / fsync
+    "durability": {
+        "queue": "rename",
+        "dashboard": "rename",
+        "ack": "rename",
+    },
+    # Record lock contention per path class and log it to the session log at exit
+    "lock_stats": False,
 }
 
 
@@ -129,6 +144,68 @@ def load_config() -> dict[str, Any]:
     return config
 
 
+def get_durability(subsystem: str) -> str:
+    """Get the configured atomic_write durability level for a subsystem.
+
+    The config files are parsed once per (global, local) config directory pair;
+    call reset_config_cache() after editing them in a running process.
+
+    Args:
+        subsystem: Subsystem name under ``durability`` (e.g., "queue", "dashboard", "ack")
+
+    Returns:
+        Durability level ("none", "rename" or "fsync"); "rename" if not configured
+
+    Raises:
+        ValueError: If the configured level is unknown
+    """
+    levels = _durability_levels(get_global_config_dir(), get_local_config_dir())
+    return validate_durability(levels.get(subsystem, DEFAULT_DURABILITY))
+
+
+@lru_cache(maxsize=None)
+def _durability_levels(global_dir: Path, local_dir: Path) -> dict[str, Any]:
+    """Load the ``durability`` section, cached per config directory pair."""
+    return dict(load_config().get("durability") or {})
+
+
+def reset_config_cache() -> None:
+    """Forget cached config values so the next lookup re-reads the config files."""
+    _durability_levels.cache_clear()
+
+
+def lock_stats_enabled() -> bool:
+    """Check whether lock contention statistics are switched on.
+
+    ENSEMBLE_LOCK_STATS ("1"/"true"/"yes"/"on" or "0"/"false"/"no"/"off")
+    overrides the ``lock_stats`` config key.
+
+    Returns:
+        True if lock statistics should be recorded
+    """
+    value = os.environ.get(LOCK_STATS_ENV, "").strip().lower()
+    if value:
+        return value in ("1", "true", "yes", "on")
+    return bool(load_config().get("lock_stats", False))
+
+
+def configure_lock_stats(logger: Optional[NDJSONLogger] = None) -> Optional[LockStats]:
+    """Enable lock contention statistics if switched on.
+
+    The per-process aggregates are written to the NDJSON session log as a
+    ``lock_stats`` event when the process exits.
+
+    Args:
+        logger: Session log to write to (default: a new NDJSONLogger)
+
+    Returns:
+        The enabled LockStats, or None if lock statistics are off
+    """
+    if not lock_stats_enabled():
+        return None
+    return enable_lock_stats(logger=logger or NDJSONLogger())
+
+
 def _deep_merge(base: dict, override: dict) -> dict:
     """Deep merge two dictionaries.
 
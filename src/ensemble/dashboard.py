@@ -11,7 +11,8 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any
 
-from ensemble.lock import atomic_write
+from ensemble.config import get_durability
+from ensemble.lock import GroupCommitWriter, atomic_write, validate_durability
 
 
 class DashboardUpdater:
@@ -21,13 +22,27 @@ class DashboardUpdater:
     Markdownファイルを更新してタスクの進捗状況を表示する。
     """
 
-    def __init__(self, status_dir: Path | None = None) -> None:
+    def __init__(
+        self,
+        status_dir: Path | None = None,
+        writer: GroupCommitWriter | None = None,
+        durability: str | None = None,
+    ) -> None:
         """
         ダッシュボードアップデータを初期化する
 
         Args:
             status_dir: ステータスディレクトリ（デフォルト: status/）
-        """
+            writer: 指定時はこのGroupCommitWriter経由で書き込む（連続した更新は
+                    時間窓内で最後の1回にまとまる）。Noneの場合は更新ごとに書き込む
+            durability: ダッシュボードの耐久性レベル（"none" / "rename" / "fsync"）。
+                        Noneの場合は設定の durability.dashboard に従う。
+                        writer指定時はwriter側のレベルが使われる
+        """
+        self.writer = writer
+        if durability is None:
+            durability = get_durability("dashboard")
+        self.durability = validate_durability(durability)
         self.status_dir = status_dir if status_dir else Path("status")
         self.status_dir.mkdir(parents=True, exist_ok=True)
         self.dashboard_path = self.status_dir / "dashboard.md"
@@ -224,4 +239,7 @@ class DashboardUpdater:
 {log_section}
 ```
 """
-        atomic_write(str(self.dashboard_path), content)
+        if self.writer is not None:
+            self.writer.write(str(self.dashboard_path), content)
+        else:
+            atomic_write(str(self.dashboard_path), content, durability=self.durability)
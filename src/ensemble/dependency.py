@@ -7,6 +7,8 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable
+
 
 class CircularDependencyError(Exception):
     """循環依存検知時の例外"""
@@ -77,6 +79,18 @@ class DependencyResolver:
         newly_ready_ids = ready_after - ready_before
         return [self.tasks[tid] for tid in newly_ready_ids if tid in self.tasks]
 
+    def mark_completed_many(self, task_ids: Iterable[str]) -> None:
+        """
+        複数タスクをまとめて完了マークする
+
+        mark_completed()と違い新たに解放されたタスクは計算しないため、
+        大量の完了済みIDを反映するときはこちらを使う。
+
+        Args:
+            task_ids: 完了したタスクIDのイテラブル
+        """
+        self.completed.update(task_ids)
+
     def detect_cycles(self) -> list[list[str]]:
         """
         循環依存を検知。DFS（深さ優先探索）でサイクルを検出
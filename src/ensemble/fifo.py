@@ -0,0 +1,276 @@
+"""
+タスクキューの投入順インデックス
+
+TaskQueue が単調増加のタスクIDを払い出すシーケンスと、
+レーン・優先度ごとの追記専用ログ + 永続カーソルを提供する。
+claim はカーソル位置からログを読むだけで次のタスクを見つけられるため、
+毎回ディレクトリ全体を一覧・ソートする必要がない。
+
+ファイル構造:
+    queue/
+    ├── sequence                 # "<最後のタイムスタンプ> <最後の連番>"
+    └── tasks/<agent>/
+        ├── .fifo.lock           # ログの追記（共有）と作り直し（排他）のロック
+        ├── .p1.log              # 優先度ランク1の投入ログ（1行 = タスクファイル名）
+        └── .p1.cursor           # "<ログのinode> <次に読むオフセット>"
+
+ログはあくまで索引で、正はタスクファイルそのもの。ログに載っていない
+タスク（手動で置かれたもの、追記前に落ちたもの）は TaskQueue の全件走査で拾う。
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+# シーケンス番号の桁数（辞書順 = 数値順になるよう固定幅）
+SEQUENCE_DIGITS = 10
+
+LOCK_NAME = ".fifo.lock"
+
+# 1回に読むログの量
+READ_CHUNK = 4096
+
+# 読み終えたログがこのサイズを超えたら作り直す
+COMPACT_BYTES = 1024 * 1024
+
+# カーソルファイルの固定長（pwriteで上書きするため）
+_CURSOR_WIDTH = 40
+
+
+class TaskSequence:
+    """
+    キューごとの単調増加タスクID
+
+    IDは "<YYYYmmddHHMMSS>-<連番10桁>"。連番はflock下で払い出し、
+    タイムスタンプは前回以上に揃えるため、複数プロセスから発行しても
+    IDの辞書順が発行順と一致する。
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: シーケンスファイルのパス
+        """
+        self.path = path
+
+    def reserve(self, n: int = 1) -> list[str]:
+        """
+        連続したn個のタスクIDを払い出す
+
+        Args:
+            n: 払い出す個数
+
+        Returns:
+            発行順（= 辞書順）のタスクIDリスト
+        """
+        now = datetime.now().strftime("%Y%m%d%H%M%S")
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            fields = os.pread(fd, 64, 0).split()
+            if len(fields) == 2 and fields[1].isdigit():
+                timestamp = max(now, fields[0].decode())
+                last = int(fields[1])
+            else:
+                timestamp, last = now, 0
+
+            state = f"{timestamp} {last + n}\n".encode()
+            os.pwrite(fd, state, 0)
+            os.ftruncate(fd, len(state))
+        finally:
+            os.close(fd)  # closeでロックも解放される
+
+        return [
+            f"{timestamp}-{seq:0{SEQUENCE_DIGITS}d}" for seq in range(last + 1, last + n + 1)
+        ]
+
+
+def log_name(rank: int) -> str:
+    """優先度ランクの投入ログ名"""
+    return f".p{rank}.log"
+
+
+def append_entries(lane_dir: Path, rank: int, filenames: Iterable[str]) -> None:
+    """
+    投入ログにタスクファイル名を追記する
+
+    タスクファイルを書き終えてから呼ぶこと（先にログに載ると、
+    claimがファイルを見つけられずに読み飛ばす）。
+
+    Args:
+        lane_dir: レーンディレクトリ
+        rank: 優先度ランク
+        filenames: 追記するタスクファイル名（投入順）
+    """
+    data = "".join(f"{name}\n" for name in filenames).encode()
+    if not data:
+        return
+    with _locked(lane_dir, fcntl.LOCK_SH):
+        # O_APPENDの1回のwriteなので、複数プロセスから追記しても行は混ざらない
+        fd = os.open(lane_dir / log_name(rank), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+class LaneLog:
+    """
+    1レーン・1優先度分の投入ログをカーソル位置から読むリーダー
+
+    claimのたびに作り直して使う（カーソルは他のワーカーも進めるため、
+    インスタンスをまたいで読んだ位置を持ち越さない）。
+    """
+
+    def __init__(self, lane_dir: Path, rank: int) -> None:
+        """
+        Args:
+            lane_dir: レーンディレクトリ
+            rank: 優先度ランク
+        """
+        self.lane_dir = lane_dir
+        self.rank = rank
+        self.log_path = lane_dir / log_name(rank)
+        self.cursor_path = lane_dir / f".p{rank}.cursor"
+        self._entries: deque[tuple[str, int]] = deque()
+        self._inode: int | None = None
+        self._size = 0
+        self._offset = 0
+        self._read_offset = 0
+        self._dirty = False
+        self._load()
+
+    def peek(self) -> str | None:
+        """
+        カーソル位置のタスクファイル名を返す
+
+        Returns:
+            タスクファイル名、ログを読み終えていればNone
+        """
+        if not self._entries and self._read_offset < self._size:
+            self._read()
+        return self._entries[0][0] if self._entries else None
+
+    def pop(self) -> str | None:
+        """カーソル位置のタスクファイル名を返し、カーソルを1件進める"""
+        if self.peek() is None:
+            return None
+        name, end = self._entries.popleft()
+        self._offset = end
+        self._dirty = True
+        return name
+
+    def backlog(self) -> int:
+        """カーソルより後ろに残っているエントリ数の概算"""
+        remaining = self._size - self._offset
+        if remaining <= 0:
+            return 0
+        entry_size = len(self._entries[0][0]) + 1 if self._entries else 0
+        return max(1, remaining // entry_size) if entry_size else 1
+
+    def commit(self) -> None:
+        """
+        進めたカーソルを保存する
+
+        読み終えたログが大きくなっていれば空のログに作り直す。
+        """
+        if not self._dirty or self._inode is None:
+            return
+        self._write_cursor(self._inode, self._offset)
+        self._dirty = False
+        if self._offset >= self._size >= COMPACT_BYTES:
+            self._compact()
+
+    def _load(self) -> None:
+        """ログの状態とカーソルを読み込む"""
+        try:
+            stat = self.log_path.stat()
+        except FileNotFoundError:
+            return
+        self._inode = stat.st_ino
+        self._size = stat.st_size
+
+        inode, offset = self._read_cursor()
+        # ログが作り直された・カーソルが壊れている場合は先頭から読む
+        # （読み飛ばしたエントリのファイルはもう無いので取得に失敗するだけ）
+        if inode != self._inode or offset > self._size:
+            offset = 0
+        self._offset = self._read_offset = offset
+
+    def _read(self) -> None:
+        """ログの続きを読んでエントリを溜める"""
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(self._read_offset)
+                data = f.read(min(READ_CHUNK, self._size - self._read_offset))
+        except FileNotFoundError:
+            self._size = self._read_offset
+            return
+
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            # 1行がチャンクより長い（壊れたログ）場合は残りを読み飛ばす
+            self._read_offset = self._size
+            return
+        offset = self._read_offset
+        for line in data[:end].splitlines(keepends=True):
+            offset += len(line)
+            name = line.strip().decode(errors="replace")
+            if name:
+                self._entries.append((name, offset))
+        self._read_offset = offset
+
+    def _read_cursor(self) -> tuple[int | None, int]:
+        """カーソルファイルを読む（無い・壊れている場合は (None, 0)）"""
+        try:
+            fields = self.cursor_path.read_bytes().split()
+        except FileNotFoundError:
+            return None, 0
+        if len(fields) != 2 or not (fields[0].isdigit() and fields[1].isdigit()):
+            return None, 0
+        return int(fields[0]), int(fields[1])
+
+    def _write_cursor(self, inode: int, offset: int) -> None:
+        """
+        カーソルを固定長で上書きする
+
+        ディレクトリにファイルを作らない（claim待ちのinotifyを起こさない）よう、
+        tmp + renameではなくpwriteで書く。
+        """
+        fd = os.open(self.cursor_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, f"{inode} {offset}".ljust(_CURSOR_WIDTH - 1).encode() + b"\n", 0)
+        finally:
+            os.close(fd)
+
+    def _compact(self) -> None:
+        """読み終えたログを空のログに差し替える（追記とは排他）"""
+        with _locked(self.lane_dir, fcntl.LOCK_EX):
+            try:
+                stat = self.log_path.stat()
+            except FileNotFoundError:
+                return
+            # ロック待ちの間に追記されていたら作り直さない
+            if stat.st_ino != self._inode or stat.st_size != self._offset:
+                return
+            tmp_path = self.log_path.with_suffix(".tmp")
+            os.close(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+            os.rename(tmp_path, self.log_path)
+            self._write_cursor(self.log_path.stat().st_ino, 0)
+
+
+@contextmanager
+def _locked(lane_dir: Path, operation: int) -> Iterator[None]:
+    """レーンのログロックを取る"""
+    fd = os.open(lane_dir / LOCK_NAME, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
@@ -7,14 +7,321 @@ mvコマンド（os.rename）のアトミック性を利用。
 
 from __future__ import annotations
 
+import atexit
 import fcntl
+import json
 import os
 import tempfile
+import threading
 import time
+import weakref
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Iterator
 
+from ensemble.logger import NDJSONLogger
 
-def atomic_write(filepath: str, content: str) -> bool:
+
+# 同時に存在できるflock待機スレッドの上限（超えた分は非ブロッキングのポーリングで待つ）
+MAX_FLOCK_WAITERS = 32
+
+# 上限に達したときのポーリング間隔（秒）
+_FLOCK_POLL_INTERVAL = 0.01
+
+
+def acquire_flock(
+    lock_path: str, operation: int = fcntl.LOCK_EX, timeout: float | None = 5.0
+) -> tuple[int, float]:
+    """
+    ロックファイルを開いてflockを取る（期限付きのブロッキング待ち）
+
+    まず非ブロッキングで試し、取れなければヘルパースレッドでブロッキングのflockを
+    呼んで期限まで待つ。ポーリングしないため、ロックが解放されると直ちに取得できる。
+
+    期限切れで諦めた待機スレッドは、同じロックファイル・同じ種類の次の呼び出しが
+    引き継ぐ（新しいスレッドを作らない）。引き継がれないまま取得できたロックは
+    すぐに手放される。待機スレッドが MAX_FLOCK_WAITERS に達している場合は
+    非ブロッキングのflockをポーリングして待つ。
+
+    Args:
+        lock_path: ロックファイルパス（なければ作成）
+        operation: fcntl.LOCK_EX（排他）または fcntl.LOCK_SH（共有）
+        timeout: 待つ最大秒数（Noneなら無期限）
+
+    Returns:
+        (ロック済みのfd, 取得までに待った秒数)。fdは release_flock() で解放する
+
+    Raises:
+        TimeoutError: timeout秒以内に取得できなかった場合
+        OSError: ロックファイルを開けない・flockに失敗した場合
+    """
+    started = time.monotonic()
+    fd = os.open(lock_path, os.O_CREAT | os.O_WRONLY, 0o644)
+    try:
+        fcntl.flock(fd, operation | fcntl.LOCK_NB)
+        return fd, 0.0
+    except BlockingIOError:
+        pass
+    except BaseException:
+        os.close(fd)
+        raise
+
+    deadline = None if timeout is None else started + timeout
+    try:
+        stat = os.fstat(fd)
+    except BaseException:
+        os.close(fd)
+        raise
+    key = (stat.st_dev, stat.st_ino, operation)
+
+    # 競合時: 諦められた待機スレッドを引き継ぐか、fdの所有権を新しいスレッドに渡す
+    waiter = _FlockWaiter.adopt(key)
+    if waiter is not None:
+        os.close(fd)
+    else:
+        waiter = _FlockWaiter.spawn(key, fd)
+    if waiter is None:
+        if not _poll_flock(fd, operation, deadline):
+            os.close(fd)
+            raise TimeoutError(f"Failed to acquire lock {lock_path} within {timeout}s")
+        return fd, time.monotonic() - started
+
+    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+    if not waiter.wait(remaining):
+        raise TimeoutError(f"Failed to acquire lock {lock_path} within {timeout}s")
+    return waiter.fd, time.monotonic() - started
+
+
+def _poll_flock(fd: int, operation: int, deadline: float | None) -> bool:
+    """非ブロッキングのflockを期限まで繰り返す（待機スレッドの上限に達した場合用）"""
+    while True:
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            pass
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        delay = _FLOCK_POLL_INTERVAL
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline - time.monotonic()))
+        time.sleep(delay)
+
+
+def release_flock(fd: int) -> None:
+    """acquire_flock() で取ったロックを解放してfdを閉じる"""
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+class _FlockWaiter(threading.Thread):
+    """
+    ブロッキングのflockを呼び、呼び出し側が期限まで待てるようにするスレッド
+
+    呼び出し側が諦めたスレッドは (st_dev, st_ino, operation) ごとに登録され、
+    同じロックを待つ次の呼び出し側が adopt() で引き継ぐ。
+    """
+
+    # 全スレッドの登録状態を守るロック（各スレッドの_guardより先に取る）
+    _registry_lock = threading.Lock()
+    _abandoned_waiters: dict[tuple[int, int, int], list[_FlockWaiter]] = {}
+    _live = 0
+
+    def __init__(self, key: tuple[int, int, int], fd: int) -> None:
+        super().__init__(name="ensemble-flock", daemon=True)
+        self.key = key
+        self.fd = fd
+        self.operation = key[2]
+        self._done = threading.Event()
+        self._guard = threading.Lock()
+        self._abandoned = False
+        self._error: BaseException | None = None
+
+    @classmethod
+    def spawn(cls, key: tuple[int, int, int], fd: int) -> _FlockWaiter | None:
+        """
+        新しい待機スレッドを開始する
+
+        Returns:
+            開始したスレッド、上限（MAX_FLOCK_WAITERS）に達している場合None
+        """
+        with cls._registry_lock:
+            if cls._live >= MAX_FLOCK_WAITERS:
+                return None
+            cls._live += 1
+        waiter = cls(key, fd)
+        waiter.start()
+        return waiter
+
+    @classmethod
+    def adopt(cls, key: tuple[int, int, int]) -> _FlockWaiter | None:
+        """
+        諦められた待機スレッドを引き継ぐ
+
+        Returns:
+            まだ待っているスレッド、なければNone
+        """
+        with cls._registry_lock:
+            waiters = cls._abandoned_waiters.get(key, [])
+            while waiters:
+                waiter = waiters.pop()
+                with waiter._guard:
+                    if not waiter._done.is_set():
+                        waiter._abandoned = False
+                        return waiter
+            cls._abandoned_waiters.pop(key, None)
+        return None
+
+    def run(self) -> None:
+        try:
+            fcntl.flock(self.fd, self.operation)
+        except BaseException as e:  # 呼び出し側のスレッドで送出し直す
+            self._error = e
+        with self._registry_lock:
+            type(self)._live -= 1
+            with self._guard:
+                if self._abandoned:
+                    # 誰も引き継がなかった: 後から取れたロックはcloseで手放す
+                    os.close(self.fd)
+                    waiters = self._abandoned_waiters.get(self.key, [])
+                    if self in waiters:
+                        waiters.remove(self)
+                    if not waiters:
+                        self._abandoned_waiters.pop(self.key, None)
+                self._done.set()
+
+    def wait(self, timeout: float | None) -> bool:  # type: ignore[override]
+        """
+        取得を待つ
+
+        Returns:
+            取得できた場合True、期限切れの場合False（スレッドは引き継ぎ待ちとして登録され、
+            誰も引き継がなければ取得後にfdを閉じる）
+
+        Raises:
+            flockが送出した例外（fdは閉じられる）
+        """
+        self._done.wait(timeout)
+        with self._registry_lock, self._guard:
+            if not self._done.is_set():
+                self._abandoned = True
+                self._abandoned_waiters.setdefault(self.key, []).append(self)
+                return False
+        if self._error is not None:
+            os.close(self.fd)
+            raise self._error
+        return True
+
+
+# 読み書きロックのロックファイル（ディレクトリごとに LOCK_STRIPES 個、削除しない）
+#   .rwlock-0 〜 .rwlock-f: ファイル名のハッシュで対応するロックファイルを決める
+RW_LOCK_PREFIX = ".rwlock-"
+LOCK_STRIPES = 16
+
+
+def lock_file_for(filepath: str) -> str:
+    """
+    ファイルの読み書きを調停するロックファイルのパスを返す
+
+    同じディレクトリの .rwlock-<n> を使う。ロックファイルは書き込みのたびに
+    作成・削除せず残し続けるため、ディレクトリあたりの数は LOCK_STRIPES 個で頭打ちになる
+    （別のファイルが同じロックファイルを共有することはある）。
+    """
+    directory, name = os.path.split(filepath)
+    stripe = zlib.crc32(name.encode("utf-8")) % LOCK_STRIPES
+    return os.path.join(directory, f"{RW_LOCK_PREFIX}{stripe:x}")
+
+
+@contextmanager
+def shared_lock(filepath: str, timeout: float | None = 5.0) -> Iterator[None]:
+    """
+    ファイルを読む間、共有ロック（LOCK_SH）を取る
+
+    読み手同士は並行でき、exclusive_lock() / atomic_write_with_lock() の書き込みとは
+    排他になる。その場で上書きする書き込み（durability="none"）でも書きかけを読まない。
+
+    使い方:
+        with shared_lock(str(report_file)):
+            report = codec.load_file(report_file)
+
+    Args:
+        filepath: 読むファイルのパス（親ディレクトリが存在すること）
+        timeout: ロック取得を待つ最大秒数（Noneなら無期限）
+
+    Raises:
+        TimeoutError: timeout秒以内に取得できなかった場合
+        OSError: ロックファイルを開けない場合（親ディレクトリがないなど）
+    """
+    with _rw_locked(filepath, fcntl.LOCK_SH, timeout):
+        yield
+
+
+@contextmanager
+def exclusive_lock(filepath: str, timeout: float | None = 5.0) -> Iterator[None]:
+    """
+    ファイルを書き換える間、排他ロック（LOCK_EX）を取る
+
+    atomic_write_with_lock() と同じロックファイルを使う。
+
+    Args:
+        filepath: 書き換えるファイルのパス（親ディレクトリが存在すること）
+        timeout: ロック取得を待つ最大秒数（Noneなら無期限）
+
+    Raises:
+        TimeoutError: timeout秒以内に取得できなかった場合
+        OSError: ロックファイルを開けない場合（親ディレクトリがないなど）
+    """
+    with _rw_locked(filepath, fcntl.LOCK_EX, timeout):
+        yield
+
+
+@contextmanager
+def _rw_locked(filepath: str, operation: int, timeout: float | None) -> Iterator[None]:
+    """lock_file_for(filepath) のflockを取る（ロック統計が有効なら記録する）"""
+    call = _LockCall(filepath)
+    call.attempts = 1
+    try:
+        with call.waiting():
+            lock_fd, _ = acquire_flock(lock_file_for(filepath), operation, timeout)
+    except Exception as e:
+        call.failed(e)
+        call.finish()
+        raise
+    call.finish()
+    try:
+        yield
+    finally:
+        release_flock(lock_fd)
+
+
+# atomic_write の耐久性レベル
+#   none:   その場で上書き（tmp・renameなし。shared_lock()を取らない読み手は書きかけの内容を
+#           見うる。使い捨ての状態向け）
+#   rename: tmp作成 → rename（読み手は常に完全な内容を見る。電源断ではデータが失われうる）
+#   fsync:  rename に加えてファイルと親ディレクトリをfsyncする（電源断後も内容が残る）
+DURABILITY_LEVELS = ("none", "rename", "fsync")
+DEFAULT_DURABILITY = "rename"
+
+
+def validate_durability(durability: str) -> str:
+    """
+    耐久性レベルを検証する
+
+    Raises:
+        ValueError: 未知のレベルの場合
+    """
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(
+            f"Unknown durability: {durability!r} (expected one of {DURABILITY_LEVELS})"
+        )
+    return durability
+
+
+def atomic_write(filepath: str, content: str, durability: str = DEFAULT_DURABILITY) -> bool:
     """
     アトミックな書き込みを行う
 
@@ -24,10 +331,16 @@ def atomic_write(filepath: str, content: str) -> bool:
     Args:
         filepath: 書き込み先ファイルパス
         content: 書き込む内容
+        durability: 耐久性レベル（"none" / "rename" / "fsync"、DURABILITY_LEVELS参照）。
+                    "none"の場合は exclusive_lock() を取って上書きする
 
     Returns:
         成功時True、失敗時False
+
+    Raises:
+        ValueError: 未知の耐久性レベルの場合
     """
+    validate_durability(durability)
     dir_path = os.path.dirname(filepath)
 
     # 親ディレクトリが存在しない場合は失敗
@@ -35,31 +348,111 @@ def atomic_write(filepath: str, content: str) -> bool:
         return False
 
     try:
-        # tmpファイルを同じディレクトリに作成（同一ファイルシステム保証）
-        fd, tmp_path = tempfile.mkstemp(dir=dir_path if dir_path else ".")
+        if durability == "none":
+            # その場で上書きするため、shared_lock() の読み手と排他にする
+            with exclusive_lock(filepath):
+                _write_file(filepath, content, durability)
+        else:
+            _write_file(filepath, content, durability)
+        return True
+    except Exception:
+        return False
+
+
+def _write_file(
+    filepath: str, content: str, durability: str, sync_dir: bool = True
+) -> None:
+    """
+    耐久性レベルに応じてファイルを書き込む（失敗時は例外。tmpファイルは残さない）
+
+    Args:
+        filepath: 書き込み先ファイルパス
+        content: 書き込む内容
+        durability: 耐久性レベル
+        sync_dir: durability="fsync" のとき親ディレクトリもfsyncするか
+                  （まとめて書く場合は呼び出し側がディレクトリごとに1回行う）
+    """
+    if durability == "none":
+        fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content.encode("utf-8"))
+        return
+
+    dir_path = os.path.dirname(filepath) or "."
+    # tmpファイルを同じディレクトリに作成（同一ファイルシステム保証）
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content.encode("utf-8"))
+            if durability == "fsync":
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(tmp_path, filepath)  # アトミック
+    except BaseException:
+        # 失敗時はtmpファイルを削除
         try:
-            os.write(fd, content.encode("utf-8"))
-            os.close(fd)
-            os.rename(tmp_path, filepath)  # アトミック
-            return True
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durability == "fsync" and sync_dir:
+        _fsync_dir(dir_path)
+
+
+def _fsync_dir(dir_path: str) -> None:
+    """ディレクトリをfsyncする（renameによるエントリの置き換えを永続化する）"""
+    fd = os.open(dir_path or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_files(files: dict[str, str], durability: str) -> dict[str, bool]:
+    """
+    複数ファイルを書き込む
+
+    durability="fsync" の場合、親ディレクトリのfsyncはディレクトリごとに1回にまとめる。
+
+    Returns:
+        {ファイルパス: 成功したか}
+    """
+    results: dict[str, bool] = {}
+    for filepath, content in files.items():
+        try:
+            if durability == "none":
+                with exclusive_lock(filepath):
+                    _write_file(filepath, content, durability)
+            else:
+                _write_file(filepath, content, durability, sync_dir=False)
+            results[filepath] = True
         except Exception:
-            # 失敗時はtmpファイルを削除
+            results[filepath] = False
+
+    if durability == "fsync":
+        for dir_path in {os.path.dirname(path) for path, ok in results.items() if ok}:
             try:
-                os.unlink(tmp_path)
+                _fsync_dir(dir_path)
             except OSError:
-                pass
-            return False
-    except Exception:
-        return False
+                for path in results:
+                    if os.path.dirname(path) == dir_path:
+                        results[path] = False
+    return results
 
 
-def atomic_write_with_lock(filepath: str, content: str, timeout: float = 5.0) -> bool:
+def atomic_write_with_lock(
+    filepath: str,
+    content: str,
+    timeout: float = 5.0,
+    durability: str = DEFAULT_DURABILITY,
+) -> bool:
     """
     flock排他ロック + atomic write（tmp + rename）
 
     複数プロセスからの並列書き込みを排他制御し、YAML破損を防ぐ。
     Shogun inbox_write.shの実装に倣い、以下を実現:
-    - flockによる排他ロック（タイムアウト付き）
+    - flockによる排他ロック（タイムアウト付き）。ロックファイルは lock_file_for() の
+      永続ファイルで、shared_lock() の読み手と共有する
     - tmpファイル作成 → renameでアトミック書き込み
     - 3回リトライ
 
@@ -67,55 +460,53 @@ def atomic_write_with_lock(filepath: str, content: str, timeout: float = 5.0) ->
         filepath: 書き込み先ファイルパス
         content: 書き込む内容
         timeout: ロック取得タイムアウト（秒）
+        durability: 耐久性レベル（"none" / "rename" / "fsync"、DURABILITY_LEVELS参照）
 
     Returns:
         成功時True、失敗時False
+
+    Raises:
+        ValueError: 未知の耐久性レベルの場合
     """
+    validate_durability(durability)
+    call = _LockCall(filepath)
+    try:
+        return _atomic_write_with_lock(filepath, content, timeout, durability, call)
+    finally:
+        call.finish()
+
+
+def _atomic_write_with_lock(
+    filepath: str, content: str, timeout: float, durability: str, call: _LockCall
+) -> bool:
+    """atomic_write_with_lock() の本体（試行ごとの待ち時間・失敗原因をcallに記録する）"""
     dir_path = os.path.dirname(filepath)
 
     # 親ディレクトリが存在しない場合は失敗
     if dir_path and not os.path.exists(dir_path):
+        call.error = "FileNotFoundError"
         return False
 
-    lock_file_path = Path(filepath).with_suffix(Path(filepath).suffix + ".lock")
+    # ロックファイルは削除せず、読み手（shared_lock）と共有する
+    lock_file_path = lock_file_for(filepath)
     max_attempts = 3
 
     for attempt in range(max_attempts):
         lock_fd = None
         try:
-            # ロックファイルを開く（作成）
-            lock_fd = os.open(str(lock_file_path), os.O_CREAT | os.O_WRONLY, 0o644)
+            # ロックファイルを開いて排他ロックを取る（解放されるまでカーネル内で待つ）
+            call.attempts += 1
+            with call.waiting():
+                lock_fd, _ = acquire_flock(lock_file_path, timeout=timeout)
 
-            # 非ブロッキングでロック取得を試みる（タイムアウト実装）
-            start_time = time.time()
-            while True:
-                try:
-                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    # ロック取得成功
-                    break
-                except BlockingIOError:
-                    # ロック取得失敗、タイムアウトチェック
-                    if time.time() - start_time > timeout:
-                        raise TimeoutError(f"Failed to acquire lock within {timeout}s")
-                    time.sleep(0.1)  # 100ms待機後リトライ
-
-            # tmpファイルを同じディレクトリに作成（同一ファイルシステム保証）
-            fd, tmp_path = tempfile.mkstemp(dir=dir_path if dir_path else ".")
-            try:
-                os.write(fd, content.encode("utf-8"))
-                os.close(fd)
-                os.rename(tmp_path, filepath)  # アトミック
-                return True
-            except Exception:
-                # 失敗時はtmpファイルを削除
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
-                raise  # リトライのために再送出
+            # 失敗時はtmpファイルを消して例外を送出する（リトライする）
+            _write_file(filepath, content, durability)
+            call.error = None
+            return True
 
         except (TimeoutError, Exception) as e:
             # ロック取得失敗またはエラー
+            call.failed(e)
             if attempt < max_attempts - 1:
                 # リトライ
                 time.sleep(1)
@@ -125,23 +516,80 @@ def atomic_write_with_lock(filepath: str, content: str, timeout: float = 5.0) ->
                 return False
 
         finally:
-            # ロック解放 + ロックファイル削除
+            # ロック解放（ロックファイルは次の書き込み・読み込みで再利用する）
             if lock_fd is not None:
                 try:
-                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
-                    os.close(lock_fd)
+                    release_flock(lock_fd)
                 except Exception:
                     pass
 
-            try:
-                lock_file_path.unlink(missing_ok=True)
-            except Exception:
-                pass
-
     return False
 
 
-def atomic_claim(filepath: str, processing_dir: str) -> str | None:
+def atomic_write_batch_with_lock(
+    files: dict[str, str],
+    lock_path: str,
+    timeout: float = 5.0,
+    durability: str = DEFAULT_DURABILITY,
+) -> bool:
+    """
+    1つのflock排他ロック内で複数ファイルをatomic write（tmp + rename）する
+
+    ファイルごとにロック取得・解放を繰り返すatomic_write_with_lockと異なり、
+    ロックのコストをバッチ全体で1回に償却する。各ファイルは個別にアトミック。
+
+    Args:
+        files: {書き込み先ファイルパス: 書き込む内容}
+        lock_path: バッチ全体で使うロックファイルパス
+        timeout: ロック取得タイムアウト（秒）
+        durability: 耐久性レベル。"fsync"の場合、ディレクトリのfsyncは
+                    ディレクトリごとに1回にまとめる
+
+    Returns:
+        全ファイルの書き込みに成功した場合True、失敗時False
+
+    Raises:
+        ValueError: 未知の耐久性レベルの場合
+    """
+    validate_durability(durability)
+    call = _LockCall(lock_path)
+    try:
+        for filepath in files:
+            dir_path = os.path.dirname(filepath)
+            # 親ディレクトリが存在しない場合は失敗
+            if dir_path and not os.path.exists(dir_path):
+                call.error = "FileNotFoundError"
+                return False
+
+        lock_fd = None
+        try:
+            call.attempts += 1
+            with call.waiting():
+                lock_fd, _ = acquire_flock(lock_path, timeout=timeout)
+
+            results = _write_files(files, durability)
+            if not all(results.values()):
+                call.error = "WriteError"
+                return False
+            return True
+
+        except Exception as e:
+            call.failed(e)
+            return False
+
+        finally:
+            if lock_fd is not None:
+                try:
+                    release_flock(lock_fd)
+                except Exception:
+                    pass
+    finally:
+        call.finish()
+
+
+def atomic_claim(
+    filepath: str, processing_dir: str, dest_name: str | None = None
+) -> str | None:
     """
     アトミックなタスク取得を行う
 
@@ -151,11 +599,12 @@ def atomic_claim(filepath: str, processing_dir: str) -> str | None:
     Args:
         filepath: 取得対象のファイルパス
         processing_dir: 処理中ファイルの移動先ディレクトリ
+        dest_name: 移動先のファイル名（デフォルト: 元のファイル名）
 
     Returns:
         成功時は移動先パス、失敗時（別プロセスが先に取得）はNone
     """
-    filename = os.path.basename(filepath)
+    filename = dest_name or os.path.basename(filepath)
     dest = os.path.join(processing_dir, filename)
 
     try:
@@ -166,3 +615,346 @@ def atomic_claim(filepath: str, processing_dir: str) -> str | None:
         return None
     except Exception:
         return None
+
+
+class GroupCommitWriter:
+    """
+    小さなatomic writeを短い時間窓でまとめて書き込むライター
+
+    write()は書き込みを予約して即座に返り、最初の予約からwindow秒後に
+    バックグラウンドスレッドがまとめて書き込む。窓の間に同じパスへ複数回
+    書かれた場合は最後の内容だけを書く（途中の内容のtmp作成・renameを省く）。
+    各ファイルはこれまで通りtmp + renameでアトミックに置き換わる。
+
+    ダッシュボードのように同じファイルを頻繁に書き換える経路向け。
+    書いた直後に別プロセスから読まれる必要がある場合は write().result() で待つか flush() する。
+
+    使い方:
+        writer = GroupCommitWriter(window=0.005)
+        writer.write("status/dashboard.md", content)   # Future[bool] を返す
+        writer.flush()                                  # 予約分を今すぐ書く
+        writer.close()                                  # flush + スレッド停止
+    """
+
+    DEFAULT_WINDOW = 0.005
+
+    def __init__(
+        self, window: float = DEFAULT_WINDOW, durability: str = DEFAULT_DURABILITY
+    ) -> None:
+        """
+        Args:
+            window: 最初の予約から書き込むまでに他の書き込みを待つ秒数
+            durability: 耐久性レベル。"fsync"の場合、ディレクトリのfsyncは
+                        バッチ内でディレクトリごとに1回にまとめる
+        """
+        if window < 0:
+            raise ValueError("window must not be negative")
+        self.window = window
+        self.durability = validate_durability(durability)
+        # 予約とスレッドは別オブジェクトに持たせ、ライターを参照しないようにする
+        # （close()し忘れたライターも回収でき、回収時・プロセス終了時に予約分が書かれる）
+        self._state = _GroupCommitState(window, self.durability)
+        self._finalizer = weakref.finalize(self, self._state.close)
+
+    @property
+    def requested(self) -> int:
+        """予約された書き込み数"""
+        return self._state.requested
+
+    @property
+    def committed(self) -> int:
+        """実際に書いたファイル数"""
+        return self._state.committed
+
+    def write(self, filepath: str, content: str) -> Future[bool]:
+        """
+        書き込みを予約する
+
+        Args:
+            filepath: 書き込み先ファイルパス
+            content: 書き込む内容
+
+        Returns:
+            書き込みに成功したか（atomic_writeの戻り値と同じ）のFuture。
+            後続の書き込みに上書きされた場合は、その書き込みの結果になる
+        """
+        return self._state.write(filepath, content)
+
+    def flush(self) -> None:
+        """予約済みの書き込みを呼び出し元のスレッドで今すぐ書く"""
+        self._state.commit()
+
+    def close(self) -> None:
+        """予約済みの書き込みを書き、バックグラウンドスレッドを止める"""
+        self._finalizer()
+
+    def __enter__(self) -> GroupCommitWriter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class _GroupCommitState:
+    """GroupCommitWriter の予約とバックグラウンドスレッド"""
+
+    def __init__(self, window: float, durability: str) -> None:
+        self.window = window
+        self.durability = durability
+        # 予約順を保った {パス: (内容, そのパスを待つFutureのリスト)}
+        self._pending: dict[str, tuple[str, list[Future[bool]]]] = {}
+        self._cond = threading.Condition()
+        # バッチの取り出しから書き込みまでを直列化する（古いバッチが後から書かれないように）
+        self._commit_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        # 予約された書き込み数と実際に書いたファイル数
+        self.requested = 0
+        self.committed = 0
+
+    def write(self, filepath: str, content: str) -> Future[bool]:
+        """書き込みを予約する（GroupCommitWriter.write()参照）"""
+        future: Future[bool] = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("GroupCommitWriter is closed")
+            _, waiters = self._pending.pop(filepath, ("", []))
+            waiters.append(future)
+            self._pending[filepath] = (content, waiters)
+            self.requested += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ensemble-group-commit", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+        return future
+
+    def close(self) -> None:
+        """予約済みの書き込みを書き、バックグラウンドスレッドを止める"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        # ライターの回収がこのスレッド上で起きた場合は自分をjoinしない
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.commit()
+
+    def _run(self) -> None:
+        """予約を待ち、window秒集めてからまとめて書く"""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                # close()されたら待たずに抜ける（残りはclose()が書く）
+                deadline = time.monotonic() + self.window
+                while not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            self.commit()
+
+    def commit(self) -> None:
+        """予約をまとめて取り出して書き込む"""
+        with self._commit_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            results = _write_files(
+                {filepath: content for filepath, (content, _) in batch.items()},
+                self.durability,
+            )
+            with self._cond:
+                self.committed += len(batch)
+            for filepath, (_, waiters) in batch.items():
+                for future in waiters:
+                    future.set_result(results[filepath])
+
+
+# パス種別ごとに集計する項目の初期値
+_LOCK_STATS_FIELDS = {
+    "calls": 0,
+    "failures": 0,
+    "attempts": 0,
+    "timeouts": 0,
+    "wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
+
+
+def lock_path_class(filepath: str) -> str:
+    """
+    ロック統計で使うパス種別を判定する
+
+    Returns:
+        "report"（reports/配下）、"dashboard"（dashboard*）、
+        "queue"（キューのタスク・処理中・遅延・デッドレター）、それ以外は "other"
+    """
+    path = Path(filepath)
+    if "reports" in path.parts[:-1]:
+        return "report"
+    if path.name.startswith("dashboard"):
+        return "dashboard"
+    if {"queue", "tasks", "processing", "delayed", "dead"} & set(path.parts[:-1]):
+        return "queue"
+    return "other"
+
+
+class LockStats:
+    """
+    ロック付き書き込みの競合統計（プロセス内でパス種別ごとに累積する）
+
+    enable_lock_stats() で有効にすると、atomic_write_with_lock() と
+    atomic_write_batch_with_lock() の呼び出しごとに、ロック待ち時間・試行回数・
+    タイムアウト回数・失敗原因をパス種別（lock_path_class()）ごとに加算する。
+    flush() で累積値をNDJSONセッションログ（lock_statsイベント）や
+    メトリクスファイル（JSON）に書き出す。
+
+    集計の形式（snapshot()の戻り値）:
+        {"queue": {"calls": 12, "failures": 1, "attempts": 14, "timeouts": 2,
+                   "wait_seconds": 3.2, "max_wait_seconds": 1.5,
+                   "errors": {"TimeoutError": 2}}, ...}
+    """
+
+    def __init__(self, logger: NDJSONLogger | None = None, path: Path | None = None) -> None:
+        """
+        Args:
+            logger: flush() で lock_stats イベントを書き込むセッションログ
+            path: flush() で累積値を書き出すメトリクスファイル
+        """
+        self.logger = logger
+        self.path = path
+        self._classes: dict[str, dict[str, Any]] = {}
+        self._guard = threading.Lock()
+        self._dirty = False
+
+    def record(
+        self,
+        path_class: str,
+        waited: float,
+        attempts: int,
+        timeouts: int = 0,
+        error: str | None = None,
+    ) -> None:
+        """
+        1回の呼び出しを加算する
+
+        Args:
+            path_class: パス種別
+            waited: ロック待ちの合計秒数（全試行分）
+            attempts: ロック取得の試行回数
+            timeouts: タイムアウトした試行の数
+            error: 最終的に失敗した場合の原因（例外のクラス名）。成功時None
+        """
+        with self._guard:
+            stats = self._classes.setdefault(
+                path_class, {**_LOCK_STATS_FIELDS, "errors": {}}
+            )
+            stats["calls"] += 1
+            stats["attempts"] += attempts
+            stats["timeouts"] += timeouts
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            if error is not None:
+                stats["failures"] += 1
+                stats["errors"][error] = stats["errors"].get(error, 0) + 1
+            self._dirty = True
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """パス種別ごとの累積値のコピーを返す"""
+        with self._guard:
+            return {
+                path_class: {**stats, "errors": dict(stats["errors"])}
+                for path_class, stats in self._classes.items()
+            }
+
+    def flush(self) -> None:
+        """前回から記録があれば、累積値をセッションログ・メトリクスファイルに書き出す"""
+        with self._guard:
+            if not self._dirty:
+                return
+            self._dirty = False
+        data = {"pid": os.getpid(), "classes": self.snapshot()}
+        if self.logger is not None:
+            self.logger.log_event(NDJSONLogger.LOCK_STATS, data)
+        if self.path is not None:
+            atomic_write(str(self.path), json.dumps({**data, "updated_at": time.time()}))
+
+
+# 有効な統計（enable_lock_stats()で設定。Noneなら記録しない）
+_lock_stats: LockStats | None = None
+
+
+def enable_lock_stats(
+    logger: NDJSONLogger | None = None, path: Path | None = None
+) -> LockStats:
+    """
+    ロック競合の統計を有効にする（プロセス内のすべてのロック付き書き込みが対象）
+
+    累積値はプロセス終了時にも書き出される。
+
+    Args:
+        logger: lock_stats イベントを書き込むセッションログ
+        path: 累積値を書き出すメトリクスファイル（プロセスごとに別のパスにする）
+
+    Returns:
+        記録先のLockStats（snapshot()で途中経過を読める）
+    """
+    global _lock_stats
+    disable_lock_stats()
+    _lock_stats = LockStats(logger=logger, path=path)
+    atexit.register(_lock_stats.flush)
+    return _lock_stats
+
+
+def disable_lock_stats() -> None:
+    """ロック競合の統計を書き出して無効にする"""
+    global _lock_stats
+    stats, _lock_stats = _lock_stats, None
+    if stats is not None:
+        atexit.unregister(stats.flush)
+        stats.flush()
+
+
+class _LockCall:
+    """ロック付き書き込み1回分の記録（統計が有効なら finish() でLockStatsに加算する）"""
+
+    __slots__ = ("filepath", "attempts", "waited", "timeouts", "error")
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath
+        self.attempts = 0
+        self.waited = 0.0
+        self.timeouts = 0
+        self.error: str | None = None
+
+    @contextmanager
+    def waiting(self) -> Iterator[None]:
+        """ロック待ちの時間を計る"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.waited += time.monotonic() - started
+
+    def failed(self, error: BaseException) -> None:
+        """試行の失敗を記録する"""
+        self.error = type(error).__name__
+        if isinstance(error, TimeoutError):
+            self.timeouts += 1
+
+    def finish(self) -> None:
+        """統計が有効ならこの呼び出しを加算する"""
+        stats = _lock_stats
+        if stats is not None:
+            stats.record(
+                lock_path_class(self.filepath),
+                self.waited,
+                self.attempts,
+                self.timeouts,
+                self.error,
+            )
@@ -102,6 +102,11 @@ class NDJSONLogger:
     SESSION_START = "session_start"
     SESSION_END = "session_end"
     DISPATCH_INSTRUCTION = "dispatch_instruction"
+    TASK_LEASE_EXPIRED = "task_lease_expired"
+    TASK_RETRY_SCHEDULED = "task_retry_scheduled"
+    TASK_DEAD_LETTERED = "task_dead_lettered"
+    TASK_DROPPED = "task_dropped"
+    LOCK_STATS = "lock_stats"
 
     def __init__(
         self, log_dir: Path | None = None, session_id: str | None = None
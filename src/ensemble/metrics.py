@@ -0,0 +1,409 @@
+"""
+キューのメトリクス（固定バケットのヒストグラム）
+
+TaskQueue が記録する待ち時間（enqueue → claim）・処理時間（claim → complete）・
+キュー深さをヒストグラムに集計する。各プロセスは自分のヒストグラムを
+queue/metrics/<ホスト>-<pid>.json に定期的に書き出し、
+`ensemble queue stats` が全ファイルを合算して表示・Prometheusテキスト形式で出力する。
+終了したプロセスのファイルは書き出しのついでに aggregate.json へ畳み込み、
+TaskQueue.cleanup() で全て削除する。
+
+ファイル構造:
+    queue/metrics/
+    ├── aggregate.json   # 終了したプロセスの合算
+    ├── host-1234.json   # 実行中のプロセスごとの累積ヒストグラム
+    └── host-5678.json
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import socket
+import time
+import weakref
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any
+
+from ensemble.lock import atomic_write, exclusive_lock
+
+# 秒単位の所要時間バケット（上限値、Prometheusのleと同じく上限を含む）
+DURATION_BUCKETS = (
+    0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0,
+)
+
+# キュー深さ（保留タスク数）のバケット
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# 記録するメトリクス名 → (バケット, 説明)
+QUEUE_HISTOGRAMS: dict[str, tuple[tuple[float, ...], str]] = {
+    "wait_seconds": (DURATION_BUCKETS, "Time tasks spend pending before a claim"),
+    "service_seconds": (DURATION_BUCKETS, "Time between claim and complete"),
+    "depth": (DEPTH_BUCKETS, "Pending tasks seen by claim"),
+}
+
+# 書き出し間隔（秒）
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+# 終了したプロセスのメトリクスを畳み込むファイル名
+AGGREGATE_NAME = "aggregate.json"
+
+# 他ホストのプロセスのファイルは、この秒数更新がなければ終了したとみなす
+STALE_SECONDS = 24 * 3600
+
+# プロセス内でメトリクスファイルごとに共有する累積値（同じキューの複数インスタンスで1ファイル）
+_PROCESS_METRICS: dict[Path, QueueMetrics] = {}
+
+
+class Histogram:
+    """固定バケットのヒストグラム"""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        """
+        Args:
+            buckets: 昇順のバケット上限値。最後に +Inf バケットが暗黙に付く
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """値を1件記録する"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: Histogram) -> None:
+        """
+        同じバケットの別ヒストグラムを加算する
+
+        Raises:
+            ValueError: バケットが異なる場合
+        """
+        if other.buckets != self.buckets:
+            raise ValueError("cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    @property
+    def mean(self) -> float:
+        """平均値（0件の場合0）"""
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        分位点の上限をバケットから推定する
+
+        Args:
+            q: 0〜1の分位
+
+        Returns:
+            q分位の値を含むバケットの上限値（+Infバケットならinf、0件なら0）
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return float(bound)
+        return math.inf
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSONに書き出せる辞書に変換する"""
+        return {
+            "buckets": list(self.buckets),
+            "counts": self.counts,
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Histogram:
+        """to_dict()の結果から復元する"""
+        histogram = cls(tuple(data["buckets"]))
+        histogram.counts = list(data["counts"])
+        histogram.sum = data["sum"]
+        histogram.count = data["count"]
+        return histogram
+
+
+class QueueMetrics:
+    """キューのヒストグラム一式（QUEUE_HISTOGRAMSの各メトリクス）"""
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        """全ての記録を捨てる"""
+        self.histograms = {
+            name: Histogram(buckets) for name, (buckets, _) in QUEUE_HISTOGRAMS.items()
+        }
+        # 最初と最後の記録時刻（スループットの算出用）
+        self.started_at: float | None = None
+        self.updated_at: float | None = None
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        メトリクスに値を記録する
+
+        Args:
+            name: QUEUE_HISTOGRAMSのキー
+            value: 記録する値
+        """
+        self.histograms[name].observe(value)
+        now = time.time()
+        if self.started_at is None:
+            self.started_at = now
+        self.updated_at = now
+
+    def merge(self, other: QueueMetrics) -> None:
+        """別プロセスのメトリクスを加算する"""
+        for name, histogram in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(histogram)
+        if other.started_at is not None:
+            self.started_at = min(self.started_at or other.started_at, other.started_at)
+        if other.updated_at is not None:
+            self.updated_at = max(self.updated_at or other.updated_at, other.updated_at)
+
+    def throughput(self) -> float:
+        """完了タスク数 / 記録期間（件/秒、期間がなければ0）"""
+        if self.started_at is None or self.updated_at is None:
+            return 0.0
+        elapsed = self.updated_at - self.started_at
+        completed = self.histograms["service_seconds"].count
+        return completed / elapsed if elapsed > 0 else 0.0
+
+    def busy_workers(self) -> float:
+        """
+        平均稼働ワーカー数をリトルの法則（スループット × 平均処理時間）で推定する
+
+        max_parallel_workersがこれを大きく上回るならワーカー過多、
+        近い値で待ち時間が伸びているならワーカー不足の目安になる。
+        """
+        return self.throughput() * self.histograms["service_seconds"].mean
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSONに書き出せる辞書に変換する"""
+        return {
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+            "histograms": {
+                name: histogram.to_dict() for name, histogram in self.histograms.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> QueueMetrics:
+        """to_dict()の結果から復元する（未知のメトリクスは無視する）"""
+        metrics = cls()
+        metrics.started_at = data.get("started_at")
+        metrics.updated_at = data.get("updated_at")
+        for name, histogram in data.get("histograms", {}).items():
+            if name in metrics.histograms:
+                metrics.histograms[name] = Histogram.from_dict(histogram)
+        return metrics
+
+    def render_prometheus(
+        self, prefix: str = "ensemble_queue", gauges: dict[str, float] | None = None
+    ) -> str:
+        """
+        Prometheusのテキスト形式（node_exporterのtextfile collector向け）に変換する
+
+        Args:
+            prefix: メトリクス名の接頭辞
+            gauges: 追加で出力するゲージ（{名前: 値}）
+
+        Returns:
+            テキスト形式のメトリクス
+        """
+        lines: list[str] = []
+        for name, histogram in self.histograms.items():
+            metric = f"{prefix}_{name}"
+            lines.append(f"# HELP {metric} {QUEUE_HISTOGRAMS[name][1]}")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {_format_value(histogram.sum)}")
+            lines.append(f"{metric}_count {histogram.count}")
+
+        for name, value in (gauges or {}).items():
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsRecorder:
+    """
+    プロセスごとのメトリクスを記録し、定期的にファイルへ書き出す
+
+    記録はメモリ上のヒストグラムへの加算のみで、書き出しは
+    flush_interval秒に1回（tmp + renameで1ファイル）にまとめる。
+    同じプロセス・同じディレクトリのインスタンスは累積値とファイルを共有する。
+    最後の記録はインスタンスの破棄時・プロセス終了時に書き出される。
+    """
+
+    def __init__(self, metrics_dir: Path, flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> None:
+        """
+        Args:
+            metrics_dir: 書き出し先ディレクトリ（queue/metrics/）
+            flush_interval: 書き出し間隔（秒）。0なら記録のたびに書き出す
+        """
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self.path = metrics_dir / f"{socket.gethostname()}-{os.getpid()}.json"
+        self.metrics = _PROCESS_METRICS.get(self.path)
+        if self.metrics is None:
+            # 同じpidの以前のプロセスが残したファイルは引き継ぐ（上書きで失わない）
+            self.metrics = _read_metrics(self.path) or QueueMetrics()
+            _PROCESS_METRICS[self.path] = self.metrics
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        weakref.finalize(self, _write_metrics, self.path, self.metrics)
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        値を記録し、書き出し間隔を過ぎていればファイルに書き出す
+
+        Args:
+            name: QUEUE_HISTOGRAMSのキー
+            value: 記録する値
+        """
+        self.metrics.observe(name, value)
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """未書き出しの記録があればファイルに書き出し、終了したプロセスのファイルを畳み込む"""
+        if not self._dirty:
+            return
+        _write_metrics(self.path, self.metrics)
+        fold_stale_metrics(self.metrics_dir)
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+    def reset(self) -> None:
+        """プロセス内の累積値を捨てる（キューのcleanup()でファイルを消したとき用）"""
+        self.metrics.clear()
+        self._dirty = False
+
+
+def _write_metrics(path: Path, metrics: QueueMetrics) -> None:
+    """メトリクスをファイルに書き出す（キューのディレクトリが消えていれば何もしない）"""
+    if metrics.updated_at is None:
+        return
+    try:
+        path.parent.mkdir(exist_ok=True)
+    except OSError:
+        return
+    atomic_write(str(path), json.dumps(metrics.to_dict()))
+
+
+def _read_metrics(path: Path) -> QueueMetrics | None:
+    """メトリクスファイルを読む（ない・壊れている場合None）"""
+    try:
+        return QueueMetrics.from_dict(json.loads(path.read_text()))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _is_stale(metrics_file: Path) -> bool:
+    """
+    メトリクスファイルを書いたプロセスが終了しているか
+
+    同じホストのファイルはpidの生存で、他ホスト（と旧形式のファイル）は
+    STALE_SECONDS 以上更新がないかで判定する。
+    """
+    host, _, pid = metrics_file.stem.rpartition("-")
+    if host == socket.gethostname() and pid.isdigit():
+        if int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass  # 別ユーザーのプロセスとして生きている
+        return False
+    try:
+        return time.time() - metrics_file.stat().st_mtime >= STALE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def fold_stale_metrics(metrics_dir: Path) -> list[Path]:
+    """
+    終了したプロセスのメトリクスファイルを aggregate.json に畳み込んで削除する
+
+    Args:
+        metrics_dir: メトリクスディレクトリ（queue/metrics/）
+
+    Returns:
+        畳み込んだファイルのリスト
+    """
+    aggregate_path = metrics_dir / AGGREGATE_NAME
+    stale = [
+        f
+        for f in metrics_dir.glob("*.json")
+        if f.name != AGGREGATE_NAME and _is_stale(f)
+    ]
+    if not stale:
+        return []
+
+    try:
+        with exclusive_lock(str(aggregate_path)):
+            aggregate = _read_metrics(aggregate_path) or QueueMetrics()
+            folded = []
+            for metrics_file in stale:
+                metrics = _read_metrics(metrics_file)
+                if metrics is None and metrics_file.exists():
+                    continue  # 書き込み途中・壊れたファイルは残す
+                if metrics is not None:
+                    aggregate.merge(metrics)
+                folded.append(metrics_file)
+            if aggregate.updated_at is not None:
+                atomic_write(str(aggregate_path), json.dumps(aggregate.to_dict()))
+            for metrics_file in folded:
+                metrics_file.unlink(missing_ok=True)
+    except (TimeoutError, OSError):
+        return []  # 他のプロセスが畳み込み中。次の書き出しで再試行する
+    return folded
+
+
+def load_metrics(metrics_dir: Path) -> QueueMetrics:
+    """
+    全プロセスのメトリクスファイルを合算する
+
+    Args:
+        metrics_dir: メトリクスディレクトリ（queue/metrics/）
+
+    Returns:
+        合算したメトリクス（ファイルがなければ空）
+    """
+    merged = QueueMetrics()
+    if not metrics_dir.is_dir():
+        return merged
+    for metrics_file in sorted(metrics_dir.glob("*.json")):
+        metrics = _read_metrics(metrics_file)
+        if metrics is not None:  # 書き込み途中・壊れたファイルは読み飛ばす
+            merged.merge(metrics)
+    return merged
+
+
+def _format_value(value: float) -> str:
+    """Prometheus形式の数値表記（整数は小数点なし）"""
+    if math.isfinite(value) and value == int(value):
+        return str(int(value))
+    return repr(float(value))
@@ -6,16 +6,369 @@
 
 from __future__ import annotations
 
+import hashlib
+import heapq
+import json
 import os
+import random
+import re
+import time
 import uuid
+import zlib
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any
-
-import yaml
+from typing import Any, Iterator
 
+from ensemble import codec
+from ensemble.archive import AppendOnlyReader, ReportArchive
+from ensemble.backpressure import Backpressure, DepthCounter, QueueFullError, apply_deltas
 from ensemble.dependency import DependencyResolver
-from ensemble.lock import atomic_claim, atomic_write, atomic_write_with_lock
+from ensemble.fifo import LaneLog, TaskSequence, append_entries
+from ensemble.config import get_durability
+from ensemble.lock import (
+    RW_LOCK_PREFIX,
+    atomic_claim,
+    atomic_write,
+    atomic_write_batch_with_lock,
+    atomic_write_with_lock,
+    shared_lock,
+    validate_durability,
+)
+from ensemble.logger import NDJSONLogger
+from ensemble.metrics import MetricsRecorder
+from ensemble.snapshot import read_snapshot, write_snapshot
+from ensemble.watch import IN_MODIFY, DirectoryWatcher
+
+# 選択可能なストレージバックエンド
+QUEUE_BACKENDS = ("file", "sqlite", "remote")
+
+# 優先度 → ファイル名プレフィックスのランク（小さいほど先にclaimされる）
+PRIORITY_RANKS = {"high": 0, "medium": 1, "low": 2}
+DEFAULT_PRIORITY = "medium"
+
+# claimのリース期間（秒）。期限切れのタスクはreap_expired()でtasks/に戻される
+DEFAULT_VISIBILITY_TIMEOUT = 1800.0
+
+# 遅延タスクを振り分ける時間バケットの幅（秒）
+DELAY_BUCKET_SECONDS = 60
+
+# 優先度プレフィックス付きタスクファイル名（例: p0_20260101120000-abcd1234.yaml）
+_PRIORITY_FILENAME = re.compile(r"^p(\d)_(.+)$")
+
+# レーン内のシャード（サブディレクトリ）数の上限（シャード名は2桁の16進数）
+MAX_SHARDS = 256
+
+
+def create_task_queue(
+    base_dir: Path | None = None, backend: str = "file", **kwargs: Any
+) -> Any:
+    """
+    指定バックエンドのタスクキューを作成する
+
+    Args:
+        base_dir: ベースディレクトリ（デフォルト: queue/）
+        backend: "file"（デフォルト、タスクごとのYAMLファイル）、
+                 "sqlite"（単一のSQLite DB、WALモード）、または
+                 "remote"（ensemble queue serve のサーバーに接続）
+        **kwargs: キューのコンストラクタに渡す追加引数
+                  （visibility_timeout, logger, remoteの場合はaddress など）
+
+    Returns:
+        TaskQueue、SQLiteTaskQueue または RemoteTaskQueue
+
+    Raises:
+        ValueError: 未知のバックエンドが指定された場合
+    """
+    if backend == "file":
+        return TaskQueue(base_dir=base_dir, **kwargs)
+    if backend == "sqlite":
+        from ensemble.queue_sqlite import SQLiteTaskQueue
+
+        return SQLiteTaskQueue(base_dir=base_dir, **kwargs)
+    if backend == "remote":
+        from ensemble.queue_server import RemoteTaskQueue
+
+        return RemoteTaskQueue(base_dir=base_dir, **kwargs)
+    raise ValueError(
+        f"Unknown queue backend: {backend} (expected one of {', '.join(QUEUE_BACKENDS)})"
+    )
+
+
+def lane_name(agent: str) -> str:
+    """
+    エージェント名からレーンディレクトリ名を作る
+
+    ファイル名に使えない文字は "_" に置き換え、先頭のドットは除去する
+    （隠しファイル・相対パスとの衝突を避けるため）。
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", agent).lstrip(".")
+    return name or "_"
+
+
+def normalize_priority(priority: Any) -> str:
+    """
+    優先度を "high" / "medium" / "low" の文字列に正規化する
+
+    scanner.TaskPriority などの .value を持つEnumも受け付ける。
+
+    Raises:
+        ValueError: 未知の優先度が指定された場合
+    """
+    value = getattr(priority, "value", priority)
+    value = str(value).lower()
+    if value not in PRIORITY_RANKS:
+        raise ValueError(
+            f"Unknown priority: {priority} (expected one of {', '.join(PRIORITY_RANKS)})"
+        )
+    return value
+
+
+def task_filename(task_id: str, priority: str = DEFAULT_PRIORITY) -> str:
+    """優先度プレフィックス付きのタスクファイル名を返す"""
+    return f"p{PRIORITY_RANKS[priority]}_{task_id}.yaml"
+
+
+def parse_task_filename(filename: str) -> tuple[int, str]:
+    """
+    タスクファイル名から (優先度ランク, タスクID) を取り出す
+
+    プレフィックスのないファイル（tasks/直下に手動で置かれたもの等）は
+    デフォルト優先度として扱う。シャードのサブディレクトリ付き（"0a/p1_<id>.yaml"）でもよい。
+    """
+    filename = filename.rpartition("/")[2]
+    stem = filename[:-5] if filename.endswith(".yaml") else filename
+    match = _PRIORITY_FILENAME.match(stem)
+    if match:
+        return int(match.group(1)), match.group(2)
+    return PRIORITY_RANKS[DEFAULT_PRIORITY], stem
+
+
+def generate_task_id() -> str:
+    """ユニークなタスクIDを生成"""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    short_uuid = uuid.uuid4().hex[:8]
+    return f"{timestamp}-{short_uuid}"
+
+
+def shard_name(task_id: str, shards: int) -> str:
+    """タスクIDのハッシュからレーン内のシャード名（"00"〜"ff"）を決める"""
+    return f"{zlib.crc32(task_id.encode()) % shards:02x}"
+
+
+def make_dedup_key(command: str, agent: str, params: dict[str, Any] | None = None) -> str:
+    """
+    タスクの内容（command + agent + params）から重複排除キーを作る
+
+    paramsはキー順に正規化するため、同じ内容なら辞書の順序に関係なく同じキーになる。
+    """
+    content = json.dumps([command, agent, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@dataclass
+class RetryPolicy:
+    """
+    error報告されたタスクの再試行ポリシー
+
+    Attributes:
+        max_attempts: 最大実行回数（これに達したらdead-letterへ）
+        base_delay: 1回目の再試行までの待ち時間（秒）。以降は倍々に増える
+        max_delay: 待ち時間の上限（秒）
+        jitter: 待ち時間に加える揺らぎの割合（0.1なら±10%）
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 30.0
+    max_delay: float = 3600.0
+    jitter: float = 0.1
+
+    def __post_init__(self) -> None:
+        if self.max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        if self.base_delay < 0 or self.max_delay < 0:
+            raise ValueError("retry delays must not be negative")
+        if not 0 <= self.jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+
+    def delay_for(self, attempts: int) -> float:
+        """
+        attempts回失敗したタスクを次に実行するまでの待ち時間を返す
+
+        Args:
+            attempts: これまでの失敗回数（1以上）
+
+        Returns:
+            待ち時間（秒）
+        """
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+def to_timestamp(when: datetime | float) -> float:
+    """datetimeまたはUNIX時刻（秒）をUNIX時刻に変換する"""
+    if isinstance(when, datetime):
+        return when.timestamp()
+    return float(when)
+
+
+def build_task(
+    command: str,
+    agent: str,
+    params: dict[str, Any] | None = None,
+    priority: Any = DEFAULT_PRIORITY,
+    blocked_by: list[str] | None = None,
+    created_at: str | None = None,
+    task_id: str | None = None,
+    not_before: datetime | float | None = None,
+) -> dict[str, Any]:
+    """
+    キューに保存するタスク辞書を組み立てる
+
+    Args:
+        command: 実行するコマンド
+        agent: 担当エージェント
+        params: 追加パラメータ
+        priority: 優先度
+        blocked_by: 依存タスクIDのリスト（Noneの場合はキーを含めない）
+        created_at: 作成日時（デフォルト: 現在時刻）
+        task_id: タスクID（デフォルト: 新規生成）
+        not_before: この時刻まではclaimされない（datetimeまたはUNIX時刻）
+
+    Returns:
+        タスク辞書
+    """
+    task: dict[str, Any] = {
+        "task_id": task_id or generate_task_id(),
+        "command": command,
+        "agent": agent,
+        "params": params or {},
+    }
+    if blocked_by is not None:
+        task["blocked_by"] = blocked_by
+    task["priority"] = normalize_priority(priority)
+    task["status"] = "pending"
+    task["created_at"] = created_at or datetime.now().isoformat()
+    if not_before is not None:
+        task["not_before"] = datetime.fromtimestamp(to_timestamp(not_before)).isoformat()
+    return task
+
+
+class TaskGroup:
+    """
+    enqueue_group()で投入したタスクのグループ（fan-out / fan-in）
+
+    complete()はグループのタスクが最終結果（success / error / dead-letter）になるたびに
+    groups/<group_id>/done に "タスクID<TAB>結果" を1行追記する（O_APPENDの1回のwrite）。
+    待つ側はこの完了ログの追記分だけを読み、reports/ を走査しない。
+    """
+
+    MEMBERS_NAME = "members"
+    DONE_NAME = "done"
+
+    # timeout=Noneで待つ場合の1回の待機上限（秒）
+    WAIT_SLICE = 60.0
+
+    def __init__(self, queue: TaskQueue, group_id: str, task_ids: list[str]) -> None:
+        """
+        Args:
+            queue: グループのタスクを投入したキュー
+            group_id: グループID
+            task_ids: グループのタスクID（投入順）
+        """
+        self.queue = queue
+        self.group_id = group_id
+        self.task_ids = task_ids
+        self.group_dir = queue.groups_dir / group_id
+        self._reader = AppendOnlyReader(self.group_dir / self.DONE_NAME)
+        self._completed: dict[str, str] = {}
+
+    def completed(self) -> dict[str, str]:
+        """
+        完了したタスクを返す
+
+        Returns:
+            {タスクID: 結果}（完了順）
+        """
+        self._refresh()
+        return dict(self._completed)
+
+    def is_done(self) -> bool:
+        """全タスクが完了したか"""
+        self._refresh()
+        return len(self._completed) >= len(self.task_ids)
+
+    def wait_all(self, timeout: float | None = None) -> bool:
+        """
+        全タスクの完了を待つ
+
+        Args:
+            timeout: 最大待機秒数。Noneなら完了するまで待つ
+
+        Returns:
+            全タスクが完了した場合True、タイムアウトした場合False
+        """
+        return self._wait(lambda: len(self._completed) >= len(self.task_ids), timeout)
+
+    def wait_any(self, timeout: float | None = None) -> str | None:
+        """
+        いずれかのタスクの完了を待つ
+
+        Args:
+            timeout: 最大待機秒数。Noneなら完了するまで待つ
+
+        Returns:
+            最初に完了したタスクのID、タイムアウトした場合None
+        """
+        if self._wait(lambda: bool(self._completed), timeout):
+            return next(iter(self._completed))
+        return None
+
+    def reports(self) -> dict[str, dict[str, Any] | None]:
+        """
+        完了したタスクのレポートを取得する
+
+        Returns:
+            {タスクID: レポート}（完了順）
+        """
+        return {task_id: self.queue.get_report(task_id) for task_id in self.completed()}
+
+    def _refresh(self) -> None:
+        """完了ログの追記分を読み込む"""
+        reset, lines = self._reader.read_new()
+        if reset:
+            self._completed = {}
+        for line in lines:
+            task_id, _, result = line.partition("\t")
+            # at-least-onceで同じタスクが2回完了した場合は最初の結果を使う
+            self._completed.setdefault(task_id, result)
+
+    def _wait(self, predicate: Any, timeout: float | None) -> bool:
+        """完了ログへの追記を待ちながらpredicateが真になるまで待つ"""
+        self._refresh()
+        if predicate():
+            return True
+        if timeout is not None and timeout <= 0:
+            return False
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.group_dir.mkdir(parents=True, exist_ok=True)
+        with DirectoryWatcher(
+            [self.group_dir], recursive_new_dirs=False, mask=IN_MODIFY
+        ) as watcher:
+            while True:
+                # watch開始前の追記を取りこぼさないよう、待つ前に再確認する
+                self._refresh()
+                if predicate():
+                    return True
+                if deadline is None:
+                    remaining = self.WAIT_SLICE
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                watcher.wait(remaining)
 
 
 class TaskQueue:
@@ -25,32 +378,207 @@ class TaskQueue:
     構造:
         queue/
         ├── tasks/       # 保留中のタスク
+        │   └── <agent>/ # エージェント別レーン（+ 優先度別の投入ログとclaimカーソル）
+        │       └── <shard>/  # shards指定時のみ: タスクIDのハッシュ別サブディレクトリ
+        ├── delayed/     # not_before が未来のタスク
+        │   └── <分バケット>/<agent>/<期限ms>_p1_<id>.yaml
         ├── processing/  # 処理中のタスク
-        └── reports/     # 完了報告
+        ├── reports/     # 完了報告
+        ├── dead/        # 再試行を使い切ったタスク（dead-letter）
+        ├── metrics/     # プロセスごとの待ち時間・処理時間・深さのヒストグラム
+        ├── groups/      # enqueue_group()のメンバーと完了ログ
+        ├── dedup/       # 重複排除キー → 未完了のタスクID
+        ├── archive/     # archive_reports()で退避した完了報告（NDJSONセグメント）
+        ├── completed.idx  # 完了済みタスクIDの追記専用インデックス
+        ├── depth        # レーン別の保留タスク数（遅延タスクを含む）
+        ├── checkpoint.ndjson  # 再起動時のウォームスタート用チェックポイント
+        └── sequence     # タスクIDの連番
+
+    enqueueされたタスクは担当エージェント（agentフィールド）ごとの
+    レーンに置かれ、claim(agent=...)は自レーンだけを一覧する。
+    tasks/直下に手動で置かれたタスクはagent指定なしのclaimで取得される。
+
+    タスクIDは "<タイムスタンプ>-<連番>" で、辞書順が投入順と一致する。
+    タスクファイル名は優先度ランクをプレフィックスに持つ
+    （p0_=high, p1_=medium, p2_=low）。レーンへの書き込みは投入ログにも追記され、
+    claimはカーソル位置からログを読んで「優先度 → 投入順」に選択する
+    （ディレクトリの一覧・ソートもYAMLのパースもしない）。
+    processing/ と reports/ のファイル名はタスクIDのみ。
+
+    claimはリース（visibility timeout）付きで、processing/ のファイルの
+    mtimeをリース期限として使う。heartbeat()で期限を延長でき、
+    期限切れのタスクはreap_expired()でtasks/に戻される。
+
+    not_before付きのタスクは期限の分バケット別に delayed/ に置かれ、
+    claim時に期限が来たバケットだけを一覧して tasks/ へ移す（未来のタスクはパースしない）。
+    retry_policyを指定すると、error報告されたタスクはバックオフ後に再実行され、
+    max_attemptsに達したら dead/ に移される。
+
+    レーン別の保留タスク数（深さ）は depth カウンターファイルで管理する。
+    backpressureを指定すると、上限を超えるenqueueは待たされるか、
+    QueueFullErrorで拒否されるか、優先度の低い保留タスクを dead/ に落として受け入れられる。
+
+    shardsを指定すると、レーン内のタスクファイルをタスクIDのハッシュで
+    サブディレクトリに分散させる（1ディレクトリのエントリ数を抑え、rename・一覧を速く保つ）。
+    読み込み側はshardsの設定に関係なく両方の配置を扱うため、途中で切り替えてもよい。
+
+    complete()はパース済みの保留タスク・ディレクトリの一覧と完了済みIDを定期的に
+    checkpoint.ndjson に書き出し、新しいインスタンスはそこから始めて
+    チェックポイント以降に変わったディレクトリ・ファイル・追記分だけを読む。
+
+    dedup_key付き（dedup=Trueなら内容のハッシュがデフォルト）のenqueueは、
+    同じキーのタスクが未完了ならファイルを作らずにそのタスクIDを返す。
+    キーは最終結果（完了・dead-letter・drop）が出た時点で解放される。
     """
 
-    def __init__(self, base_dir: Path | None = None) -> None:
+    # enqueue_many がバッチ全体で共有するロックファイル名
+    BATCH_LOCK_NAME = ".enqueue.lock"
+    COMPLETED_INDEX_NAME = "completed.idx"
+    SEQUENCE_NAME = "sequence"
+    DEPTH_NAME = "depth"
+    CHECKPOINT_NAME = "checkpoint.ndjson"
+
+    # complete()がチェックポイントを書き出す間隔（秒）
+    CHECKPOINT_INTERVAL = 300.0
+
+    # ディレクトリのmtimeがこの秒数以上前なら、一覧を取った後に変更されていないとみなす
+    # （ファイルシステムのタイムスタンプは粗い時計で付くため余裕を持たせる）
+    LISTING_MTIME_MARGIN = 2.0
+    ARCHIVE_BATCH_SIZE = 1000
+
+    # 中断された回収ファイル（*.reaping）を処理中に戻すまでの猶予（秒）
+    REAP_ORPHAN_GRACE = 60.0
+
+    # 遅延タスクがある場合のclaim(timeout=...)の最大待機単位（秒）
+    DELAYED_POLL_INTERVAL = 1.0
+
+    # 投入ログに載っていないタスクを探してレーンを一覧する最小間隔（秒）
+    # （ログへの追記前に落ちた場合などにしか生じないため、空振りのclaimごとには一覧しない）
+    UNLOGGED_SCAN_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        base_dir: Path | None = None,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        logger: NDJSONLogger | None = None,
+        wire_format: str = "yaml",
+        retry_policy: RetryPolicy | None = None,
+        metrics: bool = True,
+        backpressure: Backpressure | None = None,
+        dedup: bool = False,
+        shards: int = 0,
+        checkpoint_interval: float | None = CHECKPOINT_INTERVAL,
+        durability: str | None = None,
+        read_only: bool = False,
+    ) -> None:
         """
         キューを初期化する
 
         Args:
             base_dir: ベースディレクトリ（デフォルト: queue/）
+            visibility_timeout: claimのデフォルトリース期間（秒）
+            logger: リース期限切れなどのイベントを記録するNDJSONロガー
+            wire_format: タスク・レポートの書き込み形式（"yaml" or "json"）。
+                         エージェントがファイルを直接読まない場合のみ"json"にする。
+                         読み込みはどちらの形式にも対応する
+            retry_policy: error報告されたタスクの再試行ポリシー。
+                          Noneの場合はerrorも最終結果としてレポートに保存する
+            metrics: 待ち時間（enqueue → claim）・処理時間（claim → complete）・
+                     claim時のキュー深さを queue/metrics/ に記録するか
+            backpressure: 保留タスク数の上限と、上限に達したときの動作。
+                          Noneの場合は上限なし（深さのカウントは常に行う）
+            dedup: dedup_key省略時も command + agent + params のハッシュで
+                   重複排除するか
+            shards: レーン内のシャード数（0ならシャードしない、最大MAX_SHARDS）
+            checkpoint_interval: complete()がチェックポイントを書き出す間隔（秒）。
+                                 Noneの場合は書き出さない（読み込みは常に行う）
+            durability: タスク・レポートなどのファイルの耐久性レベル
+                        （"none" / "rename" / "fsync"）。Noneの場合は設定の
+                        durability.queue に従う。"none"ではclaimが書きかけの
+                        タスクを拾いうるため、単一プロセスの使い捨てキュー専用
+            read_only: Trueなら既存のキューを読むだけで、ディレクトリ・完了済みIDの
+                       インデックス・深さのカウンター・メトリクスを作らず、期限の来た
+                       遅延タスクも移さない（ensemble queue stats / snapshot 用）。
+                       書き込みを伴うメソッドは呼ばないこと
         """
+        if not 0 <= shards <= MAX_SHARDS:
+            raise ValueError(f"shards must be between 0 and {MAX_SHARDS}")
+        if durability is None:
+            durability = get_durability("queue")
+        self.durability = validate_durability(durability)
         self.base_dir = base_dir if base_dir else Path("queue")
+        self.wire_format = codec.validate_format(wire_format)
+        self.visibility_timeout = visibility_timeout
+        self.logger = logger
+        self.retry_policy = retry_policy
+        self.backpressure = backpressure
+        self.dedup = dedup
+        self.shards = shards
+        self.checkpoint_interval = checkpoint_interval
+        self.read_only = read_only
         self.tasks_dir = self.base_dir / "tasks"
         self.processing_dir = self.base_dir / "processing"
         self.reports_dir = self.base_dir / "reports"
+        self.delayed_dir = self.base_dir / "delayed"
+        self.dead_dir = self.base_dir / "dead"
+        self.groups_dir = self.base_dir / "groups"
+        self.dedup_dir = self.base_dir / "dedup"
 
         # ディレクトリ作成
-        self.tasks_dir.mkdir(parents=True, exist_ok=True)
-        self.processing_dir.mkdir(parents=True, exist_ok=True)
-        self.reports_dir.mkdir(parents=True, exist_ok=True)
+        if not read_only:
+            self.tasks_dir.mkdir(parents=True, exist_ok=True)
+            self.processing_dir.mkdir(parents=True, exist_ok=True)
+            self.reports_dir.mkdir(parents=True, exist_ok=True)
+
+        # 古いレポートの退避先（archive_reports()で使う）
+        self.archive = ReportArchive(self.base_dir / "archive")
+
+        # 単調増加のタスクID（辞書順 = 投入順）
+        self.sequence = TaskSequence(self.base_dir / self.SEQUENCE_NAME)
+
+        # 作成済みレーン・シャードディレクトリ（mkdirの繰り返しを避ける）
+        self._known_lanes: set[str] = set()
+        self._known_shards: set[Path] = set()
+        # 全件走査でのシャードの開始位置（ラウンドロビン）
+        self._scan_offset = 0
+
+        # 完了済みIDの追記専用インデックス
+        self.completed_index = self.base_dir / self.COMPLETED_INDEX_NAME
+        self._completed_ids: set[str] = set()
+        self._completed_reader = AppendOnlyReader(self.completed_index)
+        # パース済みの保留タスク（パス → (inode, タスク)）
+        self._task_cache: dict[Path, tuple[int, dict[str, Any]]] = {}
+        # 保留タスクのディレクトリの一覧（パス → (一覧を取った時刻, *.yaml, サブディレクトリ)）
+        self._listings: dict[Path, tuple[float, list[Path], list[Path]]] = {}
+        # チェックポイント（初回の読み込み時に1回だけ使い、以後は定期的に書き出す）
+        self.checkpoint_path = self.base_dir / self.CHECKPOINT_NAME
+        self._checkpoint_loaded = False
+        self._next_checkpoint = time.monotonic() + (checkpoint_interval or 0)
+        # agent（Noneは全レーン）ごとの次にレーンを一覧してよい時刻（最初のclaimでは一覧する）
+        self._next_unlogged_scan: dict[str | None, float] = {}
+
+        # メトリクス（処理時間はこのインスタンスでclaimしたタスクのみ計測する）
+        self.metrics = (
+            MetricsRecorder(self.base_dir / "metrics") if metrics and not read_only else None
+        )
+        self._claimed_at: dict[str, float] = {}
+
+        if not read_only and not self.completed_index.exists():
+            self._bootstrap_completed_index()
+
+        # レーン別の保留タスク数（ディレクトリを一覧せずに上限を判定する）
+        self.depth = DepthCounter(self.base_dir / self.DEPTH_NAME)
+        if not read_only and not self.depth.path.exists():
+            self.recount_depth()
 
     def enqueue(
         self,
         command: str,
         agent: str,
         params: dict[str, Any] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+        not_before: datetime | float | None = None,
+        dedup_key: str | None = None,
     ) -> str:
         """
         タスクをキューに追加する
@@ -59,44 +587,469 @@ class TaskQueue:
             command: 実行するコマンド
             agent: 担当エージェント
             params: 追加パラメータ
+            priority: 優先度（"high" / "medium" / "low" または TaskPriority）
+            not_before: この時刻まではclaimされない（datetimeまたはUNIX時刻）
+            dedup_key: 重複排除キー。同じキーの未完了タスクがあればそのIDを返す
+                       （デフォルト: dedup=Trueなら内容のハッシュ、それ以外は重複排除しない）
 
         Returns:
-            タスクID
+            タスクID（重複していた場合は既存タスクのID）
+
+        Raises:
+            QueueFullError: backpressureの上限に達していて受け入れられない場合
+            OSError: タスクファイルを書き込めなかった場合（ロック取得のタイムアウトなど）
         """
-        task_id = self._generate_task_id()
+        task = self._build_task(
+            command, agent, params, priority=priority, not_before=not_before
+        )
+        existing = self._reserve_dedup(task, dedup_key)
+        if existing is not None:
+            return existing
+        self._admit_reserved([task])
+        self._write_admitted(task)
 
-        task = {
-            "task_id": task_id,
-            "command": command,
-            "agent": agent,
-            "params": params or {},
-            "status": "pending",
-            "created_at": datetime.now().isoformat(),
+        return task["task_id"]
+
+    def enqueue_many(self, specs: list[dict[str, Any]]) -> list[str]:
+        """
+        複数タスクをまとめてキューに追加する
+
+        ロック取得をバッチ全体で1回にまとめ、各タスクファイルは
+        個別にtmp + renameでアトミックに書き込む。
+
+        Args:
+            specs: タスク仕様のリスト。各要素は以下のキーを持つ:
+                {"command": str, "agent": str, "params": dict（省略可）,
+                 "blocked_by": list[str]（省略可）, "priority": str（省略可）,
+                 "not_before": datetime | float（省略可）, "dedup_key": str（省略可）}
+
+        Returns:
+            タスクIDのリスト（specsと同じ順序。重複していたタスクは既存タスクのID）
+
+        Raises:
+            QueueFullError: backpressureの上限に達していて受け入れられない場合
+                            （バッチのどのタスクも投入されない）
+            OSError: タスクファイルを書き込めなかった場合（書き込めた分も取り消す）
+        """
+        return self._enqueue_specs(specs)
+
+    def enqueue_group(
+        self, specs: list[dict[str, Any]], group_id: str | None = None
+    ) -> TaskGroup:
+        """
+        複数タスクを1つのグループとして投入する（fan-out）
+
+        返されたTaskGroupの wait_all() / wait_any() で完了を待てる（fan-in）。
+        別プロセスからは group(group_id) で同じグループを参照できる。
+        グループのタスクは重複排除しない（他のタスクの完了はグループに記録されないため）。
+
+        Args:
+            specs: タスク仕様のリスト（enqueue_many と同じ形式）
+            group_id: グループID（デフォルト: 新規生成）
+
+        Returns:
+            投入したタスクのグループ
+        """
+        group_id = group_id or f"group-{generate_task_id()}"
+        group_dir = self.groups_dir / group_id
+        group_dir.mkdir(parents=True, exist_ok=True)
+
+        task_ids = self._enqueue_specs(specs, group_id=group_id)
+        atomic_write(
+            str(group_dir / TaskGroup.MEMBERS_NAME),
+            "".join(f"{task_id}\n" for task_id in task_ids),
+            durability=self.durability,
+        )
+        return TaskGroup(self, group_id, task_ids)
+
+    def group(self, group_id: str) -> TaskGroup:
+        """
+        既存のグループを参照する
+
+        Args:
+            group_id: グループID
+
+        Returns:
+            タスクグループ
+
+        Raises:
+            KeyError: グループが存在しない場合
+        """
+        members_file = self.groups_dir / group_id / TaskGroup.MEMBERS_NAME
+        try:
+            task_ids = members_file.read_text().split()
+        except FileNotFoundError:
+            raise KeyError(group_id) from None
+        return TaskGroup(self, group_id, task_ids)
+
+    def _enqueue_specs(
+        self, specs: list[dict[str, Any]], group_id: str | None = None
+    ) -> list[str]:
+        """
+        enqueue_many / enqueue_group の本体
+
+        group_id指定時は各タスクに記録し、重複排除はしない。
+        """
+        tasks: list[dict[str, Any]] = []
+        task_ids: list[str] = []
+        created_at = datetime.now().isoformat()
+        # IDはバッチ分をまとめて払い出す（シーケンスのロックは1回）
+        reserved = self.sequence.reserve(len(specs)) if specs else []
+
+        for spec, task_id in zip(specs, reserved):
+            task = self._build_task(
+                spec["command"],
+                spec["agent"],
+                spec.get("params"),
+                priority=spec.get("priority", DEFAULT_PRIORITY),
+                blocked_by=spec.get("blocked_by") if "blocked_by" in spec else None,
+                created_at=created_at,
+                not_before=spec.get("not_before"),
+                task_id=task_id,
+            )
+            if group_id is not None:
+                task["group_id"] = group_id
+                existing = None
+            else:
+                existing = self._reserve_dedup(task, spec.get("dedup_key"))
+            if existing is None:
+                tasks.append(task)
+            task_ids.append(existing or task["task_id"])
+
+        # 受け入れはバッチ全体で判定する（一部だけ投入されることはない）
+        self._admit_reserved(tasks)
+        files = {
+            str(self._task_path(task)): codec.dumps(task, self.wire_format)
+            for task in tasks
         }
 
-        task_file = self.tasks_dir / f"{task_id}.yaml"
-        content = yaml.dump(task, allow_unicode=True, default_flow_style=False)
-        atomic_write_with_lock(str(task_file), content)
+        if files:
+            if not atomic_write_batch_with_lock(
+                files,
+                str(self.tasks_dir / self.BATCH_LOCK_NAME),
+                durability=self.durability,
+            ):
+                # 書けた分も取り消す（消す前にclaimされたタスクはそのまま処理される）
+                for path in files:
+                    Path(path).unlink(missing_ok=True)
+                self._rollback_admitted(
+                    [
+                        task
+                        for task in tasks
+                        if not (self.processing_dir / f"{task['task_id']}.yaml").exists()
+                    ]
+                )
+                raise OSError(f"failed to write {len(files)} task files to {self.tasks_dir}")
+            self._publish([Path(path) for path in files])
 
-        return task_id
+        return task_ids
 
-    def claim(self) -> dict[str, Any] | None:
+    def claim(
+        self,
+        agent: str | None = None,
+        lease: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any] | None:
         """
         タスクを取得する（アトミック）
 
+        優先度の高いタスクから、同じ優先度内では古い順に取得する。
+
+        Args:
+            agent: 指定時はこのエージェントのレーンのみから取得。
+                   Noneの場合は全レーンから取得
+            lease: リース期間（秒）。Noneの場合はvisibility_timeout
+            timeout: キューが空の場合に新しいタスクを待つ最大秒数。
+                     Linuxではinotifyで待機し、それ以外ではバックオフ付きポーリング。
+                     Noneまたは0の場合は待たない
+
         Returns:
-            タスクデータ、またはキューが空の場合None
+            タスクデータ（lease_expires_at付き）、またはキューが空の場合None
         """
-        # 最も古いタスクを取得（ファイル名でソート）
-        task_files = sorted(self.tasks_dir.glob("*.yaml"))
+        claimed = self.claim_batch(1, agent=agent, lease=lease)
+        if claimed or not timeout:
+            return claimed[0] if claimed else None
 
-        for task_file in task_files:
-            result = atomic_claim(str(task_file), str(self.processing_dir))
-            if result:
-                with open(result) as f:
-                    return yaml.safe_load(f)
+        deadline = time.monotonic() + timeout
+        # タスクファイルの作成後に投入ログへ追記されるため、ログの追記（IN_MODIFY）でも起きる
+        with DirectoryWatcher(self.claim_watch_dirs(agent), mask=IN_MODIFY) as watcher:
+            while True:
+                # watch開始前に置かれたタスクを取りこぼさないよう、待つ前に再確認する
+                claimed = self.claim_batch(1, agent=agent, lease=lease)
+                if claimed:
+                    return claimed[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # 遅延タスクは期限が来てもファイルが増えないため、短い間隔で再確認する
+                if self.has_delayed():
+                    remaining = min(remaining, self.DELAYED_POLL_INTERVAL)
+                watcher.wait(remaining)
 
-        return None
+    def claim_batch(
+        self, n: int, agent: str | None = None, lease: float | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        最大n件のタスクをまとめて取得する
+
+        各レーン・優先度の投入ログをカーソル位置から読み、先頭同士を
+        (優先度ランク, タスクID) のヒープで比べて取り出す（ディレクトリの一覧・ソート不要）。
+        tasks/直下（手動で置かれたタスク）は毎回一覧して同じヒープで比べる。
+        それでも足りない場合のみ、ログに載っていないレーン内のタスク
+        （ログへの追記前に落ちたもの等）を探すためにレーンを一覧する。この一覧は
+        最初のclaimと、以後UNLOGGED_SCAN_INTERVAL秒に1回までに限る。
+        各タスクはatomic_claimで個別にアトミックに取得する。
+
+        Args:
+            n: 取得する最大件数
+            agent: 指定時はこのエージェントのレーンのみから取得
+            lease: リース期間（秒）。Noneの場合はvisibility_timeout
+
+        Returns:
+            取得したタスクデータのリスト（優先度 → 古い順、空の場合は空リスト）
+        """
+        claimed: list[dict[str, Any]] = []
+        if n <= 0:
+            return claimed
+
+        self._promote_due_tasks()
+        lease_expires = time.time() + (
+            self.visibility_timeout if lease is None else lease
+        )
+
+        if agent is not None:
+            lane_dir = self.tasks_dir / lane_name(agent)
+            lane_dirs = [lane_dir] if lane_dir.is_dir() else []
+        else:
+            lane_dirs = self._lane_dirs()
+        logs = [
+            LaneLog(lane_dir, rank)
+            for lane_dir in lane_dirs
+            for rank in PRIORITY_RANKS.values()
+        ]
+        # (優先度ランク, タスクID, ログの番号 or -1, tasks/直下のファイルパス)
+        heap: list[tuple[int, str, int, str]] = []
+        for i, log in enumerate(logs):
+            head = log.peek()
+            if head is not None:
+                heap.append((*parse_task_filename(head), i, ""))
+        if agent is None:
+            heap.extend(
+                (*parse_task_filename(task_file.name), -1, str(task_file))
+                for task_file in self.tasks_dir.glob("*.yaml")
+            )
+        heapq.heapify(heap)
+        if self.metrics:
+            self.metrics.observe("depth", sum(log.backlog() for log in logs))
+
+        try:
+            while heap and len(claimed) < n:
+                _, task_id, i, top_level_file = heapq.heappop(heap)
+                if i < 0:
+                    task = self._claim_file(Path(top_level_file), task_id, lease_expires)
+                else:
+                    log = logs[i]
+                    task = self._claim_file(log.lane_dir / log.pop(), task_id, lease_expires)
+                    head = log.peek()
+                    if head is not None:
+                        heapq.heappush(heap, (*parse_task_filename(head), i, ""))
+                if task is not None:
+                    claimed.append(task)
+        finally:
+            for log in logs:
+                log.commit()
+
+        if len(claimed) < n and time.monotonic() >= self._next_unlogged_scan.get(agent, 0.0):
+            self._next_unlogged_scan[agent] = time.monotonic() + self.UNLOGGED_SCAN_INTERVAL
+            claimed.extend(
+                self._claim_by_scan(n - len(claimed), lane_dirs, lease_expires)
+            )
+        return claimed
+
+    def _claim_by_scan(
+        self, n: int, lane_dirs: list[Path], lease_expires: float
+    ) -> list[dict[str, Any]]:
+        """
+        レーンを一覧して最大n件のタスクを取得する（投入ログに載っていないタスク用）
+
+        ファイル名から得た (優先度ランク, タスクID) のヒープから順に取り出す。
+        シャードされたレーンは1シャードずつ、呼び出しごとに開始位置をずらして
+        ラウンドロビンで一覧し、n件取れた時点で残りのシャードは一覧しない。
+        """
+        claimed: list[dict[str, Any]] = []
+        groups: list[list[Path]] = [list(lane_dir.glob("*.yaml")) for lane_dir in lane_dirs]
+        shard_dirs = [shard for lane_dir in lane_dirs for shard in self._shard_dirs(lane_dir)]
+        if shard_dirs:
+            start = self._scan_offset % len(shard_dirs)
+            self._scan_offset += 1
+            groups.extend(
+                list(shard.glob("*.yaml")) for shard in shard_dirs[start:] + shard_dirs[:start]
+            )
+
+        for group in groups:
+            heap = [(*parse_task_filename(f.name), str(f)) for f in group]
+            heapq.heapify(heap)
+            while heap and len(claimed) < n:
+                _, task_id, task_file = heapq.heappop(heap)
+                task = self._claim_file(Path(task_file), task_id, lease_expires)
+                if task is not None:
+                    claimed.append(task)
+            if len(claimed) >= n:
+                break
+        return claimed
+
+    def _claim_file(
+        self, task_file: Path, task_id: str, lease_expires: float
+    ) -> dict[str, Any] | None:
+        """
+        タスクファイルをprocessing/へ移して取得する
+
+        Returns:
+            タスクデータ（lease_expires_at付き）、別プロセスが先に取得した場合None
+        """
+        # renameはmtimeを保持するため、移動前にリース期限をmtimeに設定する
+        # （移動直後にreaperが古いmtimeを見て回収する競合を防ぐ）
+        try:
+            os.utime(task_file, (lease_expires, lease_expires))
+        except OSError:
+            return None  # 別プロセスが先に取得した
+        result = atomic_claim(
+            str(task_file), str(self.processing_dir), dest_name=f"{task_id}.yaml"
+        )
+        if not result:
+            return None
+        lane_dir = self._lane_of(task_file)
+        if lane_dir is not None:
+            self.depth.add({lane_dir.name: -1})
+        task = codec.load_file(result)
+        task["lease_expires_at"] = datetime.fromtimestamp(lease_expires).isoformat()
+        if self.metrics:
+            self._record_claim(task)
+        return task
+
+    def heartbeat(self, task_id: str, lease: float | None = None) -> bool:
+        """
+        処理中タスクのリースを延長する
+
+        Args:
+            task_id: タスクID
+            lease: 現在時刻からの新しいリース期間（秒）。Noneの場合はvisibility_timeout
+
+        Returns:
+            延長できた場合True、タスクが処理中でない（完了・回収済み）場合False
+        """
+        lease_expires = time.time() + (
+            self.visibility_timeout if lease is None else lease
+        )
+        try:
+            os.utime(
+                self.processing_dir / f"{task_id}.yaml", (lease_expires, lease_expires)
+            )
+        except FileNotFoundError:
+            return False
+        return True
+
+    def reap_expired(self) -> list[str]:
+        """
+        リース期限切れの処理中タスクをtasks/に戻す
+
+        ワーカーがclaim後に停止したタスクを回収する。戻したタスクは
+        attemptsを1増やし、ロガーがあれば task_lease_expired イベントを記録する。
+        retry_policyがある場合はerror報告と同じ扱いで、バックオフ後の再試行として
+        delayed/ に戻し、max_attemptsに達したら dead/ に移す。
+        回収後に元のワーカーがcompleteした場合も報告は保存される（at-least-once）。
+
+        Returns:
+            キューに戻したタスクIDのリスト（dead/に移したものは含まない）
+        """
+        now = time.time()
+        reaped: list[str] = []
+
+        # 回収が途中で中断されたファイルを処理中に戻す
+        # （renameでctimeが更新されるため、ctimeが古いものだけを対象にする）
+        for orphan in self.processing_dir.glob("*.reaping"):
+            try:
+                if now - orphan.stat().st_ctime > self.REAP_ORPHAN_GRACE:
+                    os.rename(orphan, orphan.with_suffix(".yaml"))
+            except FileNotFoundError:
+                pass
+
+        for processing_file in self.processing_dir.glob("*.yaml"):
+            try:
+                if processing_file.stat().st_mtime > now:
+                    continue
+            except FileNotFoundError:
+                continue  # 完了済み
+
+            # 回収中のファイルをcomplete()から見えない名前に移して確保する
+            reaping_file = processing_file.with_suffix(".reaping")
+            try:
+                os.rename(processing_file, reaping_file)
+            except FileNotFoundError:
+                continue
+            try:
+                # stat〜rename間にheartbeatされていたら戻す
+                if reaping_file.stat().st_mtime > now:
+                    os.rename(reaping_file, processing_file)
+                    continue
+                task = codec.load_file(reaping_file) or {}
+            except FileNotFoundError:
+                continue
+            task_id = task.get("task_id") or processing_file.stem
+            if self.retry_policy is not None:
+                # error報告と同じく、max_attemptsに達したらdead/に移す
+                task["task_id"] = task_id
+                try:
+                    requeued = self._retry_or_dead_letter(
+                        task, reaping_file, "", "lease expired"
+                    )
+                except OSError:
+                    os.rename(reaping_file, processing_file)
+                    continue
+                if requeued:
+                    reaped.append(task_id)
+                self._log_lease_expired(task_id, task.get("agent"), task.get("attempts", 0) + 1)
+                continue
+
+            task["attempts"] = task.get("attempts", 0) + 1
+            task["status"] = "pending"
+            task.pop("lease_expires_at", None)
+            priority = task.get("priority", DEFAULT_PRIORITY)
+            if priority not in PRIORITY_RANKS:
+                priority = DEFAULT_PRIORITY
+
+            agent = task.get("agent")
+            filename = task_filename(task_id, priority)
+            if agent:
+                task_file = self._lane_task_path(self._lane_dir(agent), filename)
+            else:
+                task_file = self.tasks_dir / filename
+            content = codec.dumps(task, self.wire_format)
+            if not atomic_write(str(task_file), content, durability=self.durability):
+                # 書き戻せなければ処理中に戻し、次回の回収に任せる
+                os.rename(reaping_file, processing_file)
+                continue
+            self._publish([task_file])
+            if agent:
+                self.depth.add({lane_name(agent): 1})
+            reaping_file.unlink()
+            reaped.append(task_id)
+            self._log_lease_expired(task_id, agent, task["attempts"])
+
+        return reaped
+
+    def _log_lease_expired(self, task_id: str, agent: str | None, attempts: int) -> None:
+        """ロガーがあれば task_lease_expired イベントを記録する"""
+        if self.logger:
+            self.logger.log_event(
+                NDJSONLogger.TASK_LEASE_EXPIRED,
+                {
+                    "task_id": task_id,
+                    "agent": agent,
+                    "attempts": attempts,
+                    "queue": str(self.base_dir),
+                },
+            )
 
     def complete(
         self,
@@ -108,21 +1061,34 @@ class TaskQueue:
         """
         タスク完了を報告する
 
+        retry_policyがある場合、errorはレポートにせず、max_attemptsに達するまでは
+        バックオフ後に再実行するよう delayed/ に戻し、達したら dead/ に移す。
+
         Args:
             task_id: タスクID
             result: 結果 ("success" or "error")
             output: 出力内容
             error: エラーメッセージ（エラー時のみ）
+
+        Raises:
+            OSError: 再試行・dead-letterのファイルを書き込めなかった場合
         """
         processing_file = self.processing_dir / f"{task_id}.yaml"
 
+        claimed_at = self._claimed_at.pop(task_id, None)
+        if self.metrics and claimed_at is not None:
+            self.metrics.observe("service_seconds", time.monotonic() - claimed_at)
+
         # 元のタスク情報を読み込み
-        if processing_file.exists():
-            with open(processing_file) as f:
-                task = yaml.safe_load(f)
-        else:
+        try:
+            task = self._load_file(processing_file)
+        except FileNotFoundError:
             task = {"task_id": task_id}
 
+        if result == "error" and self.retry_policy is not None:
+            self._retry_or_dead_letter(task, processing_file, output, error)
+            return
+
         # レポート作成
         report = {
             **task,
@@ -135,13 +1101,132 @@ class TaskQueue:
 
         # reportsに保存
         report_file = self.reports_dir / f"{task_id}.yaml"
-        content = yaml.dump(report, allow_unicode=True, default_flow_style=False)
-        atomic_write_with_lock(str(report_file), content)
+        content = codec.dumps(report, self.wire_format)
+        atomic_write_with_lock(str(report_file), content, durability=self.durability)
+        self._append_completed(task_id)
+        self._record_group_completion(task, result)
+        self._release_dedup(task)
 
         # processingから削除
         if processing_file.exists():
             processing_file.unlink()
 
+        # 次回の起動がここまでのパース結果から始められるよう、定期的に書き出す
+        if self.checkpoint_interval is not None and time.monotonic() >= self._next_checkpoint:
+            self.snapshot(self.checkpoint_path, full=False)
+            self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+
+    def get_report(self, task_id: str) -> dict[str, Any] | None:
+        """
+        完了報告を取得する
+
+        Args:
+            task_id: タスクID
+
+        Returns:
+            レポートデータ、未完了の場合None
+        """
+        report_file = self.reports_dir / f"{task_id}.yaml"
+        if report_file.exists():
+            return self._load_file(report_file)
+        report = self.archive.get(task_id)
+        if report is None:
+            dead_file = self.dead_dir / f"{task_id}.yaml"
+            if dead_file.exists():
+                return codec.load_file(dead_file)
+        return report
+
+    def list_dead(self) -> list[str]:
+        """
+        dead-letterに移されたタスクIDリストを取得する
+
+        Returns:
+            タスクIDのリスト
+        """
+        if not self.dead_dir.is_dir():
+            return []
+        return sorted(f.stem for f in self.dead_dir.glob("*.yaml"))
+
+    def requeue_dead(self, task_id: str) -> bool:
+        """
+        dead-letterのタスクを試行回数をリセットしてキューに戻す
+
+        Args:
+            task_id: タスクID
+
+        Returns:
+            戻した場合True、dead-letterにない場合False
+        """
+        dead_file = self.dead_dir / f"{task_id}.yaml"
+        try:
+            entry = codec.load_file(dead_file) or {}
+        except FileNotFoundError:
+            return False
+
+        task = {
+            key: value
+            for key, value in entry.items()
+            if key not in self._DEAD_LETTER_KEYS
+        }
+        task["task_id"] = task_id
+        task["status"] = "pending"
+        task["attempts"] = 0
+        if task.get("dedup_key"):
+            # 手動で戻すタスクは同じキーの未完了タスクがあっても戻す
+            self._reserve_dedup(task, task["dedup_key"])
+
+        task_file = self._task_path(task)
+        content = codec.dumps(task, self.wire_format)
+        if not atomic_write_with_lock(
+            str(task_file), content, durability=self.durability
+        ):
+            return False
+        self._publish([task_file])
+        self._count_pending([task])
+        dead_file.unlink(missing_ok=True)
+        return True
+
+    def archive_reports(self, older_than: float = 0.0) -> list[str]:
+        """
+        完了レポートをアーカイブ（NDJSONセグメント）に移す
+
+        アーカイブ済みレポートもget_report()で取得できるが、
+        reports/を走査する読み手（ディレクトリ一覧など）からは見えなくなる。
+
+        Args:
+            older_than: 完了からこの秒数以上経ったレポートのみ移す
+
+        Returns:
+            アーカイブしたタスクIDのリスト
+        """
+        cutoff = time.time() - older_than
+        archived: list[str] = []
+        batch: dict[str, dict[str, Any]] = {}
+        batch_files: list[Path] = []
+
+        def flush() -> None:
+            archived.extend(self.archive.append(batch))
+            # アーカイブに書き終えてから削除する（途中で落ちても失われない）
+            for report_file in batch_files:
+                report_file.unlink(missing_ok=True)
+            batch.clear()
+            batch_files.clear()
+
+        for report_file in self.reports_dir.glob("*.yaml"):
+            try:
+                if report_file.stat().st_mtime > cutoff:
+                    continue
+                report = codec.load_file(report_file)
+            except FileNotFoundError:
+                continue
+            batch[(report or {}).get("task_id") or report_file.stem] = report or {}
+            batch_files.append(report_file)
+            if len(batch) >= self.ARCHIVE_BATCH_SIZE:
+                flush()
+        flush()
+
+        return archived
+
     def list_pending(self) -> list[str]:
         """
         保留中のタスクIDリストを取得する
@@ -149,8 +1234,192 @@ class TaskQueue:
         Returns:
             タスクIDのリスト
         """
-        task_files = self.tasks_dir.glob("*.yaml")
-        return [f.stem for f in task_files]
+        if not self.read_only:
+            self._promote_due_tasks()
+        return [parse_task_filename(f.name)[1] for f in self._pending_files()]
+
+    def counts(self) -> dict[str, int]:
+        """
+        状態ごとのタスク数を取得する
+
+        Returns:
+            {"pending", "processing", "delayed", "dead"} → 件数
+        """
+        return {
+            "pending": len(self.list_pending()),
+            "processing": len(list(self.processing_dir.glob("*.yaml"))),
+            "delayed": len(list(self.delayed_dir.glob("*/*/*.yaml"))),
+            "dead": len(list(self.dead_dir.glob("*.yaml"))),
+        }
+
+    def depths(self) -> dict[str, int]:
+        """
+        レーン別の保留タスク数をカウンターファイルから取得する（ディレクトリは一覧しない）
+
+        Returns:
+            {レーン名: 保留タスク数（遅延タスクを含む）}
+        """
+        return self.depth.read()
+
+    def recount_depth(self) -> dict[str, int]:
+        """
+        レーンと delayed/ を一覧して深さのカウンターを数え直す
+
+        手動でタスクファイルを置いた・消した場合や、カウンター導入前のキュー用。
+
+        Returns:
+            数え直したレーン別の保留タスク数
+        """
+        depths: Counter[str] = Counter()
+        for lane_dir in self._lane_dirs():
+            depths[lane_dir.name] += len(self._lane_files(lane_dir))
+        for delayed_file in self.delayed_dir.glob("*/*/*.yaml"):
+            depths[delayed_file.parent.name] += 1
+        self.depth.reset(depths)
+        return dict(+depths)
+
+    def snapshot(self, path: Path | None = None, full: bool = True) -> int:
+        """
+        キューの状態を1つのファイルに書き出す
+
+        Args:
+            path: 書き込み先（デフォルト: queue/checkpoint.ndjson）
+            full: Trueなら処理中・遅延・完了報告・dead-letter・グループ・重複排除キーも含める
+                  （restore()用）。Falseなら保留タスク・ディレクトリの一覧と完了済みIDのみ
+                  （ウォームスタート用）
+
+        Returns:
+            書き込んだレコード数
+        """
+        path = path or self.checkpoint_path
+        watermark = time.time()
+        self._load_pending_tasks()
+        completed_ids = self._load_completed_ids()
+        inode, offset = self._completed_reader.position
+        try:
+            sequence = self.sequence.path.read_text().strip()
+        except FileNotFoundError:
+            sequence = ""
+
+        def records() -> Iterator[dict[str, Any]]:
+            yield {"state": "completed", "task_ids": sorted(completed_ids)}
+            for task_file, (ino, task) in self._task_cache.items():
+                yield self._snapshot_record("pending", task_file, task, ino=ino)
+            if not full:
+                for directory, (_, _, subdirs) in self._listings.items():
+                    yield {
+                        "state": "dir",
+                        "path": self._relative(directory),
+                        "subdirs": [d.name for d in subdirs],
+                    }
+                return
+            for state, pattern_dir, pattern in (
+                ("delayed", self.delayed_dir, "*/*/*.yaml"),
+                ("processing", self.processing_dir, "*.yaml"),
+                ("report", self.reports_dir, "*.yaml"),
+                ("dead", self.dead_dir, "*.yaml"),
+            ):
+                for task_file in pattern_dir.glob(pattern):
+                    try:
+                        mtime = task_file.stat().st_mtime
+                        task = codec.load_file(task_file) or {}
+                    except FileNotFoundError:
+                        continue  # 一覧後にclaim・完了された
+                    yield self._snapshot_record(state, task_file, task, mtime=mtime)
+            for raw_file in [*self.groups_dir.glob("*/*"), *self.dedup_dir.glob("[!.]*")]:
+                try:
+                    data = raw_file.read_text()
+                except FileNotFoundError:
+                    continue
+                yield {"state": "raw", "path": self._relative(raw_file), "data": data}
+
+        header = {
+            "watermark": watermark,
+            "full": full,
+            "completed_index": [inode, offset],
+            "sequence": sequence,
+        }
+        return write_snapshot(path, header, records())
+
+    def restore(self, path: Path) -> dict[str, int]:
+        """
+        snapshot()で書き出したファイルからキューを復元する
+
+        既に存在するファイルと、どこかの状態（保留・処理中・完了・dead-letter）に
+        既にあるタスクは上書きしない（スナップショットより新しい状態を優先する）。
+        処理中のタスクはリース期限（mtime）ごと戻すため、期限切れならreap_expired()で回収される。
+
+        Args:
+            path: スナップショットファイル
+
+        Returns:
+            状態ごとの復元した件数
+
+        Raises:
+            FileNotFoundError: ファイルが存在しない場合
+            ValueError: スナップショットではない場合
+        """
+        header, records = read_snapshot(path)
+        completed_ids = self._load_completed_ids()
+        known_ids = {
+            *completed_ids,
+            *(parse_task_filename(f.name)[1] for f in self._pending_files()),
+            *(
+                parse_task_filename(f.name.partition("_")[2])[1]
+                for f in self.delayed_dir.glob("*/*/*.yaml")
+            ),
+            *(f.stem for f in self.processing_dir.glob("*.yaml")),
+            *(f.stem for f in self.dead_dir.glob("*.yaml")),
+        }
+        restored: Counter[str] = Counter()
+        lane_files: list[Path] = []
+
+        for record in records:
+            state = record.get("state")
+            if state == "dir":
+                continue  # チェックポイント用のディレクトリ一覧
+            if state == "completed":
+                missing = [t for t in record.get("task_ids", []) if t not in completed_ids]
+                if missing:
+                    with open(self.completed_index, "a") as f:
+                        f.write("".join(f"{task_id}\n" for task_id in missing))
+                    restored[state] += len(missing)
+                continue
+
+            target = (self.base_dir / str(record.get("path", ""))).resolve()
+            if self.base_dir.resolve() not in target.parents or target.exists():
+                continue
+            if state == "raw":
+                target.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write(
+                    str(target), record.get("data", ""), durability=self.durability
+                )
+                restored[state] += 1
+                continue
+            task = record.get("task") or {}
+            task_id = task.get("task_id")
+            if state != "report" and task_id in known_ids:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            content = codec.dumps(task, self.wire_format)
+            if not atomic_write(str(target), content, durability=self.durability):
+                continue
+            if "mtime" in record:
+                os.utime(target, (record["mtime"], record["mtime"]))
+            if state == "pending":
+                lane_files.append(target)
+            restored[state] += 1
+
+        # IDが既存のタスクと重ならないよう、シーケンスが無ければ戻す
+        if header.get("sequence") and not self.sequence.path.exists():
+            atomic_write(
+                str(self.sequence.path), header["sequence"] + "\n", durability=self.durability
+            )
+        self._publish(lane_files)
+        self.recount_depth()
+        self._task_cache = {}
+        self._listings = {}
+        return dict(restored)
 
     def cleanup(self) -> None:
         """
@@ -159,6 +1428,40 @@ class TaskQueue:
         for dir_path in [self.tasks_dir, self.processing_dir, self.reports_dir]:
             for f in dir_path.glob("*.yaml"):
                 f.unlink()
+        for lane_dir in self._lane_dirs():
+            for f in self._lane_files(lane_dir):
+                f.unlink()
+        # 投入ログとカーソル（シーケンスは残し、IDは増え続ける）
+        for lane_dir in self._lane_dirs():
+            for f in [*lane_dir.glob(".p*.log"), *lane_dir.glob(".p*.cursor")]:
+                f.unlink(missing_ok=True)
+        for f in self.delayed_dir.glob("*/*/*.yaml"):
+            f.unlink()
+        for f in self.dead_dir.glob("*.yaml"):
+            f.unlink()
+        for f in self.groups_dir.glob("*/*"):
+            f.unlink()
+        for group_dir in self.groups_dir.glob("*"):
+            group_dir.rmdir()
+        for f in self.dedup_dir.glob("*"):
+            f.unlink()
+
+        self.archive.clear()
+
+        # インデックスは作り直して別inodeにする（他プロセスのキャッシュを無効化）
+        self.completed_index.unlink(missing_ok=True)
+        self.completed_index.touch()
+        self._completed_ids = set()
+        self._task_cache = {}
+        self._listings = {}
+        self.depth.reset({})
+        self.checkpoint_path.unlink(missing_ok=True)
+
+        # 以前のセッションのメトリクスと混ざらないよう捨てる
+        for f in (self.base_dir / "metrics").glob("*.json"):
+            f.unlink()
+        if self.metrics:
+            self.metrics.reset()
 
     def enqueue_with_dependency(
         self,
@@ -166,6 +1469,8 @@ class TaskQueue:
         agent: str,
         params: dict[str, Any] | None = None,
         blocked_by: list[str] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+        not_before: datetime | float | None = None,
     ) -> str:
         """
         依存関係付きでタスクをキューに追加する
@@ -175,27 +1480,28 @@ class TaskQueue:
             agent: 担当エージェント
             params: 追加パラメータ
             blocked_by: このタスクがブロックされている他のタスクIDのリスト
+            priority: 優先度（"high" / "medium" / "low" または TaskPriority）
+            not_before: この時刻まではclaimされない（datetimeまたはUNIX時刻）
 
         Returns:
             タスクID
-        """
-        task_id = self._generate_task_id()
-
-        task = {
-            "task_id": task_id,
-            "command": command,
-            "agent": agent,
-            "params": params or {},
-            "blocked_by": blocked_by or [],
-            "status": "pending",
-            "created_at": datetime.now().isoformat(),
-        }
 
-        task_file = self.tasks_dir / f"{task_id}.yaml"
-        content = yaml.dump(task, allow_unicode=True, default_flow_style=False)
-        atomic_write_with_lock(str(task_file), content)
+        Raises:
+            QueueFullError: backpressureの上限に達していて受け入れられない場合
+            OSError: タスクファイルを書き込めなかった場合（ロック取得のタイムアウトなど）
+        """
+        task = self._build_task(
+            command,
+            agent,
+            params,
+            priority=priority,
+            blocked_by=blocked_by or [],
+            not_before=not_before,
+        )
+        self._admit([task])
+        self._write_admitted(task)
 
-        return task_id
+        return task["task_id"]
 
     def get_ready_tasks(self, completed_task_ids: list[str] | None = None) -> list[dict]:
         """
@@ -203,40 +1509,815 @@ class TaskQueue:
 
         Args:
             completed_task_ids: 完了済みタスクIDのリスト。
-                               Noneの場合はreports/から取得
+                               Noneの場合は完了済みIDインデックス（completed.idx）の
+                               キャッシュに前回以降の追記分を読み足して使う
 
         Returns:
             実行可能なタスクのリスト
         """
-        # 全タスクを読み込み
-        all_tasks = []
-        for task_file in self.tasks_dir.glob("*.yaml"):
-            with open(task_file) as f:
-                task = yaml.safe_load(f)
-                if task:
-                    all_tasks.append(task)
+        # 保留タスクを読み込み（前回から変わったディレクトリ・ファイルのみ読む）
+        self._promote_due_tasks()
+        all_tasks = self._load_pending_tasks()
 
-        # 完了済みタスクIDを取得
+        # 完了済みタスクIDを取得（インデックスの追記分のみ読む）
         if completed_task_ids is None:
-            completed_task_ids = []
-            for report_file in self.reports_dir.glob("*.yaml"):
-                with open(report_file) as f:
-                    report = yaml.safe_load(f)
-                    if report and report.get("task_id"):
-                        completed_task_ids.append(report["task_id"])
+            completed_task_ids = self._load_completed_ids()
 
         # DependencyResolverで実行可能タスクをフィルタ
         if not all_tasks:
             return []
 
         resolver = DependencyResolver(all_tasks)
-        for completed_id in completed_task_ids:
-            resolver.mark_completed(completed_id)
+        resolver.mark_completed_many(completed_task_ids)
+
+        # キャッシュ中のタスクを呼び出し側に書き換えられないようコピーして返す
+        return [dict(task) for task in resolver.get_ready_tasks()]
+
+    def _load_file(self, path: Path) -> Any:
+        """
+        キューのファイルを読み込む
+
+        durability="rename" / "fsync" ではrenameで置き換えるため書きかけは見えず、
+        ロックは取らない。"none"（その場で上書き）の場合のみ shared_lock() を取り、
+        ロックを取れない（競合・読み取り専用ディレクトリ）場合はロックなしで読む。
+
+        Raises:
+            FileNotFoundError: ファイルが存在しない場合
+        """
+        if self.durability != "none":
+            return codec.load_file(path)
+        try:
+            with shared_lock(str(path)):
+                return codec.load_file(path)
+        except FileNotFoundError:
+            raise
+        except (TimeoutError, OSError):
+            return codec.load_file(path)
+
+    def _load_pending_tasks(self) -> list[dict[str, Any]]:
+        """
+        保留タスクを読み込む
+
+        タスクファイルは書き込み後に変更されない（reaperは別inodeで書き直す）ため、
+        inodeが前回と同じファイルはキャッシュを再利用する。
+        前回の一覧以降に変更されていない（mtimeが古い）ディレクトリは一覧もstatもしない。
+        """
+        self._load_checkpoint()
+        cache: dict[Path, tuple[int, dict[str, Any]]] = {}
+        listings: dict[Path, tuple[float, list[Path], list[Path]]] = {}
+        cached_by_dir: dict[Path, list[Path]] = {}
+        for task_file in self._task_cache:
+            cached_by_dir.setdefault(task_file.parent, []).append(task_file)
+
+        # tasks/直下（深さ0） → レーン（1） → シャード（2）の順にたどる
+        directories = [(self.tasks_dir, 0)]
+        while directories:
+            directory, depth = directories.pop()
+            listing = self._list_pending_dir(directory)
+            if listing is None:
+                continue
+            listings[directory] = listing
+            _, task_files, subdirs = listing
+            if depth < 2:
+                directories.extend((subdir, depth + 1) for subdir in subdirs)
+
+            if self._listings.get(directory) is listing:
+                # 変更されていないディレクトリはキャッシュをそのまま使う
+                for task_file in cached_by_dir.get(directory, []):
+                    cache[task_file] = self._task_cache[task_file]
+                continue
+            for task_file in task_files:
+                try:
+                    inode = task_file.stat().st_ino
+                    cached = self._task_cache.get(task_file)
+                    if cached is not None and cached[0] == inode:
+                        task = cached[1]
+                    else:
+                        task = self._load_file(task_file)
+                except FileNotFoundError:
+                    # 読み込み中に他のワーカーがclaimした
+                    continue
+                if task:
+                    cache[task_file] = (inode, task)
+
+        self._task_cache = cache
+        self._listings = listings
+        return [task for _, task in cache.values()]
+
+    def _list_pending_dir(
+        self, directory: Path
+    ) -> tuple[float, list[Path], list[Path]] | None:
+        """
+        保留タスクのディレクトリの一覧を返す（前回の一覧以降に変更がなければ前回のもの）
+
+        Returns:
+            (一覧を取った時刻, *.yamlファイル, サブディレクトリ)。
+            ディレクトリが存在しない場合None
+        """
+        try:
+            mtime = directory.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        previous = self._listings.get(directory)
+        if previous is not None and mtime < previous[0] - self.LISTING_MTIME_MARGIN:
+            return previous
+
+        listed_at = time.time()
+        task_files: list[Path] = []
+        subdirs: list[Path] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".yaml"):
+                        task_files.append(Path(entry.path))
+                    elif entry.is_dir():
+                        subdirs.append(Path(entry.path))
+        except FileNotFoundError:
+            return None
+        return listed_at, task_files, subdirs
+
+    def _load_completed_ids(self) -> set[str]:
+        """
+        完了済みIDインデックスを前回の続きから読み込む
+
+        インデックスが作り直された（cleanup）場合は先頭から読み直す。
+        """
+        if not self.completed_index.exists():
+            if self.read_only:
+                return set(self._completed_ids_from_reports())
+            self._bootstrap_completed_index()
+        self._load_checkpoint()
+
+        reset, task_ids = self._completed_reader.read_new()
+        if reset:
+            self._completed_ids = set()
+        self._completed_ids.update(task_ids)
+        return self._completed_ids
+
+    def _load_checkpoint(self) -> None:
+        """
+        チェックポイントからパース済みの保留タスクと完了済みIDを読み込む（初回のみ）
+
+        保留タスクはinodeが同じファイルだけが再利用され、完了済みIDは
+        チェックポイント時点のオフセットから続きを読むため、再起動後は
+        チェックポイント以降の変更分だけをパースすればよい。
+        ディレクトリの一覧はwatermark（チェックポイントを取り始めた時刻）に
+        取ったものとして扱い、それ以降に変更されたディレクトリだけを一覧し直す。
+        """
+        if self._checkpoint_loaded:
+            return
+        self._checkpoint_loaded = True
+        if self._task_cache or self._completed_ids:
+            return
+        try:
+            header, records = read_snapshot(self.checkpoint_path)
+        except (FileNotFoundError, ValueError):
+            return
+
+        watermark = header.get("watermark")
+        files_by_dir: dict[Path, list[Path]] = {}
+        dirs: list[dict[str, Any]] = []
+        for record in records:
+            if record.get("state") == "completed":
+                inode, offset = header.get("completed_index") or (None, 0)
+                if inode is not None:
+                    self._completed_ids = set(record.get("task_ids", []))
+                    self._completed_reader.seek(inode, offset)
+            elif record.get("state") == "pending" and record.get("task"):
+                task_file = self.base_dir / record["path"]
+                self._task_cache[task_file] = (record.get("ino", -1), record["task"])
+                files_by_dir.setdefault(task_file.parent, []).append(task_file)
+            elif record.get("state") == "dir":
+                dirs.append(record)
+
+        if watermark is None:
+            return
+        for record in dirs:
+            directory = self.base_dir / record["path"]
+            self._listings[directory] = (
+                watermark,
+                files_by_dir.get(directory, []),
+                [directory / name for name in record.get("subdirs", [])],
+            )
+
+    def _snapshot_record(
+        self,
+        state: str,
+        task_file: Path,
+        task: dict[str, Any],
+        ino: int | None = None,
+        mtime: float | None = None,
+    ) -> dict[str, Any]:
+        """スナップショットの1ファイル分のレコード"""
+        record: dict[str, Any] = {
+            "state": state,
+            "path": self._relative(task_file),
+            "task": task,
+        }
+        if ino is not None:
+            record["ino"] = ino
+        if mtime is not None:
+            record["mtime"] = mtime
+        return record
+
+    def _relative(self, path: Path) -> str:
+        """キューのベースディレクトリからの相対パス"""
+        return path.relative_to(self.base_dir).as_posix()
+
+    def _record_group_completion(self, task: dict[str, Any], result: str) -> None:
+        """
+        グループのタスクの最終結果をグループの完了ログに追記する
+
+        O_APPENDの1回のwriteのため、複数ワーカーが同時に完了しても行は混ざらない。
+        """
+        group_id = task.get("group_id")
+        if not group_id:
+            return
+        try:
+            with open(self.groups_dir / group_id / TaskGroup.DONE_NAME, "a") as f:
+                f.write(f"{task['task_id']}\t{result}\n")
+        except FileNotFoundError:
+            pass  # cleanup済みのグループ
+
+    def _append_completed(self, task_id: str) -> None:
+        """
+        完了済みIDをインデックスに追記する
 
-        return resolver.get_ready_tasks()
+        O_APPENDの1回のwriteで書くため、複数プロセスから追記しても行は混ざらない。
+        """
+        with open(self.completed_index, "a") as f:
+            f.write(f"{task_id}\n")
+
+    def _bootstrap_completed_index(self) -> None:
+        """インデックス導入前のキュー向けに、既存レポートからインデックスを作る"""
+        task_ids = self._completed_ids_from_reports()
+        with open(self.completed_index, "a") as f:
+            f.write("".join(f"{task_id}\n" for task_id in task_ids))
+
+    def _completed_ids_from_reports(self) -> list[str]:
+        """アーカイブと reports/ から完了済みIDを集める"""
+        task_ids = self.archive.task_ids()
+        for report_file in self.reports_dir.glob("*.yaml"):
+            report = codec.load_file(report_file)
+            if report and report.get("task_id"):
+                task_ids.append(report["task_id"])
+        return task_ids
+
+    def _build_task(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None,
+        priority: Any = DEFAULT_PRIORITY,
+        blocked_by: list[str] | None = None,
+        created_at: str | None = None,
+        not_before: datetime | float | None = None,
+        task_id: str | None = None,
+    ) -> dict[str, Any]:
+        """タスクファイルに書き込むタスク辞書を組み立てる"""
+        return build_task(
+            command,
+            agent,
+            params,
+            priority=priority,
+            blocked_by=blocked_by,
+            created_at=created_at,
+            task_id=task_id or self._generate_task_id(),
+            not_before=not_before,
+        )
+
+    def _reserve_dedup(self, task: dict[str, Any], dedup_key: str | None) -> str | None:
+        """
+        重複排除キーをタスクに予約する
+
+        キーファイルはtmpに書いてからlinkで作るため、同時に予約しても
+        1つだけが成功し、他は中身（タスクID）まで書かれたファイルを読む。
+        キーが指すタスクが完了済み・dead-letter済み（解放前に落ちた等）なら取り直す。
+
+        Args:
+            task: 投入するタスク（予約できたら dedup_key を記録する）
+            dedup_key: 重複排除キー（Noneならdedup=Trueの場合のみ内容のハッシュ）
+
+        Returns:
+            同じキーの未完了タスクのID、予約できた場合None
+        """
+        if dedup_key is None:
+            if not self.dedup:
+                return None
+            dedup_key = make_dedup_key(task["command"], task["agent"], task["params"])
+        key_file = self._dedup_file(dedup_key)
+        self.dedup_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = key_file.with_name(f".{key_file.name}.{task['task_id']}.tmp")
+        tmp_file.write_text(task["task_id"])
+        try:
+            while True:
+                try:
+                    os.link(tmp_file, key_file)
+                except FileExistsError:
+                    try:
+                        existing = key_file.read_text().strip()
+                    except FileNotFoundError:
+                        continue  # 解放された
+                    if not self._is_finished(existing):
+                        return existing
+                    self._unlink_dedup_file(key_file, existing)
+                    continue
+                task["dedup_key"] = dedup_key
+                return None
+        finally:
+            tmp_file.unlink(missing_ok=True)
+
+    def _release_dedup(self, task: dict[str, Any]) -> None:
+        """最終結果が出たタスクの重複排除キーを解放する"""
+        if task.get("dedup_key"):
+            self._unlink_dedup_file(self._dedup_file(task["dedup_key"]), task["task_id"])
+
+    def _unlink_dedup_file(self, key_file: Path, task_id: str) -> None:
+        """キーファイルがtask_idを指している場合のみ削除する"""
+        try:
+            if key_file.read_text().strip() == task_id:
+                key_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _dedup_file(self, dedup_key: str) -> Path:
+        """重複排除キーのファイル（任意の文字列を使えるようハッシュを名前にする）"""
+        return self.dedup_dir / hashlib.sha256(dedup_key.encode()).hexdigest()
+
+    def _is_finished(self, task_id: str) -> bool:
+        """タスクの最終結果（完了報告・dead-letter）が出ているか"""
+        return (
+            task_id in self._load_completed_ids()
+            or (self.dead_dir / f"{task_id}.yaml").exists()
+        )
+
+    def _admit_reserved(self, tasks: list[dict[str, Any]]) -> None:
+        """受け入れられなかった場合は予約した重複排除キーを解放して _admit() する"""
+        try:
+            self._admit(tasks)
+        except QueueFullError:
+            for task in tasks:
+                self._release_dedup(task)
+            raise
+
+    def _write_admitted(self, task: dict[str, Any]) -> None:
+        """
+        _admit() 済みのタスクを書き込んで投入ログに載せる
+
+        Raises:
+            OSError: 書き込めなかった場合（深さと重複排除キーは元に戻す）
+        """
+        task_file = self._task_path(task)
+        content = codec.dumps(task, self.wire_format)
+        if not atomic_write_with_lock(str(task_file), content, durability=self.durability):
+            self._rollback_admitted([task])
+            raise OSError(f"failed to write task file {task_file}")
+        self._publish([task_file])
+
+    def _rollback_admitted(self, tasks: list[dict[str, Any]]) -> None:
+        """書き込めなかったタスクの分だけ深さを戻し、重複排除キーを解放する"""
+        removals = {lane: -count for lane, count in self._lane_counts(tasks).items()}
+        if removals:
+            self.depth.add(removals)
+        for task in tasks:
+            self._release_dedup(task)
+
+    def _admit(self, tasks: list[dict[str, Any]]) -> None:
+        """
+        投入するタスクの分だけ深さを増やす（backpressureがあれば上限を判定する）
+
+        上限を超える場合、policyに従って空くまで待つ・拒否する・
+        新しいタスクより優先度の低い保留タスクを落とす。
+
+        Raises:
+            QueueFullError: 受け入れられない場合
+        """
+        if not tasks:
+            return
+        additions = self._lane_counts(tasks)
+        policy = self.backpressure
+        if policy is None:
+            self.depth.add(additions)
+            return
+        if policy.overflow({}, additions):
+            raise QueueFullError(
+                f"{len(tasks)} tasks exceed the queue depth limits on their own"
+            )
+        # 落とせるのはバッチのどのタスクよりも優先度が低いタスクだけ
+        rank = max(PRIORITY_RANKS[task["priority"]] for task in tasks)
+        deadline = time.monotonic() + policy.timeout
+        watcher: DirectoryWatcher | None = None
+        try:
+            while True:
+                with self.depth.locked() as depths:
+                    excess = policy.overflow(depths, additions)
+                    if not excess:
+                        apply_deltas(depths, additions)
+                        return
+                if policy.policy == "drop_lowest" and self._drop_lowest(excess, rank):
+                    continue
+                remaining = deadline - time.monotonic()
+                if policy.policy != "block" or remaining <= 0:
+                    raise QueueFullError(
+                        f"queue is full ({', '.join(scope or 'total' for scope in excess)}): "
+                        f"{sum(depths.values())} pending in {self.base_dir}"
+                    )
+                if watcher is None:
+                    # カウンターファイルはその場で書き換えられるため、IN_MODIFYで減少を待つ
+                    watcher = DirectoryWatcher(
+                        [self.base_dir], recursive_new_dirs=False, mask=IN_MODIFY
+                    )
+                    continue  # watch開始前に空いた分を取りこぼさないよう再確認する
+                watcher.wait(remaining)
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    def _drop_lowest(self, excess: dict[str, int], rank: int) -> bool:
+        """
+        あふれた範囲から優先度ランクがrankより低い保留タスクを dead/ に落とす
+
+        優先度が低い順、同じ優先度では新しい順に選ぶ（古いタスクほど残す）。
+        ここだけはレーンを一覧する（上限に達したときのみ）。
+
+        Args:
+            excess: Backpressure.overflow() の結果
+            rank: 投入するタスクの優先度ランク
+
+        Returns:
+            1件以上落とした場合True
+        """
+        dropped = 0
+        for scope, count in excess.items():
+            if scope:
+                lane_dir = self.tasks_dir / scope
+                lane_dirs = [lane_dir] if lane_dir.is_dir() else []
+            else:
+                lane_dirs = self._lane_dirs()
+            candidates = sorted(
+                (
+                    (*parse_task_filename(task_file.name), task_file)
+                    for lane_dir in lane_dirs
+                    for task_file in self._lane_files(lane_dir)
+                ),
+                reverse=True,
+            )
+            for victim_rank, task_id, task_file in candidates:
+                if count <= 0 or victim_rank <= rank:
+                    break
+                if self._drop_task(task_file, task_id):
+                    dropped += 1
+                    count -= 1
+        return dropped > 0
+
+    def _drop_task(self, task_file: Path, task_id: str) -> bool:
+        """
+        保留タスクを dead/ に移す（requeue_dead()で戻せる）
+
+        Returns:
+            移した場合True、別プロセスが先に取得した場合False
+        """
+        self.dead_dir.mkdir(parents=True, exist_ok=True)
+        dead_file = self.dead_dir / f"{task_id}.yaml"
+        try:
+            os.rename(task_file, dead_file)
+        except FileNotFoundError:
+            return False
+        lane_dir = self._lane_of(task_file)
+        if lane_dir is not None:
+            self.depth.add({lane_dir.name: -1})
+
+        task = codec.load_file(dead_file) or {"task_id": task_id}
+        entry = {
+            **task,
+            "status": "dropped",
+            "result": "dropped",
+            "completed_at": datetime.now().isoformat(),
+        }
+        content = codec.dumps(entry, self.wire_format)
+        atomic_write(str(dead_file), content, durability=self.durability)
+        self._record_group_completion(task, "dropped")
+        self._release_dedup(task)
+
+        if self.logger:
+            self.logger.log_event(
+                NDJSONLogger.TASK_DROPPED,
+                {
+                    "task_id": task_id,
+                    "agent": task.get("agent"),
+                    "priority": task.get("priority"),
+                    "queue": str(self.base_dir),
+                },
+            )
+        return True
+
+    def _count_pending(self, tasks: list[dict[str, Any]]) -> None:
+        """上限を判定せずにタスクの分だけ深さを増やす（キューに戻すタスク用）"""
+        self.depth.add(self._lane_counts(tasks))
+
+    @staticmethod
+    def _lane_counts(tasks: list[dict[str, Any]]) -> dict[str, int]:
+        """タスクのレーン別件数（tasks/直下に置かれるagentなしのタスクは数えない）"""
+        return dict(Counter(lane_name(task["agent"]) for task in tasks if task.get("agent")))
+
+    def flush_metrics(self) -> None:
+        """記録済みのメトリクスを queue/metrics/ に書き出す"""
+        if self.metrics:
+            self.metrics.flush()
+
+    def _record_claim(self, task: dict[str, Any]) -> None:
+        """claimしたタスクの待ち時間を記録し、処理時間の計測を始める"""
+        self._claimed_at[task["task_id"]] = time.monotonic()
+
+        # 遅延タスクは期限が来てからの待ち時間を計る
+        ready_at = task.get("not_before") or task.get("created_at")
+        if ready_at:
+            try:
+                waited = time.time() - datetime.fromisoformat(str(ready_at)).timestamp()
+            except ValueError:
+                return
+            self.metrics.observe("wait_seconds", max(0.0, waited))
+
+    def _task_path(self, task: dict[str, Any]) -> Path:
+        """
+        保留タスクの書き込み先を返す
+
+        not_beforeが未来ならdelayed/の分バケット、それ以外はレーンディレクトリ。
+        """
+        filename = task_filename(task["task_id"], task.get("priority", DEFAULT_PRIORITY))
+        agent = task.get("agent")
+
+        not_before = task.get("not_before")
+        if not_before:
+            due = datetime.fromisoformat(str(not_before)).timestamp()
+            if due > time.time():
+                delayed_dir = (
+                    self.delayed_dir
+                    / f"{int(due // DELAY_BUCKET_SECONDS):010d}"
+                    / lane_name(agent or "")
+                )
+                delayed_dir.mkdir(parents=True, exist_ok=True)
+                return delayed_dir / f"{int(due * 1000):013d}_{filename}"
+
+        if not agent:
+            return self.tasks_dir / filename
+        return self._lane_task_path(self._lane_dir(agent), filename)
+
+    def claim_watch_dirs(self, agent: str | None = None) -> list[Path]:
+        """
+        claimを待つ間にwatchすべきディレクトリを返す
+
+        Args:
+            agent: 指定時はこのエージェントのレーンのみ
+        """
+        if agent is not None:
+            lane_dirs = [self._lane_dir(agent)]
+        else:
+            lane_dirs = self._lane_dirs()
+        dirs = [] if agent is not None else [self.tasks_dir]
+        for lane_dir in lane_dirs:
+            dirs.extend([lane_dir, *self._shard_dirs(lane_dir)])
+        return dirs
+
+    def has_delayed(self) -> bool:
+        """
+        遅延タスクがあるか
+
+        遅延タスクは期限が来てもディレクトリに変更が起きないため、
+        claimを待つ側はこれがTrueの間DELAYED_POLL_INTERVAL以下の間隔で再確認する。
+        """
+        return self.delayed_dir.is_dir() and any(self.delayed_dir.iterdir())
+
+    def _promote_due_tasks(self) -> list[str]:
+        """
+        期限が来た遅延タスクをレーンディレクトリに移す
+
+        バケット名（分単位）が現在より先のバケットは中身を一覧せずに飛ばし、
+        未来のタスクファイルはパースもしない。移動はrenameのため、
+        複数プロセスが同時に昇格しても1回だけ移る。
+
+        Returns:
+            移したタスクIDのリスト
+        """
+        if not self.delayed_dir.is_dir():
+            return []
+
+        now = time.time()
+        now_ms = int(now * 1000)
+        current_bucket = int(now // DELAY_BUCKET_SECONDS)
+        promoted: list[str] = []
+        promoted_files: list[Path] = []
+
+        for bucket_dir in sorted(self.delayed_dir.iterdir()):
+            if not bucket_dir.name.isdigit() or int(bucket_dir.name) > current_bucket:
+                continue
+            try:
+                lane_dirs = list(bucket_dir.iterdir())
+            except FileNotFoundError:
+                continue  # 別プロセスが片付けた
+            for lane_dir in lane_dirs:
+                # 期限順に移す（投入ログの順序 = claimの順序になる）
+                for delayed_file in sorted(lane_dir.glob("*.yaml")):
+                    due_ms, _, filename = delayed_file.name.partition("_")
+                    if not due_ms.isdigit() or int(due_ms) > now_ms:
+                        continue
+                    task_file = self._lane_task_path(self._lane_dir(lane_dir.name), filename)
+                    try:
+                        os.rename(delayed_file, task_file)
+                    except FileNotFoundError:
+                        continue  # 別プロセスが先に移した
+                    promoted.append(parse_task_filename(filename)[1])
+                    promoted_files.append(task_file)
+
+            # 過ぎたバケットは空になっていれば片付ける（書き込み中のtmpがあれば残る）
+            if int(bucket_dir.name) < current_bucket:
+                for lane_dir in lane_dirs:
+                    if not any(lane_dir.glob("*.yaml")):
+                        # 読み書きロックのロックファイルはもう使われない
+                        for lock_file in lane_dir.glob(f"{RW_LOCK_PREFIX}*"):
+                            lock_file.unlink(missing_ok=True)
+                    try:
+                        lane_dir.rmdir()
+                    except OSError:
+                        pass
+                try:
+                    bucket_dir.rmdir()
+                except OSError:
+                    pass
+
+        self._publish(promoted_files)
+        return promoted
+
+    # dead-letterエントリのうち、キューに戻すときに落とすキー
+    _DEAD_LETTER_KEYS = ("result", "output", "error", "completed_at", "lease_expires_at")
+
+    def _retry_or_dead_letter(
+        self,
+        task: dict[str, Any],
+        processing_file: Path,
+        output: str,
+        error: str | None,
+    ) -> bool:
+        """
+        error報告されたタスクを再試行用に delayed/ へ戻すか、dead/ に移す
+
+        Args:
+            task: 処理中だったタスク
+            processing_file: processing/ のタスクファイル
+            output: 出力内容
+            error: エラーメッセージ
+
+        Returns:
+            再試行としてキューに戻した場合True、dead/に移した場合False
+
+        Raises:
+            OSError: 書き込めなかった場合（タスクはprocessing/に残り、リース切れで戻る）
+        """
+        assert self.retry_policy is not None
+        task_id = task["task_id"]
+        attempts = task.get("attempts", 0) + 1
+        task.pop("lease_expires_at", None)
+
+        if attempts < self.retry_policy.max_attempts:
+            delay = self.retry_policy.delay_for(attempts)
+            retry = {
+                **task,
+                "status": "pending",
+                "attempts": attempts,
+                "last_error": error or output,
+                "not_before": datetime.fromtimestamp(time.time() + delay).isoformat(),
+            }
+            content = codec.dumps(retry, self.wire_format)
+            retry_file = self._task_path(retry)
+            if not atomic_write_with_lock(
+                str(retry_file), content, durability=self.durability
+            ):
+                raise OSError(f"failed to write retry task file {retry_file}")
+            self._publish([retry_file])
+            # 再試行は上限に関係なく受け入れる（処理中だったタスクが戻るだけ）
+            self._count_pending([retry])
+            event = NDJSONLogger.TASK_RETRY_SCHEDULED
+            event_data = {"attempts": attempts, "delay": delay}
+            requeued = True
+        else:
+            entry = {
+                **task,
+                "status": "dead",
+                "attempts": attempts,
+                "result": "error",
+                "output": output,
+                "completed_at": datetime.now().isoformat(),
+            }
+            if error:
+                entry["error"] = error
+            self.dead_dir.mkdir(parents=True, exist_ok=True)
+            content = codec.dumps(entry, self.wire_format)
+            dead_file = self.dead_dir / f"{task_id}.yaml"
+            if not atomic_write_with_lock(
+                str(dead_file), content, durability=self.durability
+            ):
+                raise OSError(f"failed to write dead-letter file {dead_file}")
+            self._record_group_completion(task, "dead")
+            self._release_dedup(task)
+            event = NDJSONLogger.TASK_DEAD_LETTERED
+            event_data = {"attempts": attempts}
+            requeued = False
+
+        processing_file.unlink(missing_ok=True)
+
+        if self.logger:
+            self.logger.log_event(
+                event,
+                {
+                    "task_id": task_id,
+                    "agent": task.get("agent"),
+                    "error": error,
+                    "queue": str(self.base_dir),
+                    **event_data,
+                },
+            )
+        return requeued
+
+    def _lane_dir(self, agent: str) -> Path:
+        """エージェントのレーンディレクトリを返す（なければ作成）"""
+        lane = lane_name(agent)
+        lane_dir = self.tasks_dir / lane
+        if lane not in self._known_lanes:
+            lane_dir.mkdir(parents=True, exist_ok=True)
+            self._known_lanes.add(lane)
+        return lane_dir
+
+    def _lane_dirs(self) -> list[Path]:
+        """存在する全レーンディレクトリを返す"""
+        return [d for d in self.tasks_dir.iterdir() if d.is_dir()]
+
+    def _lane_task_path(self, lane_dir: Path, filename: str) -> Path:
+        """レーン内のタスクファイルのパス（shards指定時はシャードのサブディレクトリ）"""
+        if not self.shards:
+            return lane_dir / filename
+        shard_dir = lane_dir / shard_name(parse_task_filename(filename)[1], self.shards)
+        if shard_dir not in self._known_shards:
+            shard_dir.mkdir(exist_ok=True)
+            self._known_shards.add(shard_dir)
+        return shard_dir / filename
+
+    def _lane_of(self, task_file: Path) -> Path | None:
+        """タスクファイルが属するレーンディレクトリ（tasks/直下ならNone）"""
+        if task_file.parent.parent == self.tasks_dir:
+            return task_file.parent
+        if task_file.parent.parent.parent == self.tasks_dir:
+            return task_file.parent.parent
+        return None
+
+    @staticmethod
+    def _shard_dirs(lane_dir: Path) -> list[Path]:
+        """レーン内のシャードディレクトリを返す"""
+        try:
+            return sorted(d for d in lane_dir.iterdir() if d.is_dir())
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _lane_files(lane_dir: Path) -> list[Path]:
+        """レーン内の保留タスクファイル（シャードの中も含む）"""
+        return [*lane_dir.glob("*.yaml"), *lane_dir.glob("*/*.yaml")]
+
+    def _pending_files(self, agent: str | None = None) -> list[Path]:
+        """
+        保留中のタスクファイルを列挙する
+
+        Args:
+            agent: 指定時はこのエージェントのレーンのみ。
+                   Noneの場合はtasks/直下と全レーン
+        """
+        if agent is not None:
+            lane_dir = self.tasks_dir / lane_name(agent)
+            return self._lane_files(lane_dir) if lane_dir.is_dir() else []
+
+        files = list(self.tasks_dir.glob("*.yaml"))
+        for lane_dir in self._lane_dirs():
+            files.extend(self._lane_files(lane_dir))
+        return files
 
     def _generate_task_id(self) -> str:
-        """ユニークなタスクIDを生成"""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        short_uuid = uuid.uuid4().hex[:8]
-        return f"{timestamp}-{short_uuid}"
+        """キュー内で単調増加するタスクIDを生成"""
+        return self.sequence.reserve()[0]
+
+    def _publish(self, task_files: list[Path]) -> None:
+        """
+        レーンに書き込んだタスクファイルを投入ログに追記する
+
+        tasks/直下・delayed/のファイルはログに載せない（claimの全件走査で拾う）。
+        シャード内のファイルはレーンからの相対パス（"0a/p1_<id>.yaml"）で載せる。
+        """
+        grouped: dict[tuple[Path, int], list[str]] = {}
+        for task_file in task_files:
+            lane_dir = self._lane_of(task_file)
+            if lane_dir is None:
+                continue
+            rank, _ = parse_task_filename(task_file.name)
+            grouped.setdefault((lane_dir, rank), []).append(
+                task_file.relative_to(lane_dir).as_posix()
+            )
+        for (lane_dir, rank), filenames in grouped.items():
+            append_entries(lane_dir, rank, filenames)
@@ -0,0 +1,898 @@
+"""
+キューサーバー
+
+キューの状態をメモリに持ち、write-ahead log（WAL）に永続化するデーモンと、
+TaskQueueと同じインターフェースでサーバーに接続するクライアント（RemoteTaskQueue）。
+
+ファイルベースのTaskQueueは同一ファイルシステム上のos.renameの原子性に依存するため、
+複数マシンのワーカーから安全に共有できない。サーバーモードでは全操作を
+1プロセスで直列化し、ワーカーはUnixソケット（ローカル）またはTCP（他ノード）で接続する。
+
+プロトコル（1行1JSON、1接続で複数リクエスト可）:
+    → {"method": "claim", "params": {"agent": "worker"}, "token": "..."}
+    ← {"result": {...}}  または  {"error": {"type": "ValueError", "message": "..."}}
+
+構造:
+    queue/
+    ├── queue.sock   # Unixソケット
+    ├── queue.wal    # 操作ログ（1行1JSON、起動時と一定量の追記ごとにコンパクション）
+    └── archive/     # コンパクション時にメモリから退避した古い完了報告
+"""
+
+from __future__ import annotations
+
+import heapq
+import hmac
+import json
+import os
+import select
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from ensemble.archive import ReportArchive
+from ensemble.dependency import DependencyResolver
+from ensemble.logger import NDJSONLogger
+from ensemble.queue import (
+    DEFAULT_PRIORITY,
+    DEFAULT_VISIBILITY_TIMEOUT,
+    PRIORITY_RANKS,
+    build_task,
+    lane_name,
+    normalize_priority,
+)
+
+# デフォルトのソケット・WALファイル名（キューディレクトリ直下）
+DEFAULT_SOCKET_NAME = "queue.sock"
+WAL_NAME = "queue.wal"
+
+# 認証トークンを渡す環境変数
+TOKEN_ENV = "ENSEMBLE_QUEUE_TOKEN"
+
+# クライアントから呼び出せるメソッド
+RPC_METHODS = (
+    "enqueue",
+    "enqueue_many",
+    "enqueue_with_dependency",
+    "claim",
+    "claim_batch",
+    "heartbeat",
+    "reap_expired",
+    "complete",
+    "get_report",
+    "list_pending",
+    "get_ready_tasks",
+    "cleanup",
+)
+
+# コンパクションまでにWALへ追記するレコード数の下限
+DEFAULT_COMPACT_RECORDS = 100_000
+
+# メモリに保持する完了報告の上限（超えた分はコンパクション時にarchive/へ退避）
+DEFAULT_MAX_REPORTS = 10_000
+
+# 送信後に通信エラーになっても送り直してよいメソッド
+# （claimの二重処理はリース切れで回収される: at-least-once）
+_RETRY_SAFE_METHODS = frozenset(
+    {
+        "claim",
+        "claim_batch",
+        "heartbeat",
+        "reap_expired",
+        "get_report",
+        "list_pending",
+        "get_ready_tasks",
+    }
+)
+
+# claim(timeout=...)の待機中にリース期限切れを確認する間隔（秒）
+_CLAIM_WAIT_SLICE = 1.0
+
+
+class QueueServerError(Exception):
+    """キューサーバーがエラーを返した、または通信できない場合の例外"""
+
+
+class QueueState:
+    """
+    メモリ上のキュー状態とWALによる永続化
+
+    全操作は1つのロック（Condition）で直列化される。各操作はWALに追記してから
+    メモリに反映するため、再起動時はWALを再生すれば同じ状態に戻る。
+
+    WALへの追記が compact_records 件（と現在の状態の2倍）を超えるか、完了報告が
+    max_reports 件を超えるとWALを書き直す。その際、古い完了報告は archive/ に退避して
+    メモリから外す（get_report() と依存関係の解決はアーカイブも参照する）。
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        fsync: bool = False,
+        logger: NDJSONLogger | None = None,
+        compact_records: int = DEFAULT_COMPACT_RECORDS,
+        max_reports: int = DEFAULT_MAX_REPORTS,
+    ) -> None:
+        """
+        Args:
+            data_dir: WALを置くディレクトリ
+            visibility_timeout: claimのデフォルトリース期間（秒）
+            fsync: WALへの追記ごとにfsyncするか（電源断にも耐えるが遅い）
+            logger: リース期限切れなどのイベントを記録するNDJSONロガー
+            compact_records: コンパクションまでにWALへ追記するレコード数の下限
+            max_reports: メモリに保持する完了報告の上限
+        """
+        self.data_dir = data_dir
+        self.wal_path = data_dir / WAL_NAME
+        self.visibility_timeout = visibility_timeout
+        self.fsync = fsync
+        self.logger = logger
+        self.compact_records = compact_records
+        self.max_reports = max_reports
+        self.archive = ReportArchive(data_dir / "archive")
+
+        self._cond = threading.Condition()
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._processing: dict[str, dict[str, Any]] = {}
+        self._reports: dict[str, dict[str, Any]] = {}
+        # 取得順（優先度ランク, 登録順）とレーン別のヒープ
+        self._order: dict[str, tuple[int, int]] = {}
+        self._lanes: dict[str, list[tuple[int, int, str]]] = {}
+        self._seq = 0
+        # 前回のコンパクション以降にWALにあるレコード数
+        self._wal_records = 0
+
+        data_dir.mkdir(parents=True, exist_ok=True)
+        self._replay()
+        self._compact()
+        self._wal = open(self.wal_path, "a")
+
+    def close(self) -> None:
+        """WALを閉じる"""
+        with self._cond:
+            self._wal.close()
+
+    # --- RPCメソッド（TaskQueueと同じインターフェース） ---
+
+    def enqueue(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """タスクを追加する"""
+        return self.enqueue_many(
+            [{"command": command, "agent": agent, "params": params, "priority": priority}]
+        )[0]
+
+    def enqueue_with_dependency(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        blocked_by: list[str] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """依存関係付きでタスクを追加する"""
+        spec = {
+            "command": command,
+            "agent": agent,
+            "params": params,
+            "blocked_by": blocked_by or [],
+            "priority": priority,
+        }
+        return self.enqueue_many([spec])[0]
+
+    def enqueue_many(self, specs: list[dict[str, Any]]) -> list[str]:
+        """複数タスクをまとめて追加する（WALへの書き込みは1回）"""
+        created_at = datetime.now().isoformat()
+        tasks = [
+            build_task(
+                spec["command"],
+                spec["agent"],
+                spec.get("params"),
+                priority=spec.get("priority", DEFAULT_PRIORITY),
+                blocked_by=spec.get("blocked_by") if "blocked_by" in spec else None,
+                created_at=created_at,
+            )
+            for spec in specs
+        ]
+        with self._cond:
+            self._commit([{"op": "enqueue", "task": task} for task in tasks])
+            self._cond.notify_all()
+        return [task["task_id"] for task in tasks]
+
+    def claim(
+        self,
+        agent: str | None = None,
+        lease: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any] | None:
+        """タスクを取得する。timeout指定時は新しいタスクが来るまで待つ"""
+        deadline = time.monotonic() + (timeout or 0)
+        with self._cond:
+            while True:
+                self._reap_expired_locked()
+                claimed = self._claim_locked(1, agent, lease)
+                if claimed:
+                    return claimed[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, _CLAIM_WAIT_SLICE))
+
+    def claim_batch(
+        self, n: int, agent: str | None = None, lease: float | None = None
+    ) -> list[dict[str, Any]]:
+        """最大n件のタスクをまとめて取得する"""
+        with self._cond:
+            return self._claim_locked(n, agent, lease)
+
+    def heartbeat(self, task_id: str, lease: float | None = None) -> bool:
+        """処理中タスクのリースを延長する"""
+        with self._cond:
+            if task_id not in self._processing:
+                return False
+            lease_expires = time.time() + (self.visibility_timeout if lease is None else lease)
+            self._commit([{"op": "heartbeat", "task_id": task_id, "lease_expires": lease_expires}])
+            return True
+
+    def reap_expired(self) -> list[str]:
+        """リース期限切れの処理中タスクを保留に戻す"""
+        with self._cond:
+            return self._reap_expired_locked()
+
+    def complete(
+        self,
+        task_id: str,
+        result: str,
+        output: str,
+        error: str | None = None,
+    ) -> None:
+        """タスク完了を報告する"""
+        with self._cond:
+            task = self._processing.get(task_id) or self._pending.get(task_id)
+            report = _public(task) if task else {"task_id": task_id}
+            report.pop("lease_expires_at", None)
+            report.update(
+                {"result": result, "output": output, "completed_at": datetime.now().isoformat()}
+            )
+            if error:
+                report["error"] = error
+            self._commit([{"op": "complete", "report": report}])
+            # 依存待ちのタスクが実行可能になった可能性がある
+            self._cond.notify_all()
+
+    def get_report(self, task_id: str) -> dict[str, Any] | None:
+        """完了報告を取得する"""
+        with self._cond:
+            report = self._reports.get(task_id)
+            if report is None:
+                return self.archive.get(task_id)
+            return dict(report)
+
+    def list_pending(self) -> list[str]:
+        """保留中のタスクIDリストを取得する"""
+        with self._cond:
+            return list(self._pending)
+
+    def get_ready_tasks(self, completed_task_ids: list[str] | None = None) -> list[dict]:
+        """依存関係を考慮して、実行可能なタスクを取得する"""
+        with self._cond:
+            if not self._pending:
+                return []
+            resolver = DependencyResolver([dict(t) for t in self._pending.values()])
+            if completed_task_ids is None:
+                completed_task_ids = [*self.archive.task_ids(), *self._reports]
+            resolver.mark_completed_many(completed_task_ids)
+            return resolver.get_ready_tasks()
+
+    def cleanup(self) -> None:
+        """全タスク・レポート（アーカイブを含む）を削除する"""
+        with self._cond:
+            # 先にアーカイブを消す（WALの再生でアーカイブを消すことはない）
+            self.archive.clear()
+            self._commit([{"op": "cleanup"}])
+
+    # --- 内部処理 ---
+
+    def _claim_locked(
+        self, n: int, agent: str | None, lease: float | None
+    ) -> list[dict[str, Any]]:
+        """ロック保持中にn件claimする"""
+        lease_expires = time.time() + (self.visibility_timeout if lease is None else lease)
+        claimed_at = datetime.now().isoformat()
+        lanes = [lane_name(agent)] if agent is not None else list(self._lanes)
+
+        records = []
+        while len(records) < n:
+            best: tuple[int, int, str] | None = None
+            for lane in lanes:
+                heap = self._lanes.get(lane)
+                # claim済み・完了済みのエントリは遅延削除する
+                while heap and heap[0][2] not in self._pending:
+                    heapq.heappop(heap)
+                if heap and (best is None or heap[0] < best):
+                    best = heap[0]
+            if best is None:
+                break
+            task_id = best[2]
+            heapq.heappop(self._lanes[lane_name(self._pending[task_id]["agent"])])
+            records.append(
+                {
+                    "op": "claim",
+                    "task_id": task_id,
+                    "lease_expires": lease_expires,
+                    "claimed_at": claimed_at,
+                }
+            )
+
+        self._commit(records)
+        return [_public(self._processing[r["task_id"]]) for r in records]
+
+    def _reap_expired_locked(self) -> list[str]:
+        """ロック保持中にリース期限切れのタスクを戻す"""
+        now = time.time()
+        expired = [
+            task_id
+            for task_id, task in self._processing.items()
+            if task["_lease_expires"] <= now
+        ]
+        self._commit([{"op": "requeue", "task_id": task_id} for task_id in expired])
+
+        for task_id in expired:
+            task = self._pending[task_id]
+            if self.logger:
+                self.logger.log_event(
+                    NDJSONLogger.TASK_LEASE_EXPIRED,
+                    {
+                        "task_id": task_id,
+                        "agent": task.get("agent"),
+                        "attempts": task.get("attempts", 0),
+                        "queue": str(self.wal_path),
+                    },
+                )
+        if expired:
+            self._cond.notify_all()
+        return expired
+
+    def _commit(self, records: list[dict[str, Any]]) -> None:
+        """WALに追記してからメモリに反映する"""
+        if not records:
+            return
+        self._wal.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        for record in records:
+            self._apply(record)
+
+        self._wal_records += len(records)
+        live = len(self._pending) + len(self._processing) + len(self._reports)
+        if (
+            self._wal_records >= max(self.compact_records, 2 * live)
+            or len(self._reports) > self.max_reports
+        ):
+            self._wal.close()
+            self._compact()
+            self._wal = open(self.wal_path, "a")
+
+    def _apply(self, record: dict[str, Any]) -> None:
+        """WALの1レコードをメモリ上の状態に反映する"""
+        op = record["op"]
+        if op == "enqueue":
+            task = record["task"]
+            self._push_pending(task, self._order.get(task["task_id"]))
+        elif op == "claim":
+            task = self._pending.pop(record["task_id"], None)
+            if task is not None:
+                task["status"] = "processing"
+                task["claimed_at"] = record["claimed_at"]
+                task["_lease_expires"] = record["lease_expires"]
+                task["lease_expires_at"] = datetime.fromtimestamp(
+                    record["lease_expires"]
+                ).isoformat()
+                self._processing[record["task_id"]] = task
+        elif op == "heartbeat":
+            task = self._processing.get(record["task_id"])
+            if task is not None:
+                task["_lease_expires"] = record["lease_expires"]
+                task["lease_expires_at"] = datetime.fromtimestamp(
+                    record["lease_expires"]
+                ).isoformat()
+        elif op == "requeue":
+            task = self._processing.pop(record["task_id"], None)
+            if task is not None:
+                for key in ("_lease_expires", "lease_expires_at", "claimed_at"):
+                    task.pop(key, None)
+                task["status"] = "pending"
+                task["attempts"] = task.get("attempts", 0) + 1
+                # 元の取得順を保つ
+                self._push_pending(task, self._order.get(task["task_id"]))
+        elif op == "complete":
+            report = record["report"]
+            task_id = report["task_id"]
+            self._pending.pop(task_id, None)
+            self._processing.pop(task_id, None)
+            self._order.pop(task_id, None)
+            self._reports[task_id] = report
+        elif op == "cleanup":
+            self._pending.clear()
+            self._processing.clear()
+            self._reports.clear()
+            self._order.clear()
+            self._lanes.clear()
+
+    def _push_pending(self, task: dict[str, Any], order: tuple[int, int] | None) -> None:
+        """タスクを保留状態にしてレーンのヒープに積む"""
+        if order is None:
+            self._seq += 1
+            order = (PRIORITY_RANKS[task["priority"]], self._seq)
+        task_id = task["task_id"]
+        self._order[task_id] = order
+        self._pending[task_id] = task
+        heapq.heappush(self._lanes.setdefault(lane_name(task["agent"]), []), (*order, task_id))
+
+    def _replay(self) -> None:
+        """起動時にWALを再生する（クラッシュで途中まで書かれた末尾行は無視）"""
+        if not self.wal_path.exists():
+            return
+        with open(self.wal_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(record)
+
+    def _compact(self) -> None:
+        """
+        現在の状態だけを含むWALに書き直す（tmp + fsync + rename）
+
+        完了報告がmax_reportsを超えていれば、古い方から半分まで減るように
+        archive/ へ退避する。退避はWALの書き直しより先にfsyncされるため、
+        途中でクラッシュしても報告は失われない（WALとアーカイブの両方に残るだけ）。
+        """
+        if len(self._reports) > self.max_reports:
+            keep = self.max_reports // 2
+            old_ids = list(self._reports)[: len(self._reports) - keep]
+            self.archive.append({task_id: self._reports[task_id] for task_id in old_ids})
+            for task_id in old_ids:
+                del self._reports[task_id]
+
+        records: list[dict[str, Any]] = [
+            {"op": "complete", "report": report} for report in self._reports.values()
+        ]
+        live = sorted(
+            [*self._pending.values(), *self._processing.values()],
+            key=lambda t: self._order[t["task_id"]],
+        )
+        for task in live:
+            stored = {k: v for k, v in task.items() if k not in ("_lease_expires", "lease_expires_at")}
+            if task["task_id"] in self._processing:
+                stored["status"] = "pending"
+                stored.pop("claimed_at", None)
+            records.append({"op": "enqueue", "task": stored})
+            if task["task_id"] in self._processing:
+                records.append(
+                    {
+                        "op": "claim",
+                        "task_id": task["task_id"],
+                        "lease_expires": task["_lease_expires"],
+                        "claimed_at": task.get("claimed_at"),
+                    }
+                )
+
+        tmp_path = self.wal_path.with_name(WAL_NAME + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.wal_path)
+        self._wal_records = len(records)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """1接続分のリクエストを1行ずつ処理する"""
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.queue_server._track(self.request)  # type: ignore[attr-defined]
+
+    def finish(self) -> None:
+        self.server.queue_server._untrack(self.request)  # type: ignore[attr-defined]
+        super().finish()
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.queue_server.dispatch(line)  # type: ignore[attr-defined]
+            self.wfile.write(response)
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class QueueServer:
+    """QueueStateをUnixソケット（と任意でTCP）で公開するサーバー"""
+
+    def __init__(
+        self,
+        state: QueueState,
+        socket_path: Path | None = None,
+        tcp_address: tuple[str, int] | None = None,
+        token: str | None = None,
+    ) -> None:
+        """
+        Args:
+            state: 公開するキュー状態
+            socket_path: Unixソケットのパス（Noneの場合はUnixソケットを開かない）
+            tcp_address: TCPで待ち受ける (host, port)。Noneの場合はTCPを開かない
+            token: 設定した場合、このトークンを含まないリクエストを拒否する
+        """
+        if socket_path is None and tcp_address is None:
+            raise ValueError("QueueServer needs a socket_path or a tcp_address")
+
+        self.state = state
+        self.token = token
+        self._servers: list[socketserver.BaseServer] = []
+        self._threads: list[threading.Thread] = []
+        # 処理中のクライアント接続（shutdown()で切断する）
+        self._connections: set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
+
+        if socket_path is not None:
+            # 前回異常終了したソケットファイルが残っていれば消す
+            socket_path.unlink(missing_ok=True)
+            server = _UnixServer(str(socket_path), _RequestHandler)
+            os.chmod(socket_path, 0o600)
+            self._servers.append(server)
+        if tcp_address is not None:
+            self._servers.append(_TCPServer(tcp_address, _RequestHandler))
+
+        for server in self._servers:
+            server.queue_server = self  # type: ignore[attr-defined]
+
+    @property
+    def addresses(self) -> list[str]:
+        """待ち受け中のアドレス（RemoteTaskQueueのaddress形式）"""
+        addresses = []
+        for server in self._servers:
+            if isinstance(server, _UnixServer):
+                addresses.append(f"unix:{server.server_address}")
+            else:
+                host, port = server.server_address[:2]  # type: ignore[misc]
+                addresses.append(f"tcp:{host}:{port}")
+        return addresses
+
+    def start(self) -> None:
+        """バックグラウンドスレッドで待ち受けを開始する"""
+        for server in self._servers:
+            thread = threading.Thread(
+                target=server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self) -> None:
+        """待ち受けを停止し、クライアント接続・ソケット・WALを閉じる"""
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server, _UnixServer):
+                Path(server.server_address).unlink(missing_ok=True)  # type: ignore[arg-type]
+        for thread in self._threads:
+            thread.join()
+        # 接続中のクライアントが閉じたWALに書き込まないよう切断する
+        with self._connections_lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.state.close()
+
+    def _track(self, conn: socket.socket) -> None:
+        with self._connections_lock:
+            self._connections.add(conn)
+
+    def _untrack(self, conn: socket.socket) -> None:
+        with self._connections_lock:
+            self._connections.discard(conn)
+
+    def dispatch(self, line: bytes) -> bytes:
+        """
+        1リクエストを処理してレスポンス行を返す
+
+        Args:
+            line: リクエストのJSON行
+
+        Returns:
+            レスポンスのJSON行
+        """
+        try:
+            request = json.loads(line)
+            if self.token is not None and not hmac.compare_digest(
+                str(request.get("token", "")), self.token
+            ):
+                raise PermissionError("invalid queue token")
+            method = request.get("method")
+            if method not in RPC_METHODS:
+                raise ValueError(f"Unknown queue method: {method!r}")
+            result = getattr(self.state, method)(**request.get("params", {}))
+            response: dict[str, Any] = {"result": result}
+        except (ValueError, TypeError, KeyError, PermissionError) as e:
+            response = {"error": {"type": type(e).__name__, "message": str(e)}}
+        except Exception as e:
+            response = {"error": {"type": "QueueServerError", "message": str(e)}}
+        return (json.dumps(response, ensure_ascii=False) + "\n").encode()
+
+
+def parse_address(address: str) -> tuple[int, Any]:
+    """
+    アドレス文字列をソケットファミリーと接続先に変換する
+
+    Args:
+        address: "unix:/path/to/queue.sock"、"tcp:host:port"、"host:port"、
+                 またはソケットファイルのパス
+
+    Returns:
+        (ソケットファミリー, connect()に渡すアドレス)
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    if address.startswith("tcp:"):
+        address = address[len("tcp:"):]
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+
+class RemoteTaskQueue:
+    """
+    キューサーバーに接続するクライアント
+
+    TaskQueueと同じメソッドを持つため、create_task_queue(backend="remote")で
+    AutonomousLoopRunnerなどからそのまま使える。
+    """
+
+    def __init__(
+        self,
+        base_dir: Path | None = None,
+        address: str | None = None,
+        visibility_timeout: float | None = None,
+        logger: NDJSONLogger | None = None,
+        token: str | None = None,
+        timeout: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            base_dir: キューディレクトリ。addressがNoneの場合は
+                      base_dir/queue.sock に接続する（デフォルト: queue/）
+            address: サーバーのアドレス（"unix:/path"、"tcp:host:port"）
+            visibility_timeout: claimのデフォルトリース期間（秒）。
+                                Noneの場合はサーバーの設定に従う
+            logger: TaskQueueとの互換のため受け取る（イベントはサーバー側で記録される）
+            token: 認証トークン（デフォルト: 環境変数 ENSEMBLE_QUEUE_TOKEN）
+            timeout: 1リクエストの通信タイムアウト（秒）
+        """
+        if address is None:
+            address = f"unix:{(base_dir or Path('queue')) / DEFAULT_SOCKET_NAME}"
+        self.address = address
+        self.visibility_timeout = visibility_timeout
+        self.logger = logger
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+        self._file: Any = None
+
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            self._disconnect()
+
+    def __enter__(self) -> RemoteTaskQueue:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def enqueue(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """タスクをキューに追加する"""
+        return self._call(
+            "enqueue",
+            command=command,
+            agent=agent,
+            params=params,
+            priority=normalize_priority(priority),
+        )
+
+    def enqueue_many(self, specs: list[dict[str, Any]]) -> list[str]:
+        """複数タスクをまとめてキューに追加する"""
+        specs = [
+            {**spec, "priority": normalize_priority(spec["priority"])} if "priority" in spec else spec
+            for spec in specs
+        ]
+        return self._call("enqueue_many", specs=specs)
+
+    def enqueue_with_dependency(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        blocked_by: list[str] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """依存関係付きでタスクをキューに追加する"""
+        return self._call(
+            "enqueue_with_dependency",
+            command=command,
+            agent=agent,
+            params=params,
+            blocked_by=blocked_by,
+            priority=normalize_priority(priority),
+        )
+
+    def claim(
+        self,
+        agent: str | None = None,
+        lease: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any] | None:
+        """タスクを取得する（timeout指定時はサーバー側で新しいタスクを待つ）"""
+        return self._call(
+            "claim",
+            _wait=timeout or 0,
+            agent=agent,
+            lease=self._lease(lease),
+            timeout=timeout,
+        )
+
+    def claim_batch(
+        self, n: int, agent: str | None = None, lease: float | None = None
+    ) -> list[dict[str, Any]]:
+        """最大n件のタスクをまとめて取得する"""
+        return self._call("claim_batch", n=n, agent=agent, lease=self._lease(lease))
+
+    def heartbeat(self, task_id: str, lease: float | None = None) -> bool:
+        """処理中タスクのリースを延長する"""
+        return self._call("heartbeat", task_id=task_id, lease=self._lease(lease))
+
+    def reap_expired(self) -> list[str]:
+        """リース期限切れの処理中タスクを保留に戻す"""
+        return self._call("reap_expired")
+
+    def complete(
+        self,
+        task_id: str,
+        result: str,
+        output: str,
+        error: str | None = None,
+    ) -> None:
+        """タスク完了を報告する"""
+        self._call("complete", task_id=task_id, result=result, output=output, error=error)
+
+    def get_report(self, task_id: str) -> dict[str, Any] | None:
+        """完了報告を取得する"""
+        return self._call("get_report", task_id=task_id)
+
+    def list_pending(self) -> list[str]:
+        """保留中のタスクIDリストを取得する"""
+        return self._call("list_pending")
+
+    def get_ready_tasks(self, completed_task_ids: list[str] | None = None) -> list[dict]:
+        """依存関係を考慮して、実行可能なタスクを取得する"""
+        return self._call("get_ready_tasks", completed_task_ids=completed_task_ids)
+
+    def cleanup(self) -> None:
+        """全タスク・レポートを削除する"""
+        self._call("cleanup")
+
+    def _lease(self, lease: float | None) -> float | None:
+        return self.visibility_timeout if lease is None else lease
+
+    def _call(self, method: str, _wait: float = 0, **params: Any) -> Any:
+        """
+        サーバーのメソッドを呼び出す
+
+        接続・送信に失敗した場合は1回だけ再接続して送り直す。送信後（応答待ちのタイムアウトや
+        切断）の失敗は、サーバーが処理済みかもしれないため _RETRY_SAFE_METHODS の
+        メソッドだけ送り直し、enqueue・completeなどは二重に実行しないよう例外にする。
+
+        Raises:
+            ValueError: サーバーが引数エラーを返した場合
+            QueueServerError: 通信エラー、またはサーバー側のエラー
+        """
+        request: dict[str, Any] = {"method": method, "params": params}
+        if self.token is not None:
+            request["token"] = self.token
+        payload = (json.dumps(request, ensure_ascii=False) + "\n").encode()
+
+        with self._lock:
+            for attempt in range(2):
+                sent = False
+                try:
+                    if self._sock is not None and self._is_stale():
+                        # サーバーの再起動などで切断済みなら送る前につなぎ直す
+                        self._disconnect()
+                    if self._sock is None:
+                        self._connect()
+                    assert self._sock is not None
+                    self._sock.settimeout(self.timeout + _wait)
+                    self._file.write(payload)
+                    self._file.flush()
+                    sent = True
+                    line = self._file.readline()
+                    if not line:
+                        raise ConnectionError("queue server closed the connection")
+                    break
+                except OSError as e:
+                    self._disconnect()
+                    if attempt == 1 or (sent and method not in _RETRY_SAFE_METHODS):
+                        raise QueueServerError(
+                            f"cannot reach queue server at {self.address}: {e}"
+                        ) from e
+
+        response = json.loads(line)
+        error = response.get("error")
+        if error:
+            if error["type"] in ("ValueError", "TypeError", "KeyError"):
+                raise ValueError(error["message"])
+            raise QueueServerError(error["message"])
+        return response.get("result")
+
+    def _connect(self) -> None:
+        family, target = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    def _is_stale(self) -> bool:
+        """応答待ちでないのに読み込み可能なら、サーバー側が接続を閉じている"""
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        return bool(readable)
+
+    def _disconnect(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._file = None
+
+
+def _public(task: dict[str, Any]) -> dict[str, Any]:
+    """内部用のキー（_で始まる）を除いたタスクのコピーを返す"""
+    return {k: v for k, v in task.items() if not k.startswith("_")}
@@ -0,0 +1,585 @@
+"""
+SQLite（WALモード）バックエンドのタスクキュー
+
+TaskQueueと同じAPIを、単一のSQLiteデータベースで提供する。
+claimはインデックス付きの UPDATE ... RETURNING 1トランザクションで完了するため、
+保留中タスク数に依存しない。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from ensemble.dependency import DependencyResolver
+from ensemble.logger import NDJSONLogger
+from ensemble.queue import (
+    DEFAULT_PRIORITY,
+    DEFAULT_VISIBILITY_TIMEOUT,
+    PRIORITY_RANKS,
+    generate_task_id,
+    normalize_priority,
+)
+from ensemble.watch import backoff_delays
+
+# UPDATE ... RETURNING は SQLite 3.35.0 以降で利用可能
+_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id      TEXT PRIMARY KEY,
+    command      TEXT NOT NULL DEFAULT '',
+    agent        TEXT NOT NULL DEFAULT '',
+    params       TEXT NOT NULL DEFAULT '{}',
+    blocked_by   TEXT,
+    priority     INTEGER NOT NULL DEFAULT 1,
+    seq          INTEGER,
+    status       TEXT NOT NULL,
+    created_at   TEXT NOT NULL,
+    claimed_at   TEXT,
+    lease_expires_at REAL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    completed_at TEXT,
+    result       TEXT,
+    output       TEXT,
+    error        TEXT
+);
+"""
+
+# claim順（優先度 → 投入順）に沿ったインデックス
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tasks_seq ON tasks (seq);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_seq ON tasks (status, seq);
+CREATE INDEX IF NOT EXISTS idx_tasks_seq_claim_order
+    ON tasks (status, priority, seq);
+CREATE INDEX IF NOT EXISTS idx_tasks_seq_lane_claim_order
+    ON tasks (status, agent, priority, seq);
+CREATE INDEX IF NOT EXISTS idx_tasks_lease
+    ON tasks (status, lease_expires_at);
+DROP INDEX IF EXISTS idx_tasks_status_agent_created;
+DROP INDEX IF EXISTS idx_tasks_status_created;
+DROP INDEX IF EXISTS idx_tasks_claim_order;
+DROP INDEX IF EXISTS idx_tasks_lane_claim_order;
+"""
+
+_TASK_COLUMNS = (
+    "task_id, command, agent, params, blocked_by, priority, seq, status, "
+    "created_at, lease_expires_at, attempts"
+)
+
+# claim順（同一バッチ内はcreated_atが同じためseqで投入順を保つ）
+_CLAIM_ORDER = "ORDER BY priority, seq"
+
+# 投入順の連番（1文で採番するため複数プロセスからのINSERTでも単調増加）
+_NEXT_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM tasks)"
+
+# claim時に更新するカラム（claimed_at, lease_expires_at）
+_CLAIM_SET = "status = 'processing', claimed_at = ?, lease_expires_at = ?"
+
+# 既存DBに後から追加したカラム
+_ADDED_COLUMNS = {
+    "priority": "INTEGER NOT NULL DEFAULT 1",
+    "lease_expires_at": "REAL",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "seq": "INTEGER",
+}
+
+_PRIORITY_NAMES = {rank: name for name, rank in PRIORITY_RANKS.items()}
+
+
+class SQLiteTaskQueue:
+    """
+    SQLiteバックエンドのタスクキュー
+
+    構造:
+        queue/
+        └── queue.db     # 全タスク（status: pending / processing / completed）
+
+    claimはlease_expires_atカラムにリース期限を記録し、
+    期限切れのタスクはreap_expired()でpendingに戻される。
+    """
+
+    DB_NAME = "queue.db"
+
+    def __init__(
+        self,
+        base_dir: Path | None = None,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        logger: NDJSONLogger | None = None,
+    ) -> None:
+        """
+        キューを初期化する
+
+        Args:
+            base_dir: ベースディレクトリ（デフォルト: queue/）
+            visibility_timeout: claimのデフォルトリース期間（秒）
+            logger: リース期限切れなどのイベントを記録するNDJSONロガー
+        """
+        self.base_dir = base_dir if base_dir else Path("queue")
+        self.visibility_timeout = visibility_timeout
+        self.logger = logger
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.base_dir / self.DB_NAME
+
+        # 同一インスタンスを複数スレッドから使えるよう接続をロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=5.0,
+            isolation_level=None,  # トランザクションは明示的に制御
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.executescript(_INDEXES)
+
+    def _migrate(self) -> None:
+        """古いスキーマのDBに不足カラムを追加する"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        for name, definition in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+        if "seq" not in columns:
+            # 既存行は挿入順（rowid）をそのまま連番にする
+            self._conn.execute("UPDATE tasks SET seq = rowid")
+
+    def close(self) -> None:
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """
+        タスクをキューに追加する
+
+        Args:
+            command: 実行するコマンド
+            agent: 担当エージェント
+            params: 追加パラメータ
+            priority: 優先度（"high" / "medium" / "low" または TaskPriority）
+
+        Returns:
+            タスクID
+        """
+        return self._insert(command, agent, params, blocked_by=None, priority=priority)
+
+    def enqueue_with_dependency(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None = None,
+        blocked_by: list[str] | None = None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """
+        依存関係付きでタスクをキューに追加する
+
+        Args:
+            command: 実行するコマンド
+            agent: 担当エージェント
+            params: 追加パラメータ
+            blocked_by: このタスクがブロックされている他のタスクIDのリスト
+            priority: 優先度（"high" / "medium" / "low" または TaskPriority）
+
+        Returns:
+            タスクID
+        """
+        return self._insert(
+            command, agent, params, blocked_by=blocked_by or [], priority=priority
+        )
+
+    def enqueue_many(self, specs: list[dict[str, Any]]) -> list[str]:
+        """
+        複数タスクを1トランザクションでまとめてキューに追加する
+
+        Args:
+            specs: タスク仕様のリスト（TaskQueue.enqueue_many と同じ形式）
+
+        Returns:
+            タスクIDのリスト（specsと同じ順序）
+        """
+        created_at = datetime.now().isoformat()
+        rows = []
+        for spec in specs:
+            rows.append(
+                (
+                    generate_task_id(),
+                    spec["command"],
+                    spec["agent"],
+                    json.dumps(spec.get("params") or {}, ensure_ascii=False),
+                    (
+                        json.dumps(spec["blocked_by"] or [])
+                        if "blocked_by" in spec
+                        else None
+                    ),
+                    PRIORITY_RANKS[
+                        normalize_priority(spec.get("priority", DEFAULT_PRIORITY))
+                    ],
+                    created_at,
+                )
+            )
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"""
+                    INSERT INTO tasks (task_id, command, agent, params, blocked_by,
+                                       priority, seq, status, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, {_NEXT_SEQ}, 'pending', ?)
+                    """,
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return [row[0] for row in rows]
+
+    def claim(
+        self,
+        agent: str | None = None,
+        lease: float | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, Any] | None:
+        """
+        タスクを取得する（アトミック）
+
+        Args:
+            agent: 指定時はこのエージェント宛のタスクのみ取得
+            lease: リース期間（秒）。Noneの場合はvisibility_timeout
+            timeout: キューが空の場合に新しいタスクを待つ最大秒数
+                     （指数バックオフでポーリング）。Noneまたは0の場合は待たない
+
+        Returns:
+            タスクデータ（lease_expires_at付き）、またはキューが空の場合None
+        """
+        deadline = time.monotonic() + (timeout or 0)
+        delays = backoff_delays()
+        while True:
+            claimed = self.claim_batch(1, agent=agent, lease=lease)
+            if claimed:
+                return claimed[0]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(next(delays), remaining))
+
+    def claim_batch(
+        self, n: int, agent: str | None = None, lease: float | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        最大n件のタスクを1トランザクションでまとめて取得する
+
+        Args:
+            n: 取得する最大件数
+            agent: 指定時はこのエージェント宛のタスクのみ取得
+            lease: リース期間（秒）。Noneの場合はvisibility_timeout
+
+        Returns:
+            取得したタスクデータのリスト（古い順）
+        """
+        if n <= 0:
+            return []
+
+        where = "status = 'pending'"
+        args: list[Any] = []
+        if agent is not None:
+            where += " AND agent = ?"
+            args.append(agent)
+        select = f"SELECT task_id FROM tasks WHERE {where} {_CLAIM_ORDER} LIMIT ?"
+        args.append(n)
+
+        lease_expires = time.time() + (
+            self.visibility_timeout if lease is None else lease
+        )
+        claim_args = (datetime.now().isoformat(), lease_expires)
+        with self._lock:
+            if _SUPPORTS_RETURNING:
+                rows = self._conn.execute(
+                    f"""
+                    UPDATE tasks SET {_CLAIM_SET}
+                    WHERE task_id IN ({select})
+                    RETURNING {_TASK_COLUMNS}
+                    """,
+                    (*claim_args, *args),
+                ).fetchall()
+            else:
+                rows = self._claim_without_returning(select, args, claim_args)
+
+        # RETURNINGの順序は保証されないためclaim順に並べ直す
+        rows = sorted(rows, key=lambda r: (r["priority"], r["seq"]))
+        return [self._row_to_task(row) for row in rows]
+
+    def heartbeat(self, task_id: str, lease: float | None = None) -> bool:
+        """
+        処理中タスクのリースを延長する
+
+        Args:
+            task_id: タスクID
+            lease: 現在時刻からの新しいリース期間（秒）。Noneの場合はvisibility_timeout
+
+        Returns:
+            延長できた場合True、タスクが処理中でない場合False
+        """
+        lease_expires = time.time() + (
+            self.visibility_timeout if lease is None else lease
+        )
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET lease_expires_at = ? "
+                "WHERE task_id = ? AND status = 'processing'",
+                (lease_expires, task_id),
+            )
+        return cursor.rowcount > 0
+
+    def reap_expired(self) -> list[str]:
+        """
+        リース期限切れの処理中タスクをpendingに戻す
+
+        戻したタスクはattemptsを1増やし、ロガーがあれば
+        task_lease_expired イベントを記録する。
+
+        Returns:
+            pendingに戻したタスクIDのリスト
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT task_id, agent, attempts FROM tasks "
+                    "WHERE status = 'processing' AND lease_expires_at <= ?",
+                    (time.time(),),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE tasks SET status = 'pending', claimed_at = NULL, "
+                    "lease_expires_at = NULL, attempts = attempts + 1 "
+                    "WHERE task_id = ?",
+                    [(row["task_id"],) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if self.logger:
+            for row in rows:
+                self.logger.log_event(
+                    NDJSONLogger.TASK_LEASE_EXPIRED,
+                    {
+                        "task_id": row["task_id"],
+                        "agent": row["agent"],
+                        "attempts": row["attempts"] + 1,
+                        "queue": str(self.db_path),
+                    },
+                )
+
+        return [row["task_id"] for row in rows]
+
+    def complete(
+        self,
+        task_id: str,
+        result: str,
+        output: str,
+        error: str | None = None,
+    ) -> None:
+        """
+        タスク完了を報告する
+
+        Args:
+            task_id: タスクID
+            result: 結果 ("success" or "error")
+            output: 出力内容
+            error: エラーメッセージ（エラー時のみ）
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            # 未知のタスクIDでもレポートを残す（ファイル版と同じ挙動）
+            self._conn.execute(
+                """
+                INSERT INTO tasks (task_id, status, created_at, completed_at,
+                                   result, output, error)
+                VALUES (?, 'completed', ?, ?, ?, ?, ?)
+                ON CONFLICT (task_id) DO UPDATE SET
+                    status = 'completed',
+                    completed_at = excluded.completed_at,
+                    lease_expires_at = NULL,
+                    result = excluded.result,
+                    output = excluded.output,
+                    error = excluded.error
+                """,
+                (task_id, now, now, result, output, error),
+            )
+
+    def get_report(self, task_id: str) -> dict[str, Any] | None:
+        """
+        完了報告を取得する
+
+        Args:
+            task_id: タスクID
+
+        Returns:
+            レポートデータ、未完了の場合None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM tasks WHERE task_id = ? AND status = 'completed'",
+                (task_id,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        report = self._row_to_task(row)
+        report["result"] = row["result"]
+        report["output"] = row["output"]
+        report["completed_at"] = row["completed_at"]
+        if row["error"]:
+            report["error"] = row["error"]
+        return report
+
+    def list_pending(self) -> list[str]:
+        """
+        保留中のタスクIDリストを取得する
+
+        Returns:
+            タスクIDのリスト
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id FROM tasks WHERE status = 'pending' ORDER BY seq"
+            ).fetchall()
+        return [row["task_id"] for row in rows]
+
+    def cleanup(self) -> None:
+        """
+        全てのタスクを削除する（セッション開始時用）
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks")
+
+    def get_ready_tasks(self, completed_task_ids: list[str] | None = None) -> list[dict]:
+        """
+        依存関係を考慮して、実行可能なタスクを取得する
+
+        Args:
+            completed_task_ids: 完了済みタスクIDのリスト。
+                               Noneの場合はcompleted状態のタスクから取得
+
+        Returns:
+            実行可能なタスクのリスト
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_TASK_COLUMNS} FROM tasks WHERE status = 'pending' "
+                "ORDER BY seq"
+            ).fetchall()
+            if completed_task_ids is None:
+                completed_task_ids = [
+                    row["task_id"]
+                    for row in self._conn.execute(
+                        "SELECT task_id FROM tasks WHERE status = 'completed'"
+                    )
+                ]
+
+        all_tasks = [self._row_to_task(row) for row in rows]
+        if not all_tasks:
+            return []
+
+        resolver = DependencyResolver(all_tasks)
+        resolver.mark_completed_many(completed_task_ids)
+
+        return resolver.get_ready_tasks()
+
+    def _insert(
+        self,
+        command: str,
+        agent: str,
+        params: dict[str, Any] | None,
+        blocked_by: list[str] | None,
+        priority: Any = DEFAULT_PRIORITY,
+    ) -> str:
+        """タスク行を追加する"""
+        task_id = generate_task_id()
+        with self._lock:
+            self._conn.execute(
+                f"""
+                INSERT INTO tasks (task_id, command, agent, params, blocked_by,
+                                   priority, seq, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, {_NEXT_SEQ}, 'pending', ?)
+                """,
+                (
+                    task_id,
+                    command,
+                    agent,
+                    json.dumps(params or {}, ensure_ascii=False),
+                    json.dumps(blocked_by) if blocked_by is not None else None,
+                    PRIORITY_RANKS[normalize_priority(priority)],
+                    datetime.now().isoformat(),
+                ),
+            )
+        return task_id
+
+    def _claim_without_returning(
+        self, select: str, args: list[Any], claim_args: tuple[Any, ...]
+    ) -> list[dict[str, Any]]:
+        """RETURNING非対応のSQLite向けclaim（BEGIN IMMEDIATEで排他）"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            task_ids = [row["task_id"] for row in self._conn.execute(select, args)]
+            rows = []
+            for task_id in task_ids:
+                self._conn.execute(
+                    f"UPDATE tasks SET {_CLAIM_SET} WHERE task_id = ?",
+                    (*claim_args, task_id),
+                )
+                rows.append(
+                    dict(
+                        self._conn.execute(
+                            f"SELECT {_TASK_COLUMNS} FROM tasks WHERE task_id = ?",
+                            (task_id,),
+                        ).fetchone()
+                    )
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        return rows
+
+    @staticmethod
+    def _row_to_task(row: Any) -> dict[str, Any]:
+        """DB行をファイル版と同じ形のタスク辞書に変換"""
+        task: dict[str, Any] = {
+            "task_id": row["task_id"],
+            "command": row["command"],
+            "agent": row["agent"],
+            "params": json.loads(row["params"]) if row["params"] else {},
+            "priority": _PRIORITY_NAMES.get(row["priority"], DEFAULT_PRIORITY),
+            "status": row["status"],
+            "created_at": row["created_at"],
+        }
+        if row["blocked_by"] is not None:
+            task["blocked_by"] = json.loads(row["blocked_by"])
+        if row["attempts"]:
+            task["attempts"] = row["attempts"]
+        if row["status"] == "processing" and row["lease_expires_at"] is not None:
+            task["lease_expires_at"] = datetime.fromtimestamp(
+                row["lease_expires_at"]
+            ).isoformat()
+        return task
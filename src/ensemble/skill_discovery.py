@@ -6,12 +6,13 @@ Workerが繰り返し実行したパターンを検知し、スキル化候補
 
 from __future__ import annotations
 
-import yaml
 from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 
+from ensemble import codec
+
 
 @dataclass
 class SkillCandidate:
@@ -201,8 +202,7 @@ class SkillDiscoveryEngine:
             "updated_at": datetime.now().isoformat(),
         }
 
-        with open(candidates_file, "w") as f:
-            yaml.dump(candidates_data, f, allow_unicode=True, sort_keys=False)
+        candidates_file.write_text(codec.dumps(candidates_data, sort_keys=False))
 
     def load_candidates(self) -> None:
         """保存済み候補を読み込み"""
@@ -210,8 +210,7 @@ class SkillDiscoveryEngine:
         if not candidates_file.exists():
             return
 
-        with open(candidates_file) as f:
-            data = yaml.safe_load(f)
+        data = codec.load_file(candidates_file)
 
         if not data:
             return
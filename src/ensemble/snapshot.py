@@ -0,0 +1,97 @@
+"""
+タスクキューのスナップショット
+
+キューの状態を1つのNDJSONファイルにまとめて書き出し・読み込む。
+TaskQueue.snapshot() / restore() と、再起動時のウォームスタート用の
+自動チェックポイント（queue/checkpoint.ndjson）が同じ形式を使う。
+
+ファイル形式:
+    1行目: ヘッダ {"version": 1, "watermark": UNIX時刻, "full": bool,
+                   "completed_index": [inode, オフセット], "sequence": "..."}
+    2行目以降: レコード（1行 = 1ファイル）
+        {"state": "pending" | "delayed" | "processing" | "report" | "dead",
+         "path": キューからの相対パス, "ino": inode, "mtime": UNIX時刻, "task": {...}}
+        {"state": "raw", "path": 相対パス, "data": 内容}       # グループ・重複排除キー
+        {"state": "completed", "task_ids": [...]}              # 完了済みIDインデックス
+        {"state": "dir", "path": 相対パス, "subdirs": [...]}   # 保留タスクのディレクトリ一覧
+                                                               # （チェックポイントのみ）
+
+watermark はスナップショットを取り始めた時刻。読み込む側は、これより後に
+変わった（mtimeが新しい）ディレクトリだけを一覧し直し、変わったファイルだけを
+パースし直せばよい（inodeが同じファイルは再利用できる）。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Iterable
+
+SNAPSHOT_VERSION = 1
+
+# ensemble queue snapshot のデフォルトのファイル名（キューディレクトリ内）
+SNAPSHOT_NAME = "snapshot.ndjson"
+
+
+def write_snapshot(path: Path, header: dict[str, Any], records: Iterable[dict[str, Any]]) -> int:
+    """
+    スナップショットを書き出す（tmp + fsync + rename）
+
+    Args:
+        path: 書き込み先
+        header: ヘッダ（versionは自動で付く）
+        records: レコード
+
+    Returns:
+        書き込んだレコード数
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 複数のワーカーが同時にチェックポイントを書いても衝突しないtmp名にする
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    count = 0
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps({**header, "version": SNAPSHOT_VERSION}, ensure_ascii=False) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+def read_snapshot(path: Path) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    スナップショットを読み込む
+
+    Args:
+        path: スナップショットファイル
+
+    Returns:
+        (ヘッダ, レコードのリスト)
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+        ValueError: スナップショットではない・未対応のバージョンの場合
+    """
+    with open(path) as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            raise ValueError(f"Not a queue snapshot: {path}") from None
+        if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported queue snapshot: {path}")
+
+        records: list[dict[str, Any]] = []
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break  # 書き込み途中の末尾（renameで置き換えるため通常は起きない）
+    return header, records
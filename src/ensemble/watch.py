@@ -0,0 +1,198 @@
+"""
+ディレクトリ変更の待機
+
+Linuxではinotify（ctypes経由、標準ライブラリのみ）でディレクトリへの
+ファイル追加を待ち、それ以外の環境では指数バックオフのポーリングにフォールバックする。
+
+TaskQueue.claim(timeout=...) が「新しいタスクが置かれるまで」待つために使う。
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+# inotifyのイベントマスク（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# inotify_event構造体のヘッダ: int wd; uint32 mask; uint32 cookie; uint32 len;
+_EVENT_HEADER = struct.Struct("iIII")
+
+# ポーリング時のバックオフ（秒）
+BACKOFF_INITIAL = 0.01
+BACKOFF_MAX = 0.5
+
+
+def _load_libc() -> ctypes.CDLL | None:
+    """inotifyが使えるlibcを読み込む（使えない環境ではNone）"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_libc()
+
+
+def backoff_delays(
+    initial: float = BACKOFF_INITIAL, maximum: float = BACKOFF_MAX
+) -> Iterator[float]:
+    """
+    指数バックオフの待機時間を無限に生成する
+
+    Args:
+        initial: 最初の待機時間（秒）
+        maximum: 待機時間の上限（秒）
+    """
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+
+class DirectoryWatcher:
+    """
+    ディレクトリへのファイル追加を待つウォッチャー
+
+    watch対象ディレクトリ直下にサブディレクトリが作られた場合は
+    それも自動的にwatchする（TaskQueueのレーン追加に対応）。
+
+    使い方:
+        with DirectoryWatcher([tasks_dir]) as watcher:
+            while not found():
+                watcher.wait(remaining)
+    """
+
+    def __init__(
+        self,
+        paths: list[Path],
+        recursive_new_dirs: bool = True,
+        mask: int = IN_CREATE | IN_MOVED_TO,
+    ) -> None:
+        """
+        Args:
+            paths: watchするディレクトリ
+            recursive_new_dirs: 新しく作られたサブディレクトリもwatchするか
+            mask: 待つinotifyイベント（デフォルトはファイルの追加のみ。
+                  追記も待つ場合は IN_MODIFY を加える）
+        """
+        self.recursive_new_dirs = recursive_new_dirs
+        self.mask = mask
+        self._fd: int | None = None
+        self._wd_paths: dict[int, Path] = {}
+        self._backoff = backoff_delays()
+
+        if _libc is not None:
+            fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+                for path in paths:
+                    self._add_watch(path)
+
+    @property
+    def uses_inotify(self) -> bool:
+        """inotifyで待機しているか（Falseならポーリング）"""
+        return self._fd is not None
+
+    def fileno(self) -> int | None:
+        """
+        inotifyのfdを返す（ポーリング時はNone）
+
+        イベントループで待つ場合はこのfdの読み込み可能を待ち、drain()を呼ぶ。
+        """
+        return self._fd
+
+    def wait(self, timeout: float) -> bool:
+        """
+        ファイルが追加されるか、タイムアウトするまで待つ
+
+        ポーリング時は変更の有無に関わらずバックオフ分だけ待ってTrueを返す
+        （呼び出し側で再確認する）。
+
+        Args:
+            timeout: 最大待機時間（秒）
+
+        Returns:
+            変更があった（または再確認すべき）場合True、タイムアウト時False
+        """
+        if timeout <= 0:
+            return False
+
+        if self._fd is None:
+            delay = min(next(self._backoff), timeout)
+            time.sleep(delay)
+            return delay < timeout
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        self.drain()
+        return True
+
+    def close(self) -> None:
+        """inotifyのfdを閉じる"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._wd_paths = {}
+
+    def __enter__(self) -> DirectoryWatcher:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _add_watch(self, path: Path) -> None:
+        """ディレクトリをwatch対象に追加する"""
+        assert self._fd is not None
+        wd = _libc.inotify_add_watch(
+            self._fd, os.fsencode(str(path)), self.mask | IN_CREATE | IN_MOVED_TO
+        )
+        if wd >= 0:
+            self._wd_paths[wd] = path
+
+    def drain(self) -> None:
+        """溜まったイベントを読み捨て、新しいサブディレクトリをwatchに加える"""
+        assert self._fd is not None
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+
+                parent = self._wd_paths.get(wd)
+                if (
+                    self.recursive_new_dirs
+                    and parent is not None
+                    and mask & IN_ISDIR
+                    and mask & (IN_CREATE | IN_MOVED_TO)
+                    and name
+                ):
+                    self._add_watch(parent / os.fsdecode(name))
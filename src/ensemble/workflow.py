@@ -12,6 +12,7 @@ from typing import Any
 
 import yaml
 
+from ensemble import codec
 from ensemble.loop_detector import CycleDetector, LoopDetectedError, LoopDetector
 
 
@@ -69,7 +70,7 @@ def parse_review_results(reports_dir: str) -> dict[str, str]:
 
     for report_file in reports_path.glob("*.yaml"):
         try:
-            content = yaml.safe_load(report_file.read_text())
+            content = codec.load_file(report_file)
             if content and isinstance(content, dict) and "result" in content:
                 # ファイル名からレビュー名を抽出（例: arch-review-task-123.yaml → arch-review）
                 filename = report_file.stem  # 拡張子なし
@@ -105,7 +106,7 @@ def merge_findings(reports_dir: str) -> list[dict[str, Any]]:
 
     for report_file in reports_path.glob("*.yaml"):
         try:
-            content = yaml.safe_load(report_file.read_text())
+            content = codec.load_file(report_file)
             if content and isinstance(content, dict):
                 findings = content.get("findings", [])
                 # ファイル名からソース情報を取得
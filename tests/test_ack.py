@@ -7,6 +7,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from ensemble.ack import AckManager
+from ensemble.lock import GroupCommitWriter
 
 
 class TestAckManager:
@@ -93,6 +94,15 @@ class TestAckManager:
         # ISO形式のタイムスタンプを含む
         assert "T" in content  # 簡易チェック
 
+    def test_send_through_group_commit_writer(self, tmp_path: Path) -> None:
+        """GroupCommitWriter経由のACKも書き込まれ、waitで受信できる"""
+        with GroupCommitWriter(window=0.01) as writer:
+            ack_manager = AckManager(ack_dir=tmp_path / "ack", writer=writer)
+            for i in range(5):
+                ack_manager.send(f"task-{i}", "worker")
+
+            assert all(ack_manager.wait(f"task-{i}", timeout=2) for i in range(5))
+
 
 class TestAckManagerEscalation:
     """AckManager の3段階エスカレーション機能のテスト"""
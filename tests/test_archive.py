@@ -0,0 +1,102 @@
+"""レポートアーカイブのテスト"""
+
+from pathlib import Path
+
+from ensemble.archive import AppendOnlyReader, ReportArchive
+
+
+class TestAppendOnlyReader:
+    """AppendOnlyReader のテスト"""
+
+    def test_reads_only_new_lines(self, tmp_path: Path) -> None:
+        """前回以降に追記された行だけを返す"""
+        path = tmp_path / "log"
+        path.write_text("a\nb\n")
+        reader = AppendOnlyReader(path)
+
+        assert reader.read_new() == (False, ["a", "b"])
+
+        with open(path, "a") as f:
+            f.write("c\n")
+        assert reader.read_new() == (False, ["c"])
+        assert reader.read_new() == (False, [])
+
+    def test_partial_line_is_deferred(self, tmp_path: Path) -> None:
+        """書き込み途中の末尾行は改行が来るまで返さない"""
+        path = tmp_path / "log"
+        path.write_text("a\npart")
+        reader = AppendOnlyReader(path)
+
+        assert reader.read_new() == (False, ["a"])
+
+        with open(path, "a") as f:
+            f.write("ial\n")
+        assert reader.read_new() == (False, ["partial"])
+
+    def test_recreated_file_is_reread(self, tmp_path: Path) -> None:
+        """作り直されたファイルは先頭から読み直す"""
+        path = tmp_path / "log"
+        path.write_text("a\nb\n")
+        reader = AppendOnlyReader(path)
+        reader.read_new()
+
+        path.unlink()
+        path.write_text("c\n")
+
+        assert reader.read_new() == (True, ["c"])
+
+    def test_missing_file(self, tmp_path: Path) -> None:
+        """ファイルがなければ空"""
+        assert AppendOnlyReader(tmp_path / "missing").read_new() == (False, [])
+
+
+class TestReportArchive:
+    """ReportArchive のテスト"""
+
+    def test_append_and_get(self, tmp_path: Path) -> None:
+        """追記したレポートをタスクIDで取得できる"""
+        archive = ReportArchive(tmp_path / "archive")
+
+        archive.append(
+            {
+                "t1": {"task_id": "t1", "result": "success", "output": "日本語\n"},
+                "t2": {"task_id": "t2", "result": "error"},
+            }
+        )
+
+        assert archive.get("t1") == {"task_id": "t1", "result": "success", "output": "日本語\n"}
+        assert archive.get("t2")["result"] == "error"
+        assert archive.get("missing") is None
+        assert sorted(archive.task_ids()) == ["t1", "t2"]
+
+    def test_index_shared_between_instances(self, tmp_path: Path) -> None:
+        """別インスタンスが追記したレポートも取得できる"""
+        reader = ReportArchive(tmp_path / "archive")
+        writer = ReportArchive(tmp_path / "archive")
+        assert reader.get("t1") is None
+
+        writer.append({"t1": {"task_id": "t1"}})
+
+        assert reader.get("t1") == {"task_id": "t1"}
+
+    def test_rotates_segments(self, tmp_path: Path) -> None:
+        """上限サイズを超えると次のセグメントに書く"""
+        archive = ReportArchive(tmp_path / "archive", segment_max_bytes=10)
+
+        archive.append({"t1": {"task_id": "t1"}})
+        archive.append({"t2": {"task_id": "t2"}})
+
+        segments = sorted(p.name for p in (tmp_path / "archive").glob("*.ndjson"))
+        assert segments == ["000001.ndjson", "000002.ndjson"]
+        assert archive.get("t1") == {"task_id": "t1"}
+        assert archive.get("t2") == {"task_id": "t2"}
+
+    def test_clear(self, tmp_path: Path) -> None:
+        """clearで全レポートが消える"""
+        archive = ReportArchive(tmp_path / "archive")
+        archive.append({"t1": {"task_id": "t1"}})
+
+        archive.clear()
+
+        assert archive.get("t1") is None
+        assert archive.task_ids() == []
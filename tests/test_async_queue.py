@@ -0,0 +1,152 @@
+"""asyncio向けタスクキューのテスト"""
+
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from ensemble.async_queue import AsyncTaskQueue
+from ensemble.queue import TaskQueue
+from ensemble.queue_sqlite import SQLiteTaskQueue
+
+
+class TestAsyncTaskQueue:
+    """AsyncTaskQueue のテスト"""
+
+    def test_enqueue_claim_complete(self, tmp_path: Path) -> None:
+        """enqueue → claim → complete がawaitで行える"""
+
+        async def scenario() -> dict:
+            async with AsyncTaskQueue(base_dir=tmp_path) as queue:
+                task_id = await queue.enqueue("Fix bug", agent="worker")
+                task = await queue.claim(agent="worker")
+                assert task["task_id"] == task_id
+                await queue.complete(task_id, "success", "done")
+                return await queue.get_report(task_id)
+
+        report = asyncio.run(scenario())
+
+        assert report["result"] == "success"
+
+    def test_claim_returns_none_when_empty(self, tmp_path: Path) -> None:
+        """timeoutなしで空なら即Noneを返す"""
+
+        async def scenario() -> object:
+            async with AsyncTaskQueue(base_dir=tmp_path) as queue:
+                return await queue.claim()
+
+        assert asyncio.run(scenario()) is None
+
+    def test_claim_waits_without_blocking_loop(self, tmp_path: Path) -> None:
+        """claim(timeout)の待機中も他のコルーチンが動き、投入されたタスクで起きる"""
+
+        async def scenario() -> tuple[dict, int]:
+            async with AsyncTaskQueue(base_dir=tmp_path) as queue:
+                ticks = 0
+
+                async def ticker() -> None:
+                    nonlocal ticks
+                    while True:
+                        await asyncio.sleep(0.01)
+                        ticks += 1
+
+                async def producer() -> str:
+                    await asyncio.sleep(0.2)
+                    return await queue.enqueue("late", agent="worker")
+
+                tick_task = asyncio.create_task(ticker())
+                task, task_id = await asyncio.gather(
+                    queue.claim(agent="worker", timeout=5), producer()
+                )
+                tick_task.cancel()
+                assert task["task_id"] == task_id
+                return task, ticks
+
+        started = time.monotonic()
+        _, ticks = asyncio.run(scenario())
+
+        assert time.monotonic() - started < 3
+        assert ticks >= 5
+
+    def test_claim_times_out(self, tmp_path: Path) -> None:
+        """timeoutまでに何も来なければNone"""
+
+        async def scenario() -> object:
+            async with AsyncTaskQueue(base_dir=tmp_path) as queue:
+                return await queue.claim(timeout=0.2)
+
+        started = time.monotonic()
+        assert asyncio.run(scenario()) is None
+        assert 0.15 <= time.monotonic() - started < 2
+
+    def test_many_workers_share_the_queue(self, tmp_path: Path) -> None:
+        """1つのイベントループの多数のワーカーで重複なく処理できる"""
+
+        async def scenario() -> list[str]:
+            async with AsyncTaskQueue(base_dir=tmp_path, max_workers=2) as queue:
+                await queue.enqueue_many(
+                    [{"command": str(i), "agent": "worker"} for i in range(30)]
+                )
+                done: list[str] = []
+
+                async def worker() -> None:
+                    while (task := await queue.claim(agent="worker")) is not None:
+                        await queue.complete(task["task_id"], "success", "")
+                        done.append(task["task_id"])
+
+                await asyncio.gather(*(worker() for _ in range(20)))
+                return done
+
+        done = asyncio.run(scenario())
+
+        assert len(done) == 30
+        assert len(set(done)) == 30
+
+    def test_ready_tasks_follow_completions(self, tmp_path: Path) -> None:
+        """依存先の完了で実行可能になったタスクも返す"""
+
+        async def scenario() -> list[str]:
+            async with AsyncTaskQueue(base_dir=tmp_path) as queue:
+                first = await queue.enqueue("first", agent="a")
+                second = await queue.enqueue_with_dependency(
+                    "second", agent="b", blocked_by=[first]
+                )
+                seen: list[str] = []
+                async for task in queue.ready_tasks(idle_timeout=0.5):
+                    seen.append(task["task_id"])
+                    if task["task_id"] == first:
+                        await queue.claim(agent="a")
+                        await queue.complete(first, "success", "")
+                assert seen == [first, second]
+                return seen
+
+        asyncio.run(scenario())
+
+    def test_wraps_other_backends(self, tmp_path: Path) -> None:
+        """SQLiteバックエンドもラップでき、待機はポーリングになる"""
+
+        async def scenario() -> object:
+            async with AsyncTaskQueue(SQLiteTaskQueue(base_dir=tmp_path)) as queue:
+                task_id = await queue.enqueue("a", agent="worker")
+                task = await queue.claim(timeout=0.5)
+                assert task["task_id"] == task_id
+                return await queue.claim(timeout=0.1)
+
+        assert asyncio.run(scenario()) is None
+
+    def test_wraps_existing_task_queue(self, tmp_path: Path) -> None:
+        """既存のTaskQueueインスタンスを渡せる"""
+        sync_queue = TaskQueue(base_dir=tmp_path)
+        task_id = sync_queue.enqueue("a", agent="worker")
+
+        async def scenario() -> dict:
+            async with AsyncTaskQueue(sync_queue) as queue:
+                return await queue.claim()
+
+        assert asyncio.run(scenario())["task_id"] == task_id
+
+    def test_invalid_max_workers(self, tmp_path: Path) -> None:
+        """max_workersは1以上"""
+        with pytest.raises(ValueError):
+            AsyncTaskQueue(base_dir=tmp_path, max_workers=0)
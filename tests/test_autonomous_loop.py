@@ -15,6 +15,12 @@ from ensemble.autonomous_loop import (
 from ensemble.pipeline import EXIT_ERROR, EXIT_SUCCESS
 
 
+@pytest.fixture(autouse=True)
+def isolate_session_logs(tmp_path, monkeypatch):
+    """Write NDJSON session logs under tmp_path instead of the repository."""
+    monkeypatch.chdir(tmp_path)
+
+
 class TestLoopConfig:
     """Test LoopConfig dataclass."""
 
@@ -57,6 +63,27 @@ class TestLoopConfig:
         with pytest.raises(ValueError, match="task_timeout must be positive"):
             LoopConfig(task_timeout=0)
 
+    def test_queue_backend_must_be_known(self):
+        """Test that queue_backend must be file, sqlite or remote."""
+        assert LoopConfig(queue_backend="sqlite").queue_backend == "sqlite"
+        assert LoopConfig(queue_backend="remote").queue_backend == "remote"
+        with pytest.raises(ValueError, match="queue_backend"):
+            LoopConfig(queue_backend="redis")
+
+    def test_queue_wait_must_not_be_negative(self):
+        """Test that queue_wait cannot be negative."""
+        assert LoopConfig(queue_wait=30).queue_wait == 30
+        with pytest.raises(ValueError, match="queue_wait"):
+            LoopConfig(queue_wait=-1)
+
+    def test_queue_max_attempts_requires_file_backend(self):
+        """Test that retries are only supported by the file queue backend."""
+        assert LoopConfig(queue_max_attempts=3).queue_max_attempts == 3
+        with pytest.raises(ValueError, match="queue_max_attempts"):
+            LoopConfig(queue_max_attempts=0)
+        with pytest.raises(ValueError, match="queue_max_attempts"):
+            LoopConfig(queue_max_attempts=3, queue_backend="sqlite")
+
 
 class TestLoopResult:
     """Test LoopResult dataclass."""
@@ -282,6 +309,46 @@ class TestAutonomousLoopRunner:
         # Should process the queued task and stop when queue is empty
         assert result.status in (LoopStatus.QUEUE_EMPTY, LoopStatus.MAX_ITERATIONS)
 
+    @patch("ensemble.autonomous_loop.subprocess.run")
+    def test_queue_mode_with_remote_backend(self, mock_run, tmp_path):
+        """Test running against a queue server via the remote backend."""
+        from ensemble.queue_server import QueueServer, QueueState
+
+        queue_dir = tmp_path / "queue"
+        server = QueueServer(QueueState(queue_dir), socket_path=queue_dir / "queue.sock")
+        server.start()
+        try:
+            task_id = server.state.enqueue(command="Fix authentication bug", agent="worker")
+            mock_run.return_value = MagicMock(returncode=0, stdout="Done", stderr="")
+
+            config = LoopConfig(max_iterations=5, commit_each=False, queue_backend="remote")
+            runner = AutonomousLoopRunner(work_dir=tmp_path, config=config, use_queue=True)
+            result = runner.run()
+
+            assert result.status == LoopStatus.QUEUE_EMPTY
+            assert result.iterations_completed == 1
+            assert server.state.get_report(task_id)["result"] == "success"
+        finally:
+            server.shutdown()
+
+    @patch("ensemble.autonomous_loop.subprocess.run")
+    def test_queue_mode_schedules_retry_for_failed_task(self, mock_run, tmp_path):
+        """Test that a failed task is delayed for retry instead of reported."""
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=tmp_path / "queue")
+        task_id = queue.enqueue(command="Fix authentication bug", agent="worker")
+        mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="failed")
+
+        config = LoopConfig(max_iterations=5, commit_each=False, queue_max_attempts=3)
+        runner = AutonomousLoopRunner(work_dir=tmp_path, config=config, use_queue=True)
+        result = runner.run()
+
+        assert result.status == LoopStatus.QUEUE_EMPTY
+        assert result.iterations_completed == 1
+        assert queue.get_report(task_id) is None
+        assert len(list((tmp_path / "queue" / "delayed").glob("*/worker/*.yaml"))) == 1
+
     @patch("ensemble.autonomous_loop.subprocess.run")
     def test_queue_empty_stops_loop(self, mock_run, tmp_path):
         """Test that empty queue stops the loop."""
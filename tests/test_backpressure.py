@@ -0,0 +1,54 @@
+"""深さのカウンターとbackpressure設定のテスト"""
+
+from pathlib import Path
+
+from ensemble.backpressure import Backpressure, DepthCounter
+
+
+class TestBackpressure:
+    """Backpressure.overflow() のテスト"""
+
+    def test_no_limits(self) -> None:
+        """上限なしなら何もあふれない"""
+        assert Backpressure().overflow({"a": 100}, {"a": 100}) == {}
+
+    def test_total_and_lane_excess(self) -> None:
+        """キュー全体とレーンの超過数を別々に返す"""
+        policy = Backpressure(max_depth=5, max_lane_depth=3)
+
+        assert policy.overflow({"a": 2, "b": 2}, {"a": 1}) == {}
+        assert policy.overflow({"a": 3, "b": 2}, {"a": 1}) == {"": 1, "a": 1}
+        assert policy.overflow({"a": 1, "b": 3}, {"a": 1, "b": 1}) == {"": 1, "b": 1}
+
+
+class TestDepthCounter:
+    """DepthCounter のテスト"""
+
+    def test_add_and_read(self, tmp_path: Path) -> None:
+        """増減がファイルに保存され、0以下のレーンは消える"""
+        counter = DepthCounter(tmp_path / "depth")
+        counter.add({"a": 2, "b": 1})
+        counter.add({"b": -1, "a": -5})
+        counter.add({"c": 1})
+
+        assert DepthCounter(tmp_path / "depth").read() == {"c": 1}
+
+    def test_missing_or_corrupt_file_is_empty(self, tmp_path: Path) -> None:
+        """ファイルが無い・壊れている場合は空として扱う"""
+        path = tmp_path / "depth"
+        assert DepthCounter(path).read() == {}
+
+        path.write_text("not json")
+        counter = DepthCounter(path)
+        assert counter.read() == {}
+        counter.add({"a": 1})
+        assert counter.read() == {"a": 1}
+
+    def test_reset(self, tmp_path: Path) -> None:
+        """数え直した値で置き換える"""
+        counter = DepthCounter(tmp_path / "depth")
+        counter.add({"a": 4})
+
+        counter.reset({"b": 2, "c": 0})
+
+        assert counter.read() == {"b": 2}
@@ -0,0 +1,94 @@
+"""キューベンチマークのテスト"""
+
+from pathlib import Path
+
+from ensemble.bench import (
+    bench_batch_throughput,
+    bench_codec,
+    bench_contention,
+    bench_ready_tasks,
+    latency_summary,
+)
+
+
+class TestBenchBatchThroughput:
+    """bench_batch_throughput のテスト"""
+
+    def test_reports_each_batch_size(self, tmp_path: Path) -> None:
+        """バッチサイズごとの結果が返ることを確認"""
+        report = bench_batch_throughput(tmp_path, batch_sizes=(1, 10), total=20)
+
+        assert report["backend"] == "file"
+        assert [r["batch_size"] for r in report["results"]] == [1, 10]
+        for result in report["results"]:
+            assert result["claimed"] == 20
+            assert result["enqueue_ops_per_sec"] > 0
+            assert result["claim_ops_per_sec"] > 0
+
+    def test_sqlite_backend(self, tmp_path: Path) -> None:
+        """sqliteバックエンドでも計測できることを確認"""
+        report = bench_batch_throughput(
+            tmp_path, batch_sizes=(5,), total=10, backend="sqlite"
+        )
+
+        assert report["results"][0]["claimed"] == 10
+
+
+class TestBenchCodec:
+    """bench_codec のテスト"""
+
+    def test_reports_each_codec(self) -> None:
+        """pyyaml / yaml / json の計測結果が返ることを確認"""
+        report = bench_codec(iterations=5)
+
+        assert [r["codec"] for r in report["results"]] == ["pyyaml", "yaml", "json"]
+        for result in report["results"]:
+            assert result["dump_us"] > 0
+            assert result["parse_us"] > 0
+
+
+class TestLatencySummary:
+    """latency_summary のテスト"""
+
+    def test_percentiles(self) -> None:
+        """パーセンタイルがミリ秒で返ることを確認"""
+        samples = [i / 1000 for i in range(1, 101)]
+
+        summary = latency_summary(samples, elapsed=2.0)
+
+        assert summary["count"] == 100
+        assert summary["ops_per_sec"] == 50.0
+        assert summary["p50_ms"] == 51.0
+        assert summary["p95_ms"] == 95.0
+        assert summary["p99_ms"] == 99.0
+
+    def test_empty_samples(self) -> None:
+        """サンプルがなくてもエラーにならない"""
+        assert latency_summary([], elapsed=0.0)["count"] == 0
+
+
+class TestBenchContention:
+    """bench_contention のテスト"""
+
+    def test_reports_each_operation(self, tmp_path: Path) -> None:
+        """複数プロセスで全タスクが1回ずつ処理されることを確認"""
+        report = bench_contention(tmp_path, workers=2, ops_per_worker=5)
+
+        operations = report["operations"]
+        assert set(operations) == {"enqueue", "claim", "complete"}
+        assert operations["enqueue"]["count"] == 10
+        assert operations["claim"]["count"] == 10
+        assert operations["complete"]["count"] == 10
+        assert operations["claim"]["p99_ms"] >= operations["claim"]["p50_ms"]
+
+
+class TestBenchReadyTasks:
+    """bench_ready_tasks のテスト"""
+
+    def test_reports_each_size(self, tmp_path: Path) -> None:
+        """キューサイズごとに結果が返ることを確認"""
+        report = bench_ready_tasks(tmp_path, sizes=(4, 8))
+
+        assert [r["tasks"] for r in report["results"]] == [4, 8]
+        # 依存なし半数 + 依存先完了済み1/4
+        assert [r["ready"] for r in report["results"]] == [3, 6]
@@ -194,3 +194,169 @@ class TestLaunchCommand:
                 or "tmux" in output_lower
                 or "claude" in output_lower
             )
+
+
+class TestQueueCommand:
+    """Test queue command."""
+
+    def test_queue_reap_requeues_expired_tasks(self, runner, temp_project):
+        """Test queue reap returns expired tasks to the pending queue."""
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=temp_project / "queue")
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+
+        result = runner.invoke(cli, ["queue", "reap"])
+
+        assert result.exit_code == 0
+        assert f"Requeued {task_id}" in result.output
+        assert queue.list_pending() == [task_id]
+
+    def test_queue_reap_nothing_to_do(self, runner, temp_project):
+        """Test queue reap with an empty queue."""
+        result = runner.invoke(cli, ["queue", "reap"])
+
+        assert result.exit_code == 0
+        assert "Reaped 0 expired task(s)" in result.output
+
+    def test_queue_serve_refuses_tcp_without_token(self, runner, temp_project):
+        """Test queue serve --tcp needs --token or an explicit --insecure."""
+        result = runner.invoke(cli, ["queue", "serve", "--tcp", "127.0.0.1:0"])
+
+        assert result.exit_code != 0
+        assert "--insecure" in result.output
+        assert not (temp_project / "queue").exists()
+
+    def test_queue_archive_moves_reports(self, runner, temp_project):
+        """Test queue archive moves completed reports out of reports/."""
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=temp_project / "queue")
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.complete(task_id, result="success", output="ok")
+
+        result = runner.invoke(cli, ["queue", "archive"])
+
+        assert result.exit_code == 0
+        assert "Archived 1 report(s)" in result.output
+        assert list((temp_project / "queue" / "reports").glob("*.yaml")) == []
+        assert queue.get_report(task_id)["output"] == "ok"
+
+
+    def test_queue_stats_writes_prometheus_file(self, runner, temp_project):
+        """Test queue stats prints histograms and writes the metrics file."""
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=temp_project / "queue")
+        queue.enqueue(command="a", agent="worker")
+        task = queue.claim()
+        queue.complete(task["task_id"], result="success", output="ok")
+        queue.flush_metrics()
+
+        result = runner.invoke(cli, ["queue", "stats"])
+
+        assert result.exit_code == 0
+        assert "Pending: 0" in result.output
+        assert "service_seconds" in result.output
+        assert "limits.max_parallel_workers" in result.output
+        prom = (temp_project / ".ensemble" / "metrics" / "queue.prom").read_text()
+        assert "ensemble_queue_service_seconds_count 1" in prom
+        assert "ensemble_queue_tasks_pending 0" in prom
+
+    def test_queue_stats_no_prom(self, runner, temp_project):
+        """Test queue stats --no-prom skips the metrics file."""
+        from ensemble.queue import TaskQueue
+
+        TaskQueue(base_dir=temp_project / "queue", metrics=False)
+        result = runner.invoke(cli, ["queue", "stats", "--no-prom"])
+
+        assert result.exit_code == 0
+        assert not (temp_project / ".ensemble" / "metrics").exists()
+
+    def test_queue_stats_does_not_modify_queue(self, runner, temp_project):
+        """Test queue stats and snapshot leave the queue directory untouched."""
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=temp_project / "queue", metrics=False)
+        queue.enqueue(command="a", agent="worker")
+        (temp_project / "queue" / "depth").unlink()
+        before = sorted(p.relative_to(temp_project) for p in temp_project.rglob("*"))
+
+        assert runner.invoke(cli, ["queue", "stats", "--no-prom"]).exit_code == 0
+        assert runner.invoke(cli, ["queue", "snapshot", "-o", "backup.ndjson"]).exit_code == 0
+
+        after = sorted(
+            p.relative_to(temp_project)
+            for p in temp_project.rglob("*")
+            if p.name != "backup.ndjson"
+        )
+        assert after == before
+
+    def test_queue_stats_rejects_missing_queue(self, runner, temp_project):
+        """Test queue stats fails on a missing queue without creating it."""
+        result = runner.invoke(cli, ["queue", "stats", "--no-prom", "--queue-dir", "nope"])
+
+        assert result.exit_code != 0
+        assert "Not a task queue" in result.output
+        assert not (temp_project / "nope").exists()
+
+    def test_queue_snapshot_and_restore(self, runner, temp_project):
+        """Test queue snapshot writes a file that restore can rebuild a queue from."""
+        import shutil
+
+        from ensemble.queue import TaskQueue
+
+        queue = TaskQueue(base_dir=temp_project / "queue")
+        task_id = queue.enqueue(command="a", agent="worker")
+
+        result = runner.invoke(cli, ["queue", "snapshot", "-o", "backup.ndjson"])
+        assert result.exit_code == 0
+        assert "Wrote 2 record(s) to backup.ndjson" in result.output
+
+        shutil.rmtree(temp_project / "queue")
+        result = runner.invoke(cli, ["queue", "restore", "backup.ndjson"])
+
+        assert result.exit_code == 0
+        assert "Restored 1 pending record(s)" in result.output
+        assert TaskQueue(base_dir=temp_project / "queue").list_pending() == [task_id]
+
+    def test_queue_restore_rejects_non_snapshot(self, runner, temp_project):
+        """Test queue restore fails cleanly on a file that is not a snapshot."""
+        (temp_project / "bogus.ndjson").write_text("not a snapshot\n")
+
+        result = runner.invoke(cli, ["queue", "restore", "bogus.ndjson"])
+
+        assert result.exit_code != 0
+        assert "Not a queue snapshot" in result.output
+
+
+class TestBenchCommand:
+    """Test bench command."""
+
+    def test_bench_queue_writes_json(self, runner, temp_project):
+        """Test bench queue writes a JSON report."""
+        import json
+
+        result = runner.invoke(
+            cli,
+            [
+                "bench",
+                "queue",
+                "--backend",
+                "file",
+                "--workers",
+                "1",
+                "--ops",
+                "3",
+                "--ready-size",
+                "4",
+                "-o",
+                "bench.json",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        report = json.loads((temp_project / "bench.json").read_text())
+        assert list(report["backends"]) == ["file"]
+        assert report["backends"]["file"]["contention"]["operations"]["claim"]["count"] == 3
@@ -0,0 +1,74 @@
+"""シリアライズcodecのテスト"""
+
+from pathlib import Path
+
+import pytest
+import yaml
+
+from ensemble import codec
+
+
+class TestCodec:
+    """codec のテスト"""
+
+    def test_yaml_round_trip(self) -> None:
+        """YAMLで書いて読み戻せることを確認"""
+        data = {"task_id": "t1", "params": {"path": "src/日本語.py"}, "blocked_by": []}
+
+        text = codec.dumps(data)
+
+        assert "task_id: t1" in text
+        assert "日本語" in text
+        assert codec.loads(text) == data
+
+    def test_yaml_matches_pyyaml_output(self) -> None:
+        """既存ファイルと同じYAMLを出力することを確認"""
+        data = {"b": 1, "a": {"c": [1, 2]}, "s": "multi\nline"}
+
+        assert codec.dumps(data) == yaml.dump(
+            data, allow_unicode=True, default_flow_style=False
+        )
+
+    def test_json_round_trip(self) -> None:
+        """JSON形式で書いて読み戻せることを確認"""
+        data = {"task_id": "t1", "output": "ok\n", "params": {"n": 1}}
+
+        text = codec.dumps(data, "json")
+
+        assert text.startswith("{")
+        assert codec.loads(text) == data
+
+    def test_json_is_readable_as_yaml(self) -> None:
+        """JSON形式のファイルも既存のYAMLリーダーで読める"""
+        data = {"task_id": "t1", "command": "fix: lint", "params": {}}
+
+        assert yaml.safe_load(codec.dumps(data, "json")) == data
+
+    def test_sort_keys_false_keeps_order(self) -> None:
+        """sort_keys=Falseでキー順を保つ"""
+        text = codec.dumps({"b": 1, "a": 2}, sort_keys=False)
+
+        assert text.index("b:") < text.index("a:")
+
+    def test_yaml_flow_mapping_is_parsed(self) -> None:
+        """JSONとして不正な'{'始まりのYAMLもYAMLとして読む"""
+        assert codec.loads("{a: 1, b: [x, y]}") == {"a": 1, "b": ["x", "y"]}
+
+    def test_load_file(self, tmp_path: Path) -> None:
+        """load_fileでファイルを読み込めることを確認"""
+        path = tmp_path / "task.yaml"
+        path.write_text(codec.dumps({"task_id": "t1"}, "json"))
+
+        assert codec.load_file(path) == {"task_id": "t1"}
+
+    def test_empty_file_is_none(self, tmp_path: Path) -> None:
+        """空ファイルはNoneを返す"""
+        path = tmp_path / "empty.yaml"
+        path.write_text("")
+
+        assert codec.load_file(path) is None
+
+    def test_unknown_format_raises(self) -> None:
+        """未知の形式はValueError"""
+        with pytest.raises(ValueError):
+            codec.dumps({}, "msgpack")
@@ -15,9 +15,15 @@ from ensemble.config import (
     resolve_workflow_path,
     _deep_merge,
     ensure_global_config,
+    get_durability,
+    reset_config_cache,
     _write_default_config,
+    configure_lock_stats,
+    lock_stats_enabled,
     DEFAULT_CONFIG,
 )
+from ensemble.lock import disable_lock_stats
+from ensemble.logger import NDJSONLogger
 
 
 class TestConfigPaths:
@@ -129,6 +135,107 @@ class TestLoadConfig:
                     assert config["session"]["attach"] is False
 
 
+class TestGetDurability:
+    """Test get_durability function."""
+
+    def test_defaults_to_rename(self):
+        """Test that every subsystem defaults to rename."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch("ensemble.config.get_global_config_dir", return_value=Path(tmpdir)):
+                with patch.object(Path, "cwd", return_value=Path(tmpdir)):
+                    assert get_durability("queue") == "rename"
+                    assert get_durability("dashboard") == "rename"
+                    assert get_durability("unknown") == "rename"
+
+    def test_per_subsystem_levels(self):
+        """Test that each subsystem reads its own level from config."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_dir = Path(tmpdir) / ".ensemble"
+            local_dir.mkdir()
+            (local_dir / "config.yaml").write_text(
+                "durability:\n  queue: fsync\n  dashboard: none\n"
+            )
+
+            with patch("ensemble.config.get_global_config_dir", return_value=Path(tmpdir)):
+                with patch.object(Path, "cwd", return_value=Path(tmpdir)):
+                    assert get_durability("queue") == "fsync"
+                    assert get_durability("dashboard") == "none"
+                    assert get_durability("ack") == "rename"
+
+    def test_config_is_parsed_once(self):
+        """Test that repeated lookups reuse the parsed config until reset."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_dir = Path(tmpdir) / ".ensemble"
+            local_dir.mkdir()
+            config_file = local_dir / "config.yaml"
+            config_file.write_text("durability:\n  queue: fsync\n")
+
+            with patch("ensemble.config.get_global_config_dir", return_value=Path(tmpdir)):
+                with patch.object(Path, "cwd", return_value=Path(tmpdir)):
+                    with patch("ensemble.config.load_config", wraps=load_config) as loader:
+                        assert get_durability("queue") == "fsync"
+                        assert get_durability("dashboard") == "rename"
+                        assert loader.call_count == 1
+
+                    config_file.write_text("durability:\n  queue: none\n")
+                    assert get_durability("queue") == "fsync"
+                    reset_config_cache()
+                    assert get_durability("queue") == "none"
+
+    def test_invalid_level_raises(self):
+        """Test that an unknown level in config raises ValueError."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_dir = Path(tmpdir) / ".ensemble"
+            local_dir.mkdir()
+            (local_dir / "config.yaml").write_text("durability:\n  queue: always\n")
+
+            with patch("ensemble.config.get_global_config_dir", return_value=Path(tmpdir)):
+                with patch.object(Path, "cwd", return_value=Path(tmpdir)):
+                    with pytest.raises(ValueError):
+                        get_durability("queue")
+
+
+class TestLockStatsSwitch:
+    """Test the lock_stats opt-in switch."""
+
+    def test_off_by_default(self, tmp_path, monkeypatch):
+        """Test that lock statistics stay off without config or env."""
+        monkeypatch.delenv("ENSEMBLE_LOCK_STATS", raising=False)
+        with patch("ensemble.config.get_global_config_dir", return_value=tmp_path):
+            with patch.object(Path, "cwd", return_value=tmp_path):
+                assert lock_stats_enabled() is False
+                assert configure_lock_stats() is None
+
+    def test_config_key_and_env_override(self, tmp_path, monkeypatch):
+        """Test that the config key turns stats on and the env var overrides it."""
+        monkeypatch.delenv("ENSEMBLE_LOCK_STATS", raising=False)
+        local_dir = tmp_path / ".ensemble"
+        local_dir.mkdir()
+        (local_dir / "config.yaml").write_text("lock_stats: true\n")
+
+        with patch("ensemble.config.get_global_config_dir", return_value=tmp_path):
+            with patch.object(Path, "cwd", return_value=tmp_path):
+                assert lock_stats_enabled() is True
+                monkeypatch.setenv("ENSEMBLE_LOCK_STATS", "0")
+                assert lock_stats_enabled() is False
+
+    def test_aggregates_are_logged(self, tmp_path, monkeypatch):
+        """Test that enabled stats are written to the session log when flushed."""
+        from ensemble.lock import atomic_write_with_lock
+
+        monkeypatch.setenv("ENSEMBLE_LOCK_STATS", "1")
+        logger = NDJSONLogger(log_dir=tmp_path / "logs", session_id="s")
+        try:
+            stats = configure_lock_stats(logger=logger)
+            assert stats is not None
+            atomic_write_with_lock(str(tmp_path / "queue" / "task.yaml"), "x")
+        finally:
+            disable_lock_stats()
+
+        events = logger.read_events(NDJSONLogger.LOCK_STATS)
+        assert sum(c["calls"] for c in events[0]["data"]["classes"].values()) == 1
+
+
 class TestEnsureGlobalConfig:
     """Test ensure_global_config function."""
 
@@ -8,6 +8,7 @@ from unittest.mock import Mock, patch
 import pytest
 
 from ensemble.dashboard import DashboardUpdater
+from ensemble.lock import GroupCommitWriter
 
 
 class TestDashboardUpdater:
@@ -101,9 +102,11 @@ class TestDashboardUpdater:
         assert "idle" in content.lower() or "ready" in content.lower()
 
     def test_update_mode_script_not_found(
-        self, tmp_path: Path
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
     ) -> None:
         """update-mode.shが見つからない場合もエラーにならない"""
+        # テンプレート版のスクリプトはカレントディレクトリの .ensemble/status/ に書く
+        monkeypatch.chdir(tmp_path)
         updater = DashboardUpdater(status_dir=tmp_path)
         # Should not raise an error
         updater.update_mode(mode="A", status="active", workers=2)
@@ -212,3 +215,26 @@ class TestDashboardUpdater:
         assert "active" in content
         assert "worker-2" in content
         assert "idle" in content
+
+    def test_group_commit_writer_coalesces_updates(self, tmp_path: Path) -> None:
+        """GroupCommitWriter経由の連続した更新は最後の状態だけが書かれる"""
+        with GroupCommitWriter(window=10) as writer:
+            updater = DashboardUpdater(status_dir=tmp_path, writer=writer)
+            for i in range(20):
+                updater.set_progress(completed=i, total=20)
+
+            writer.flush()
+
+            assert "19/20" in (tmp_path / "dashboard.md").read_text()
+            assert writer.requested == 21
+            assert writer.committed == 1
+
+    def test_durability_none_overwrites_in_place(self, tmp_path: Path) -> None:
+        """durability="none" ではtmp + renameせずにダッシュボードを上書きする"""
+        updater = DashboardUpdater(status_dir=tmp_path, durability="none")
+        inode = (tmp_path / "dashboard.md").stat().st_ino
+
+        updater.set_progress(completed=1, total=2)
+
+        assert (tmp_path / "dashboard.md").stat().st_ino == inode
+        assert "1/2" in (tmp_path / "dashboard.md").read_text()
@@ -111,6 +111,19 @@ class TestDependencyResolver:
         assert len(newly_ready) == 1
         assert newly_ready[0]["id"] == "task-002"
 
+    def test_mark_completed_many(self) -> None:
+        """まとめて完了マークしたタスクの依存先が解放される"""
+        tasks = [
+            {"id": "task-001", "command": "test 1"},
+            {"id": "task-002", "command": "test 2"},
+            {"id": "task-003", "command": "test 3", "blocked_by": ["task-001", "task-002"]},
+        ]
+        resolver = DependencyResolver(tasks)
+
+        resolver.mark_completed_many(["task-001", "task-002"])
+
+        assert [t["id"] for t in resolver.get_ready_tasks()] == ["task-003"]
+
     def test_circular_dependency_detection(self) -> None:
         """task-001→task-002→task-001の循環検知"""
         tasks = [
@@ -229,8 +242,8 @@ class TestQueueWithDependency:
         )
 
         # タスクファイルが作成されていることを確認
-        task_file_1 = queue.tasks_dir / f"{task_id_1}.yaml"
-        task_file_2 = queue.tasks_dir / f"{task_id_2}.yaml"
+        task_file_1 = queue.tasks_dir / "test-agent-1" / f"p1_{task_id_1}.yaml"
+        task_file_2 = queue.tasks_dir / "test-agent-2" / f"p1_{task_id_2}.yaml"
         assert task_file_1.exists()
         assert task_file_2.exists()
 
@@ -0,0 +1,114 @@
+"""投入順インデックスのテスト"""
+
+from pathlib import Path
+
+import ensemble.fifo as fifo
+from ensemble.fifo import LaneLog, TaskSequence, append_entries
+
+
+class TestTaskSequence:
+    """TaskSequence のテスト"""
+
+    def test_ids_are_strictly_increasing(self, tmp_path: Path) -> None:
+        """払い出したIDは辞書順に厳密に増加する"""
+        sequence = TaskSequence(tmp_path / "sequence")
+
+        ids = [sequence.reserve()[0] for _ in range(50)] + sequence.reserve(50)
+
+        assert ids == sorted(ids)
+        assert len(set(ids)) == 100
+        assert ids[0].endswith("-0000000001")
+
+    def test_shared_between_instances(self, tmp_path: Path) -> None:
+        """同じファイルを使う別インスタンス（別プロセス）とも連番を共有する"""
+        a = TaskSequence(tmp_path / "sequence")
+        b = TaskSequence(tmp_path / "sequence")
+
+        first = a.reserve()[0]
+        second = b.reserve()[0]
+
+        assert first < second
+        assert second.endswith("-0000000002")
+
+    def test_timestamp_never_goes_backwards(self, tmp_path: Path) -> None:
+        """時計が戻ってもタイムスタンプは前回以上になる"""
+        path = tmp_path / "sequence"
+        path.write_text("29991231235959 7\n")
+
+        task_id = TaskSequence(path).reserve()[0]
+
+        assert task_id == "29991231235959-0000000008"
+
+
+class TestLaneLog:
+    """LaneLog のテスト"""
+
+    def test_reads_entries_in_append_order(self, tmp_path: Path) -> None:
+        """追記順にエントリを返す"""
+        append_entries(tmp_path, 1, ["p1_b.yaml", "p1_a.yaml"])
+        log = LaneLog(tmp_path, 1)
+
+        assert log.pop() == "p1_b.yaml"
+        assert log.pop() == "p1_a.yaml"
+        assert log.pop() is None
+
+    def test_cursor_is_persisted(self, tmp_path: Path) -> None:
+        """commitしたカーソル位置から次のインスタンスが読み始める"""
+        append_entries(tmp_path, 1, ["p1_a.yaml", "p1_b.yaml"])
+        log = LaneLog(tmp_path, 1)
+        log.pop()
+        log.commit()
+
+        assert LaneLog(tmp_path, 1).peek() == "p1_b.yaml"
+
+    def test_uncommitted_pop_is_not_persisted(self, tmp_path: Path) -> None:
+        """commitしなければカーソルは進まない"""
+        append_entries(tmp_path, 1, ["p1_a.yaml"])
+        LaneLog(tmp_path, 1).pop()
+
+        assert LaneLog(tmp_path, 1).peek() == "p1_a.yaml"
+
+    def test_reads_beyond_one_chunk(self, tmp_path: Path, monkeypatch) -> None:
+        """チャンクを超える長さのログも続きを読む"""
+        monkeypatch.setattr(fifo, "READ_CHUNK", 32)
+        names = [f"p1_{i:04d}.yaml" for i in range(20)]
+        append_entries(tmp_path, 1, names)
+        log = LaneLog(tmp_path, 1)
+
+        assert [log.pop() for _ in range(20)] == names
+
+    def test_backlog_estimate(self, tmp_path: Path) -> None:
+        """残りエントリ数を概算する"""
+        append_entries(tmp_path, 1, [f"p1_{i:04d}.yaml" for i in range(10)])
+        log = LaneLog(tmp_path, 1)
+        log.pop()
+
+        assert log.backlog() == 9
+        assert LaneLog(tmp_path, 2).backlog() == 0
+
+    def test_compacts_fully_read_log(self, tmp_path: Path, monkeypatch) -> None:
+        """読み終えたログは空に作り直され、その後の追記も読める"""
+        monkeypatch.setattr(fifo, "COMPACT_BYTES", 10)
+        append_entries(tmp_path, 1, ["p1_a.yaml", "p1_b.yaml"])
+        log = LaneLog(tmp_path, 1)
+        log.pop()
+        log.pop()
+        log.commit()
+
+        assert (tmp_path / ".p1.log").stat().st_size == 0
+
+        append_entries(tmp_path, 1, ["p1_c.yaml"])
+        assert LaneLog(tmp_path, 1).pop() == "p1_c.yaml"
+
+    def test_recreated_log_resets_cursor(self, tmp_path: Path) -> None:
+        """ログが作り直された（inodeが変わった）ら先頭から読む"""
+        append_entries(tmp_path, 1, ["p1_a.yaml", "p1_b.yaml"])
+        log = LaneLog(tmp_path, 1)
+        log.pop()
+        log.commit()
+
+        replacement = tmp_path / "replacement"
+        replacement.write_text("p1_c.yaml\n")
+        replacement.rename(tmp_path / ".p1.log")
+
+        assert LaneLog(tmp_path, 1).peek() == "p1_c.yaml"
@@ -1,15 +1,34 @@
 """アトミックロック機構のテスト"""
 
+import fcntl
+import gc
+import json
 import os
 import tempfile
 import threading
 import time
+import weakref
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
-from ensemble.lock import atomic_claim, atomic_write, atomic_write_with_lock
+from ensemble.lock import (
+    GroupCommitWriter,
+    acquire_flock,
+    atomic_claim,
+    atomic_write,
+    atomic_write_batch_with_lock,
+    atomic_write_with_lock,
+    disable_lock_stats,
+    enable_lock_stats,
+    exclusive_lock,
+    lock_file_for,
+    lock_path_class,
+    release_flock,
+    shared_lock,
+)
+from ensemble.logger import NDJSONLogger
 
 
 class TestAtomicWrite:
@@ -83,6 +102,86 @@ class TestAtomicWrite:
         assert filepath.read_text() == content
 
 
+class TestAtomicWriteDurability:
+    """atomic_write の耐久性レベルのテスト"""
+
+    def _count_fsyncs(self, monkeypatch: pytest.MonkeyPatch) -> list[bool]:
+        """os.fsyncの呼び出しを記録する（ディレクトリに対する呼び出しならTrue）"""
+        calls: list[bool] = []
+        real_fsync = os.fsync
+
+        def fsync(fd: int) -> None:
+            calls.append(os.path.isdir(f"/proc/self/fd/{fd}"))
+            real_fsync(fd)
+
+        monkeypatch.setattr(os, "fsync", fsync)
+        return calls
+
+    def test_none_overwrites_in_place(self, tmp_path: Path) -> None:
+        """noneはtmpを作らず同じinodeを上書きする"""
+        filepath = tmp_path / "scratch.txt"
+        filepath.write_text("old content that is longer")
+        inode = filepath.stat().st_ino
+
+        assert atomic_write(str(filepath), "new", durability="none") is True
+
+        assert filepath.read_text() == "new"
+        assert filepath.stat().st_ino == inode
+        assert list(tmp_path.glob("[!.]*")) == [filepath]
+
+    def test_rename_replaces_file_without_fsync(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """rename（デフォルト）は別inodeに置き換え、fsyncしない"""
+        calls = self._count_fsyncs(monkeypatch)
+        filepath = tmp_path / "state.txt"
+        filepath.write_text("old")
+        inode = filepath.stat().st_ino
+
+        assert atomic_write(str(filepath), "new") is True
+
+        assert filepath.read_text() == "new"
+        assert filepath.stat().st_ino != inode
+        assert calls == []
+
+    def test_fsync_syncs_file_and_directory(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """fsyncはファイルと親ディレクトリをfsyncする"""
+        calls = self._count_fsyncs(monkeypatch)
+        filepath = tmp_path / "durable.txt"
+
+        assert atomic_write(str(filepath), "content", durability="fsync") is True
+        assert atomic_write_with_lock(str(filepath), "again", durability="fsync") is True
+
+        assert filepath.read_text() == "again"
+        assert calls == [False, True, False, True]
+
+    def test_batch_syncs_each_directory_once(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """バッチではディレクトリのfsyncがディレクトリごとに1回になる"""
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        files = {str(tmp_path / d / f"f{i}.txt"): str(i) for d in "ab" for i in range(3)}
+        calls = self._count_fsyncs(monkeypatch)
+
+        result = atomic_write_batch_with_lock(
+            files, str(tmp_path / ".batch.lock"), durability="fsync"
+        )
+
+        assert result is True
+        assert calls.count(False) == 6
+        assert calls.count(True) == 2
+
+    def test_unknown_level_raises(self, tmp_path: Path) -> None:
+        """未知のレベルはValueError"""
+        with pytest.raises(ValueError):
+            atomic_write(str(tmp_path / "f.txt"), "content", durability="paranoid")
+        with pytest.raises(ValueError):
+            GroupCommitWriter(durability="paranoid")
+
+
 class TestAtomicClaim:
     """atomic_claim のテスト"""
 
@@ -210,25 +309,25 @@ class TestAtomicWriteWithLock:
         content = filepath.read_text()
         assert content.startswith("Thread ")
 
-    def test_atomic_write_with_lock_creates_and_removes_lockfile(
+    def test_atomic_write_with_lock_keeps_persistent_lockfile(
         self, tmp_path: Path
     ) -> None:
-        """ロックファイルの作成・削除確認"""
+        """ロックファイルは書き込み後も残り、次の書き込みで再利用される"""
         filepath = tmp_path / "locktest.txt"
-        lock_filepath = Path(str(filepath) + ".lock")
-        content = "Lock test content"
+        lock_filepath = Path(lock_file_for(str(filepath)))
 
         # 書き込み前はロックファイルが存在しない
         assert not lock_filepath.exists()
 
-        result = atomic_write_with_lock(str(filepath), content)
+        assert atomic_write_with_lock(str(filepath), "first") is True
+        inode = lock_filepath.stat().st_ino
+        assert atomic_write_with_lock(str(filepath), "second") is True
 
-        # 書き込み成功
-        assert result is True
-        assert filepath.exists()
-
-        # 書き込み後はロックファイルが削除されている
-        assert not lock_filepath.exists()
+        # 同じロックファイルが残り続け、ディレクトリあたりの数は上限内
+        assert filepath.read_text() == "second"
+        assert lock_filepath.stat().st_ino == inode
+        assert lock_filepath.parent == tmp_path
+        assert not Path(str(filepath) + ".lock").exists()
 
     def test_atomic_write_with_lock_nonexistent_dir(self) -> None:
         """存在しないディレクトリへの書き込みがFalseを返す"""
@@ -315,6 +414,369 @@ class TestAtomicWriteWithLock:
         assert filepath.read_text() == content
 
 
+class TestAcquireFlock:
+    """acquire_flock のテスト"""
+
+    def test_uncontended_does_not_wait(self, tmp_path: Path) -> None:
+        """競合がなければ待ち時間0で取得する"""
+        fd, waited = acquire_flock(str(tmp_path / "a.lock"))
+        release_flock(fd)
+
+        assert waited == 0.0
+
+    def test_acquires_as_soon_as_released(self, tmp_path: Path) -> None:
+        """保持者が解放した直後に取得し、待った時間を返す"""
+        lock_path = str(tmp_path / "a.lock")
+        holder, _ = acquire_flock(lock_path)
+        timer = threading.Timer(0.3, release_flock, args=(holder,))
+        timer.start()
+
+        started = time.monotonic()
+        fd, waited = acquire_flock(lock_path, timeout=5)
+        elapsed = time.monotonic() - started
+        release_flock(fd)
+        timer.join()
+
+        assert 0.25 <= waited <= elapsed
+        # ポーリング間隔（旧実装は100ms）を待たずに取得する
+        assert elapsed < 0.3 + 0.08
+
+    def test_timeout(self, tmp_path: Path) -> None:
+        """期限までに取れなければTimeoutError"""
+        lock_path = str(tmp_path / "a.lock")
+        holder, _ = acquire_flock(lock_path)
+        try:
+            started = time.monotonic()
+            with pytest.raises(TimeoutError):
+                acquire_flock(lock_path, timeout=0.2)
+            assert 0.15 <= time.monotonic() - started < 1
+        finally:
+            release_flock(holder)
+
+    def test_abandoned_wait_does_not_keep_lock(self, tmp_path: Path) -> None:
+        """期限切れで諦めた待機が後から取ったロックは手放される"""
+        lock_path = str(tmp_path / "a.lock")
+        holder, _ = acquire_flock(lock_path)
+        with pytest.raises(TimeoutError):
+            acquire_flock(lock_path, timeout=0.05)
+        release_flock(holder)
+
+        fd, _ = acquire_flock(lock_path, timeout=2)
+        release_flock(fd)
+
+    def test_repeated_timeouts_reuse_one_waiter(self, tmp_path: Path) -> None:
+        """期限切れが続いても待機スレッドは増えない（次の呼び出しが引き継ぐ）"""
+        lock_path = str(tmp_path / "a.lock")
+        holder, _ = acquire_flock(lock_path)
+        before = sum(t.name == "ensemble-flock" for t in threading.enumerate())
+        try:
+            for _ in range(5):
+                with pytest.raises(TimeoutError):
+                    acquire_flock(lock_path, timeout=0.02)
+            waiters = sum(t.name == "ensemble-flock" for t in threading.enumerate())
+            assert waiters - before == 1
+        finally:
+            release_flock(holder)
+
+        fd, _ = acquire_flock(lock_path, timeout=2)
+        release_flock(fd)
+
+    def test_polls_when_waiters_are_exhausted(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """待機スレッドの上限に達したら非ブロッキングのflockをポーリングして待つ"""
+        monkeypatch.setattr("ensemble.lock.MAX_FLOCK_WAITERS", 0)
+        lock_path = str(tmp_path / "a.lock")
+        holder, _ = acquire_flock(lock_path)
+        with pytest.raises(TimeoutError):
+            acquire_flock(lock_path, timeout=0.05)
+        timer = threading.Timer(0.1, release_flock, args=(holder,))
+        timer.start()
+
+        fd, waited = acquire_flock(lock_path, timeout=2)
+        release_flock(fd)
+        timer.join()
+
+        assert 0.05 <= waited < 1
+
+    def test_shared_locks_do_not_block_each_other(self, tmp_path: Path) -> None:
+        """LOCK_SH同士は同時に取得できる"""
+        lock_path = str(tmp_path / "a.lock")
+        first, _ = acquire_flock(lock_path, fcntl.LOCK_SH)
+        second, waited = acquire_flock(lock_path, fcntl.LOCK_SH, timeout=0)
+        release_flock(first)
+        release_flock(second)
+
+        assert waited == 0.0
+
+
+class TestGroupCommitWriter:
+    """GroupCommitWriter のテスト"""
+
+    def test_coalesces_writes_to_same_path(self, tmp_path: Path) -> None:
+        """時間窓内の同じパスへの書き込みは最後の1回だけ書かれる"""
+        filepath = str(tmp_path / "status.md")
+        with GroupCommitWriter(window=0.2) as writer:
+            futures = [writer.write(filepath, f"update {i}") for i in range(100)]
+
+            assert all(future.result(timeout=5) for future in futures)
+            assert Path(filepath).read_text() == "update 99"
+            assert writer.requested == 100
+            assert writer.committed == 1
+
+    def test_batch_writes_every_path(self, tmp_path: Path) -> None:
+        """別々のパスはそれぞれ書かれる"""
+        with GroupCommitWriter(window=0.01) as writer:
+            futures = [writer.write(str(tmp_path / f"f{i}"), str(i)) for i in range(10)]
+            for future in futures:
+                future.result(timeout=5)
+
+        assert sorted(p.read_text() for p in tmp_path.iterdir()) == sorted(map(str, range(10)))
+
+    def test_write_is_deferred_until_window(self, tmp_path: Path) -> None:
+        """書き込みは時間窓の後に行われ、flush()で即座に書ける"""
+        filepath = tmp_path / "status.md"
+        writer = GroupCommitWriter(window=0.5)
+        try:
+            future = writer.write(str(filepath), "content")
+            time.sleep(0.05)
+            assert not filepath.exists()
+
+            writer.flush()
+
+            assert future.result(timeout=0) is True
+            assert filepath.read_text() == "content"
+        finally:
+            writer.close()
+
+    def test_close_flushes_pending(self, tmp_path: Path) -> None:
+        """close()で予約済みの書き込みが書かれ、以後は書き込めない"""
+        filepath = tmp_path / "status.md"
+        writer = GroupCommitWriter(window=10)
+        writer.write(str(filepath), "content")
+
+        start = time.monotonic()
+        writer.close()
+
+        assert time.monotonic() - start < 1
+        assert filepath.read_text() == "content"
+        with pytest.raises(RuntimeError):
+            writer.write(str(filepath), "late")
+
+    def test_failed_write_reports_false(self, tmp_path: Path) -> None:
+        """書き込めない場合はFutureの結果がFalse"""
+        with GroupCommitWriter(window=0) as writer:
+            future = writer.write(str(tmp_path / "missing" / "f"), "content")
+
+            assert future.result(timeout=5) is False
+
+    def test_unclosed_writer_is_collected_and_flushed(self, tmp_path: Path) -> None:
+        """close()し忘れたライターも回収され、回収時に予約済みの書き込みが書かれる"""
+        filepath = tmp_path / "status.md"
+        writer = GroupCommitWriter(window=10)
+        future = writer.write(str(filepath), "content")
+        ref = weakref.ref(writer)
+
+        del writer
+        gc.collect()
+
+        assert ref() is None
+        assert future.result(timeout=5) is True
+        assert filepath.read_text() == "content"
+
+
+class TestReaderWriterLock:
+    """shared_lock / exclusive_lock のテスト"""
+
+    def test_readers_share_the_lock(self, tmp_path: Path) -> None:
+        """複数の読み手は同時にロックを持てる"""
+        filepath = str(tmp_path / "report.yaml")
+
+        with shared_lock(filepath):
+            with shared_lock(filepath, timeout=0.1):
+                pass
+
+    def test_writer_excludes_readers(self, tmp_path: Path) -> None:
+        """書き手がロックを持つ間、読み手は取得できない"""
+        filepath = str(tmp_path / "report.yaml")
+
+        with exclusive_lock(filepath):
+            with pytest.raises(TimeoutError):
+                with shared_lock(filepath, timeout=0.1):
+                    pass
+
+        with shared_lock(filepath, timeout=0.1):
+            pass
+
+    def test_reader_blocks_locked_write(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """読み手がロックを持つ間、atomic_write_with_lockは書き込めない"""
+        filepath = tmp_path / "report.yaml"
+        filepath.write_text("old")
+        monkeypatch.setattr("ensemble.lock.time.sleep", lambda seconds: None)
+
+        with shared_lock(str(filepath)):
+            assert atomic_write_with_lock(str(filepath), "new", timeout=0.05) is False
+        assert filepath.read_text() == "old"
+
+        assert atomic_write_with_lock(str(filepath), "new") is True
+        assert filepath.read_text() == "new"
+
+    def test_in_place_write_waits_for_readers(self, tmp_path: Path) -> None:
+        """durability="none" の上書きは読み手が読み終わるまで待つ"""
+        filepath = tmp_path / "scratch.txt"
+        filepath.write_text("old")
+        done = threading.Event()
+
+        def writer() -> None:
+            atomic_write(str(filepath), "new", durability="none")
+            done.set()
+
+        with shared_lock(str(filepath)):
+            thread = threading.Thread(target=writer)
+            thread.start()
+            assert not done.wait(0.2)
+            assert filepath.read_text() == "old"
+        thread.join()
+
+        assert filepath.read_text() == "new"
+
+    def test_lock_files_are_bounded_per_directory(self, tmp_path: Path) -> None:
+        """ロックファイルはディレクトリごとに上限個数までしか増えない"""
+        for i in range(100):
+            assert atomic_write_with_lock(str(tmp_path / f"t{i}.yaml"), str(i)) is True
+
+        lock_files = list(tmp_path.glob(".rwlock-*"))
+        assert 1 < len(lock_files) <= 16
+        assert len(list(tmp_path.glob("*.yaml"))) == 100
+
+
+class TestLockStats:
+    """ロック競合の統計のテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _disable_after(self):
+        yield
+        disable_lock_stats()
+
+    def test_path_classes(self) -> None:
+        """パスからqueue / report / dashboard / otherを判定する"""
+        assert lock_path_class("queue/reports/t1.yaml") == "report"
+        assert lock_path_class("queue/tasks/worker/p1_t1.yaml") == "queue"
+        assert lock_path_class("/tmp/x/dead/t1.yaml") == "queue"
+        assert lock_path_class("status/dashboard.md") == "dashboard"
+        assert lock_path_class("notes/todo.md") == "other"
+
+    def test_records_calls_per_path_class(self, tmp_path: Path) -> None:
+        """有効にした後の呼び出しがパス種別ごとに集計される"""
+        (tmp_path / "tasks").mkdir()
+        (tmp_path / "reports").mkdir()
+        atomic_write_with_lock(str(tmp_path / "tasks" / "before.yaml"), "x")
+        stats = enable_lock_stats()
+
+        atomic_write_with_lock(str(tmp_path / "tasks" / "a.yaml"), "a")
+        atomic_write_with_lock(str(tmp_path / "reports" / "a.yaml"), "a")
+        atomic_write_batch_with_lock(
+            {str(tmp_path / "tasks" / "b.yaml"): "b"}, str(tmp_path / "tasks" / ".batch.lock")
+        )
+        atomic_write_with_lock(str(tmp_path / "missing" / "a.yaml"), "a")
+
+        snapshot = stats.snapshot()
+        assert snapshot["queue"]["calls"] == 2
+        assert snapshot["queue"]["attempts"] == 2
+        assert snapshot["queue"]["failures"] == 0
+        assert snapshot["report"]["calls"] == 1
+        assert snapshot["other"]["errors"] == {"FileNotFoundError": 1}
+
+    def test_records_wait_and_timeouts(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """ロックが取れない場合は待ち時間・試行回数・タイムアウトが記録される"""
+        filepath = tmp_path / "tasks" / "t.yaml"
+        filepath.parent.mkdir()
+        real_sleep = time.sleep
+
+        def contended(lock_path: str, timeout: float = 5.0) -> tuple[int, float]:
+            real_sleep(timeout)
+            raise TimeoutError(lock_path)
+
+        monkeypatch.setattr("ensemble.lock.acquire_flock", contended)
+        monkeypatch.setattr("ensemble.lock.time.sleep", lambda seconds: None)
+        stats = enable_lock_stats()
+
+        assert atomic_write_with_lock(str(filepath), "x", timeout=0.05) is False
+
+        queue_stats = stats.snapshot()["queue"]
+        assert queue_stats["attempts"] == 3
+        assert queue_stats["timeouts"] == 3
+        assert queue_stats["failures"] == 1
+        assert queue_stats["errors"] == {"TimeoutError": 1}
+        assert queue_stats["wait_seconds"] >= 0.15
+        assert queue_stats["max_wait_seconds"] == queue_stats["wait_seconds"]
+
+    def test_flush_to_session_log_and_file(self, tmp_path: Path) -> None:
+        """flushで累積値をセッションログとメトリクスファイルに書き出す"""
+        logger = NDJSONLogger(log_dir=tmp_path / "logs", session_id="s")
+        metrics_file = tmp_path / "lock-stats.json"
+        (tmp_path / "reports").mkdir()
+        stats = enable_lock_stats(logger=logger, path=metrics_file)
+
+        atomic_write_with_lock(str(tmp_path / "reports" / "r.yaml"), "r")
+        stats.flush()
+        stats.flush()  # 新しい記録がなければ書かない
+
+        events = logger.read_events(NDJSONLogger.LOCK_STATS)
+        assert len(events) == 1
+        assert events[0]["data"]["classes"]["report"]["calls"] == 1
+        written = json.loads(metrics_file.read_text())
+        assert written["pid"] == os.getpid()
+        assert written["classes"]["report"]["calls"] == 1
+
+    def test_disable_stops_recording(self, tmp_path: Path) -> None:
+        """無効にした後は記録しない"""
+        stats = enable_lock_stats()
+        disable_lock_stats()
+
+        atomic_write_with_lock(str(tmp_path / "f.txt"), "x")
+
+        assert stats.snapshot() == {}
+
+
+class TestAtomicWriteBatchWithLock:
+    """atomic_write_batch_with_lock のテスト"""
+
+    def test_writes_all_files(self, tmp_path: Path) -> None:
+        """全ファイルが書き込まれることを確認"""
+        files = {str(tmp_path / f"f{i}.txt"): f"content {i}" for i in range(5)}
+
+        result = atomic_write_batch_with_lock(files, str(tmp_path / ".batch.lock"))
+
+        assert result is True
+        for path, content in files.items():
+            assert Path(path).read_text() == content
+
+    def test_nonexistent_dir_returns_false(self, tmp_path: Path) -> None:
+        """存在しないディレクトリを含む場合はFalseを返す"""
+        files = {str(tmp_path / "missing" / "f.txt"): "content"}
+
+        result = atomic_write_batch_with_lock(files, str(tmp_path / ".batch.lock"))
+
+        assert result is False
+
+    def test_lock_timeout(self, tmp_path: Path) -> None:
+        """ロック取得できない場合はFalseを返す"""
+        files = {str(tmp_path / "f.txt"): "content"}
+
+        with patch("ensemble.lock.fcntl.flock", side_effect=BlockingIOError):
+            result = atomic_write_batch_with_lock(
+                files, str(tmp_path / ".batch.lock"), timeout=0.2
+            )
+
+        assert result is False
+        assert not (tmp_path / "f.txt").exists()
+
+
 class TestQueueUsesLockedWrite:
     """TaskQueueがflock版を使用していることを確認"""
 
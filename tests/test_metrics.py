@@ -0,0 +1,172 @@
+"""キューメトリクスのテスト"""
+
+import json
+import math
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from ensemble.metrics import (
+    AGGREGATE_NAME,
+    Histogram,
+    MetricsRecorder,
+    QueueMetrics,
+    load_metrics,
+)
+
+
+class TestHistogram:
+    """Histogram のテスト"""
+
+    def test_observe_uses_inclusive_upper_bounds(self) -> None:
+        """上限値ちょうどの値はそのバケットに入る"""
+        histogram = Histogram((1.0, 5.0))
+
+        for value in (0.5, 1.0, 3.0, 9.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == 13.5
+
+    def test_quantile(self) -> None:
+        """分位点はバケット上限で推定される"""
+        histogram = Histogram((1.0, 5.0))
+        for value in (0.5, 0.5, 0.5, 3.0, 9.0):
+            histogram.observe(value)
+
+        assert histogram.quantile(0.5) == 1.0
+        assert histogram.quantile(0.8) == 5.0
+        assert histogram.quantile(0.99) == math.inf
+        assert Histogram((1.0,)).quantile(0.5) == 0.0
+
+    def test_merge(self) -> None:
+        """同じバケットのヒストグラムを加算できる"""
+        a, b = Histogram((1.0,)), Histogram((1.0,))
+        a.observe(0.5)
+        b.observe(2.0)
+
+        a.merge(b)
+
+        assert a.counts == [1, 1]
+        assert a.mean == 1.25
+
+    def test_merge_rejects_different_buckets(self) -> None:
+        """バケットが異なる場合はValueError"""
+        with pytest.raises(ValueError):
+            Histogram((1.0,)).merge(Histogram((2.0,)))
+
+    def test_round_trip(self) -> None:
+        """to_dict / from_dict で復元できる"""
+        histogram = Histogram((1.0, 5.0))
+        histogram.observe(3.0)
+
+        restored = Histogram.from_dict(histogram.to_dict())
+
+        assert restored.counts == histogram.counts
+        assert restored.sum == histogram.sum
+
+
+class TestQueueMetrics:
+    """QueueMetrics のテスト"""
+
+    def test_busy_workers_uses_littles_law(self) -> None:
+        """平均稼働ワーカー数 = スループット × 平均処理時間"""
+        metrics = QueueMetrics()
+        for _ in range(10):
+            metrics.observe("service_seconds", 4.0)
+        metrics.started_at = 0.0
+        metrics.updated_at = 20.0
+
+        assert metrics.throughput() == 0.5
+        assert metrics.busy_workers() == 2.0
+
+    def test_render_prometheus(self) -> None:
+        """Prometheusテキスト形式は累積バケットとゲージを出力する"""
+        metrics = QueueMetrics()
+        metrics.observe("wait_seconds", 0.2)
+        metrics.observe("wait_seconds", 7.0)
+
+        text = metrics.render_prometheus(gauges={"tasks_pending": 3})
+
+        assert "# TYPE ensemble_queue_wait_seconds histogram" in text
+        assert 'ensemble_queue_wait_seconds_bucket{le="0.1"} 0' in text
+        assert 'ensemble_queue_wait_seconds_bucket{le="0.5"} 1' in text
+        assert 'ensemble_queue_wait_seconds_bucket{le="10"} 2' in text
+        assert 'ensemble_queue_wait_seconds_bucket{le="+Inf"} 2' in text
+        assert "ensemble_queue_wait_seconds_count 2" in text
+        assert "ensemble_queue_tasks_pending 3" in text
+
+
+class TestMetricsRecorder:
+    """MetricsRecorder と load_metrics のテスト"""
+
+    def test_flush_and_load_merges_processes(self, tmp_path: Path) -> None:
+        """プロセスごとのファイルが合算される"""
+        metrics_dir = tmp_path / "metrics"
+        metrics_dir.mkdir()
+        other = QueueMetrics()
+        other.observe("depth", 5)
+        (metrics_dir / "otherhost-1.json").write_text(json.dumps(other.to_dict()))
+        recorder = MetricsRecorder(metrics_dir, flush_interval=3600)
+        recorder.observe("depth", 3)
+
+        assert load_metrics(metrics_dir).histograms["depth"].count == 1
+
+        recorder.flush()
+
+        merged = load_metrics(metrics_dir)
+        assert merged.histograms["depth"].count == 2
+        assert merged.histograms["depth"].sum == 8
+
+    def test_instances_in_one_process_share_a_file(self, tmp_path: Path) -> None:
+        """同じプロセスの複数インスタンスは1ファイルに累積する"""
+        metrics_dir = tmp_path / "metrics"
+        first = MetricsRecorder(metrics_dir, flush_interval=3600)
+        second = MetricsRecorder(metrics_dir, flush_interval=3600)
+        first.observe("depth", 3)
+        second.observe("depth", 5)
+        first.flush()
+
+        assert first.path == second.path
+        assert [f.name for f in metrics_dir.glob("*.json")] == [first.path.name]
+        assert load_metrics(metrics_dir).histograms["depth"].count == 2
+
+    def test_dead_process_files_are_folded(self, tmp_path: Path) -> None:
+        """終了したプロセスのファイルはaggregate.jsonに畳み込まれる"""
+        metrics_dir = tmp_path / "metrics"
+        metrics_dir.mkdir()
+        child = subprocess.Popen([sys.executable, "-c", "pass"])
+        child.wait()
+        old = QueueMetrics()
+        old.observe("depth", 5)
+        dead_file = metrics_dir / f"{socket.gethostname()}-{child.pid}.json"
+        dead_file.write_text(json.dumps(old.to_dict()))
+
+        recorder = MetricsRecorder(metrics_dir, flush_interval=3600)
+        recorder.observe("depth", 3)
+        recorder.flush()
+
+        assert not dead_file.exists()
+        assert (metrics_dir / AGGREGATE_NAME).exists()
+        assert load_metrics(metrics_dir).histograms["depth"].sum == 8
+
+    def test_flushes_after_interval(self, tmp_path: Path) -> None:
+        """flush_interval=0なら記録のたびに書き出される"""
+        recorder = MetricsRecorder(tmp_path / "metrics", flush_interval=0)
+
+        recorder.observe("wait_seconds", 1.0)
+
+        assert recorder.path.exists()
+
+    def test_load_skips_broken_files(self, tmp_path: Path) -> None:
+        """壊れたファイルは読み飛ばす"""
+        metrics_dir = tmp_path / "metrics"
+        metrics_dir.mkdir()
+        (metrics_dir / "broken.json").write_text("{")
+
+        assert load_metrics(metrics_dir).histograms["depth"].count == 0
+        assert load_metrics(tmp_path / "missing").histograms["depth"].count == 0
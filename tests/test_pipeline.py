@@ -16,6 +16,12 @@ from ensemble.pipeline import (
 )
 
 
+@pytest.fixture(autouse=True)
+def isolate_session_logs(tmp_path, monkeypatch):
+    """Write NDJSON session logs under tmp_path instead of the repository."""
+    monkeypatch.chdir(tmp_path)
+
+
 def test_pipeline_runner_init():
     """Test PipelineRunner initialization."""
     runner = PipelineRunner(
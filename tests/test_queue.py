@@ -1,11 +1,19 @@
 """キュー操作のテスト"""
 
+import os
+import threading
+import time
 import yaml
 from pathlib import Path
+from typing import Any
 
 import pytest
 
-from ensemble.queue import TaskQueue
+from ensemble import codec
+from ensemble.backpressure import Backpressure, QueueFullError
+from ensemble.logger import NDJSONLogger
+from ensemble.metrics import load_metrics
+from ensemble.queue import RetryPolicy, TaskQueue, make_dedup_key, shard_name
 
 
 class TestTaskQueue:
@@ -32,7 +40,7 @@ class TestTaskQueue:
             params={"target": "src/main.py"},
         )
 
-        task_file = tmp_path / "tasks" / f"{task_id}.yaml"
+        task_file = tmp_path / "tasks" / "coder" / f"p1_{task_id}.yaml"
         assert task_file.exists()
 
         with open(task_file) as f:
@@ -65,7 +73,7 @@ class TestTaskQueue:
         assert task["command"] == "test"
 
         # tasksにはもうない
-        assert not (tmp_path / "tasks" / f"{task_id}.yaml").exists()
+        assert not (tmp_path / "tasks" / "worker" / f"p1_{task_id}.yaml").exists()
         # processingに移動
         assert (tmp_path / "processing" / f"{task_id}.yaml").exists()
 
@@ -144,6 +152,1651 @@ class TestTaskQueue:
 
         queue.cleanup()
 
-        assert len(list((tmp_path / "tasks").glob("*.yaml"))) == 0
+        assert len(list((tmp_path / "tasks").rglob("*.yaml"))) == 0
         assert len(list((tmp_path / "processing").glob("*.yaml"))) == 0
         assert len(list((tmp_path / "reports").glob("*.yaml"))) == 0
+
+    def test_get_report_returns_completed_report(self, queue: TaskQueue) -> None:
+        """get_reportで完了報告を取得できることを確認"""
+        task_id = queue.enqueue(command="test", agent="worker")
+        queue.claim()
+
+        assert queue.get_report(task_id) is None
+
+        queue.complete(task_id, result="success", output="done")
+
+        report = queue.get_report(task_id)
+        assert report is not None
+        assert report["result"] == "success"
+
+
+class TestTaskQueueBatch:
+    """enqueue_many / claim_batch のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_enqueue_many_creates_task_files(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """enqueue_manyで全タスクのファイルが作成されることを確認"""
+        task_ids = queue.enqueue_many(
+            [
+                {"command": "build", "agent": "coder", "params": {"target": "a.py"}},
+                {"command": "review", "agent": "reviewer"},
+                {"command": "deploy", "agent": "coder", "blocked_by": ["x"]},
+            ]
+        )
+
+        assert len(task_ids) == 3
+        assert len(set(task_ids)) == 3
+        assert sorted(queue.list_pending()) == sorted(task_ids)
+
+        with open(tmp_path / "tasks" / "coder" / f"p1_{task_ids[0]}.yaml") as f:
+            task = yaml.safe_load(f)
+        assert task["command"] == "build"
+        assert task["params"] == {"target": "a.py"}
+        assert task["status"] == "pending"
+        assert "blocked_by" not in task
+
+        with open(tmp_path / "tasks" / "coder" / f"p1_{task_ids[2]}.yaml") as f:
+            assert yaml.safe_load(f)["blocked_by"] == ["x"]
+
+    def test_enqueue_many_empty(self, queue: TaskQueue) -> None:
+        """空のspecsでは何もしない"""
+        assert queue.enqueue_many([]) == []
+        assert queue.list_pending() == []
+
+    def test_claim_batch_claims_up_to_n(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """claim_batchが最大n件をprocessingに移動することを確認"""
+        queue.enqueue_many([{"command": f"t{i}", "agent": "w"} for i in range(5)])
+
+        batch = queue.claim_batch(3)
+
+        assert len(batch) == 3
+        assert len(queue.list_pending()) == 2
+        for task in batch:
+            assert (tmp_path / "processing" / f"{task['task_id']}.yaml").exists()
+
+        rest = queue.claim_batch(10)
+        assert len(rest) == 2
+        assert queue.claim_batch(10) == []
+
+    def test_claim_batch_filters_by_agent(self, queue: TaskQueue) -> None:
+        """agent指定時はそのエージェント宛のタスクのみ取得する"""
+        queue.enqueue(command="code", agent="coder")
+        review_id = queue.enqueue(command="review", agent="reviewer")
+
+        batch = queue.claim_batch(10, agent="reviewer")
+
+        assert [t["task_id"] for t in batch] == [review_id]
+        assert len(queue.list_pending()) == 1
+
+    def test_claim_batch_zero(self, queue: TaskQueue) -> None:
+        """n <= 0 の場合は何も取得しない"""
+        queue.enqueue(command="code", agent="coder")
+        assert queue.claim_batch(0) == []
+        assert len(queue.list_pending()) == 1
+
+
+class TestTaskQueueLanes:
+    """エージェント別レーンのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_enqueue_places_task_in_agent_lane(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """タスクがエージェント名のレーンに置かれることを確認"""
+        coder_id = queue.enqueue(command="code", agent="coder")
+        review_id = queue.enqueue(command="review", agent="reviewer")
+
+        assert (tmp_path / "tasks" / "coder" / f"p1_{coder_id}.yaml").exists()
+        assert (tmp_path / "tasks" / "reviewer" / f"p1_{review_id}.yaml").exists()
+
+    def test_claim_with_agent_only_takes_own_lane(self, queue: TaskQueue) -> None:
+        """claim(agent=...)は自レーンのタスクのみ取得する"""
+        queue.enqueue(command="code", agent="coder")
+        review_id = queue.enqueue(command="review", agent="reviewer")
+
+        task = queue.claim(agent="reviewer")
+
+        assert task is not None
+        assert task["task_id"] == review_id
+        assert queue.claim(agent="reviewer") is None
+        assert len(queue.list_pending()) == 1
+
+    def test_claim_with_unknown_agent_returns_none(self, queue: TaskQueue) -> None:
+        """存在しないレーンを指定した場合はNone"""
+        queue.enqueue(command="code", agent="coder")
+
+        assert queue.claim(agent="nobody") is None
+
+    def test_claim_without_agent_takes_oldest_across_lanes(
+        self, queue: TaskQueue
+    ) -> None:
+        """agent指定なしでは全レーンから最も古いタスクを取得する"""
+        first = queue.enqueue(command="code", agent="coder")
+        second = queue.enqueue(command="review", agent="reviewer")
+
+        claimed = {queue.claim()["task_id"], queue.claim()["task_id"]}
+
+        assert claimed == {first, second}
+        assert queue.claim() is None
+
+    def test_claim_without_agent_includes_top_level_tasks(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """tasks/直下に手動で置かれたタスクも取得できる"""
+        (tmp_path / "tasks" / "manual-001.yaml").write_text(
+            "task_id: manual-001\ncommand: manual\nagent: worker\n"
+        )
+
+        task = queue.claim()
+
+        assert task is not None
+        assert task["task_id"] == "manual-001"
+
+    def test_lane_name_is_sanitized(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """パス区切りなどを含むエージェント名も安全なレーン名になる"""
+        task_id = queue.enqueue(command="x", agent="../evil/agent")
+
+        lanes = [d.name for d in (tmp_path / "tasks").iterdir() if d.is_dir()]
+        assert lanes == ["_evil_agent"]
+        assert queue.claim(agent="../evil/agent")["task_id"] == task_id
+
+
+class TestTaskQueuePriority:
+    """優先度付きclaimのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_enqueue_writes_priority_prefixed_file(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """優先度ランクがファイル名のプレフィックスになることを確認"""
+        task_id = queue.enqueue(command="fix", agent="worker", priority="high")
+
+        task_file = tmp_path / "tasks" / "worker" / f"p0_{task_id}.yaml"
+        assert task_file.exists()
+        with open(task_file) as f:
+            assert yaml.safe_load(f)["priority"] == "high"
+        assert queue.list_pending() == [task_id]
+
+    def test_claim_order_is_priority_then_age(self, queue: TaskQueue) -> None:
+        """優先度 → 古い順でclaimされることを確認"""
+        low = queue.enqueue(command="low", agent="worker", priority="low")
+        medium = queue.enqueue(command="medium", agent="worker")
+        high = queue.enqueue(command="high", agent="other", priority="high")
+
+        claimed = [queue.claim()["task_id"] for _ in range(3)]
+
+        assert claimed == [high, medium, low]
+
+    def test_claimed_file_named_by_task_id(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """processing/ のファイル名はプレフィックスなしのタスクIDになる"""
+        task_id = queue.enqueue(command="fix", agent="worker", priority="low")
+
+        queue.claim()
+
+        assert (tmp_path / "processing" / f"{task_id}.yaml").exists()
+        queue.complete(task_id, result="success", output="done")
+        assert queue.get_report(task_id)["priority"] == "low"
+
+    def test_accepts_task_priority_enum(self, queue: TaskQueue) -> None:
+        """scanner.TaskPriorityをそのまま渡せることを確認"""
+        from ensemble.scanner import TaskPriority
+
+        low = queue.enqueue(command="a", agent="w", priority=TaskPriority.LOW)
+        high = queue.enqueue(command="b", agent="w", priority=TaskPriority.HIGH)
+
+        assert queue.claim()["task_id"] == high
+        assert queue.claim()["task_id"] == low
+
+    def test_unknown_priority_raises(self, queue: TaskQueue) -> None:
+        """未知の優先度はValueError"""
+        with pytest.raises(ValueError):
+            queue.enqueue(command="a", agent="w", priority="urgent")
+
+    def test_enqueue_many_with_priority(self, queue: TaskQueue) -> None:
+        """enqueue_manyのspecでも優先度を指定できる"""
+        low, high = queue.enqueue_many(
+            [
+                {"command": "a", "agent": "w", "priority": "low"},
+                {"command": "b", "agent": "w", "priority": "high"},
+            ]
+        )
+
+        batch = queue.claim_batch(2)
+
+        assert [t["task_id"] for t in batch] == [high, low]
+
+    def test_unprefixed_top_level_file_is_medium(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """プレフィックスのない手動タスクはmedium扱いになる"""
+        (tmp_path / "tasks" / "manual.yaml").write_text(
+            "task_id: manual\ncommand: manual\nagent: worker\n"
+        )
+        low = queue.enqueue(command="low", agent="worker", priority="low")
+        high = queue.enqueue(command="high", agent="worker", priority="high")
+
+        claimed = [queue.claim()["task_id"] for _ in range(3)]
+
+        assert claimed == [high, "manual", low]
+
+
+class TestTaskQueueLease:
+    """リース付きclaimとreaperのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_claim_sets_lease_expiry(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """claimでprocessingファイルのmtimeがリース期限になることを確認"""
+        task_id = queue.enqueue(command="a", agent="worker")
+
+        before = time.time()
+        task = queue.claim(lease=100)
+
+        mtime = (tmp_path / "processing" / f"{task_id}.yaml").stat().st_mtime
+        assert before + 99 <= mtime <= time.time() + 101
+        assert "lease_expires_at" in task
+
+    def test_reap_ignores_live_lease(self, queue: TaskQueue) -> None:
+        """リース期限内のタスクは戻されない"""
+        queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=100)
+
+        assert queue.reap_expired() == []
+        assert queue.list_pending() == []
+
+    def test_reap_requeues_expired_task(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """期限切れタスクが元のレーンに戻りattemptsが増えることを確認"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+
+        assert queue.reap_expired() == [task_id]
+
+        assert not (tmp_path / "processing" / f"{task_id}.yaml").exists()
+        task = queue.claim()
+        assert task["task_id"] == task_id
+        assert task["attempts"] == 1
+
+    def test_heartbeat_extends_lease(self, queue: TaskQueue) -> None:
+        """heartbeatでリースが延長され、reapされなくなる"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+
+        assert queue.heartbeat(task_id, lease=100) is True
+        assert queue.reap_expired() == []
+
+    def test_heartbeat_unknown_task(self, queue: TaskQueue) -> None:
+        """処理中でないタスクのheartbeatはFalse"""
+        assert queue.heartbeat("missing") is False
+
+    def test_reap_logs_event(self, tmp_path: Path) -> None:
+        """期限切れイベントがNDJSONログに記録される"""
+        logger = NDJSONLogger(log_dir=tmp_path / "logs")
+        queue = TaskQueue(base_dir=tmp_path / "queue", logger=logger)
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+
+        queue.reap_expired()
+
+        events = logger.read_events(NDJSONLogger.TASK_LEASE_EXPIRED)
+        assert len(events) == 1
+        assert events[0]["data"]["task_id"] == task_id
+        assert events[0]["data"]["attempts"] == 1
+
+
+class TestTaskQueueCompletedIndex:
+    """完了済みIDインデックスとget_ready_tasksキャッシュのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_complete_appends_to_index(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """completeで完了済みIDがインデックスに追記される"""
+        first = queue.enqueue(command="a", agent="worker")
+        second = queue.enqueue(command="b", agent="worker")
+
+        queue.complete(first, result="success", output="ok")
+        queue.complete(second, result="success", output="ok")
+
+        lines = (tmp_path / "completed.idx").read_text().splitlines()
+        assert lines == [first, second]
+
+    def test_ready_tasks_follow_completions_from_other_instance(
+        self, tmp_path: Path
+    ) -> None:
+        """別インスタンスの完了もインデックス経由で反映される"""
+        scheduler = TaskQueue(base_dir=tmp_path)
+        worker = TaskQueue(base_dir=tmp_path)
+        first = scheduler.enqueue(command="first", agent="w")
+        second = scheduler.enqueue_with_dependency(
+            command="second", agent="w", blocked_by=[first]
+        )
+        assert [t["task_id"] for t in scheduler.get_ready_tasks()] == [first]
+
+        worker.complete(first, result="success", output="ok")
+
+        assert [t["task_id"] for t in scheduler.get_ready_tasks()] == [second]
+
+    def test_ready_tasks_do_not_reparse_reports(
+        self, queue: TaskQueue, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """2回目以降は変更のないタスクやレポートをパースしない"""
+        done = queue.enqueue(command="done", agent="w")
+        queue.claim()
+        queue.complete(done, result="success", output="ok")
+        pending = queue.enqueue_with_dependency(
+            command="next", agent="w", blocked_by=[done]
+        )
+        queue.get_ready_tasks()
+
+        def fail_load(*args, **kwargs):
+            raise AssertionError("unexpected parse")
+
+        monkeypatch.setattr("ensemble.queue.codec.load_file", fail_load)
+
+        assert [t["task_id"] for t in queue.get_ready_tasks()] == [pending]
+
+    def test_index_bootstrapped_from_existing_reports(self, tmp_path: Path) -> None:
+        """インデックスがない既存キューではレポートから作られる"""
+        (tmp_path / "reports").mkdir()
+        (tmp_path / "reports" / "old.yaml").write_text(
+            "task_id: old\nresult: success\n"
+        )
+
+        queue = TaskQueue(base_dir=tmp_path)
+        task_id = queue.enqueue_with_dependency(
+            command="next", agent="w", blocked_by=["old"]
+        )
+
+        assert (tmp_path / "completed.idx").read_text() == "old\n"
+        assert [t["task_id"] for t in queue.get_ready_tasks()] == [task_id]
+
+    def test_cleanup_resets_index(self, tmp_path: Path) -> None:
+        """cleanup後は別インスタンスでも古い完了済みIDが使われない"""
+        scheduler = TaskQueue(base_dir=tmp_path)
+        other = TaskQueue(base_dir=tmp_path)
+        done = scheduler.enqueue(command="done", agent="w")
+        scheduler.claim()
+        scheduler.complete(done, result="success", output="ok")
+        scheduler.get_ready_tasks()
+
+        other.cleanup()
+        task_id = scheduler.enqueue_with_dependency(
+            command="next", agent="w", blocked_by=[done]
+        )
+
+        assert scheduler.get_ready_tasks() == []
+        assert scheduler.get_ready_tasks(completed_task_ids=[done])[0]["task_id"] == task_id
+
+
+class TestTaskQueueWireFormat:
+    """wire_format のテスト"""
+
+    def test_json_wire_format(self, tmp_path: Path) -> None:
+        """JSON形式で書いたタスク・レポートを読めることを確認"""
+        queue = TaskQueue(base_dir=tmp_path, wire_format="json")
+        task_id = queue.enqueue(command="a", agent="worker", params={"n": 1})
+
+        task_file = tmp_path / "tasks" / "worker" / f"p1_{task_id}.yaml"
+        assert task_file.read_text().startswith("{")
+
+        task = queue.claim()
+        assert task["params"] == {"n": 1}
+
+        queue.complete(task_id, result="success", output="ok")
+        assert queue.get_report(task_id)["result"] == "success"
+
+    def test_yaml_queue_reads_json_tasks(self, tmp_path: Path) -> None:
+        """形式の異なるインスタンス間でもタスクを受け渡せる"""
+        producer = TaskQueue(base_dir=tmp_path, wire_format="json")
+        consumer = TaskQueue(base_dir=tmp_path)
+        task_id = producer.enqueue(command="a", agent="worker")
+
+        assert consumer.claim()["task_id"] == task_id
+
+    def test_unknown_wire_format_raises(self, tmp_path: Path) -> None:
+        """未知の形式はValueError"""
+        with pytest.raises(ValueError):
+            TaskQueue(base_dir=tmp_path, wire_format="xml")
+
+
+class TestTaskQueueArchive:
+    """archive_reports のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def _complete(self, queue: TaskQueue, command: str) -> str:
+        task_id = queue.enqueue(command=command, agent="worker")
+        queue.complete(task_id, result="success", output=command)
+        return task_id
+
+    def test_archived_report_still_fetchable(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """アーカイブ後もget_reportで取得でき、reports/からは消える"""
+        task_id = self._complete(queue, "a")
+
+        assert queue.archive_reports() == [task_id]
+
+        assert not (tmp_path / "reports" / f"{task_id}.yaml").exists()
+        assert queue.get_report(task_id)["output"] == "a"
+
+    def test_older_than_keeps_recent_reports(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """older_thanより新しいレポートは残る"""
+        task_id = self._complete(queue, "a")
+
+        assert queue.archive_reports(older_than=3600) == []
+        assert (tmp_path / "reports" / f"{task_id}.yaml").exists()
+
+    def test_archived_dependencies_stay_completed(self, tmp_path: Path) -> None:
+        """アーカイブ済みの依存先も完了扱いのまま（インデックス再構築時も）"""
+        queue = TaskQueue(base_dir=tmp_path)
+        done = self._complete(queue, "a")
+        queue.archive_reports()
+        (tmp_path / "completed.idx").unlink()
+
+        fresh = TaskQueue(base_dir=tmp_path)
+        task_id = fresh.enqueue_with_dependency(command="b", agent="worker", blocked_by=[done])
+
+        assert [t["task_id"] for t in fresh.get_ready_tasks()] == [task_id]
+
+    def test_cleanup_clears_archive(self, queue: TaskQueue) -> None:
+        """cleanupでアーカイブも消える"""
+        task_id = self._complete(queue, "a")
+        queue.archive_reports()
+
+        queue.cleanup()
+
+        assert queue.get_report(task_id) is None
+
+
+class TestTaskQueueBlockingClaim:
+    """claim(timeout=...) のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_returns_none_after_timeout(self, queue: TaskQueue) -> None:
+        """タスクが来なければタイムアウト後にNone"""
+        start = time.monotonic()
+
+        assert queue.claim(timeout=0.1) is None
+        assert time.monotonic() - start >= 0.09
+
+    def test_wakes_up_on_enqueue(self, tmp_path: Path) -> None:
+        """待機中に別インスタンスがenqueueしたタスクを取得する"""
+        consumer = TaskQueue(base_dir=tmp_path)
+        producer = TaskQueue(base_dir=tmp_path)
+        timer = threading.Timer(0.05, producer.enqueue, kwargs={"command": "a", "agent": "new-lane"})
+        timer.start()
+
+        start = time.monotonic()
+        task = consumer.claim(timeout=5)
+
+        assert task is not None and task["command"] == "a"
+        assert time.monotonic() - start < 2
+        timer.join()
+
+    def test_agent_lane_wait(self, tmp_path: Path) -> None:
+        """agent指定時は自レーンへのenqueueで起きる"""
+        consumer = TaskQueue(base_dir=tmp_path)
+        producer = TaskQueue(base_dir=tmp_path)
+        timer = threading.Timer(0.05, producer.enqueue, kwargs={"command": "a", "agent": "coder"})
+        timer.start()
+
+        task = consumer.claim(agent="coder", timeout=5)
+
+        assert task is not None and task["agent"] == "coder"
+        timer.join()
+
+
+class TestTaskQueueDelayed:
+    """not_before付き（遅延）タスクのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_future_task_is_not_claimable(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """期限前のタスクはdelayed/に置かれ、claimされない"""
+        task_id = queue.enqueue(command="a", agent="worker", not_before=time.time() + 300)
+
+        assert queue.claim() is None
+        assert queue.list_pending() == []
+        delayed = list((tmp_path / "delayed").glob("*/worker/*.yaml"))
+        assert len(delayed) == 1
+        assert delayed[0].name.endswith(f"_p1_{task_id}.yaml")
+
+    def test_past_not_before_is_enqueued_directly(self, queue: TaskQueue) -> None:
+        """期限が過ぎている場合は通常のレーンに入る"""
+        task_id = queue.enqueue(command="a", agent="worker", not_before=time.time() - 1)
+
+        assert queue.list_pending() == [task_id]
+
+    def test_due_task_is_promoted(self, queue: TaskQueue) -> None:
+        """期限が来たタスクはclaimできる"""
+        task_id = queue.enqueue(command="a", agent="worker", not_before=time.time() + 0.2)
+        assert queue.claim() is None
+
+        time.sleep(0.3)
+
+        task = queue.claim()
+        assert task["task_id"] == task_id
+        assert "not_before" in task
+
+    def test_blocking_claim_wakes_for_due_task(self, queue: TaskQueue) -> None:
+        """claim(timeout=...)は遅延タスクの期限が来たら返る"""
+        task_id = queue.enqueue(command="a", agent="worker", not_before=time.time() + 0.3)
+
+        task = queue.claim(timeout=5)
+
+        assert task["task_id"] == task_id
+
+    def test_future_tasks_are_not_parsed(
+        self, queue: TaskQueue, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """未来のタスクはget_ready_tasksでパースされない"""
+        queue.enqueue(command="later", agent="worker", not_before=time.time() + 300)
+        now_id = queue.enqueue(command="now", agent="worker")
+
+        import ensemble.queue
+
+        loaded: list[str] = []
+        original = ensemble.queue.codec.load_file
+        monkeypatch.setattr(
+            "ensemble.queue.codec.load_file",
+            lambda path: loaded.append(str(path)) or original(path),
+        )
+
+        ready = queue.get_ready_tasks()
+
+        assert [t["task_id"] for t in ready] == [now_id]
+        assert all("delayed" not in path for path in loaded)
+
+    def test_enqueue_many_with_not_before(self, queue: TaskQueue) -> None:
+        """enqueue_manyのspecでもnot_beforeを指定できる"""
+        _, now = queue.enqueue_many(
+            [
+                {"command": "a", "agent": "worker", "not_before": time.time() + 300},
+                {"command": "b", "agent": "worker"},
+            ]
+        )
+
+        assert queue.list_pending() == [now]
+
+    def test_past_buckets_are_removed(
+        self, queue: TaskQueue, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """期限の過ぎたバケットは読み書きロックのロックファイルごと片付く"""
+        monkeypatch.setattr("ensemble.queue.DELAY_BUCKET_SECONDS", 0.1)
+        task_id = queue.enqueue(command="a", agent="worker", not_before=time.time() + 0.1)
+        assert list((tmp_path / "delayed").glob("*/worker/.rwlock-*"))
+
+        time.sleep(0.3)
+
+        assert queue.claim()["task_id"] == task_id
+        assert list((tmp_path / "delayed").iterdir()) == []
+
+    def test_cleanup_removes_delayed(self, queue: TaskQueue) -> None:
+        """cleanupで遅延タスクも削除される"""
+        queue.enqueue(command="a", agent="worker", not_before=time.time() + 0.2)
+        queue.cleanup()
+
+        time.sleep(0.3)
+
+        assert queue.claim() is None
+
+
+class TestTaskQueueRetry:
+    """再試行ポリシーとdead-letterのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """即時再試行・最大2回のキューを作成"""
+        policy = RetryPolicy(max_attempts=2, base_delay=0, jitter=0)
+        return TaskQueue(base_dir=tmp_path, retry_policy=policy)
+
+    def test_delay_for_grows_exponentially(self) -> None:
+        """待ち時間は倍々に増え、上限で頭打ちになる"""
+        policy = RetryPolicy(base_delay=10, max_delay=50, jitter=0)
+
+        assert [policy.delay_for(n) for n in (1, 2, 3, 4)] == [10, 20, 40, 50]
+
+    def test_delay_for_applies_jitter(self) -> None:
+        """揺らぎはjitterの範囲に収まる"""
+        policy = RetryPolicy(base_delay=100, jitter=0.1)
+
+        for _ in range(20):
+            assert 90 <= policy.delay_for(1) <= 110
+
+    def test_invalid_policy(self) -> None:
+        """不正な設定はValueError"""
+        with pytest.raises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_failed_retry_write_keeps_task_processing(
+        self, queue: TaskQueue, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """再試行を書き込めなければ例外になり、タスクはprocessing/に残る"""
+        task_id = queue.enqueue("a", agent="worker")
+        queue.claim()
+        monkeypatch.setattr(
+            "ensemble.queue.atomic_write_with_lock", lambda *args, **kwargs: False
+        )
+
+        with pytest.raises(OSError):
+            queue.complete(task_id, "error", "", error="boom")
+
+        assert (queue.processing_dir / f"{task_id}.yaml").exists()
+        assert queue.depths() == {}
+        with pytest.raises(ValueError):
+            RetryPolicy(jitter=2)
+
+    def test_error_schedules_retry(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """errorはレポートにならず、attempts付きで再実行される"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim()
+
+        queue.complete(task_id, "error", "out", error="boom")
+
+        assert queue.get_report(task_id) is None
+        assert not (tmp_path / "processing" / f"{task_id}.yaml").exists()
+        task = queue.claim()
+        assert task["task_id"] == task_id
+        assert task["attempts"] == 1
+        assert task["last_error"] == "boom"
+
+    def test_retry_waits_for_backoff(self, tmp_path: Path) -> None:
+        """再試行はバックオフの待ち時間が過ぎるまでclaimされない"""
+        queue = TaskQueue(
+            base_dir=tmp_path, retry_policy=RetryPolicy(base_delay=300, jitter=0)
+        )
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim()
+
+        queue.complete(task_id, "error", "out", error="boom")
+
+        assert queue.claim() is None
+        assert len(list((tmp_path / "delayed").glob("*/worker/*.yaml"))) == 1
+
+    def test_exhausted_task_is_dead_lettered(self, queue: TaskQueue) -> None:
+        """max_attemptsに達したタスクはdead/に移り、完了扱いにならない"""
+        first = queue.enqueue(command="a", agent="worker")
+        queue.enqueue_with_dependency(command="b", agent="other", blocked_by=[first])
+
+        queue.claim(agent="worker")
+        queue.complete(first, "error", "out", error="boom")
+        queue.claim(agent="worker")
+        queue.complete(first, "error", "out", error="boom again")
+
+        assert queue.list_dead() == [first]
+        report = queue.get_report(first)
+        assert report["status"] == "dead"
+        assert report["attempts"] == 2
+        assert report["error"] == "boom again"
+        assert queue.get_ready_tasks() == []
+
+    def test_requeue_dead(self, queue: TaskQueue) -> None:
+        """requeue_deadでattemptsをリセットしてキューに戻す"""
+        task_id = queue.enqueue(command="a", agent="worker", priority="high")
+        for _ in range(2):
+            queue.claim()
+            queue.complete(task_id, "error", "out", error="boom")
+
+        assert queue.requeue_dead(task_id) is True
+        assert queue.requeue_dead(task_id) is False
+
+        assert queue.list_dead() == []
+        task = queue.claim()
+        assert task["task_id"] == task_id
+        assert task["attempts"] == 0
+        assert task["priority"] == "high"
+        assert "result" not in task
+
+    def test_success_is_reported(self, queue: TaskQueue) -> None:
+        """successは通常どおりレポートに保存される"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim()
+
+        queue.complete(task_id, "success", "done")
+
+        assert queue.get_report(task_id)["result"] == "success"
+
+    def test_without_policy_error_is_final(self, tmp_path: Path) -> None:
+        """retry_policyなしではerrorもレポートに保存される"""
+        queue = TaskQueue(base_dir=tmp_path)
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim()
+
+        queue.complete(task_id, "error", "out", error="boom")
+
+        assert queue.get_report(task_id)["result"] == "error"
+        assert queue.claim() is None
+
+    def test_retry_and_dead_letter_are_logged(self, tmp_path: Path) -> None:
+        """再試行とdead-letterがNDJSONログに記録される"""
+        logger = NDJSONLogger(log_dir=tmp_path / "logs")
+        queue = TaskQueue(
+            base_dir=tmp_path / "queue",
+            logger=logger,
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0, jitter=0),
+        )
+        task_id = queue.enqueue(command="a", agent="worker")
+        for _ in range(2):
+            queue.claim()
+            queue.complete(task_id, "error", "out", error="boom")
+
+        retries = logger.read_events(NDJSONLogger.TASK_RETRY_SCHEDULED)
+        dead = logger.read_events(NDJSONLogger.TASK_DEAD_LETTERED)
+        assert [e["data"]["attempts"] for e in retries] == [1]
+        assert [e["data"]["task_id"] for e in dead] == [task_id]
+
+    def test_reaped_task_is_dead_lettered_at_max_attempts(self, tmp_path: Path) -> None:
+        """リース切れを繰り返すタスクもmax_attemptsでdead/に移される"""
+        queue = TaskQueue(
+            base_dir=tmp_path,
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0, jitter=0),
+        )
+        task_id = queue.enqueue(command="poison", agent="worker")
+
+        queue.claim(lease=-1)
+        assert queue.reap_expired() == [task_id]
+        assert queue.claim(lease=-1)["attempts"] == 1
+        assert queue.reap_expired() == []
+
+        assert queue.list_dead() == [task_id]
+        assert queue.get_report(task_id)["error"] == "lease expired"
+        assert queue.claim() is None
+        assert queue.counts()["processing"] == 0
+
+
+class TestTaskQueueReadOnly:
+    """read_only=Trueのテスト"""
+
+    def test_read_only_does_not_write(self, tmp_path: Path) -> None:
+        """既存のキューを読めるが、ファイル・ディレクトリは作らない"""
+        queue = TaskQueue(base_dir=tmp_path, metrics=False)
+        done = queue.enqueue(command="a", agent="worker")
+        pending = queue.enqueue(command="b", agent="worker")
+        queue.claim()
+        queue.complete(done, "success", "ok")
+        (tmp_path / "depth").unlink()
+        (tmp_path / "completed.idx").unlink()
+        before = sorted(tmp_path.rglob("*"))
+
+        reader = TaskQueue(base_dir=tmp_path, read_only=True)
+        assert reader.counts()["pending"] == 1
+        assert reader.list_pending() == [pending]
+        assert reader.snapshot(tmp_path.parent / "snapshot.ndjson") > 0
+
+        assert sorted(tmp_path.rglob("*")) == before
+        assert reader.metrics is None
+
+    def test_missing_directory_is_not_created(self, tmp_path: Path) -> None:
+        """存在しないキューを開いてもディレクトリを作らない"""
+        TaskQueue(base_dir=tmp_path / "missing", read_only=True)
+
+        assert not (tmp_path / "missing").exists()
+
+
+class TestTaskQueueMetrics:
+    """待ち時間・処理時間・深さのメトリクスのテスト"""
+
+    def test_claim_and_complete_are_recorded(self, tmp_path: Path) -> None:
+        """claimで待ち時間と深さ、completeで処理時間が記録される"""
+        queue = TaskQueue(base_dir=tmp_path)
+        queue.enqueue(command="a", agent="worker")
+        queue.enqueue(command="b", agent="worker")
+
+        task = queue.claim()
+        queue.complete(task["task_id"], "success", "done")
+        queue.flush_metrics()
+
+        metrics = load_metrics(tmp_path / "metrics")
+        assert metrics.histograms["wait_seconds"].count == 1
+        assert metrics.histograms["service_seconds"].count == 1
+        assert metrics.histograms["depth"].sum == 2
+
+    def test_complete_without_claim_records_no_service_time(self, tmp_path: Path) -> None:
+        """このインスタンスでclaimしていないタスクの処理時間は記録しない"""
+        queue = TaskQueue(base_dir=tmp_path)
+        task_id = queue.enqueue(command="a", agent="worker")
+
+        queue.complete(task_id, "success", "done")
+        queue.flush_metrics()
+
+        assert load_metrics(tmp_path / "metrics").histograms["service_seconds"].count == 0
+
+    def test_cleanup_removes_metrics(self, tmp_path: Path) -> None:
+        """cleanupで以前のセッションのメトリクスを捨てる"""
+        queue = TaskQueue(base_dir=tmp_path)
+        queue.enqueue(command="a", agent="worker")
+        queue.claim()
+        queue.flush_metrics()
+
+        queue.cleanup()
+        queue.flush_metrics()
+
+        assert list((tmp_path / "metrics").glob("*.json")) == []
+        assert load_metrics(tmp_path / "metrics").histograms["depth"].count == 0
+
+    def test_metrics_can_be_disabled(self, tmp_path: Path) -> None:
+        """metrics=Falseなら何も書き出さない"""
+        queue = TaskQueue(base_dir=tmp_path, metrics=False)
+        queue.enqueue(command="a", agent="worker")
+        queue.claim()
+        queue.flush_metrics()
+
+        assert not (tmp_path / "metrics").exists()
+
+    def test_counts(self, tmp_path: Path) -> None:
+        """状態ごとのタスク数を返す"""
+        queue = TaskQueue(base_dir=tmp_path)
+        queue.enqueue(command="a", agent="worker")
+        queue.enqueue(command="b", agent="worker")
+        queue.enqueue(command="c", agent="worker", not_before=time.time() + 300)
+        queue.claim()
+
+        assert queue.counts() == {"pending": 1, "processing": 1, "delayed": 1, "dead": 0}
+
+
+class TestTaskQueueFifo:
+    """単調増加IDと投入ログによるFIFO claimのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    def test_ids_are_monotonic_within_a_burst(self, queue: TaskQueue) -> None:
+        """同じ秒に投入してもIDの辞書順が投入順になる"""
+        task_ids = [queue.enqueue(command=str(i), agent="worker") for i in range(20)]
+        task_ids += queue.enqueue_many(
+            [{"command": str(i), "agent": "worker"} for i in range(20)]
+        )
+
+        assert task_ids == sorted(task_ids)
+        assert len(set(task_ids)) == 40
+
+    def test_claim_is_fifo_under_burst(self, queue: TaskQueue) -> None:
+        """バースト投入したタスクが投入順にclaimされる"""
+        task_ids = [queue.enqueue(command=str(i), agent="worker") for i in range(20)]
+
+        claimed = [queue.claim()["task_id"] for _ in range(20)]
+
+        assert claimed == task_ids
+
+    def test_claim_uses_cursor_without_scanning(
+        self, queue: TaskQueue, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """投入ログで足りる場合はレーンを一覧しない"""
+        first = queue.enqueue(command="a", agent="worker")
+        queue.enqueue(command="b", agent="worker")
+
+        def fail(*args: object) -> None:
+            raise AssertionError("lane was scanned")
+
+        monkeypatch.setattr(queue, "_claim_by_scan", fail)
+
+        assert queue.claim(agent="worker")["task_id"] == first
+
+    def test_cursor_is_shared_between_instances(self, tmp_path: Path) -> None:
+        """別インスタンス（別ワーカー）もカーソルの続きから取得する"""
+        producer = TaskQueue(base_dir=tmp_path)
+        task_ids = [producer.enqueue(command=str(i), agent="worker") for i in range(4)]
+
+        a = TaskQueue(base_dir=tmp_path)
+        b = TaskQueue(base_dir=tmp_path)
+        claimed = [a.claim()["task_id"], b.claim()["task_id"], a.claim()["task_id"]]
+
+        assert claimed == task_ids[:3]
+        assert b.claim()["task_id"] == task_ids[3]
+
+    def test_priority_still_wins_over_log_order(self, queue: TaskQueue) -> None:
+        """優先度の高いレーンのログが先に読まれる"""
+        low = queue.enqueue(command="low", agent="worker", priority="low")
+        high = queue.enqueue(command="high", agent="other", priority="high")
+
+        assert [t["task_id"] for t in queue.claim_batch(2)] == [high, low]
+
+    def test_unlogged_lane_file_is_found_by_scan(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """ログに載っていないレーン内のタスクも取得できる"""
+        lane = tmp_path / "tasks" / "worker"
+        lane.mkdir(parents=True)
+        (lane / "p1_manual.yaml").write_text("task_id: manual\ncommand: m\nagent: worker\n")
+
+        assert queue.claim(agent="worker")["task_id"] == "manual"
+
+    def test_empty_claims_do_not_rescan_lanes(
+        self, queue: TaskQueue, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """空振りのclaimでもレーンの一覧はUNLOGGED_SCAN_INTERVALに1回まで"""
+        scans: list[int] = []
+        original = queue._claim_by_scan
+
+        def counting(*args: Any) -> list[dict[str, Any]]:
+            scans.append(1)
+            return original(*args)
+
+        monkeypatch.setattr(queue, "_claim_by_scan", counting)
+        for _ in range(5):
+            assert queue.claim(agent="worker") is None
+        assert len(scans) == 1
+
+        queue._next_unlogged_scan.clear()
+        queue.claim(agent="worker")
+        assert len(scans) == 2
+
+    def test_requeued_tasks_are_claimable(self, queue: TaskQueue) -> None:
+        """reapで戻したタスクはログに再追記されて取得できる"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+        queue.reap_expired()
+
+        assert queue.claim(agent="worker")["task_id"] == task_id
+
+    def test_cleanup_removes_logs(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """cleanupで投入ログとカーソルも削除される"""
+        queue.enqueue(command="a", agent="worker")
+        queue.claim()
+
+        queue.cleanup()
+
+        assert list((tmp_path / "tasks" / "worker").glob(".p*")) == []
+
+
+class TestTaskQueueGroup:
+    """enqueue_group() と完了バリアのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """テスト用キューを作成"""
+        return TaskQueue(base_dir=tmp_path)
+
+    @staticmethod
+    def _specs() -> list[dict]:
+        return [
+            {"command": "arch-review", "agent": "reviewer"},
+            {"command": "security-review", "agent": "security-reviewer"},
+        ]
+
+    def _finish(self, queue: TaskQueue, agent: str, result: str = "success") -> str:
+        task = queue.claim(agent=agent)
+        queue.complete(task["task_id"], result, f"{agent} done")
+        return task["task_id"]
+
+    def test_group_tasks_are_enqueued(self, queue: TaskQueue) -> None:
+        """グループのタスクがgroup_id付きで投入される"""
+        group = queue.enqueue_group(self._specs())
+
+        assert sorted(queue.list_pending()) == sorted(group.task_ids)
+        task = queue.claim(agent="reviewer")
+        assert task["group_id"] == group.group_id
+
+    def test_wait_all(self, queue: TaskQueue) -> None:
+        """全タスクが完了するとwait_allがTrueになる"""
+        group = queue.enqueue_group(self._specs())
+
+        self._finish(queue, "reviewer")
+        assert group.wait_all(timeout=0) is False
+        assert group.is_done() is False
+
+        self._finish(queue, "security-reviewer", result="error")
+        assert group.wait_all(timeout=1) is True
+        assert list(group.completed().values()) == ["success", "error"]
+        assert [r["output"] for r in group.reports().values()] == [
+            "reviewer done",
+            "security-reviewer done",
+        ]
+
+    def test_wait_any_returns_first_completed(self, queue: TaskQueue) -> None:
+        """wait_anyは最初に完了したタスクのIDを返す"""
+        group = queue.enqueue_group(self._specs())
+        assert group.wait_any(timeout=0.1) is None
+
+        finished = self._finish(queue, "security-reviewer")
+
+        assert group.wait_any(timeout=1) == finished
+
+    def test_wait_all_wakes_on_completion_from_other_thread(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """別スレッド（別ワーカー）の完了で待機から起きる"""
+        group = queue.enqueue_group(self._specs())
+        worker = TaskQueue(base_dir=tmp_path)
+
+        def run_workers() -> None:
+            time.sleep(0.1)
+            self._finish(worker, "reviewer")
+            self._finish(worker, "security-reviewer")
+
+        thread = threading.Thread(target=run_workers)
+        thread.start()
+        started = time.monotonic()
+        try:
+            assert group.wait_all(timeout=5) is True
+        finally:
+            thread.join()
+        assert time.monotonic() - started < 4
+
+    def test_wait_does_not_scan_reports(
+        self, queue: TaskQueue, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """待機はreports/を読まない"""
+        group = queue.enqueue_group(self._specs())
+        self._finish(queue, "reviewer")
+        self._finish(queue, "security-reviewer")
+
+        def fail(*args: object) -> None:
+            raise AssertionError("reports/ was read")
+
+        monkeypatch.setattr("ensemble.queue.codec.load_file", fail)
+
+        assert group.wait_all(timeout=1) is True
+
+    def test_group_lookup_from_another_instance(
+        self, queue: TaskQueue, tmp_path: Path
+    ) -> None:
+        """group(group_id)で別インスタンスから同じグループを参照できる"""
+        group = queue.enqueue_group(self._specs(), group_id="review-1")
+        self._finish(queue, "reviewer")
+
+        other = TaskQueue(base_dir=tmp_path).group("review-1")
+
+        assert other.task_ids == group.task_ids
+        assert len(other.completed()) == 1
+        with pytest.raises(KeyError):
+            queue.group("missing")
+
+    def test_retry_is_not_counted_until_final(self, tmp_path: Path) -> None:
+        """再試行待ちのerrorは数えず、dead-letterで最終結果になる"""
+        queue = TaskQueue(
+            base_dir=tmp_path,
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0, jitter=0),
+        )
+        group = queue.enqueue_group([{"command": "a", "agent": "worker"}])
+
+        self._finish(queue, "worker", result="error")
+        assert group.completed() == {}
+
+        self._finish(queue, "worker", result="error")
+        assert list(group.completed().values()) == ["dead"]
+
+    def test_cleanup_removes_groups(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """cleanupでグループも削除される"""
+        queue.enqueue_group(self._specs())
+
+        queue.cleanup()
+
+        assert list((tmp_path / "groups").iterdir()) == []
+
+
+class TestTaskQueueBackpressure:
+    """深さのカウンターとbackpressureのテスト"""
+
+    def _queue(self, tmp_path: Path, **kwargs) -> TaskQueue:
+        return TaskQueue(base_dir=tmp_path, backpressure=Backpressure(**kwargs))
+
+    def test_depth_follows_enqueue_and_claim(self, tmp_path: Path) -> None:
+        """enqueue / claim / 遅延タスクの投入で深さが増減する"""
+        queue = TaskQueue(base_dir=tmp_path)
+        queue.enqueue_many([{"command": str(i), "agent": "worker"} for i in range(3)])
+        queue.enqueue("later", agent="reviewer", not_before=time.time() + 3600)
+
+        assert queue.depths() == {"worker": 3, "reviewer": 1}
+
+        queue.claim_batch(2, agent="worker")
+        assert queue.depths() == {"worker": 1, "reviewer": 1}
+
+    def test_reap_and_retry_count_again(self, tmp_path: Path) -> None:
+        """回収・再試行でキューに戻ったタスクは再び数える"""
+        queue = TaskQueue(
+            base_dir=tmp_path,
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0, jitter=0),
+        )
+        first = queue.enqueue("a", agent="worker")
+        queue.enqueue("b", agent="worker")
+        queue.claim(lease=0)
+        queue.claim()
+        assert queue.depths() == {}
+
+        queue.reap_expired()
+        assert queue.depths() == {"worker": 1}
+
+        queue.complete(queue.claim()["task_id"], "error", "")
+        assert queue.depths() == {"worker": 1}
+        assert queue.claim()["task_id"] == first
+
+    def test_recount_depth(self, tmp_path: Path) -> None:
+        """既存のキューはカウンターが無ければ一覧して数える"""
+        TaskQueue(base_dir=tmp_path).enqueue("a", agent="worker")
+        (tmp_path / "depth").unlink()
+
+        assert TaskQueue(base_dir=tmp_path).depths() == {"worker": 1}
+
+    def test_reject_when_lane_is_full(self, tmp_path: Path) -> None:
+        """policy=rejectではレーンの上限を超える投入をすぐ拒否する"""
+        queue = self._queue(tmp_path, max_lane_depth=2, policy="reject")
+        queue.enqueue("a", agent="worker")
+        queue.enqueue("b", agent="worker")
+
+        with pytest.raises(QueueFullError):
+            queue.enqueue("c", agent="worker")
+        queue.enqueue("d", agent="reviewer")
+
+        assert len(queue.list_pending()) == 3
+
+    def test_batch_is_all_or_nothing(self, tmp_path: Path) -> None:
+        """enqueue_manyはバッチ全体が入らなければ1件も投入しない"""
+        queue = self._queue(tmp_path, max_depth=3, policy="reject")
+        queue.enqueue("a", agent="worker")
+
+        with pytest.raises(QueueFullError):
+            queue.enqueue_many([{"command": str(i), "agent": "worker"} for i in range(3)])
+
+        assert len(queue.list_pending()) == 1
+        assert queue.depths() == {"worker": 1}
+
+    def test_block_waits_for_claim(self, tmp_path: Path) -> None:
+        """policy=blockでは他のワーカーのclaimで空くまで待つ"""
+        queue = self._queue(tmp_path, max_depth=1, policy="block", timeout=5)
+        queue.enqueue("a", agent="worker")
+
+        def consume() -> None:
+            time.sleep(0.2)
+            TaskQueue(base_dir=tmp_path).claim()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        started = time.monotonic()
+        queue.enqueue("b", agent="worker")
+        consumer.join()
+
+        assert 0.15 <= time.monotonic() - started < 3
+        assert queue.depths() == {"worker": 1}
+
+    def test_block_times_out(self, tmp_path: Path) -> None:
+        """timeoutまで空かなければQueueFullError"""
+        queue = self._queue(tmp_path, max_depth=1, policy="block", timeout=0.2)
+        queue.enqueue("a", agent="worker")
+
+        started = time.monotonic()
+        with pytest.raises(QueueFullError):
+            queue.enqueue("b", agent="worker")
+        assert time.monotonic() - started >= 0.15
+
+    def test_drop_lowest(self, tmp_path: Path) -> None:
+        """policy=drop_lowestでは優先度が最も低い中で最新のタスクを dead/ に落とす"""
+        logger = NDJSONLogger(log_dir=tmp_path / "logs")
+        queue = TaskQueue(
+            base_dir=tmp_path / "queue",
+            logger=logger,
+            backpressure=Backpressure(max_depth=3, policy="drop_lowest"),
+        )
+        old_low = queue.enqueue("old-low", agent="a", priority="low")
+        new_low = queue.enqueue("new-low", agent="b", priority="low")
+        medium = queue.enqueue("medium", agent="a")
+
+        high = queue.enqueue("urgent", agent="a", priority="high")
+
+        assert queue.list_dead() == [new_low]
+        assert queue.get_report(new_low)["result"] == "dropped"
+        assert sorted(queue.list_pending()) == sorted([old_low, medium, high])
+        assert queue.depths() == {"a": 3}
+        dropped = logger.read_events(NDJSONLogger.TASK_DROPPED)
+        assert [e["data"]["task_id"] for e in dropped] == [new_low]
+
+        assert queue.requeue_dead(new_low) is True
+        assert queue.depths() == {"a": 3, "b": 1}
+
+    def test_drop_lowest_never_drops_higher_priority(self, tmp_path: Path) -> None:
+        """落とせる低優先度のタスクが無ければ新しいタスクを拒否する"""
+        queue = self._queue(tmp_path, max_depth=1, policy="drop_lowest")
+        first = queue.enqueue("a", agent="worker")
+
+        with pytest.raises(QueueFullError):
+            queue.enqueue("b", agent="worker")
+
+        assert queue.list_pending() == [first]
+
+    def test_invalid_backpressure(self) -> None:
+        """不正な設定はValueError"""
+        with pytest.raises(ValueError):
+            Backpressure(policy="spill")
+        with pytest.raises(ValueError):
+            Backpressure(max_depth=0)
+
+
+class TestTaskQueueDedup:
+    """enqueue時の重複排除のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """内容のハッシュで重複排除するキューを作成"""
+        return TaskQueue(base_dir=tmp_path, dedup=True)
+
+    def test_make_dedup_key_ignores_param_order(self) -> None:
+        """paramsの順序が違っても同じキー、内容が違えば別のキー"""
+        key = make_dedup_key("scan", "worker", {"a": 1, "b": 2})
+
+        assert key == make_dedup_key("scan", "worker", {"b": 2, "a": 1})
+        assert key != make_dedup_key("scan", "reviewer", {"a": 1, "b": 2})
+
+    def test_duplicate_returns_existing_id(self, queue: TaskQueue) -> None:
+        """未完了の同じタスクは新しく作らず既存のIDを返す"""
+        first = queue.enqueue("scan", agent="worker", params={"path": "src"})
+        second = queue.enqueue("scan", agent="worker", params={"path": "src"})
+        other = queue.enqueue("scan", agent="worker", params={"path": "tests"})
+
+        assert second == first
+        assert other != first
+        assert len(queue.list_pending()) == 2
+
+    def test_failed_write_rolls_back_reservation(
+        self, queue: TaskQueue, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """書き込みに失敗したenqueueは例外になり、深さと重複排除キーを戻す"""
+        monkeypatch.setattr(
+            "ensemble.queue.atomic_write_with_lock", lambda *args, **kwargs: False
+        )
+        monkeypatch.setattr(
+            "ensemble.queue.atomic_write_batch_with_lock", lambda *args, **kwargs: False
+        )
+        with pytest.raises(OSError):
+            queue.enqueue("scan", agent="worker")
+        with pytest.raises(OSError):
+            queue.enqueue_many([{"command": "lint", "agent": "worker"}])
+        with pytest.raises(OSError):
+            queue.enqueue_with_dependency("build", agent="worker")
+        monkeypatch.undo()
+
+        assert queue.depths() == {}
+        assert list(queue.dedup_dir.iterdir()) == []
+        task_id = queue.enqueue("scan", agent="worker")
+        assert queue.list_pending() == [task_id]
+
+    def test_duplicate_while_processing(self, queue: TaskQueue) -> None:
+        """処理中のタスクも重複とみなす"""
+        first = queue.enqueue("scan", agent="worker")
+        queue.claim()
+
+        assert queue.enqueue("scan", agent="worker") == first
+        assert queue.list_pending() == []
+
+    def test_key_is_released_on_completion(self, queue: TaskQueue) -> None:
+        """完了後は同じ内容を新しいタスクとして投入できる"""
+        first = queue.enqueue("scan", agent="worker")
+        queue.claim()
+        queue.complete(first, "success", "")
+
+        second = queue.enqueue("scan", agent="worker")
+
+        assert second != first
+        assert queue.list_pending() == [second]
+
+    def test_stale_key_is_reclaimed(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """解放されずに残ったキーも、指すタスクが完了済みなら取り直す"""
+        first = queue.enqueue("scan", agent="worker")
+        queue.claim()
+        queue.complete(first, "success", "")
+        key_file = queue._dedup_file(make_dedup_key("scan", "worker"))
+        key_file.write_text(first)
+
+        assert queue.enqueue("scan", agent="worker") != first
+
+    def test_explicit_key(self, tmp_path: Path) -> None:
+        """dedup=Falseでもdedup_keyを渡せば重複排除する"""
+        queue = TaskQueue(base_dir=tmp_path)
+        first = queue.enqueue("a", agent="worker", dedup_key="nightly-scan")
+
+        assert queue.enqueue("b", agent="reviewer", dedup_key="nightly-scan") == first
+        assert queue.enqueue("a", agent="worker") != first
+
+    def test_enqueue_many(self, queue: TaskQueue) -> None:
+        """バッチ内・既存タスクとの重複は既存のIDになる"""
+        existing = queue.enqueue("a", agent="worker")
+
+        task_ids = queue.enqueue_many(
+            [
+                {"command": "a", "agent": "worker"},
+                {"command": "b", "agent": "worker"},
+                {"command": "b", "agent": "worker"},
+            ]
+        )
+
+        assert task_ids[0] == existing
+        assert task_ids[1] == task_ids[2] != existing
+        assert len(queue.list_pending()) == 2
+        assert queue.depths() == {"worker": 2}
+
+    def test_key_survives_retry_and_is_released_by_dead_letter(self, tmp_path: Path) -> None:
+        """再試行中は重複のまま、dead-letterで解放される"""
+        queue = TaskQueue(
+            base_dir=tmp_path,
+            dedup=True,
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0, jitter=0),
+        )
+        first = queue.enqueue("a", agent="worker")
+        queue.complete(queue.claim()["task_id"], "error", "")
+        assert queue.enqueue("a", agent="worker") == first
+
+        queue.complete(queue.claim()["task_id"], "error", "")
+        assert queue.list_dead() == [first]
+        assert queue.enqueue("a", agent="worker") != first
+
+    def test_rejected_enqueue_releases_key(self, tmp_path: Path) -> None:
+        """backpressureで拒否された投入はキーを残さない"""
+        queue = TaskQueue(
+            base_dir=tmp_path,
+            dedup=True,
+            backpressure=Backpressure(max_depth=1, policy="reject"),
+        )
+        queue.enqueue("a", agent="worker")
+        with pytest.raises(QueueFullError):
+            queue.enqueue("b", agent="worker")
+        queue.claim()
+
+        assert queue.enqueue("b", agent="worker") in queue.list_pending()
+
+    def test_groups_are_not_deduplicated(self, queue: TaskQueue) -> None:
+        """グループのタスクは重複排除しない"""
+        existing = queue.enqueue("a", agent="worker")
+
+        group = queue.enqueue_group([{"command": "a", "agent": "worker"}])
+
+        assert group.task_ids != [existing]
+        assert len(queue.list_pending()) == 2
+
+
+class TestTaskQueueShards:
+    """シャード配置のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path) -> TaskQueue:
+        """16シャードのキューを作成"""
+        return TaskQueue(base_dir=tmp_path, shards=16)
+
+    def test_tasks_are_spread_over_shards(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """タスクファイルはレーン内のシャードに置かれる"""
+        task_ids = queue.enqueue_many([{"command": str(i), "agent": "worker"} for i in range(40)])
+
+        lane_dir = tmp_path / "tasks" / "worker"
+        assert list(lane_dir.glob("*.yaml")) == []
+        assert len(list(lane_dir.glob("*/*.yaml"))) == 40
+        assert len([d for d in lane_dir.iterdir() if d.is_dir()]) > 1
+        task_id = task_ids[0]
+        assert (lane_dir / shard_name(task_id, 16) / f"p1_{task_id}.yaml").exists()
+        assert sorted(queue.list_pending()) == sorted(task_ids)
+
+    def test_claim_keeps_priority_and_fifo_order(self, queue: TaskQueue) -> None:
+        """シャードに分かれても優先度 → 投入順に取得する"""
+        low = queue.enqueue("low", agent="worker", priority="low")
+        mediums = [queue.enqueue(str(i), agent="worker") for i in range(10)]
+        high = queue.enqueue("high", agent="worker", priority="high")
+
+        claimed = [task["task_id"] for task in queue.claim_batch(20, agent="worker")]
+
+        assert claimed == [high, *mediums, low]
+        assert queue.depths() == {}
+
+    def test_scan_fallback_walks_shards(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """投入ログに載っていないシャード内のタスクも全件走査で取得する"""
+        task_ids = queue.enqueue_many([{"command": str(i), "agent": "worker"} for i in range(5)])
+        for log in (tmp_path / "tasks" / "worker").glob(".p*.log"):
+            log.unlink()
+
+        claimed = {task["task_id"] for task in queue.claim_batch(10)}
+
+        assert claimed == set(task_ids)
+
+    def test_layouts_are_interchangeable(self, tmp_path: Path) -> None:
+        """シャードなしの設定でもシャード配置のキューを読み書きできる"""
+        sharded = TaskQueue(base_dir=tmp_path, shards=4)
+        first = sharded.enqueue("a", agent="worker")
+        plain = TaskQueue(base_dir=tmp_path)
+        second = plain.enqueue("b", agent="worker")
+
+        assert sorted(plain.list_pending()) == [first, second]
+        assert [t["task_id"] for t in plain.claim_batch(2)] == [first, second]
+
+    def test_reap_and_delayed_go_to_shards(self, queue: TaskQueue, tmp_path: Path) -> None:
+        """回収・遅延タスクの昇格もシャードに置かれる"""
+        task_id = queue.enqueue("a", agent="worker")
+        queue.claim(lease=0)
+        queue.reap_expired()
+        delayed_id = queue.enqueue("b", agent="worker", not_before=time.time() - 1)
+
+        lane_dir = tmp_path / "tasks" / "worker"
+        assert (lane_dir / shard_name(task_id, 16) / f"p1_{task_id}.yaml").exists()
+        assert (lane_dir / shard_name(delayed_id, 16) / f"p1_{delayed_id}.yaml").exists()
+
+    def test_blocking_claim_wakes_on_new_shard(self, queue: TaskQueue) -> None:
+        """新しいシャードに置かれたタスクでもclaim待ちが起きる"""
+        def produce() -> None:
+            time.sleep(0.2)
+            queue.enqueue("late", agent="worker")
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        started = time.monotonic()
+        task = queue.claim(agent="worker", timeout=5)
+        producer.join()
+
+        assert task is not None
+        assert time.monotonic() - started < 3
+
+    def test_cleanup_removes_sharded_files(self, queue: TaskQueue) -> None:
+        """cleanupでシャード内のタスクも削除される"""
+        queue.enqueue_many([{"command": str(i), "agent": "worker"} for i in range(5)])
+
+        queue.cleanup()
+
+        assert queue.list_pending() == []
+
+    def test_invalid_shards(self, tmp_path: Path) -> None:
+        """シャード数は0〜256"""
+        with pytest.raises(ValueError):
+            TaskQueue(base_dir=tmp_path, shards=257)
+
+
+class TestTaskQueueSnapshot:
+    """スナップショット・復元・チェックポイントのテスト"""
+
+    def test_restore_into_empty_queue(self, tmp_path: Path) -> None:
+        """全状態のタスクを空のキューに復元できる"""
+        source = TaskQueue(
+            base_dir=tmp_path / "source",
+            retry_policy=RetryPolicy(max_attempts=1, base_delay=0, jitter=0),
+        )
+        done = source.enqueue("done", agent="worker")
+        dead = source.enqueue("dead", agent="worker")
+        processing = source.enqueue("processing", agent="worker")
+        pending = source.enqueue("pending", agent="worker", priority="low")
+        delayed = source.enqueue("delayed", agent="worker", not_before=time.time() + 3600)
+        for task_id, result in ((done, "success"), (dead, "error")):
+            assert source.claim()["task_id"] == task_id
+            source.complete(task_id, result, "out")
+        assert source.claim(lease=0)["task_id"] == processing
+        group = source.enqueue_group([{"command": "g", "agent": "reviewer"}])
+        snapshot_file = tmp_path / "snapshot.ndjson"
+
+        source.snapshot(snapshot_file)
+        target = TaskQueue(base_dir=tmp_path / "target")
+        restored = target.restore(snapshot_file)
+
+        assert restored["pending"] == 1 + len(group.task_ids)
+        assert sorted(target.list_pending()) == sorted([pending, *group.task_ids])
+        assert target.get_report(done)["output"] == "out"
+        assert target.list_dead() == [dead]
+        assert target.counts()["delayed"] == 1
+        ready = {task["task_id"] for task in target.get_ready_tasks()}
+        assert ready == {pending, *group.task_ids}
+        assert target.group(group.group_id).task_ids == group.task_ids
+        # 期限切れのリースで戻した処理中タスクは回収される
+        assert target.reap_expired() == [processing]
+        assert target.depths() == {"worker": 3, "reviewer": 1}
+        # 完了済みIDとシーケンスも戻る
+        after = target.enqueue_with_dependency("after", agent="x", blocked_by=[done])
+        assert after in {task["task_id"] for task in target.get_ready_tasks()}
+        assert after > max(pending, delayed, processing)
+
+    def test_restore_keeps_newer_state(self, tmp_path: Path) -> None:
+        """スナップショット後に進んだタスクは戻さない"""
+        queue = TaskQueue(base_dir=tmp_path)
+        task_id = queue.enqueue("a", agent="worker")
+        snapshot_file = tmp_path / "snapshot.ndjson"
+        queue.snapshot(snapshot_file)
+        queue.complete(queue.claim()["task_id"], "success", "")
+
+        assert queue.restore(snapshot_file) == {}
+        assert queue.list_pending() == []
+        assert queue.get_report(task_id)["result"] == "success"
+
+    def test_restore_rejects_other_files(self, tmp_path: Path) -> None:
+        """スナップショットでないファイルはValueError"""
+        bogus = tmp_path / "bogus.ndjson"
+        bogus.write_text('{"version": 99}\n')
+
+        with pytest.raises(ValueError):
+            TaskQueue(base_dir=tmp_path / "queue").restore(bogus)
+
+    def test_checkpoint_warm_start(self, tmp_path: Path, monkeypatch) -> None:
+        """新しいインスタンスはチェックポイント以降の変更分だけをパースする"""
+        queue = TaskQueue(base_dir=tmp_path, checkpoint_interval=None)
+        first = queue.enqueue("a", agent="worker")
+        done = queue.enqueue("b", agent="other")
+        queue.complete(queue.claim(agent="other")["task_id"], "success", "")
+        dependent = queue.enqueue_with_dependency("d", agent="worker", blocked_by=[done])
+        queue.snapshot(full=False)
+        assert queue.checkpoint_path.exists()
+        second = queue.enqueue("c", agent="worker")
+
+        parsed: list[str] = []
+        load_file = codec.load_file
+
+        def counting_load_file(path):
+            parsed.append(Path(path).name)
+            return load_file(path)
+
+        monkeypatch.setattr("ensemble.queue.codec.load_file", counting_load_file)
+        restarted = TaskQueue(base_dir=tmp_path, checkpoint_interval=None)
+        ready = [task["task_id"] for task in restarted.get_ready_tasks()]
+
+        assert sorted(ready) == [first, dependent, second]
+        assert parsed == [f"p1_{second}.yaml"]
+
+    def test_stale_checkpoint_entries_are_ignored(self, tmp_path: Path) -> None:
+        """チェックポイント後にclaim・作り直されたファイルは使わない"""
+        queue = TaskQueue(base_dir=tmp_path, checkpoint_interval=None)
+        queue.enqueue("a", agent="worker")
+        queue.snapshot(full=False)
+        queue.claim()
+        queue.cleanup()
+        second = queue.enqueue("b", agent="worker")
+
+        restarted = TaskQueue(base_dir=tmp_path, checkpoint_interval=None)
+
+        assert [t["task_id"] for t in restarted.get_ready_tasks()] == [second]
+
+    def test_checkpoint_is_written_by_complete(self, tmp_path: Path) -> None:
+        """チェックポイントはcomplete()が書き出し、get_ready_tasks()は書かない"""
+        queue = TaskQueue(base_dir=tmp_path, checkpoint_interval=0)
+        queue.enqueue("a", agent="worker")
+        queue.get_ready_tasks()
+        assert not queue.checkpoint_path.exists()
+
+        queue.complete(queue.claim()["task_id"], "success", "")
+
+        assert queue.checkpoint_path.exists()
+
+    def test_unchanged_directories_are_not_listed(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """チェックポイント以降に変更のないディレクトリは再起動後も一覧しない"""
+        queue = TaskQueue(base_dir=tmp_path, checkpoint_interval=None)
+        idle = queue.enqueue("a", agent="idle")
+        queue.enqueue("b", agent="busy")
+        # ディレクトリを十分古くしてからチェックポイントを取る
+        past = time.time() - 60
+        for directory in (tmp_path / "tasks", tmp_path / "tasks" / "idle"):
+            os.utime(directory, (past, past))
+        queue.snapshot(full=False)
+        for directory in (tmp_path / "tasks", tmp_path / "tasks" / "idle"):
+            os.utime(directory, (past, past))
+        added = queue.enqueue("c", agent="busy")
+
+        listed: list[str] = []
+        scandir = os.scandir
+
+        def counting_scandir(path):
+            listed.append(Path(path).name)
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", counting_scandir)
+        restarted = TaskQueue(base_dir=tmp_path, checkpoint_interval=None)
+        ready = {task["task_id"] for task in restarted.get_ready_tasks()}
+
+        assert idle in ready and added in ready
+        assert "idle" not in listed and "tasks" not in listed
+        assert "busy" in listed
+
+
+class TestTaskQueueDurability:
+    """TaskQueue の耐久性レベルのテスト"""
+
+    def test_level_comes_from_config(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """durability省略時は設定の durability.queue を使う"""
+        monkeypatch.setattr("ensemble.queue.get_durability", lambda subsystem: "fsync")
+
+        assert TaskQueue(base_dir=tmp_path).durability == "fsync"
+        assert TaskQueue(base_dir=tmp_path, durability="none").durability == "none"
+        with pytest.raises(ValueError):
+            TaskQueue(base_dir=tmp_path, durability="sometimes")
+
+    def test_fsync_level_is_used_for_queue_writes(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """タスクとレポートの書き込みがfsyncされる"""
+        queue = TaskQueue(base_dir=tmp_path, durability="fsync")
+        synced: list[int] = []
+        real_fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(fd), real_fsync(fd)))
+
+        task_id = queue.enqueue("a", agent="worker")
+        enqueue_syncs = len(synced)
+        queue.claim()
+        queue.complete(task_id, "success", "done")
+
+        assert enqueue_syncs == 2
+        assert len(synced) == 4
+        assert queue.get_report(task_id)["result"] == "success"
@@ -0,0 +1,343 @@
+"""キューサーバーとRemoteTaskQueueのテスト"""
+
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from ensemble.queue import create_task_queue
+from ensemble.queue_server import (
+    QueueServer,
+    QueueServerError,
+    QueueState,
+    RemoteTaskQueue,
+    parse_address,
+)
+
+
+@pytest.fixture
+def server(tmp_path: Path):
+    """Unixソケットで待ち受けるテスト用サーバー"""
+    state = QueueState(tmp_path)
+    srv = QueueServer(state, socket_path=tmp_path / "queue.sock")
+    srv.start()
+    yield srv
+    srv.shutdown()
+
+
+@pytest.fixture
+def queue(tmp_path: Path, server: QueueServer):
+    """サーバーに接続したクライアント"""
+    client = RemoteTaskQueue(base_dir=tmp_path)
+    yield client
+    client.close()
+
+
+class TestQueueState:
+    """QueueState のテスト"""
+
+    def test_priority_then_fifo(self, tmp_path: Path) -> None:
+        """優先度 → 登録順でclaimされることを確認"""
+        state = QueueState(tmp_path)
+        low = state.enqueue(command="low", agent="w", priority="low")
+        first = state.enqueue(command="first", agent="w")
+        second = state.enqueue(command="second", agent="w")
+        high = state.enqueue(command="high", agent="w", priority="high")
+
+        claimed = [state.claim()["task_id"] for _ in range(4)]
+
+        assert claimed == [high, first, second, low]
+        state.close()
+
+    def test_claim_by_agent(self, tmp_path: Path) -> None:
+        """agent指定時は自レーンのタスクのみ取得する"""
+        state = QueueState(tmp_path)
+        state.enqueue(command="code", agent="coder")
+        review = state.enqueue(command="review", agent="reviewer")
+
+        assert state.claim(agent="reviewer")["task_id"] == review
+        assert state.claim(agent="reviewer") is None
+        state.close()
+
+    def test_state_survives_restart(self, tmp_path: Path) -> None:
+        """WALを再生すると保留・処理中・完了の状態が戻る"""
+        state = QueueState(tmp_path)
+        done = state.enqueue(command="done", agent="w")
+        running = state.enqueue(command="running", agent="w")
+        waiting = state.enqueue(command="waiting", agent="w")
+        state.claim()
+        state.complete(done, result="success", output="ok")
+        state.claim(lease=100)
+        state.close()
+
+        restarted = QueueState(tmp_path)
+
+        assert restarted.get_report(done)["output"] == "ok"
+        assert restarted.list_pending() == [waiting]
+        assert restarted.heartbeat(running) is True
+        restarted.close()
+
+    def test_torn_wal_tail_is_ignored(self, tmp_path: Path) -> None:
+        """途中まで書かれたWALの末尾行は無視される"""
+        state = QueueState(tmp_path)
+        task_id = state.enqueue(command="a", agent="w")
+        state.close()
+        with open(tmp_path / "queue.wal", "a") as f:
+            f.write('{"op": "enq')
+
+        restarted = QueueState(tmp_path)
+
+        assert restarted.list_pending() == [task_id]
+        restarted.close()
+
+    def test_reap_expired_requeues(self, tmp_path: Path) -> None:
+        """期限切れのタスクが保留に戻りattemptsが増える"""
+        state = QueueState(tmp_path)
+        task_id = state.enqueue(command="a", agent="w")
+        state.claim(lease=-1)
+
+        assert state.reap_expired() == [task_id]
+        assert state.claim()["attempts"] == 1
+        state.close()
+
+    def test_wal_is_compacted_while_running(self, tmp_path: Path) -> None:
+        """追記がcompact_recordsを超えると起動中でもWALが書き直される"""
+        state = QueueState(tmp_path, compact_records=10)
+        for _ in range(20):
+            task_id = state.enqueue(command="a", agent="w")
+            state.claim()
+            state.complete(task_id, result="success", output="ok")
+
+        lines = (tmp_path / "queue.wal").read_text().splitlines()
+        # 追記したのは60レコード。コンパクション後は完了報告ごとに1行程度
+        assert len(lines) < 60
+        state.close()
+
+        restarted = QueueState(tmp_path)
+        assert restarted.get_report(task_id)["output"] == "ok"
+        restarted.close()
+
+    def test_old_reports_are_archived(self, tmp_path: Path) -> None:
+        """max_reportsを超えた古い報告はアーカイブに移り、引き続き参照できる"""
+        state = QueueState(tmp_path, max_reports=4)
+        done = []
+        for i in range(6):
+            task_id = state.enqueue(command=f"t{i}", agent="w")
+            state.claim()
+            state.complete(task_id, result="success", output=str(i))
+            done.append(task_id)
+        waiting = state.enqueue_with_dependency(command="last", agent="w", blocked_by=[done[0]])
+
+        assert len(state._reports) <= 4
+        assert state.archive.get(done[0])["output"] == "0"
+        assert state.get_report(done[0])["output"] == "0"
+        assert [t["task_id"] for t in state.get_ready_tasks()] == [waiting]
+        state.cleanup()
+        assert state.get_report(done[0]) is None
+        state.close()
+
+
+class TestRemoteTaskQueue:
+    """RemoteTaskQueue 経由の操作のテスト"""
+
+    def test_enqueue_claim_complete(self, queue: RemoteTaskQueue) -> None:
+        """TaskQueueと同じ操作がサーバー越しに行える"""
+        task_id = queue.enqueue(command="build", agent="coder", params={"n": 1})
+
+        task = queue.claim()
+        assert task["task_id"] == task_id
+        assert task["params"] == {"n": 1}
+        assert task["status"] == "processing"
+        assert "lease_expires_at" in task
+
+        queue.complete(task_id, result="success", output="ok")
+        assert queue.get_report(task_id)["result"] == "success"
+        assert queue.claim() is None
+
+    def test_dependencies(self, queue: RemoteTaskQueue) -> None:
+        """依存関係付きタスクは依存先の完了後に実行可能になる"""
+        first = queue.enqueue(command="first", agent="w")
+        second = queue.enqueue_with_dependency(command="second", agent="w", blocked_by=[first])
+
+        assert [t["task_id"] for t in queue.get_ready_tasks()] == [first]
+        queue.complete(first, result="success", output="ok")
+        assert [t["task_id"] for t in queue.get_ready_tasks()] == [second]
+
+    def test_enqueue_many_and_claim_batch(self, queue: RemoteTaskQueue) -> None:
+        """まとめて追加・取得できる"""
+        ids = queue.enqueue_many([{"command": f"t{i}", "agent": "w"} for i in range(3)])
+
+        batch = queue.claim_batch(5)
+
+        assert [t["task_id"] for t in batch] == ids
+
+    def test_claim_timeout_wakes_on_enqueue(
+        self, tmp_path: Path, queue: RemoteTaskQueue
+    ) -> None:
+        """claim(timeout=...)は別クライアントのenqueueで起きる"""
+        producer = RemoteTaskQueue(base_dir=tmp_path)
+        timer = threading.Timer(0.05, producer.enqueue, kwargs={"command": "a", "agent": "w"})
+        timer.start()
+
+        start = time.monotonic()
+        task = queue.claim(timeout=5)
+
+        assert task is not None and task["command"] == "a"
+        assert time.monotonic() - start < 2
+        timer.join()
+        producer.close()
+
+    def test_invalid_priority_raises_value_error(self, queue: RemoteTaskQueue) -> None:
+        """未知の優先度はValueError"""
+        with pytest.raises(ValueError):
+            queue.enqueue(command="a", agent="w", priority="urgent")
+
+    def test_concurrent_claims_are_exclusive(self, tmp_path: Path, queue: RemoteTaskQueue) -> None:
+        """複数クライアントの並列claimで同じタスクが二重取得されない"""
+        queue.enqueue_many([{"command": f"t{i}", "agent": "w"} for i in range(40)])
+        claimed: list[str] = []
+        lock = threading.Lock()
+
+        def worker() -> None:
+            client = RemoteTaskQueue(base_dir=tmp_path)
+            while (task := client.claim()) is not None:
+                with lock:
+                    claimed.append(task["task_id"])
+            client.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(claimed) == len(set(claimed)) == 40
+
+    def test_unreachable_server(self, tmp_path: Path) -> None:
+        """サーバーがなければQueueServerError"""
+        client = RemoteTaskQueue(address=f"unix:{tmp_path / 'missing.sock'}")
+
+        with pytest.raises(QueueServerError):
+            client.claim()
+
+    def test_enqueue_is_not_resent_after_send(self, tmp_path: Path) -> None:
+        """送信後に接続が切れた場合、enqueueは二重に送らずQueueServerError"""
+        import socket
+
+        sock_path = tmp_path / "flaky.sock"
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(str(sock_path))
+        listener.listen()
+        received: list[bytes] = []
+
+        def serve() -> None:
+            # 1行読んだら応答せずに切断する
+            for _ in range(2):
+                try:
+                    conn, _ = listener.accept()
+                except OSError:
+                    return
+                with conn:
+                    received.append(conn.makefile("rb").readline())
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        client = RemoteTaskQueue(address=f"unix:{sock_path}", timeout=2)
+        try:
+            with pytest.raises(QueueServerError):
+                client.enqueue(command="a", agent="w")
+            time.sleep(0.1)
+            assert len(received) == 1
+        finally:
+            client.close()
+            listener.close()
+
+    def test_reconnects_after_server_restart(self, tmp_path: Path) -> None:
+        """サーバーが再起動しても、届いていない要求は新しい接続で送り直される"""
+        sock_path = tmp_path / "queue.sock"
+        server = QueueServer(QueueState(tmp_path), socket_path=sock_path)
+        server.start()
+        client = RemoteTaskQueue(address=f"unix:{sock_path}")
+        try:
+            first = client.enqueue(command="a", agent="w")
+            server.shutdown()
+            server = QueueServer(QueueState(tmp_path), socket_path=sock_path)
+            server.start()
+
+            second = client.enqueue(command="b", agent="w")
+
+            assert client.list_pending() == [first, second]
+        finally:
+            client.close()
+            server.shutdown()
+
+    def test_failed_send_is_retried(self, tmp_path: Path) -> None:
+        """書き込み自体に失敗した要求は再接続して1回だけ送り直す"""
+        sock_path = tmp_path / "queue.sock"
+        server = QueueServer(QueueState(tmp_path), socket_path=sock_path)
+        server.start()
+        client = RemoteTaskQueue(address=f"unix:{sock_path}")
+        try:
+            client.list_pending()
+            server.shutdown()
+            server = QueueServer(QueueState(tmp_path), socket_path=sock_path)
+            server.start()
+
+            # 切断の事前検知をすり抜けても、送信の失敗なら送り直せる
+            with patch.object(RemoteTaskQueue, "_is_stale", return_value=False):
+                task_id = client.enqueue(command="a", agent="w")
+
+            assert client.list_pending() == [task_id]
+        finally:
+            client.close()
+            server.shutdown()
+
+    def test_create_task_queue_remote(self, tmp_path: Path, server: QueueServer) -> None:
+        """create_task_queue(backend="remote")でクライアントが返る"""
+        client = create_task_queue(base_dir=tmp_path, backend="remote")
+        try:
+            assert isinstance(client, RemoteTaskQueue)
+            assert client.claim() is None
+        finally:
+            client.close()
+
+
+class TestQueueServerTCP:
+    """TCP待ち受けとトークン認証のテスト"""
+
+    def test_tcp_with_token(self, tmp_path: Path) -> None:
+        """TCPでも接続でき、トークンが違うと拒否される"""
+        server = QueueServer(
+            QueueState(tmp_path), tcp_address=("127.0.0.1", 0), token="secret"
+        )
+        server.start()
+        try:
+            address = server.addresses[0]
+            assert address.startswith("tcp:127.0.0.1:")
+
+            client = RemoteTaskQueue(address=address, token="secret")
+            task_id = client.enqueue(command="a", agent="w")
+            assert client.claim()["task_id"] == task_id
+            client.close()
+
+            intruder = RemoteTaskQueue(address=address, token="wrong")
+            with pytest.raises(QueueServerError):
+                intruder.list_pending()
+            intruder.close()
+        finally:
+            server.shutdown()
+
+
+class TestParseAddress:
+    """parse_address のテスト"""
+
+    def test_formats(self) -> None:
+        """unix: / tcp: / host:port / パスを解釈できる"""
+        import socket
+
+        assert parse_address("unix:/tmp/q.sock") == (socket.AF_UNIX, "/tmp/q.sock")
+        assert parse_address("tcp:10.0.0.5:7878") == (socket.AF_INET, ("10.0.0.5", 7878))
+        assert parse_address("localhost:7878") == (socket.AF_INET, ("localhost", 7878))
+        assert parse_address("queue/queue.sock") == (socket.AF_UNIX, "queue/queue.sock")
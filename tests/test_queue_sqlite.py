@@ -0,0 +1,384 @@
+"""SQLiteバックエンドのキュー操作のテスト"""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+from ensemble.queue import TaskQueue, create_task_queue
+from ensemble.queue_sqlite import SQLiteTaskQueue
+
+
+class TestSQLiteTaskQueue:
+    """SQLiteTaskQueue のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path):
+        """テスト用キューを作成"""
+        q = SQLiteTaskQueue(base_dir=tmp_path)
+        yield q
+        q.close()
+
+    def test_init_creates_wal_database(self, tmp_path: Path) -> None:
+        """初期化時にWALモードのDBが作成されることを確認"""
+        q = SQLiteTaskQueue(base_dir=tmp_path)
+        try:
+            assert (tmp_path / "queue.db").exists()
+            conn = sqlite3.connect(str(tmp_path / "queue.db"))
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            indexes = [
+                row[1]
+                for row in conn.execute("PRAGMA index_list('tasks')").fetchall()
+            ]
+            conn.close()
+            assert mode == "wal"
+            assert "idx_tasks_status_seq" in indexes
+        finally:
+            q.close()
+
+    def test_enqueue_and_claim(self, queue: SQLiteTaskQueue) -> None:
+        """enqueueしたタスクをclaimで取得できることを確認"""
+        task_id = queue.enqueue(
+            command="build", agent="coder", params={"target": "src/main.py"}
+        )
+
+        task = queue.claim()
+
+        assert task is not None
+        assert task["task_id"] == task_id
+        assert task["command"] == "build"
+        assert task["agent"] == "coder"
+        assert task["params"] == {"target": "src/main.py"}
+        assert task["status"] == "processing"
+
+    def test_claim_is_fifo(self, queue: SQLiteTaskQueue) -> None:
+        """古いタスクから順に取得されることを確認"""
+        ids = [queue.enqueue(command=f"task{i}", agent="worker") for i in range(3)]
+
+        claimed = [queue.claim()["task_id"] for _ in range(3)]
+
+        assert claimed == ids
+
+    def test_claim_returns_none_if_queue_empty(self, queue: SQLiteTaskQueue) -> None:
+        """キューが空の場合Noneを返すことを確認"""
+        assert queue.claim() is None
+
+    def test_claimed_task_not_claimed_twice(self, queue: SQLiteTaskQueue) -> None:
+        """claim済みタスクは再取得されないことを確認"""
+        queue.enqueue(command="only", agent="worker")
+
+        assert queue.claim() is not None
+        assert queue.claim() is None
+
+    def test_complete_records_report(self, queue: SQLiteTaskQueue) -> None:
+        """completeで結果が記録されることを確認"""
+        task_id = queue.enqueue(command="test", agent="worker")
+        queue.claim()
+
+        queue.complete(task_id, result="error", output="Build failed", error="Timeout")
+
+        report = queue.get_report(task_id)
+        assert report is not None
+        assert report["command"] == "test"
+        assert report["result"] == "error"
+        assert report["output"] == "Build failed"
+        assert report["error"] == "Timeout"
+
+    def test_complete_unknown_task(self, queue: SQLiteTaskQueue) -> None:
+        """未知のタスクIDでもレポートが残ることを確認"""
+        queue.complete("unknown-id", result="success", output="ok")
+
+        report = queue.get_report("unknown-id")
+        assert report is not None
+        assert report["result"] == "success"
+
+    def test_list_pending_excludes_claimed_tasks(self, queue: SQLiteTaskQueue) -> None:
+        """claimされたタスクはlist_pendingに含まれないことを確認"""
+        id1 = queue.enqueue(command="task1", agent="agent1")
+        id2 = queue.enqueue(command="task2", agent="agent2")
+
+        queue.claim()
+
+        assert queue.list_pending() == [id2]
+        assert id1 not in queue.list_pending()
+
+    def test_cleanup_removes_all_tasks(self, queue: SQLiteTaskQueue) -> None:
+        """cleanupで全タスクが削除されることを確認"""
+        queue.enqueue(command="task1", agent="agent1")
+        queue.enqueue(command="task2", agent="agent2")
+
+        queue.cleanup()
+
+        assert queue.list_pending() == []
+        assert queue.claim() is None
+
+    def test_get_ready_tasks_respects_dependencies(self, queue: SQLiteTaskQueue) -> None:
+        """依存先が完了するまでタスクが実行可能にならないことを確認"""
+        first = queue.enqueue(command="first", agent="worker")
+        second = queue.enqueue_with_dependency(
+            command="second", agent="worker", blocked_by=[first]
+        )
+
+        ready = [t["task_id"] for t in queue.get_ready_tasks()]
+        assert ready == [first]
+
+        queue.claim()
+        queue.complete(first, result="success", output="done")
+
+        ready = [t["task_id"] for t in queue.get_ready_tasks()]
+        assert ready == [second]
+
+    def test_get_ready_tasks_with_explicit_completed_ids(
+        self, queue: SQLiteTaskQueue
+    ) -> None:
+        """completed_task_idsを明示指定できることを確認"""
+        task_id = queue.enqueue_with_dependency(
+            command="second", agent="worker", blocked_by=["external-task"]
+        )
+
+        assert queue.get_ready_tasks() == []
+        ready = queue.get_ready_tasks(completed_task_ids=["external-task"])
+        assert [t["task_id"] for t in ready] == [task_id]
+
+    def test_state_shared_between_instances(self, tmp_path: Path) -> None:
+        """同じDBを開いた別インスタンス間で状態が共有されることを確認"""
+        producer = SQLiteTaskQueue(base_dir=tmp_path)
+        consumer = SQLiteTaskQueue(base_dir=tmp_path)
+        try:
+            task_id = producer.enqueue(command="shared", agent="worker")
+            task = consumer.claim()
+            assert task is not None
+            assert task["task_id"] == task_id
+            assert producer.claim() is None
+        finally:
+            producer.close()
+            consumer.close()
+
+    def test_concurrent_claims_are_exclusive(self, tmp_path: Path) -> None:
+        """並列claimで同じタスクが二重取得されないことを確認"""
+        setup = SQLiteTaskQueue(base_dir=tmp_path)
+        for i in range(50):
+            setup.enqueue(command=f"task{i}", agent="worker")
+        setup.close()
+
+        claimed: list[str] = []
+        claimed_lock = threading.Lock()
+
+        def worker() -> None:
+            q = SQLiteTaskQueue(base_dir=tmp_path)
+            try:
+                while True:
+                    task = q.claim()
+                    if task is None:
+                        return
+                    with claimed_lock:
+                        claimed.append(task["task_id"])
+            finally:
+                q.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(claimed) == 50
+        assert len(set(claimed)) == 50
+
+
+class TestCreateTaskQueue:
+    """create_task_queue のテスト"""
+
+    def test_default_backend_is_file(self, tmp_path: Path) -> None:
+        """デフォルトはファイルバックエンド"""
+        queue = create_task_queue(base_dir=tmp_path)
+        assert isinstance(queue, TaskQueue)
+
+    def test_sqlite_backend(self, tmp_path: Path) -> None:
+        """sqliteを指定するとSQLiteTaskQueueが返る"""
+        queue = create_task_queue(base_dir=tmp_path, backend="sqlite")
+        try:
+            assert isinstance(queue, SQLiteTaskQueue)
+        finally:
+            queue.close()
+
+    def test_unknown_backend_raises(self, tmp_path: Path) -> None:
+        """未知のバックエンドはValueError"""
+        with pytest.raises(ValueError):
+            create_task_queue(base_dir=tmp_path, backend="redis")
+
+
+class TestSQLiteTaskQueueBatch:
+    """SQLiteTaskQueue の enqueue_many / claim_batch のテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path):
+        """テスト用キューを作成"""
+        q = SQLiteTaskQueue(base_dir=tmp_path)
+        yield q
+        q.close()
+
+    def test_enqueue_many_and_claim_batch(self, queue: SQLiteTaskQueue) -> None:
+        """まとめて追加したタスクをまとめて取得できることを確認"""
+        task_ids = queue.enqueue_many(
+            [{"command": f"t{i}", "agent": "worker"} for i in range(5)]
+        )
+
+        batch = queue.claim_batch(3)
+
+        assert [t["task_id"] for t in batch] == task_ids[:3]
+        assert all(t["status"] == "processing" for t in batch)
+        assert len(queue.list_pending()) == 2
+
+    def test_enqueue_many_preserves_fifo_order(self, queue: SQLiteTaskQueue) -> None:
+        """同一バッチのタスクが投入順にlist/claimされることを確認"""
+        task_ids = queue.enqueue_many(
+            [{"command": f"t{i}", "agent": "worker"} for i in range(50)]
+        )
+
+        assert queue.list_pending() == task_ids
+        claimed = [queue.claim()["task_id"] for _ in range(25)]
+        claimed += [t["task_id"] for t in queue.claim_batch(25)]
+        assert claimed == task_ids
+
+    def test_claim_batch_filters_by_agent(self, queue: SQLiteTaskQueue) -> None:
+        """agent指定時はそのエージェント宛のタスクのみ取得する"""
+        queue.enqueue(command="code", agent="coder")
+        review_id = queue.enqueue(command="review", agent="reviewer")
+
+        batch = queue.claim_batch(10, agent="reviewer")
+
+        assert [t["task_id"] for t in batch] == [review_id]
+
+    def test_claim_with_agent(self, queue: SQLiteTaskQueue) -> None:
+        """claim(agent=...)は指定エージェントのタスクのみ取得する"""
+        queue.enqueue(command="code", agent="coder")
+        review_id = queue.enqueue(command="review", agent="reviewer")
+
+        assert queue.claim(agent="reviewer")["task_id"] == review_id
+        assert queue.claim(agent="reviewer") is None
+        assert queue.claim() is not None
+
+    def test_claim_order_is_priority_then_age(self, queue: SQLiteTaskQueue) -> None:
+        """優先度 → 古い順でclaimされることを確認"""
+        low = queue.enqueue(command="low", agent="w", priority="low")
+        medium = queue.enqueue(command="medium", agent="w")
+        high = queue.enqueue(command="high", agent="w", priority="high")
+
+        claimed = [queue.claim()["task_id"] for _ in range(3)]
+
+        assert claimed == [high, medium, low]
+
+    def test_migrates_database_without_priority(self, tmp_path: Path) -> None:
+        """priorityカラムのない既存DBにカラムが追加されることを確認"""
+        conn = sqlite3.connect(str(tmp_path / "queue.db"))
+        conn.execute(
+            "CREATE TABLE tasks (task_id TEXT PRIMARY KEY, command TEXT NOT NULL "
+            "DEFAULT '', agent TEXT NOT NULL DEFAULT '', params TEXT NOT NULL "
+            "DEFAULT '{}', blocked_by TEXT, status TEXT NOT NULL, created_at TEXT "
+            "NOT NULL, claimed_at TEXT, completed_at TEXT, result TEXT, output TEXT, "
+            "error TEXT)"
+        )
+        conn.execute(
+            "INSERT INTO tasks (task_id, command, agent, status, created_at) "
+            "VALUES ('old', 'old', 'w', 'pending', '2026-01-01T00:00:00')"
+        )
+        conn.commit()
+        conn.close()
+
+        q = SQLiteTaskQueue(base_dir=tmp_path)
+        try:
+            task = q.claim()
+            assert task["task_id"] == "old"
+            assert task["priority"] == "medium"
+        finally:
+            q.close()
+
+    def test_enqueue_many_keeps_blocked_by(self, queue: SQLiteTaskQueue) -> None:
+        """blocked_by付きのspecが依存関係として保存されることを確認"""
+        first, second = queue.enqueue_many(
+            [
+                {"command": "first", "agent": "w"},
+                {"command": "second", "agent": "w", "blocked_by": ["missing"]},
+            ]
+        )
+
+        ready = [t["task_id"] for t in queue.get_ready_tasks()]
+        assert ready == [first]
+
+
+class TestSQLiteTaskQueueLease:
+    """SQLiteTaskQueue のリース付きclaimとreaperのテスト"""
+
+    @pytest.fixture
+    def queue(self, tmp_path: Path):
+        """テスト用キューを作成"""
+        q = SQLiteTaskQueue(base_dir=tmp_path)
+        yield q
+        q.close()
+
+    def test_claim_returns_lease_expiry(self, queue: SQLiteTaskQueue) -> None:
+        """claimしたタスクにリース期限が付くことを確認"""
+        queue.enqueue(command="a", agent="worker")
+
+        task = queue.claim(lease=100)
+
+        assert "lease_expires_at" in task
+
+    def test_reap_ignores_live_lease(self, queue: SQLiteTaskQueue) -> None:
+        """リース期限内のタスクは戻されない"""
+        queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=100)
+
+        assert queue.reap_expired() == []
+        assert queue.claim() is None
+
+    def test_reap_requeues_expired_task(self, queue: SQLiteTaskQueue) -> None:
+        """期限切れタスクがpendingに戻りattemptsが増えることを確認"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+
+        assert queue.reap_expired() == [task_id]
+
+        task = queue.claim()
+        assert task["task_id"] == task_id
+        assert task["attempts"] == 1
+
+    def test_heartbeat_extends_lease(self, queue: SQLiteTaskQueue) -> None:
+        """heartbeatでリースが延長され、reapされなくなる"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+
+        assert queue.heartbeat(task_id, lease=100) is True
+        assert queue.reap_expired() == []
+        assert queue.heartbeat("missing") is False
+
+    def test_completed_task_is_not_reaped(self, queue: SQLiteTaskQueue) -> None:
+        """完了済みタスクはリース期限を過ぎても戻されない"""
+        task_id = queue.enqueue(command="a", agent="worker")
+        queue.claim(lease=-1)
+        queue.complete(task_id, result="success", output="ok")
+
+        assert queue.reap_expired() == []
+
+
+class TestSQLiteTaskQueueBlockingClaim:
+    """SQLiteTaskQueue の claim(timeout=...) のテスト"""
+
+    def test_claim_waits_for_new_task(self, tmp_path: Path) -> None:
+        """claim(timeout=...)は待機中に追加されたタスクを取得する"""
+        consumer = SQLiteTaskQueue(base_dir=tmp_path)
+        producer = SQLiteTaskQueue(base_dir=tmp_path)
+        try:
+            assert consumer.claim(timeout=0.05) is None
+
+            timer = threading.Timer(0.05, producer.enqueue, kwargs={"command": "a", "agent": "w"})
+            timer.start()
+            task = consumer.claim(timeout=5)
+            timer.join()
+
+            assert task is not None and task["command"] == "a"
+        finally:
+            consumer.close()
+            producer.close()
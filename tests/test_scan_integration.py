@@ -40,6 +40,11 @@ class TestSessionStartHook:
 class TestAutonomousLoopScanIntegration:
     """Test that autonomous loop uses scan for task selection."""
 
+    @pytest.fixture(autouse=True)
+    def isolate_session_logs(self, tmp_path, monkeypatch):
+        """Write NDJSON session logs under tmp_path instead of the repository."""
+        monkeypatch.chdir(tmp_path)
+
     @patch("ensemble.autonomous_loop.subprocess.run")
     def test_loop_scan_mode(self, mock_run, tmp_path):
         """Test autonomous loop with scan-based task selection."""
@@ -366,3 +366,27 @@ class TestCLIScanCommand:
         result = runner.invoke(cli, ["scan"])
 
         assert result.exit_code == 0
+
+    @patch("ensemble.scanner.subprocess.run")
+    def test_scan_enqueue_pushes_tasks_with_priority(
+        self, mock_run, tmp_path, monkeypatch
+    ):
+        """Test scan --enqueue writes candidates into the queue by priority."""
+        from ensemble.cli import cli
+        from ensemble.queue import TaskQueue
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "code.py").write_text("# TODO: later\n# FIXME: broken\n")
+        mock_run.return_value = MagicMock(returncode=0, stdout="[]")
+
+        runner = CliRunner()
+        result = runner.invoke(cli, ["scan", "--include", "todo", "--enqueue"])
+
+        assert result.exit_code == 0
+        assert "Enqueued 2 tasks" in result.output
+
+        queue = TaskQueue(base_dir=tmp_path / "queue")
+        first = queue.claim(agent="worker")
+        second = queue.claim(agent="worker")
+        assert first["priority"] == "high"
+        assert second["priority"] != "high"
@@ -0,0 +1,77 @@
+"""ディレクトリ変更待機のテスト"""
+
+import threading
+import time
+from pathlib import Path
+
+from ensemble import watch
+from ensemble.watch import DirectoryWatcher, backoff_delays
+
+
+class TestBackoffDelays:
+    """backoff_delays のテスト"""
+
+    def test_doubles_up_to_maximum(self) -> None:
+        """待機時間が倍々に増え、上限で止まる"""
+        delays = backoff_delays(initial=0.1, maximum=0.5)
+
+        assert [next(delays) for _ in range(5)] == [0.1, 0.2, 0.4, 0.5, 0.5]
+
+
+class TestDirectoryWatcher:
+    """DirectoryWatcher のテスト"""
+
+    def test_wait_times_out(self, tmp_path: Path) -> None:
+        """変更がなければタイムアウトでFalse"""
+        with DirectoryWatcher([tmp_path]) as watcher:
+            start = time.monotonic()
+            assert watcher.wait(0.05) is False
+            assert time.monotonic() - start >= 0.04
+
+    def test_wakes_on_new_file(self, tmp_path: Path) -> None:
+        """ファイルが追加されるとタイムアウト前に戻る"""
+        with DirectoryWatcher([tmp_path]) as watcher:
+            timer = threading.Timer(0.05, (tmp_path / "task.yaml").write_text, ["x"])
+            timer.start()
+            start = time.monotonic()
+            assert watcher.wait(5) is True
+            assert time.monotonic() - start < 2
+            timer.join()
+
+    def test_watches_new_subdirectories(self, tmp_path: Path) -> None:
+        """後から作られたサブディレクトリへの追加も検知する"""
+        with DirectoryWatcher([tmp_path]) as watcher:
+            lane = tmp_path / "worker"
+            lane.mkdir()
+            assert watcher.wait(1) is True
+
+            timer = threading.Timer(0.05, (lane / "task.yaml").write_text, ["x"])
+            timer.start()
+            assert watcher.wait(5) is True
+            timer.join()
+
+    def test_modify_mask_wakes_on_append(self, tmp_path: Path) -> None:
+        """IN_MODIFYを指定すると既存ファイルへの追記でも起きる"""
+        log = tmp_path / "done"
+        log.write_text("")
+
+        def append() -> None:
+            with open(log, "a") as f:
+                f.write("task\n")
+
+        with DirectoryWatcher([tmp_path], mask=watch.IN_MODIFY) as watcher:
+            if not watcher.uses_inotify:
+                return
+            timer = threading.Timer(0.05, append)
+            timer.start()
+            assert watcher.wait(5) is True
+            timer.join()
+
+    def test_polling_fallback(self, tmp_path: Path, monkeypatch) -> None:
+        """inotifyが使えない環境ではバックオフで待つ"""
+        monkeypatch.setattr(watch, "_libc", None)
+
+        with DirectoryWatcher([tmp_path]) as watcher:
+            assert watcher.uses_inotify is False
+            assert watcher.wait(1) is True
+            assert watcher.wait(0.001) is False
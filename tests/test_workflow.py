@@ -128,6 +128,23 @@ class TestParseReviewResults:
         assert results == {"arch-review": "approved"}
 
 
+    def test_does_not_create_lock_files(self, reports_dir: Path) -> None:
+        """読み込みだけでロックファイルを作らない（読み取り専用ディレクトリでも読める）"""
+        (reports_dir / "arch-review-task-123.yaml").write_text(
+            yaml.dump({"result": "approved"})
+        )
+        reports_dir.chmod(0o555)
+        try:
+            results = parse_review_results(str(reports_dir))
+            findings = merge_findings(str(reports_dir))
+        finally:
+            reports_dir.chmod(0o755)
+
+        assert results == {"arch-review": "approved"}
+        assert findings == []
+        assert not list(reports_dir.glob(".rwlock-*"))
+
+
 class TestMergeFindings:
     """merge_findings関数のテスト"""
 